@@ -1,9 +1,15 @@
-import boto3
 import logging
-from fastapi import Depends, HTTPException, status
+import time
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import APIKeyHeader
 
 from app.core.config import settings
+from app.core.metrics import AUTH_LATENCY
+from app.core.timing import record_timing, timed
+from app.models.compact import CodecError, CompactChatRequest, decode_chat_request
+from app.services.bedrock_client import get_shared_client
+from app.services.rate_limiting import get_rate_limiter
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -15,10 +21,10 @@ api_key_header = APIKeyHeader(name=API_KEY_NAME)
 # AWS Bedrock client dependency
 def get_bedrock_client():
     """
-    Dependency for getting an AWS Bedrock client
+    Dependency for getting the shared AWS Bedrock client
     """
     try:
-        return boto3.client('bedrock-runtime', region_name=settings.AWS_REGION)
+        return get_shared_client()
     except Exception as e:
         logger.error(f"Failed to initialize Bedrock client: {str(e)}")
         raise HTTPException(
@@ -31,6 +37,18 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
     """
     Dependency for verifying API key
     """
+    started = time.perf_counter()
+    outcome = "rejected"
+    try:
+        api_key = _check_api_key(api_key)
+        outcome = "accepted"
+        return api_key
+    finally:
+        elapsed = time.perf_counter() - started
+        AUTH_LATENCY.labels(outcome).observe(elapsed)
+        record_timing("auth", elapsed)
+
+def _check_api_key(api_key: str) -> str:
     if not settings.API_KEYS:
         # If no API keys are configured, fail securely
         logger.error("No API keys configured but authentication is required")
@@ -49,5 +67,75 @@ async def verify_api_key(api_key: str = Depends(api_key_header)):
     
     return api_key
 
+async def _request_user_id(request: Request) -> Optional[str]:
+    """
+    Extract user_id from a JSON request body. FastAPI has already parsed and
+    cached the body by the time dependencies run, so this does not re-parse it.
+    """
+    compact = getattr(request.state, "compact_chat_request", None)
+    if compact is not None:
+        return compact.user_id
+    if request.method != "POST" or "json" not in request.headers.get("content-type", ""):
+        return None
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    user_id = body.get("user_id") if isinstance(body, dict) else None
+    return str(user_id) if user_id else None
+
+# Fast codec request body dependency
+async def read_compact_chat_request(request: Request) -> CompactChatRequest:
+    """
+    Decode a chat completion body with the fast codec, rejecting bodies over
+    MAX_REQUEST_BYTES before reading them in full. The decoded request is kept on
+    ``request.state`` so later dependencies do not parse the body again.
+    """
+    compact = getattr(request.state, "compact_chat_request", None)
+    if compact is not None:
+        return compact
+    
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Request body exceeds {settings.MAX_REQUEST_BYTES} bytes"
+    )
+    length = request.headers.get("content-length", "")
+    if length.isdigit() and int(length) > settings.MAX_REQUEST_BYTES:
+        raise too_large
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > settings.MAX_REQUEST_BYTES:
+            raise too_large
+        chunks.append(chunk)
+    
+    try:
+        compact = decode_chat_request(b"".join(chunks))
+    except CodecError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    request.state.compact_chat_request = compact
+    return compact
+
+# Rate limiting dependency
+async def enforce_rate_limit(request: Request, response: Response, api_key: str = Depends(verify_api_key)):
+    """
+    Dependency enforcing per API key and per user_id request and token limits
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+    
+    with timed("ratelimit"):
+        result = await get_rate_limiter().check(api_key, await _request_user_id(request))
+    headers = result.headers()
+    if not result.allowed:
+        logger.warning(f"Rate limit exceeded for API key {api_key[:5]}...")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers=headers,
+        )
+    response.headers.update(headers)
+
 # Common security dependencies
-security_dependencies = [Depends(verify_api_key)]
\ No newline at end of file
+security_dependencies = [Depends(verify_api_key), Depends(enforce_rate_limit)]
\ No newline at end of file
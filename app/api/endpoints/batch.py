@@ -0,0 +1,63 @@
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+
+from app.api.dependencies import security_dependencies, verify_api_key
+from app.core.config import settings
+from app.models.batch import BatchChatCompletionRequest, BatchChatCompletionResponse
+from app.services.batch import run_batch
+from app.services.rate_limiting import record_token_usage
+from app.services.usage_tracking import track_usage
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post(
+    "/v1/batch/chat/completions",
+    response_model=BatchChatCompletionResponse,
+    dependencies=security_dependencies,
+    summary="Run several chat completions in one request"
+)
+async def create_batch_chat_completion(
+    batch: BatchChatCompletionRequest,
+    background_tasks: BackgroundTasks,
+    api_key: str = Depends(verify_api_key),
+    http_request: Request = None,
+):
+    """
+    Run up to BATCH_MAX_ITEMS non-streaming chat completions concurrently.
+
+    Each item succeeds or fails on its own: failed items carry an error with the
+    status code the single-request endpoint would have returned.
+    """
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one request")
+    if len(batch.requests) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch exceeds the limit of {settings.BATCH_MAX_ITEMS} requests"
+        )
+
+    max_concurrency = min(batch.max_concurrency or settings.BATCH_MAX_CONCURRENCY, settings.BATCH_MAX_CONCURRENCY)
+    items = await run_batch(batch.requests, max_concurrency, api_key=api_key)
+
+    # Track usage in background, per item so costs land on the right model
+    for request, item in zip(batch.requests, items):
+        if item.response is None:
+            continue
+        usage = item.response.usage
+        tokens = usage.total_tokens
+        details = usage.prompt_tokens_details
+        background_tasks.add_task(
+            track_usage,
+            model=item.response.model,
+            tokens=tokens,
+            user_id=request.user_id,
+            http_request=http_request,
+            api_key=api_key,
+            cached_tokens=details.cached_tokens if details else 0,
+            cache_write_tokens=details.cache_write_tokens if details else 0
+        )
+        background_tasks.add_task(record_token_usage, api_key, request.user_id, tokens)
+
+    succeeded = sum(1 for item in items if item.response is not None)
+    return BatchChatCompletionResponse(data=items, succeeded=succeeded, failed=len(items) - succeeded)
@@ -1,28 +1,35 @@
 import logging
-import json
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
-from fastapi.responses import StreamingResponse
-from typing import List
+import time
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request, Response
+from typing import Optional, Union
 
-from app.api.dependencies import get_bedrock_client, security_dependencies
-from app.models.chat import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChoice, ChatCompletionUsage, Message
+from app.api.dependencies import (
+    get_bedrock_client, read_compact_chat_request, security_dependencies, verify_api_key
+)
+from app.core.metrics import REQUEST_LATENCY, SSE_CHUNKS
+from app.core.timing import current_timing, mark_handler_done, timed
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse, Message
+from app.models.compact import CompactChatRequest, encode_chat_completion
+from app.services.adapters import InvalidConversation, finish_reason
+from app.services.admission import AdmissionRejected
 from app.services.bedrock import BedrockService
+from app.services.bedrock_errors import is_throttle, outcome
+from app.services.resilience import CircuitOpenError
+from app.services.sessions import PendingTurn, SessionConflict, get_session_store
+from app.services.sse import DONE, ChunkEncoder, EventStreamResponse, coalesce_deltas, encode_error
+from app.services.rate_limiting import record_token_usage
 from app.services.usage_tracking import track_usage
 from app.core.config import settings
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post(
-    "/v1/chat/completions", 
-    response_model=ChatCompletionResponse,
-    dependencies=security_dependencies,
-    summary="Create a chat completion"
-)
 async def create_chat_completion(
     request: ChatCompletionRequest,
     background_tasks: BackgroundTasks,
+    response: Response,
     bedrock_client = Depends(get_bedrock_client),
+    api_key: str = Depends(verify_api_key),
     http_request: Request = None,
 ):
     """
@@ -30,83 +37,217 @@ async def create_chat_completion(
     
     This endpoint is compatible with the OpenAI API format for easier frontend integration.
     """
+    return await _chat_completion(request, background_tasks, response, bedrock_client, api_key, http_request)
+
+async def create_chat_completion_fast(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    request: CompactChatRequest = Depends(read_compact_chat_request),
+    bedrock_client = Depends(get_bedrock_client),
+    api_key: str = Depends(verify_api_key),
+    http_request: Request = None,
+):
+    """
+    Create a completion for a chat conversation.
+    
+    This endpoint is compatible with the OpenAI API format for easier frontend integration.
+    The request body is decoded and the response encoded by the fast codec.
+    """
+    return await _chat_completion(request, background_tasks, response, bedrock_client, api_key, http_request,
+                                  fast=True)
+
+def _observe_request(bedrock_service: BedrockService, request, result: str, started: float):
+    model = bedrock_service.model_id or request.model
+    REQUEST_LATENCY.labels(model, str(bool(request.stream)).lower(), result).observe(time.perf_counter() - started)
+
+async def _chat_completion(
+    request: Union[ChatCompletionRequest, CompactChatRequest],
+    background_tasks: BackgroundTasks,
+    response: Response,
+    bedrock_client,
+    api_key: str,
+    http_request: Request,
+    fast: bool = False,
+    turn: Optional[PendingTurn] = None,
+):
+    """
+    Shared body of the chat completion endpoints. With a session ``turn``, the
+    turn and the assistant's reply are added to the session once the completion
+    succeeded; the caller releases a turn that fails before streaming starts.
+    """
+    started = time.perf_counter()
+    timing = current_timing()
+    if timing is not None:
+        # Reading and validating the body, and dependency overhead other than auth and rate limiting
+        timing.remainder("decode")
+    bedrock_service = BedrockService(bedrock_client, api_key=api_key, user_id=request.user_id)
     try:
-        bedrock_service = BedrockService(bedrock_client)
-        
         # Handle streaming responses
         if request.stream:
+            deltas = bedrock_service.stream_completion_deltas(
+                model_id=request.model,
+                messages=request.messages,
+                max_tokens=request.max_tokens,
+                temperature=request.temperature,
+                turn=turn
+            )
+            deltas = coalesce_deltas(deltas, settings.SSE_FLUSH_INTERVAL_MS / 1000, settings.SSE_FLUSH_MAX_CHARS)
+            # Pull the first delta before sending headers so the cache status is known
+            try:
+                first_delta = await deltas.__anext__()
+            except StopAsyncIteration:
+                first_delta = None
+            
+            body_started = False
+            
             async def generate_stream():
+                nonlocal body_started
+                body_started = True
+                model = bedrock_service.model_id or request.model
+                encoder = ChunkEncoder(model)
+                sse_chunks = SSE_CHUNKS.labels(model)
+                error = None
+                parts = [] if turn is not None else None
                 try:
-                    async for chunk in bedrock_service.generate_completion_stream(
-                        model_id=request.model,
-                        messages=request.messages,
-                        max_tokens=request.max_tokens,
-                        temperature=request.temperature
-                    ):
-                        # Convert to SSE format
-                        yield f"data: {chunk.model_dump_json(exclude_none=True)}\n\n"
+                    if first_delta is not None:
+                        yield encoder.delta(first_delta)
+                        sse_chunks.inc()
+                        if parts is not None:
+                            parts.append(first_delta)
+                        async for text in deltas:
+                            yield encoder.delta(text)
+                            sse_chunks.inc()
+                            if parts is not None:
+                                parts.append(text)
+                    if turn is not None:
+                        await get_session_store().commit(turn, Message(role="assistant", content="".join(parts)))
+                    yield encoder.finish(finish_reason(bedrock_service.stream_metrics.get("finish_reason")))
                     
                     # End of stream marker
-                    yield "data: [DONE]\n\n"
+                    yield DONE
                     
                     # Track usage in background after completion
+                    usage = bedrock_service.stream_metrics.get("usage") or {}
+                    tokens = usage.get("total_tokens", 0)
                     background_tasks.add_task(
                         track_usage,
-                        model=request.model,
-                        tokens=1000,  # Estimate for streaming
+                        model=model,
+                        tokens=tokens,
                         user_id=request.user_id,
-                        http_request=http_request
+                        http_request=http_request,
+                        api_key=api_key,
+                        cached_tokens=usage.get("cached_tokens", 0),
+                        cache_write_tokens=usage.get("cache_write_tokens", 0)
                     )
-                except Exception as e:
+                    background_tasks.add_task(record_token_usage, api_key, request.user_id, tokens)
+                except BaseException as e:
+                    error = e
+                    if not isinstance(e, Exception):
+                        raise
                     logger.error(f"Streaming error: {str(e)}")
-                    error_data = {"error": {"message": str(e), "type": "server_error"}}
-                    yield f"data: {json.dumps(error_data)}\n\n"
+                    yield encode_error(str(e))
+                finally:
+                    REQUEST_LATENCY.labels(model, "true", outcome(error)).observe(time.perf_counter() - started)
             
-            return StreamingResponse(
-                generate_stream(),
-                media_type="text/event-stream"
-            )
+            async def close_stream():
+                # Runs once the response is done, also if the client left before
+                # generate_stream started: closes the upstream Bedrock stream (already
+                # open for the first delta) and frees the session
+                await deltas.aclose()
+                if turn is not None:
+                    await get_session_store().release(turn)
+                if not body_started:
+                    _observe_request(bedrock_service, request, "cancelled", started)
+            
+            headers = {}
+            if bedrock_service.cache_status:
+                headers["X-Cache"] = bedrock_service.cache_status
+            if bedrock_service.cache_similarity is not None:
+                headers["X-Cache-Similarity"] = f"{bedrock_service.cache_similarity:.2f}"
+            if bedrock_service.context_tokens_saved:
+                headers["X-Context-Tokens-Saved"] = str(bedrock_service.context_tokens_saved)
+            return EventStreamResponse(generate_stream(), close_stream, headers=headers)
         
         # Handle non-streaming responses
         else:
-            response = await bedrock_service.generate_completion(
-                model_id=request.model,
-                messages=request.messages,
-                max_tokens=request.max_tokens,
-                temperature=request.temperature
-            )
+            if fast:
+                result = await bedrock_service.generate_completion(
+                    model_id=request.model,
+                    messages=request.messages,
+                    max_tokens=request.max_tokens,
+                    temperature=request.temperature
+                )
+                model = bedrock_service.model_id or request.model
+                usage = result.get("usage", {})
+            else:
+                completion_response = await bedrock_service.create_chat_completion(request, turn=turn)
+                if turn is not None:
+                    await get_session_store().commit(turn, completion_response.choices[0].message)
+                model = completion_response.model
+                usage = completion_response.usage.model_dump(exclude_none=True)
+                usage.update(usage.pop("prompt_tokens_details", {}))
+            tokens = usage.get("total_tokens", 0)
+            
+            if bedrock_service.cache_status:
+                response.headers["X-Cache"] = bedrock_service.cache_status
+            if bedrock_service.cache_similarity is not None:
+                response.headers["X-Cache-Similarity"] = f"{bedrock_service.cache_similarity:.2f}"
+            if bedrock_service.context_tokens_saved:
+                response.headers["X-Context-Tokens-Saved"] = str(bedrock_service.context_tokens_saved)
             
             # Track usage in background
             background_tasks.add_task(
                 track_usage,
-                model=request.model,
-                tokens=response.get("usage", {}).get("total_tokens", 0),
+                model=model,
+                tokens=tokens,
                 user_id=request.user_id,
-                http_request=http_request
-            )
-            
-            # Format response to match OpenAI-like structure
-            completion_response = ChatCompletionResponse(
-                model=request.model,
-                choices=[
-                    ChatCompletionChoice(
-                        index=0,
-                        message=Message(
-                            role="assistant",
-                            content=response.get("completion", "")
-                        ),
-                        finish_reason="stop"
-                    )
-                ],
-                usage=ChatCompletionUsage(
-                    prompt_tokens=response.get("usage", {}).get("prompt_tokens", 0),
-                    completion_tokens=response.get("usage", {}).get("completion_tokens", 0),
-                    total_tokens=response.get("usage", {}).get("total_tokens", 0)
-                )
+                http_request=http_request,
+                api_key=api_key,
+                cached_tokens=usage.get("cached_tokens", 0),
+                cache_write_tokens=usage.get("cache_write_tokens", 0)
             )
+            background_tasks.add_task(record_token_usage, api_key, request.user_id, tokens)
             
+            REQUEST_LATENCY.labels(model, "false", "success").observe(time.perf_counter() - started)
+            if fast:
+                # Returned as-is: FastAPI skips response_model validation for Response objects
+                with timed("serialize"):
+                    body = encode_chat_completion(model, result.get("completion", ""), usage,
+                                                  result.get("finish_reason", "stop"))
+                return Response(body, media_type="application/json", headers=dict(response.headers))
+            mark_handler_done()
             return completion_response
             
+    except (InvalidConversation, SessionConflict) as e:
+        _observe_request(bedrock_service, request, "rejected", started)
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except (AdmissionRejected, CircuitOpenError) as e:
+        _observe_request(bedrock_service, request, "rejected", started)
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers())
     except Exception as e:
+        _observe_request(bedrock_service, request, outcome(e), started)
         logger.error(f"Error in chat completion: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        if is_throttle(e):
+            # Still throttled after retries: let the client back off
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        raise HTTPException(status_code=500, detail=str(e))
+
+if settings.FAST_CODEC_ENABLED:
+    # Decode the body before the security dependencies so rate limiting reuses it
+    router.add_api_route(
+        "/v1/chat/completions",
+        create_chat_completion_fast,
+        methods=["POST"],
+        response_model=ChatCompletionResponse,
+        dependencies=[Depends(read_compact_chat_request)] + security_dependencies,
+        summary="Create a chat completion"
+    )
+else:
+    router.add_api_route(
+        "/v1/chat/completions",
+        create_chat_completion,
+        methods=["POST"],
+        response_model=ChatCompletionResponse,
+        dependencies=security_dependencies,
+        summary="Create a chat completion"
+    )
@@ -0,0 +1,84 @@
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
+
+from app.api.dependencies import get_bedrock_client, security_dependencies, verify_api_key
+from app.core.config import settings
+from app.core.timing import current_timing, timed
+from app.models.embeddings import EmbeddingRequest, EmbeddingResponse, encode_embeddings
+from app.services.admission import AdmissionRejected
+from app.services.bedrock import BedrockService
+from app.services.bedrock_errors import error_code, is_throttle
+from app.services.embeddings import UnsupportedEmbeddingModel
+from app.services.rate_limiting import record_token_usage
+from app.services.resilience import CircuitOpenError
+from app.services.usage_tracking import track_usage
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post(
+    "/v1/embeddings",
+    response_model=EmbeddingResponse,
+    dependencies=security_dependencies,
+    summary="Create embeddings"
+)
+async def create_embeddings(
+    request: EmbeddingRequest,
+    background_tasks: BackgroundTasks,
+    bedrock_client = Depends(get_bedrock_client),
+    api_key: str = Depends(verify_api_key),
+    http_request: Request = None,
+):
+    """
+    Embed one text or a list of texts with a Bedrock embedding model.
+
+    This endpoint is compatible with the OpenAI API format. Repeated texts are
+    served from the embedding cache, and texts from concurrent requests are sent
+    to Bedrock in shared batches where the model accepts several texts per call.
+    """
+    timing = current_timing()
+    if timing is not None:
+        timing.remainder("decode")
+    texts = [request.input] if isinstance(request.input, str) else request.input
+    if len(texts) > settings.EMBEDDING_MAX_INPUTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Input exceeds the limit of {settings.EMBEDDING_MAX_INPUTS} texts"
+        )
+    model = request.model or settings.DEFAULT_EMBEDDING_MODEL
+
+    bedrock_service = BedrockService(bedrock_client, api_key=api_key)
+    try:
+        with timed("embed"):
+            vectors, tokens = await bedrock_service.create_embeddings(
+                model, texts, request.dimensions, request.input_type
+            )
+    except UnsupportedEmbeddingModel as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except (AdmissionRejected, CircuitOpenError) as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers=e.headers())
+    except Exception as e:
+        logger.error(f"Error creating embeddings: {str(e)}")
+        if is_throttle(e):
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        if error_code(e) == "ValidationException":
+            # e.g. dimensions the model does not support, or a text over its length limit
+            raise HTTPException(status_code=400, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Track usage in background
+    if tokens:
+        background_tasks.add_task(
+            track_usage,
+            model=model,
+            tokens=tokens,
+            user_id=request.user_id,
+            http_request=http_request,
+            api_key=api_key
+        )
+        background_tasks.add_task(record_token_usage, api_key, request.user_id, tokens)
+
+    # Returned as-is: FastAPI skips response_model validation for Response objects
+    with timed("serialize"):
+        body = encode_embeddings(model, vectors, request.encoding_format, tokens)
+    return Response(body, media_type="application/json", headers={"X-Cache": bedrock_service.cache_status})
@@ -1,8 +1,7 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends
-import boto3
+from fastapi import APIRouter, Response
 import logging
-from app.api.dependencies import get_bedrock_client
+from app.services.health import get_health_monitor, is_draining
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -20,25 +19,36 @@ async def health_check():
     }
 
 @router.get("/health/bedrock", summary="AWS Bedrock service health check")
-async def bedrock_health_check(client = Depends(get_bedrock_client)):
+async def bedrock_health_check():
     """
-    Checks the connection to AWS Bedrock service.
+    Reports the AWS Bedrock connectivity seen by the background health monitor:
+    per region and model status, last success and failure, and probe latencies.
+    Served from memory; no AWS call is made per request.
     This endpoint is publicly accessible without authentication.
     """
-    try:
-        # Minimal API call to check Bedrock service connectivity
-        # Listing models is a lightweight operation that verifies our credentials and connectivity
-        response = client.list_foundation_models(maxResults=1)
+    monitor = get_health_monitor()
+    if monitor is None:
         return {
-            "status": "connected", 
-            "timestamp": datetime.utcnow().isoformat(),
-            "service": "aws-bedrock"
-        }
-    except Exception as e:
-        logger.error(f"AWS Bedrock health check failed: {str(e)}")
-        return {
-            "status": "disconnected",
+            "status": "unknown",
             "timestamp": datetime.utcnow().isoformat(),
             "service": "aws-bedrock",
-            "error": str(e)
-        }
\ No newline at end of file
+            "error": "Health monitoring is disabled"
+        }
+    return Response(content=monitor.snapshot(), media_type="application/json")
+
+@router.get("/health/ready", summary="Readiness check endpoint")
+async def readiness_check():
+    """
+    Returns 200 once the first round of Bedrock probes has finished, and 503 while
+    every probed region/model has failed HEALTH_FAILURE_THRESHOLD probes in a row,
+    or once the worker has started draining for shutdown. Otherwise always ready
+    when health monitoring is disabled.
+    This endpoint is publicly accessible without authentication.
+    """
+    monitor = get_health_monitor()
+    ready = not is_draining() and (monitor is None or monitor.ready)
+    return Response(
+        content=b'{"ready":true}' if ready else b'{"ready":false}',
+        status_code=200 if ready else 503,
+        media_type="application/json",
+    )
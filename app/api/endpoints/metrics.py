@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Response
+
+from app.core.metrics import render_metrics
+
+router = APIRouter()
+
+@router.get("/metrics", summary="Prometheus metrics", include_in_schema=False)
+async def metrics():
+    """
+    Expose metrics in the Prometheus text format.
+    This endpoint is publicly accessible without authentication, like /health.
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
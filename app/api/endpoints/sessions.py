@@ -0,0 +1,124 @@
+import logging
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
+
+from app.api.dependencies import get_bedrock_client, security_dependencies, verify_api_key
+from app.api.endpoints.chat import _chat_completion
+from app.core.config import settings
+from app.models.chat import ChatCompletionResponse
+from app.models.compact import CompactChatRequest
+from app.models.session import SessionCreateRequest, SessionResponse, SessionTurnRequest
+from app.services.sessions import Session, SessionConflict, get_session_store
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def _session_response(session: Session, include_messages: bool = False) -> SessionResponse:
+    return SessionResponse(
+        id=session.id,
+        created=int(session.created),
+        expires_at=int(session.expires_at),
+        model=session.model,
+        message_count=len(session.messages),
+        prompt_tokens=session.prompt_tokens,
+        messages=list(session.messages) if include_messages else None,
+    )
+
+async def _get_session(session_id: str, api_key: str) -> Session:
+    session = await get_session_store().get(session_id, api_key)
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Session {session_id} not found")
+    return session
+
+@router.post(
+    "/v1/sessions",
+    response_model=SessionResponse,
+    response_model_exclude_none=True,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=security_dependencies,
+    summary="Create a conversation session"
+)
+async def create_session(request: SessionCreateRequest, api_key: str = Depends(verify_api_key)):
+    """
+    Create a server-side conversation. Later turns are added with
+    ``POST /v1/sessions/{session_id}/messages`` and carry only the new messages.
+    """
+    session = await get_session_store().create(
+        api_key,
+        request.model or settings.DEFAULT_MODEL,
+        request.messages,
+        max_tokens=request.max_tokens,
+        temperature=request.temperature,
+        user_id=request.user_id,
+    )
+    return _session_response(session)
+
+@router.get(
+    "/v1/sessions/{session_id}",
+    response_model=SessionResponse,
+    response_model_exclude_none=True,
+    dependencies=security_dependencies,
+    summary="Get a conversation session"
+)
+async def get_session(session_id: str, include_messages: bool = False, api_key: str = Depends(verify_api_key)):
+    """
+    Session metadata, and with ``include_messages`` its full history
+    """
+    return _session_response(await _get_session(session_id, api_key), include_messages)
+
+@router.delete(
+    "/v1/sessions/{session_id}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=security_dependencies,
+    summary="Delete a conversation session"
+)
+async def delete_session(session_id: str, api_key: str = Depends(verify_api_key)):
+    if not await get_session_store().delete(session_id, api_key):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Session {session_id} not found")
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+@router.post(
+    "/v1/sessions/{session_id}/messages",
+    response_model=ChatCompletionResponse,
+    dependencies=security_dependencies,
+    summary="Add a turn to a session and get the reply"
+)
+async def create_session_turn(
+    session_id: str,
+    request: SessionTurnRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    bedrock_client = Depends(get_bedrock_client),
+    api_key: str = Depends(verify_api_key),
+    http_request: Request = None,
+):
+    """
+    Run a chat completion on the session's history plus the new messages.
+
+    The new messages and the assistant's reply are stored once the completion
+    succeeds; a failed completion leaves the session unchanged. Concurrent turns
+    on the same session are rejected with 409.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="A turn must contain at least one message")
+    store = get_session_store()
+    session = await _get_session(session_id, api_key)
+    try:
+        turn = await store.begin(session, request.messages)
+    except SessionConflict as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    try:
+        # The history comes from the session, so nothing is re-validated here
+        chat_request = CompactChatRequest(
+            model=session.model,
+            messages=turn.messages,
+            max_tokens=request.max_tokens or session.max_tokens,
+            temperature=request.temperature if request.temperature is not None else session.temperature,
+            stream=bool(request.stream),
+            user_id=session.user_id,
+        )
+        return await _chat_completion(chat_request, background_tasks, response, bedrock_client, api_key,
+                                      http_request, turn=turn)
+    except BaseException:
+        # A streamed turn is released by its stream once it ends
+        await store.release(turn)
+        raise
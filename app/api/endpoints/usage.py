@@ -0,0 +1,35 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from app.api.dependencies import security_dependencies, verify_api_key
+from app.core.config import settings
+from app.services.usage_tracking import get_usage_pipeline, query_usage_rollups
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get(
+    "/v1/usage",
+    dependencies=security_dependencies,
+    summary="Per-minute usage for the calling API key"
+)
+async def get_usage(
+    model: Optional[str] = Query(None, description="Only return usage for this model"),
+    start: Optional[int] = Query(None, description="Inclusive start as a Unix timestamp"),
+    end: Optional[int] = Query(None, description="Exclusive end as a Unix timestamp"),
+    api_key: str = Depends(verify_api_key),
+):
+    """
+    Return pre-aggregated usage rollups (requests, tokens and estimated cost per model
+    per minute) for the API key making the request.
+    """
+    if not settings.TRACK_USAGE:
+        # Don't create an empty usage store just to report that it is empty
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Usage tracking is disabled")
+    pipeline = get_usage_pipeline()
+    return {
+        "object": "list",
+        "data": await query_usage_rollups(api_key=api_key, model=model, start=start, end=end),
+        "pipeline": {"queued": pipeline.queue.qsize(), "dropped": pipeline.dropped},
+    }
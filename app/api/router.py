@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from app.api.endpoints import batch, chat, embeddings, health, metrics, sessions, usage
+
+api_router = APIRouter()
+api_router.include_router(health.router, tags=["health"])
+api_router.include_router(metrics.router, tags=["metrics"])
+api_router.include_router(chat.router, tags=["chat"])
+api_router.include_router(batch.router, tags=["batch"])
+api_router.include_router(embeddings.router, tags=["embeddings"])
+api_router.include_router(sessions.router, tags=["sessions"])
+api_router.include_router(usage.router, tags=["usage"])
@@ -0,0 +1,268 @@
+"""
+Offline batch job: run chat completions from a JSONL file through Bedrock.
+
+Each input line is one of:
+
+- a chat completion request: ``{"model": ..., "messages": [...], ...}``
+- a batch line wrapping one: ``{"custom_id": ..., "body": {<chat completion request>}}``
+- a work item: ``{"request_id": ..., "title": ..., "body": "<text>"}``, sent as a
+  single user message
+
+Results are appended to the output JSONL as items finish (so not in input order),
+each tagged with its ``custom_id`` and input line number. Memory use is bounded by
+the dispatch window, not the file size. Progress is checkpointed next to the output
+file; rerunning the same command resumes an interrupted job.
+
+Usage:
+    python -m app.batch_job requests.jsonl results.jsonl --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import time
+from typing import Any, Dict, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logging import configure_logging
+from app.models.batch import BatchChatCompletionItem
+from app.models.chat import ChatCompletionRequest
+from app.services.batch import batch_item_error, run_chat_completion
+from app.services.bedrock_client import close_bedrock_client, init_bedrock_client
+from app.services.executor import init_executor, shutdown_executor
+from app.services.response_cache import close_response_cache
+from app.services.routing import close_router, init_router
+from app.services.tokenizer import warm_tokenizer
+from app.services.usage_tracking import flush_usage_pipeline, track_usage
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """
+    Job progress: every input line below ``watermark`` is done, as are the lines in
+    ``done_above``. ``output_bytes`` is the output size matching that state, so a
+    resumed job truncates results written after the last checkpoint and redoes them.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = input_path
+        self.watermark = 0
+        self.watermark_offset = 0
+        self.done_above: Set[int] = set()
+        self.output_bytes = 0
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> "Checkpoint":
+        checkpoint = cls(path, os.path.abspath(input_path))
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state["input"] != checkpoint.input_path:
+                raise SystemExit(f"Checkpoint {path} belongs to {state['input']}, not {checkpoint.input_path}")
+            checkpoint.watermark = state["watermark"]
+            checkpoint.watermark_offset = state["watermark_offset"]
+            checkpoint.done_above = set(state["done_above"])
+            checkpoint.output_bytes = state["output_bytes"]
+        return checkpoint
+
+    def save(self):
+        state = {
+            "input": self.input_path,
+            "watermark": self.watermark,
+            "watermark_offset": self.watermark_offset,
+            "done_above": sorted(self.done_above),
+            "output_bytes": self.output_bytes,
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def parse_line(line: bytes, line_number: int, default_model: str) -> Tuple[str, ChatCompletionRequest]:
+    """
+    Turn one input line into a custom ID and a chat completion request
+    """
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("Each line must be a JSON object")
+    if isinstance(data.get("body"), dict):
+        custom_id, payload = data.get("custom_id"), dict(data["body"])
+    elif "messages" in data:
+        custom_id, payload = data.pop("custom_id", None), data
+    elif isinstance(data.get("body"), str):
+        custom_id = data.get("request_id") or data.get("custom_id")
+        content = f"{data['title']}\n\n{data['body']}" if data.get("title") else data["body"]
+        payload = {"messages": [{"role": "user", "content": content}]}
+    else:
+        raise ValueError("Line has neither messages nor a body")
+    payload.setdefault("model", default_model)
+    payload["stream"] = False
+    return str(custom_id or f"line-{line_number}"), ChatCompletionRequest(**payload)
+
+
+class BatchJob:
+    """Streams an input JSONL file through Bedrock with bounded concurrency"""
+
+    def __init__(self, input_path: str, output_path: str, concurrency: int, window: int,
+                 checkpoint_every: int, default_model: str, user_id: Optional[str] = None):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.window = max(window, concurrency)
+        self.checkpoint_every = checkpoint_every
+        self.default_model = default_model
+        self.user_id = user_id
+        self.checkpoint = Checkpoint.load(f"{output_path}.checkpoint", input_path)
+        self.succeeded = 0
+        self.failed = 0
+        self._offsets: Dict[int, int] = {}
+        self._next_offset = self.checkpoint.watermark_offset
+        self._since_checkpoint = 0
+        self._progress = asyncio.Event()
+        self._out = None
+
+    def _mark_done(self, line_number: int):
+        checkpoint = self.checkpoint
+        checkpoint.done_above.add(line_number)
+        while checkpoint.watermark in checkpoint.done_above:
+            checkpoint.done_above.discard(checkpoint.watermark)
+            self._offsets.pop(checkpoint.watermark, None)
+            checkpoint.watermark += 1
+            self._progress.set()
+        checkpoint.watermark_offset = self._offsets.get(checkpoint.watermark, self._next_offset)
+
+    def _save_checkpoint(self):
+        self._out.flush()
+        self.checkpoint.output_bytes = self._out.tell()
+        self.checkpoint.save()
+        self._since_checkpoint = 0
+
+    def _write_result(self, line_number: int, custom_id: str, item: BatchChatCompletionItem):
+        record: Dict[str, Any] = {"custom_id": custom_id, "line": line_number}
+        if item.response is not None:
+            record["response"] = item.response.model_dump()
+            self.succeeded += 1
+        else:
+            record["error"] = item.error.model_dump()
+            self.failed += 1
+        self._out.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._mark_done(line_number)
+        self._since_checkpoint += 1
+        if self._since_checkpoint >= self.checkpoint_every:
+            self._save_checkpoint()
+            logger.info(f"{self.succeeded} succeeded, {self.failed} failed, "
+                        f"all lines before {self.checkpoint.watermark} done")
+
+    async def _process(self, line_number: int, line: bytes, slots: asyncio.Semaphore):
+        custom_id = f"line-{line_number}"
+        try:
+            try:
+                custom_id, request = parse_line(line, line_number, self.default_model)
+            except Exception as e:
+                item = BatchChatCompletionItem(index=line_number, error=batch_item_error(ValueError(str(e))))
+            else:
+                item = await run_chat_completion(request, line_number, user_id=self.user_id)
+                if item.response is not None and settings.TRACK_USAGE:
+                    usage = item.response.usage
+                    details = usage.prompt_tokens_details
+                    await track_usage(model=item.response.model, tokens=usage.total_tokens,
+                                      user_id=self.user_id or request.user_id,
+                                      cached_tokens=details.cached_tokens if details else 0,
+                                      cache_write_tokens=details.cache_write_tokens if details else 0)
+            self._write_result(line_number, custom_id, item)
+        finally:
+            slots.release()
+
+    async def run(self):
+        checkpoint = self.checkpoint
+        if checkpoint.output_bytes and not os.path.exists(self.output_path):
+            raise SystemExit(f"Checkpoint exists but output {self.output_path} is missing")
+        if not os.path.exists(checkpoint.path) and os.path.exists(self.output_path):
+            # A new job appends to earlier results; only a resumed one truncates
+            checkpoint.output_bytes = os.path.getsize(self.output_path)
+        if checkpoint.watermark:
+            logger.info(f"Resuming from line {checkpoint.watermark}")
+
+        self._out = open(self.output_path, "ab")
+        self._out.truncate(checkpoint.output_bytes)
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks: Set[asyncio.Task] = set()
+        started = time.perf_counter()
+        try:
+            with open(self.input_path, "rb") as source:
+                source.seek(checkpoint.watermark_offset)
+                line_number = checkpoint.watermark
+                for line in source:
+                    offset = self._next_offset
+                    self._next_offset += len(line)
+                    if line_number in checkpoint.done_above or not line.strip():
+                        if line_number not in checkpoint.done_above:
+                            self._mark_done(line_number)
+                        line_number += 1
+                        continue
+
+                    self._offsets[line_number] = offset
+                    # Bound memory: never run ahead of the oldest unfinished line by more than the window
+                    while line_number >= checkpoint.watermark + self.window:
+                        self._progress.clear()
+                        await self._progress.wait()
+                    await slots.acquire()
+                    task = asyncio.ensure_future(self._process(line_number, line, slots))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                    line_number += 1
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._save_checkpoint()
+            self._out.close()
+        elapsed = time.perf_counter() - started
+        logger.info(f"Batch job finished in {elapsed:.1f}s: {self.succeeded} succeeded, {self.failed} failed")
+
+
+async def main(args: argparse.Namespace):
+    init_bedrock_client()
+    init_router()
+    init_executor()
+    await asyncio.to_thread(warm_tokenizer)
+
+    job = BatchJob(args.input, args.output, args.concurrency, args.window, args.checkpoint_every,
+                   args.model, args.user_id)
+    # Treat SIGTERM like Ctrl-C so the checkpoint is written before exiting
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    try:
+        await job.run()
+    finally:
+        shutdown_executor()
+        close_router()
+        close_bedrock_client()
+        close_response_cache()
+        await flush_usage_pipeline()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="Input JSONL file")
+    parser.add_argument("output", help="Output JSONL file (results are appended)")
+    parser.add_argument("--concurrency", type=int, default=settings.BATCH_MAX_CONCURRENCY)
+    parser.add_argument("--window", type=int, default=1000,
+                        help="Most lines that may be in progress or done ahead of the oldest unfinished line")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Results between checkpoints")
+    parser.add_argument("--model", default=settings.DEFAULT_MODEL, help="Model for lines that do not name one")
+    parser.add_argument("--user-id", help="User ID recorded for usage tracking")
+    configure_logging()
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        # SIGTERM cancels the main task
+        logger.info("Interrupted; rerun the same command to resume")
@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 from pydantic import AnyHttpUrl, validator
 from pydantic_settings import BaseSettings
 
@@ -22,6 +22,59 @@ class Settings(BaseSettings):
         
     # AWS settings
     AWS_REGION: str = "us-east-1"
+    BEDROCK_ENDPOINT_URL: Optional[str] = None
+    
+    # Multi-region routing (JSON list; empty means AWS_REGION only) and model aliases
+    BEDROCK_REGIONS: List[str] = []
+    ROUTING_EWMA_ALPHA: float = 0.2
+    ROUTING_RECOVERY_SECONDS: float = 30.0
+    ROUTING_THROTTLE_COOLDOWN_SECONDS: float = 1.0
+    MODEL_ALIASES: Dict[str, Dict[str, int]] = {}  # alias -> {model ID: max prompt tokens, 0 = no limit}
+    
+    # Bedrock client connection pool settings
+    BEDROCK_MAX_POOL_CONNECTIONS: int = 50
+    BEDROCK_TCP_KEEPALIVE: bool = True
+    BEDROCK_CONNECT_TIMEOUT: float = 5.0
+    BEDROCK_READ_TIMEOUT: float = 120.0
+    BEDROCK_RETRY_MODE: str = "standard"
+    BEDROCK_MAX_ATTEMPTS: int = 1  # botocore attempts; retries are done by the resilience layer
+    
+    # Retries with jittered backoff and a retry budget, hedging and circuit breaking
+    BEDROCK_RETRY_ATTEMPTS: int = 3
+    BEDROCK_RETRY_BASE_DELAY: float = 0.1
+    BEDROCK_RETRY_MAX_DELAY: float = 5.0
+    BEDROCK_RETRY_BUDGET_RATIO: float = 0.2
+    BEDROCK_RETRY_BUDGET_MIN_PER_SECOND: float = 1.0
+    BEDROCK_HEDGING_ENABLED: bool = False
+    BEDROCK_HEDGE_QUANTILE: float = 0.95
+    BEDROCK_HEDGE_MIN_DELAY: float = 0.05
+    BEDROCK_BREAKER_FAILURE_THRESHOLD: int = 5
+    BEDROCK_BREAKER_RESET_SECONDS: float = 30.0
+    
+    # Blocking Bedrock calls run in a bounded thread pool with per-model caps
+    BEDROCK_EXECUTOR_MAX_WORKERS: int = 50
+    BEDROCK_STREAM_MAX_WORKERS: int = 200  # Threads reading response streams, separate from the pool above
+    BEDROCK_MODEL_CONCURRENCY: int = 32
+    BEDROCK_MODEL_CONCURRENCY_LIMITS: Dict[str, int] = {}
+    
+    # Adaptive per-model concurrency limit and load shedding in front of Bedrock
+    ADMISSION_CONTROL_ENABLED: bool = False
+    ADMISSION_INITIAL_LIMIT: int = 8
+    ADMISSION_MIN_LIMIT: int = 1
+    ADMISSION_MAX_LIMIT: int = 32
+    ADMISSION_MAX_QUEUE: int = 64
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    ADMISSION_LATENCY_TOLERANCE: float = 2.0  # Recent over windowed median latency that lowers the limit, 0 disables
+    ADMISSION_BACKOFF_RATIO: float = 0.5
+    ADMISSION_API_KEY_PRIORITIES: Dict[str, int] = {}  # API key -> priority, higher is served first
+    
+    # Background Bedrock health probes behind /health/bedrock and /health/ready
+    HEALTH_MONITOR_ENABLED: bool = True
+    HEALTH_PROBE_INTERVAL_SECONDS: float = 30.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 5.0
+    HEALTH_PROBE_MODELS: List[str] = []  # Empty means DEFAULT_MODEL; probed in every routing region
+    HEALTH_PROBE_MODE: str = "validation"  # "validation" (empty body, no tokens) or "invoke" (1-token completion)
+    HEALTH_FAILURE_THRESHOLD: int = 3  # Consecutive failures of every target before /health/ready fails
     
     # CORS settings
     BACKEND_CORS_ORIGINS: List[Union[str, AnyHttpUrl]] = ["*"]
@@ -34,20 +87,114 @@ class Settings(BaseSettings):
             return v
         raise ValueError(v)
     
+    # Metrics
+    METRICS_ENABLED: bool = True
+    METRICS_MAX_MODELS: int = 50  # Models labelled by name beyond the configured ones; the rest are "other"
+    
+    # Per-request stage timing (Server-Timing header and log fields) and sampled cProfile profiles
+    SERVER_TIMING_ENABLED: bool = True
+    PROFILE_DIR: Optional[str] = None  # Directory for .prof files; profiling is off when unset
+    PROFILE_SAMPLE_RATE: float = 0.0  # Fraction of requests profiled
+    PROFILE_HEADER_ENABLED: bool = False  # Also profile requests sent with "X-Profile: 1"
+    
+    # Production server (python -m app.server): worker processes and graceful shutdown
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0  # 0 = one per CPU of the container's CPU quota
+    SERVER_LOOP: str = "auto"  # "auto" uses uvloop when installed, else "asyncio"
+    SERVER_HTTP: str = "auto"  # "auto" uses httptools when installed, else "h11"
+    SERVER_DRAIN_SECONDS: float = 5.0  # After SIGTERM, keep serving this long with /health/ready failing
+    SERVER_GRACEFUL_TIMEOUT_SECONDS: int = 30  # Then wait this long for in-flight requests to finish
+    
     # Logging settings
     LOG_LEVEL: str = "INFO"
     
     # Rate limiting
     RATE_LIMIT_ENABLED: bool = False
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_TOKENS_PER_MINUTE: int = 100000
+    RATE_LIMIT_USER_PER_MINUTE: int = 0  # Per user_id within a key; 0 means no per-user limit
+    RATE_LIMIT_USER_TOKENS_PER_MINUTE: int = 0
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" or "redis"
+    RATE_LIMIT_REDIS_URL: Optional[str] = None
     
     # Model settings
     DEFAULT_MODEL: str = "anthropic.claude-3-sonnet-20240229-v1:0"
     DEFAULT_MAX_TOKENS: int = 2000
     DEFAULT_TEMPERATURE: float = 0.7
     
+    # Context window management: fit long conversations into the model's window before rendering
+    CONTEXT_STRATEGY: str = "none"  # "none", "sliding_window", "keep_ends" or "summarize"
+    CONTEXT_MAX_PROMPT_TOKENS: int = 0  # Cap on prompt tokens below the context window (0 = window only)
+    CONTEXT_KEEP_FIRST_TURNS: int = 1
+    CONTEXT_KEEP_LAST_TURNS: int = 8
+    CONTEXT_SUMMARY_MODEL: str = "anthropic.claude-3-haiku-20240307-v1:0"
+    CONTEXT_SUMMARY_MAX_TOKENS: int = 512
+    CONTEXT_SUMMARY_CACHE_SIZE: int = 1000
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = {}  # model ID pattern -> context window in tokens
+    
+    # Embeddings (/v1/embeddings): micro-batching of concurrent requests and a vector cache
+    DEFAULT_EMBEDDING_MODEL: str = "amazon.titan-embed-text-v2:0"
+    EMBEDDING_BATCH_WINDOW_MS: float = 0.0  # How long a batch waits for more texts (batching models only, 0 = off)
+    EMBEDDING_MAX_BATCH_SIZE: int = 96  # Also capped by the model's own limit
+    EMBEDDING_MAX_INPUTS: int = 2048  # Texts per request
+    EMBEDDING_CACHE_MAX_BYTES: int = 128 * 1024 * 1024
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400
+    
+    # Server-side conversation sessions (/v1/sessions)
+    SESSION_TTL_SECONDS: int = 3600  # Since the last turn
+    SESSION_MEMORY_MAX_BYTES: int = 256 * 1024 * 1024
+    SESSION_SQLITE_PATH: Optional[str] = None  # Keeps evicted sessions and shares them between workers
+    SESSION_TURN_LEASE_SECONDS: float = 300.0  # A turn that never finishes frees its session after this
+    
+    # Fast codec for /v1/chat/completions: decode and encode raw JSON without pydantic models
+    FAST_CODEC_ENABLED: bool = False
+    MAX_REQUEST_BYTES: int = 8 * 1024 * 1024  # Enforced by the fast codec
+    
+    # Streaming: merge small deltas into one SSE frame (0 sends every delta as it arrives)
+    SSE_FLUSH_INTERVAL_MS: float = 0.0
+    SSE_FLUSH_MAX_CHARS: int = 256
+    
+    # Batch chat completions
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_MAX_CONCURRENCY: int = 8
+    
+    # Exact-match response cache (opt-in)
+    RESPONSE_CACHE_ENABLED: bool = False
+    RESPONSE_CACHE_MAX_TEMPERATURE: float = 0.0
+    RESPONSE_CACHE_TTL_SECONDS: int = 3600
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_SQLITE_PATH: Optional[str] = None
+    RESPONSE_CACHE_SQLITE_MAX_ENTRIES: int = 100000
+    
+    # Near-duplicate response cache (opt-in): reuse completions of prompts that differ only trivially
+    NEAR_CACHE_ENABLED: bool = False
+    NEAR_CACHE_MODELS: Dict[str, float] = {}  # model ID pattern -> similarity threshold (0.9 is safe); others uncached
+    NEAR_CACHE_API_KEYS: Dict[str, float] = {}  # API key -> threshold overriding the model's, 0 turns it off
+    NEAR_CACHE_MAX_TEMPERATURE: float = 0.0
+    NEAR_CACHE_TTL_SECONDS: int = 3600
+    NEAR_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    NEAR_CACHE_MAX_PROMPT_CHARS: int = 16384  # Longer prompts are not near-duplicate cached
+    
+    # Bedrock prompt caching (Messages API models): checkpoint recurring system prompts and documents
+    PROMPT_CACHE_ENABLED: bool = False
+    PROMPT_CACHE_MIN_TOKENS: int = 1024  # Shortest prefix worth caching
+    PROMPT_CACHE_MIN_REUSE: int = 2  # Sightings within the window before a prefix is checkpointed
+    PROMPT_CACHE_REUSE_WINDOW_SECONDS: float = 300.0
+    PROMPT_CACHE_MAX_CHECKPOINTS: int = 4
+    
+    # Share one upstream call between identical concurrent requests
+    REQUEST_COALESCING_ENABLED: bool = False
+    
+    # Local BPE encoding used when Bedrock does not report token usage
+    TOKENIZER_ENCODING: str = "cl100k_base"
+    
     # Usage tracking
     TRACK_USAGE: bool = True
+    USAGE_DB_PATH: str = "usage.sqlite3"
+    USAGE_QUEUE_MAX_SIZE: int = 10000
+    USAGE_BATCH_SIZE: int = 500
+    USAGE_FLUSH_INTERVAL_SECONDS: float = 1.0
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,15 @@
+import logging
+import sys
+
+from app.core.config import settings
+
+
+def configure_logging():
+    """
+    Configure root logging for the application from LOG_LEVEL
+    """
+    logging.basicConfig(
+        level=getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO),
+        format="%(asctime)s %(levelname)s %(name)s %(message)s",
+        stream=sys.stdout,
+    )
@@ -0,0 +1,192 @@
+import logging
+import os
+from typing import Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+    from prometheus_client import multiprocess as prometheus_multiprocess
+except ImportError:  # Metrics are optional
+    prometheus_client = None
+
+# Latency buckets (seconds) spanning a few ms of auth up to multi-minute generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RATE_BUCKETS = (1, 5, 10, 20, 40, 60, 80, 100, 150, 200, 400)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 96)
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+
+
+class _NoopMetric:
+    """Stand-in used when metrics are disabled or prometheus_client is missing"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+class _ModelLabelled:
+    """
+    Wraps a metric whose first label is the model, bounding that label with model_label
+    """
+
+    def __init__(self, metric):
+        self._metric = metric
+
+    def labels(self, model_id, *args):
+        return self._metric.labels(model_label(model_id), *args)
+
+
+# Label for models that were never configured nor answered by Bedrock
+OTHER_MODEL = "other"
+
+_configured: Optional[Set[str]] = None
+_registered: Set[str] = set()
+
+
+def _configured_models() -> Set[str]:
+    models = {settings.DEFAULT_MODEL, settings.CONTEXT_SUMMARY_MODEL, settings.DEFAULT_EMBEDDING_MODEL}
+    models.update(settings.HEALTH_PROBE_MODELS)
+    models.update(settings.BEDROCK_MODEL_CONCURRENCY_LIMITS)
+    for targets in settings.MODEL_ALIASES.values():
+        models.update(targets)
+    return models
+
+
+def register_model(model_id: str):
+    """
+    Give a model Bedrock has answered for its own label, for up to
+    METRICS_MAX_MODELS models beyond the configured ones
+    """
+    if model_label(model_id) == OTHER_MODEL and len(_registered) < settings.METRICS_MAX_MODELS:
+        _registered.add(model_id)
+
+
+def model_label(model_id: Optional[str]) -> str:
+    """
+    Bounded name for a model ID. Model IDs come from clients, so anything neither
+    configured nor registered maps to OTHER_MODEL; used for metric labels and for
+    the keys of per-model state.
+    """
+    global _configured
+    if _configured is None:
+        _configured = _configured_models()
+    return model_id if model_id in _registered or model_id in _configured else OTHER_MODEL
+
+
+METRICS_AVAILABLE = prometheus_client is not None and settings.METRICS_ENABLED
+
+# Under multi-process uvicorn/gunicorn each worker writes its samples to its own
+# mmap'd files in PROMETHEUS_MULTIPROC_DIR, and a scrape aggregates them all.
+MULTIPROCESS = METRICS_AVAILABLE and bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def _bounded(metric, labels: Tuple[str, ...]):
+    return _ModelLabelled(metric) if labels[:1] == ("model",) else metric
+
+
+def _histogram(name: str, documentation: str, labels: Tuple[str, ...], buckets=LATENCY_BUCKETS):
+    if not METRICS_AVAILABLE:
+        return _NoopMetric()
+    return _bounded(Histogram(name, documentation, labels, buckets=buckets), labels)
+
+
+def _counter(name: str, documentation: str, labels: Tuple[str, ...]):
+    if not METRICS_AVAILABLE:
+        return _NoopMetric()
+    return _bounded(Counter(name, documentation, labels), labels)
+
+
+def _gauge(name: str, documentation: str, labels: Tuple[str, ...]):
+    if not METRICS_AVAILABLE:
+        return _NoopMetric()
+    return _bounded(Gauge(name, documentation, labels, multiprocess_mode="livesum"), labels)
+
+
+REQUEST_LATENCY = _histogram(
+    "bridge_chat_request_duration_seconds", "End-to-end chat completion latency", ("model", "stream", "outcome"))
+AUTH_LATENCY = _histogram(
+    "bridge_auth_duration_seconds", "API key verification latency", ("outcome",))
+BEDROCK_LATENCY = _histogram(
+    "bridge_bedrock_call_duration_seconds", "Bedrock invoke latency", ("model", "outcome"))
+BEDROCK_QUEUE_WAIT = _histogram(
+    "bridge_bedrock_queue_wait_seconds", "Time waiting for a Bedrock executor slot", ("model",))
+TIME_TO_FIRST_TOKEN = _histogram(
+    "bridge_time_to_first_token_seconds", "Time from request to first streamed token", ("model",))
+TOKENS_PER_SECOND = _histogram(
+    "bridge_stream_tokens_per_second", "Completion tokens per second after the first token", ("model",),
+    buckets=RATE_BUCKETS)
+SSE_CHUNKS = _counter(
+    "bridge_sse_chunks_total", "SSE chunks sent to clients", ("model",))
+BEDROCK_ERRORS = _counter(
+    "bridge_bedrock_errors_total", "Failed Bedrock calls by error code", ("model", "code"))
+BEDROCK_THROTTLES = _counter(
+    "bridge_bedrock_throttles_total", "Bedrock calls rejected by throttling", ("model",))
+BEDROCK_RETRIES = _counter(
+    "bridge_bedrock_retries_total", "Bedrock call retries", ("model",))
+BEDROCK_FAILOVERS = _counter(
+    "bridge_bedrock_failovers_total", "Calls moved to another region after a throttle", ("model", "region"))
+BEDROCK_RESILIENCE_EVENTS = _counter(
+    "bridge_bedrock_resilience_events_total", "Hedges, exhausted retry budgets and circuit breaker changes",
+    ("model", "event"))
+PROMPT_CACHE_TOKENS = _counter(
+    "bridge_prompt_cache_tokens_total", "Prompt tokens read from or written to the Bedrock prompt cache",
+    ("model", "kind"))
+CONTEXT_TOKENS_SAVED = _counter(
+    "bridge_context_tokens_saved_total", "Prompt tokens removed by context window management", ("model", "strategy"))
+CACHE_EVENTS = _counter(
+    "bridge_cache_events_total", "Cache lookups and evictions by cache and result", ("cache", "result"))
+NEAR_CACHE_SIMILARITY = _histogram(
+    "bridge_near_cache_similarity", "Similarity of the closest cached prompt found by near-duplicate cache lookups",
+    ("model",), buckets=SIMILARITY_BUCKETS)
+IN_FLIGHT = _gauge(
+    "bridge_bedrock_in_flight", "Bedrock calls currently in flight", ("model",))
+ADMISSION_LIMIT = _gauge(
+    "bridge_admission_limit", "Adaptive concurrency limit per model", ("model",))
+ADMISSION_QUEUE_DEPTH = _gauge(
+    "bridge_admission_queue_depth", "Requests waiting for a concurrency slot", ("model",))
+ADMISSION_REJECTIONS = _counter(
+    "bridge_admission_rejections_total", "Requests shed by admission control", ("model", "reason"))
+EMBEDDING_BATCH_SIZE = _histogram(
+    "bridge_embedding_batch_size", "Texts per upstream embedding call", ("model",), buckets=BATCH_BUCKETS)
+BEDROCK_HEALTHY = _gauge(
+    "bridge_bedrock_healthy", "Workers whose last health probe of the model and region succeeded",
+    ("model", "region"))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text format, aggregating across worker
+    processes when running in multi-process mode
+    """
+    if not METRICS_AVAILABLE:
+        return b"", "text/plain; version=0.0.4; charset=utf-8"
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def mark_worker_dead(pid: Optional[int] = None):
+    """
+    Drop a worker's live gauges from the multi-process directory: this worker's on
+    shutdown, or ``pid``'s when the server process reaps a worker that died
+    """
+    if MULTIPROCESS:
+        prometheus_multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,8 @@
+import hashlib
+
+
+def api_key_fingerprint(api_key: str) -> str:
+    """
+    Stable, non-reversible identifier for an API key, safe to store or log
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:24]
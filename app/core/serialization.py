@@ -0,0 +1,29 @@
+"""
+JSON encoding for hot paths.
+
+Uses orjson when it is installed and falls back to the standard library otherwise.
+``dumps`` always returns compact UTF-8 bytes so callers can write them to the wire
+without another encode step.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    def dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    loads = orjson.loads
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        return _encoder.encode(obj).encode("utf-8")
+
+    loads = json.loads
@@ -0,0 +1,177 @@
+"""
+Per-request stage timing and sampled profiling.
+
+``ServerTimingMiddleware`` starts a ``RequestTiming`` for every HTTP request and
+keeps it in a context variable. Code on the request path records how long its
+stage took with ``timed(name)`` or ``record_timing(name, seconds)``; both are
+no-ops outside a timed request. Stages recorded before the response headers go
+out are sent as a ``Server-Timing`` header, and all stages (including those of a
+streamed body) are logged as ``name=<ms>`` fields when the response completes.
+
+With ``PROFILE_DIR`` set, a sample of requests (``PROFILE_SAMPLE_RATE``, or
+``X-Profile: 1`` when ``PROFILE_HEADER_ENABLED``) runs under cProfile and the
+stats are written to ``PROFILE_DIR`` as ``.prof`` files, which snakeviz,
+flameprof or gprof2dot turn into call graphs and flame graphs. cProfile sees the
+whole event loop thread, so other requests' work that interleaves with the
+sampled one shows up in its profile too; only one request per worker is
+profiled at a time.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-profile"
+
+
+class RequestTiming:
+    """Durations of the named stages of one request, in seconds"""
+
+    __slots__ = ("started", "durations", "mark")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.mark: Optional[float] = None
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def remainder(self, name: str):
+        """Attribute the time since the request started not yet covered by a stage to ``name``"""
+        self.add(name, max(time.perf_counter() - self.started - sum(self.durations.values()), 0.0))
+
+    def header(self, now: float) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.durations.items()]
+        parts.append(f"total;dur={(now - self.started) * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current.get()
+
+
+def record_timing(name: str, seconds: float):
+    """Add ``seconds`` to stage ``name`` of the current request, if it is timed"""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds)
+
+
+def mark_handler_done():
+    """
+    Mark the end of the endpoint function; the time until the response headers go
+    out (FastAPI validating and serializing the returned model) is recorded as
+    the ``serialize`` stage
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.mark = time.perf_counter()
+
+
+@contextmanager
+def timed(name: str):
+    """Time the enclosed block as stage ``name`` of the current request"""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started)
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware adding a Server-Timing header and a timing log line to
+    each HTTP response, and profiling sampled requests
+    """
+
+    def __init__(self, app, profile_dir: Optional[str] = None, sample_rate: float = 0.0,
+                 header_trigger: bool = False):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.header_trigger = header_trigger
+        self._profiling = False
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+
+    def _should_profile(self, scope) -> bool:
+        if not self.profile_dir or self._profiling:
+            return False
+        if self.header_trigger and any(k == PROFILE_HEADER and v == b"1" for k, v in scope["headers"]):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start_profile(self, scope):
+        """Profiler and file name for a sampled request, or (None, None)"""
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler is already active in this thread
+            return None, None
+        self._profiling = True
+        slug = scope["path"].strip("/").replace("/", "_") or "root"
+        return profile, f"{time.time_ns() // 1000}-{scope['method']}-{slug}.prof"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        profile, profile_name = self._start_profile(scope) if self._should_profile(scope) else (None, None)
+        status = 500
+
+        async def send_timed(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                if timing.mark is not None:
+                    # Handlers mark when they return; the rest is response serialization
+                    timing.add("serialize", now - timing.mark)
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.header(now).encode("latin-1")))
+                if profile_name:
+                    headers.append((b"x-profile", profile_name.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            total = time.perf_counter() - timing.started
+            _current.reset(token)
+            if profile is not None:
+                profile.disable()
+                self._profiling = False
+                path = os.path.join(self.profile_dir, profile_name)
+                try:
+                    await asyncio.to_thread(profile.dump_stats, path)
+                except OSError as e:
+                    logger.warning(f"Could not write profile {path}: {str(e)}")
+            # Requests that recorded no stage (health checks, metrics scrapes) are not logged
+            if timing.durations and logger.isEnabledFor(logging.INFO):
+                fields = {name: round(seconds * 1000, 2) for name, seconds in timing.durations.items()}
+                fields["total"] = round(total * 1000, 2)
+                logger.info(
+                    f"{scope['method']} {scope['path']} {status} "
+                    + " ".join(f"{name}={ms}ms" for name, ms in fields.items()),
+                    extra={"timing": fields, "status": status, "path": scope["path"]},
+                )
+
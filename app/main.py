@@ -4,6 +4,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.router import api_router
 from app.core.config import settings
 from app.core.logging import configure_logging
+from app.core.metrics import mark_worker_dead
+from app.core.timing import ServerTimingMiddleware
+from app.services.bedrock_client import init_bedrock_client, close_bedrock_client
+from app.services.executor import init_executor, shutdown_executor
+from app.services.health import close_health_monitor, init_health_monitor
+from app.services.near_cache import close_near_cache
+from app.services.response_cache import close_response_cache
+from app.services.routing import close_router, init_router
+from app.services.sessions import close_session_store
+from app.services.usage_tracking import flush_usage_pipeline
+from app.services.warmup import warm_worker
 
 # Configure application logging
 configure_logging()
@@ -26,20 +37,44 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# Add Server-Timing headers, per-request timing logs and sampled profiling
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        profile_dir=settings.PROFILE_DIR,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        header_trigger=settings.PROFILE_HEADER_ENABLED,
+    )
+
 # Include API router
 app.include_router(api_router)
 
 # Add startup event
 @app.on_event("startup")
 async def startup_event():
-    # Any startup initialization can go here
-    pass
+    # Create the shared Bedrock client once per worker
+    init_bedrock_client()
+    init_router()
+    init_executor()
+    # Probe Bedrock in the background so health checks answer from memory
+    init_health_monitor()
+    # Load the tokenizer, botocore data and adapters before the first request needs them
+    await warm_worker()
 
 # Add shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Any cleanup code can go here
-    pass
+    # Stop the Bedrock executor and release pooled connections
+    await close_health_monitor()
+    shutdown_executor()
+    close_router()
+    close_bedrock_client()
+    close_response_cache()
+    close_near_cache()
+    close_session_store()
+    # Write out any usage records still queued
+    await flush_usage_pipeline()
+    mark_worker_dead()
 
 if __name__ == "__main__":
     import uvicorn
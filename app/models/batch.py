@@ -0,0 +1,30 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+from app.models.chat import ChatCompletionRequest, ChatCompletionResponse
+
+class BatchChatCompletionRequest(BaseModel):
+    """Request body for the batch chat completion endpoint"""
+    requests: List[ChatCompletionRequest] = Field(..., description="Chat completion requests to run")
+    max_concurrency: Optional[int] = Field(
+        None, ge=1, description="Upper bound on requests run at once (capped by the server)"
+    )
+
+class BatchItemError(BaseModel):
+    """Why a single batch item failed"""
+    message: str
+    type: str
+    status_code: int
+
+class BatchChatCompletionItem(BaseModel):
+    """Outcome of one request in a batch: a response or an error"""
+    index: int
+    response: Optional[ChatCompletionResponse] = None
+    error: Optional[BatchItemError] = None
+
+class BatchChatCompletionResponse(BaseModel):
+    """Response format for the batch chat completion endpoint, in request order"""
+    object: str = "batch.chat.completion"
+    data: List[BatchChatCompletionItem]
+    succeeded: int
+    failed: int
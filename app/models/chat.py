@@ -1,5 +1,5 @@
 from typing import List, Optional, Union, Dict, Any, Literal
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, model_serializer, validator
 from datetime import datetime
 import uuid
 
@@ -31,11 +31,25 @@ class ChatCompletionChoice(BaseModel):
     message: Message
     finish_reason: Optional[str] = None
 
+class PromptTokensDetails(BaseModel):
+    """Breakdown of prompt tokens served from or written to the prompt cache"""
+    cached_tokens: int = 0
+    cache_write_tokens: int = 0
+
 class ChatCompletionUsage(BaseModel):
     """Token usage information for the completion"""
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    prompt_tokens_details: Optional[PromptTokensDetails] = None
+    
+    @model_serializer(mode="wrap")
+    def _omit_missing_details(self, handler):
+        # Only sent when prompt caching reported something, as the fast codec does
+        data = handler(self)
+        if data.get("prompt_tokens_details") is None:
+            data.pop("prompt_tokens_details", None)
+        return data
 
 class ChatCompletionResponse(BaseModel):
     """Response format for chat completion endpoint"""
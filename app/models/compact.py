@@ -0,0 +1,134 @@
+"""
+Compact chat completion types for the fast codec.
+
+Slotted classes decoded straight from the raw request body, without pydantic
+validation, and a response encoder that writes JSON bytes directly. Accepts and
+produces the same wire format as ``ChatCompletionRequest`` and
+``ChatCompletionResponse``; invalid bodies are rejected with FastAPI-style 422
+details.
+"""
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from app.core.serialization import dumps, loads
+
+ROLES = frozenset(("system", "user", "assistant"))
+
+
+class CodecError(Exception):
+    """Request body rejected by the fast codec"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(str(detail))
+        self.status_code = status_code
+        self.detail = detail
+
+
+class CompactMessage:
+    """A single message in a chat conversation"""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+
+
+class CompactChatRequest:
+    """Request body for the chat completion endpoint"""
+
+    __slots__ = ("model", "messages", "max_tokens", "temperature", "stream", "user_id")
+
+    def __init__(self, model: str, messages: List[CompactMessage], max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None, stream: bool = False, user_id: Optional[str] = None):
+        self.model = model
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.stream = stream
+        self.user_id = user_id
+
+
+def _invalid(loc: tuple, msg: str, error_type: str) -> CodecError:
+    return CodecError(422, [{"type": error_type, "loc": ["body", *loc], "msg": msg}])
+
+
+def _optional(data: Dict[str, Any], key: str, types: tuple, type_name: str):
+    value = data.get(key)
+    if value is not None and not isinstance(value, types):
+        raise _invalid((key,), f"Input should be a valid {type_name}", f"{type_name}_type")
+    return value
+
+
+def decode_chat_request(body: bytes) -> CompactChatRequest:
+    """
+    Parse and validate a chat completion request body
+    """
+    try:
+        data = loads(body)
+    except ValueError as e:
+        raise CodecError(422, [{"type": "json_invalid", "loc": ["body"], "msg": f"JSON decode error: {e}"}])
+    if not isinstance(data, dict):
+        raise _invalid((), "Input should be a valid dictionary", "dict_type")
+
+    model = data.get("model")
+    if not isinstance(model, str):
+        raise _invalid(("model",), "Field required" if model is None else "Input should be a valid string",
+                       "missing" if model is None else "string_type")
+    raw_messages = data.get("messages")
+    if not isinstance(raw_messages, list):
+        raise _invalid(("messages",), "Field required" if raw_messages is None else "Input should be a valid list",
+                       "missing" if raw_messages is None else "list_type")
+
+    messages = []
+    for index, message in enumerate(raw_messages):
+        if not isinstance(message, dict):
+            raise _invalid(("messages", index), "Input should be a valid dictionary", "dict_type")
+        role, content = message.get("role"), message.get("content")
+        if role not in ROLES:
+            raise _invalid(("messages", index, "role"), "Input should be 'system', 'user' or 'assistant'",
+                           "literal_error")
+        if not isinstance(content, str):
+            raise _invalid(("messages", index, "content"), "Input should be a valid string", "string_type")
+        messages.append(CompactMessage(role, content))
+
+    temperature = _optional(data, "temperature", (int, float), "number")
+    if temperature is not None and (temperature < 0 or temperature > 1):
+        raise _invalid(("temperature",), "Value error, Temperature must be between 0 and 1", "value_error")
+    return CompactChatRequest(
+        model=model,
+        messages=messages,
+        max_tokens=_optional(data, "max_tokens", (int,), "integer"),
+        temperature=temperature,
+        stream=bool(_optional(data, "stream", (bool,), "boolean")),
+        user_id=_optional(data, "user_id", (str,), "string"),
+    )
+
+
+def encode_chat_completion(model: str, content: str, usage: Dict[str, int], finish_reason: str = "stop") -> bytes:
+    """
+    Render a chat completion response body, field for field as ``ChatCompletionResponse``
+    """
+    body_usage = {
+        "prompt_tokens": usage.get("prompt_tokens", 0),
+        "completion_tokens": usage.get("completion_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+    }
+    if "cached_tokens" in usage or "cache_write_tokens" in usage:
+        body_usage["prompt_tokens_details"] = {
+            "cached_tokens": usage.get("cached_tokens", 0),
+            "cache_write_tokens": usage.get("cache_write_tokens", 0),
+        }
+    return dumps({
+        "id": str(uuid.uuid4()),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": body_usage,
+    })
@@ -0,0 +1,71 @@
+import base64
+from typing import Dict, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, validator
+
+from app.core.serialization import dumps
+from app.services.embeddings import from_float32
+
+class EmbeddingRequest(BaseModel):
+    """Request body for the embeddings endpoint"""
+    model: Optional[str] = Field(None, description="Embedding model ID (defaults to DEFAULT_EMBEDDING_MODEL)")
+    input: Union[str, List[str]] = Field(..., description="Text or list of texts to embed")
+    encoding_format: Literal["float", "base64"] = Field(
+        "float", description="float: JSON numbers at float32 precision; base64: little-endian float32 bytes"
+    )
+    dimensions: Optional[int] = Field(None, ge=1, description="Output dimensions, for models that support it")
+    input_type: Optional[Literal["search_document", "search_query", "classification", "clustering"]] = Field(
+        None, description="What the embeddings are for (Cohere models)"
+    )
+    user_id: Optional[str] = Field(None, description="Optional user identifier for tracking")
+
+    @validator("input")
+    def validate_input(cls, v):
+        texts = [v] if isinstance(v, str) else v
+        if not texts or any(not text for text in texts):
+            raise ValueError("Input must contain at least one text and no empty texts")
+        return v
+
+class EmbeddingData(BaseModel):
+    """One embedding, in input order"""
+    object: str = "embedding"
+    index: int
+    embedding: Union[List[float], str]
+
+class EmbeddingUsage(BaseModel):
+    """Input tokens billed for the request; cached texts cost none"""
+    prompt_tokens: int
+    total_tokens: int
+
+class EmbeddingResponse(BaseModel):
+    """Response format for the embeddings endpoint (OpenAI-compatible)"""
+    object: str = "list"
+    data: List[EmbeddingData]
+    model: str
+    usage: EmbeddingUsage
+
+_float_formats: Dict[int, str] = {}
+
+def _float_list(vector: bytes) -> bytes:
+    # 9 significant digits round-trip any float32 and take about two thirds of the
+    # float64 repr Bedrock sends. One format string per vector length formats the
+    # whole vector in a single call.
+    values = from_float32(vector)
+    template = _float_formats.get(len(values))
+    if template is None:
+        template = _float_formats[len(values)] = "[" + ",".join(["%.9g"] * len(values)) + "]"
+    return (template % tuple(values)).encode("ascii")
+
+def encode_embeddings(model: str, vectors: List[bytes], encoding_format: str, prompt_tokens: int) -> bytes:
+    """
+    Render an embeddings response body, field for field as ``EmbeddingResponse``,
+    writing the vectors straight from their float32 bytes
+    """
+    parts = []
+    for index, vector in enumerate(vectors):
+        if encoding_format == "base64":
+            embedding = b'"' + base64.b64encode(vector) + b'"'
+        else:
+            embedding = _float_list(vector)
+        parts.append(b'{"object":"embedding","index":%d,"embedding":%s}' % (index, embedding))
+    tail = dumps({"model": model, "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens}})
+    return b'{"object":"list","data":[' + b",".join(parts) + b"]," + tail[1:]
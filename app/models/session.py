@@ -0,0 +1,42 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field, validator
+
+from app.models.chat import Message
+
+class SessionCreateRequest(BaseModel):
+    """Request body for creating a conversation session"""
+    model: Optional[str] = Field(None, description="Model for the session's turns (defaults to DEFAULT_MODEL)")
+    messages: List[Message] = Field(default_factory=list, description="Initial history, e.g. a system prompt")
+    max_tokens: Optional[int] = Field(None, description="Default maximum number of tokens per reply")
+    temperature: Optional[float] = Field(None, description="Default sampling temperature")
+    user_id: Optional[str] = Field(None, description="Optional user identifier for tracking")
+    
+    @validator("temperature")
+    def validate_temperature(cls, v):
+        if v is not None and (v < 0 or v > 1):
+            raise ValueError("Temperature must be between 0 and 1")
+        return v
+
+class SessionTurnRequest(BaseModel):
+    """Request body for adding a turn to a session: only the new messages"""
+    messages: List[Message] = Field(..., description="New messages, usually a single user message")
+    max_tokens: Optional[int] = Field(None, description="Maximum number of tokens to generate")
+    temperature: Optional[float] = Field(None, description="Sampling temperature")
+    stream: Optional[bool] = Field(False, description="Whether to stream the response")
+    
+    @validator("temperature")
+    def validate_temperature(cls, v):
+        if v is not None and (v < 0 or v > 1):
+            raise ValueError("Temperature must be between 0 and 1")
+        return v
+
+class SessionResponse(BaseModel):
+    """A conversation session"""
+    id: str
+    object: str = "chat.session"
+    created: int
+    expires_at: int
+    model: str
+    message_count: int
+    prompt_tokens: int = Field(..., description="Locally counted tokens of the stored history")
+    messages: Optional[List[Message]] = None
@@ -0,0 +1,277 @@
+"""
+Production launcher.
+
+Runs the API with SERVER_WORKERS uvicorn worker processes, by default one per
+CPU of the container's CPU quota (cgroup v2 or v1), falling back to the CPUs the
+process may run on.
+
+With several workers a supervisor process binds the socket, imports the
+application and warms it up (``app.services.warmup``) once, then forks the
+workers. They start with the modules, tokenizer and botocore data already in
+memory, shared copy-on-write, instead of each importing them again; each one
+still runs the startup hook (clients, executor, health monitor) before it
+accepts connections. Workers that die are replaced; a worker whose startup hook
+fails stops the server instead. Unless PROMETHEUS_MULTIPROC_DIR is set, the
+workers share a temporary one so /metrics covers all of them.
+
+On SIGTERM each worker fails ``/health/ready`` for SERVER_DRAIN_SECONDS while it
+keeps serving, so load balancers stop sending it new requests, then stops
+accepting and gives in-flight requests up to SERVER_GRACEFUL_TIMEOUT_SECONDS.
+SIGINT skips the drain.
+
+uvloop and httptools are used when installed.
+
+Usage:
+    python -m app.server
+"""
+import asyncio
+import importlib
+import importlib.util
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, Optional
+
+import uvicorn
+from uvicorn.main import STARTUP_FAILURE
+
+from app.core.config import settings
+from app.core.logging import configure_logging
+
+logger = logging.getLogger(__name__)
+
+# A worker that exits sooner than this after starting is restarted after a pause
+MIN_WORKER_LIFETIME = 1.0
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_quota() -> Optional[float]:
+    """
+    CPUs allowed by the cgroup CPU quota, or None when there is no quota
+    """
+    cpu_max = _read("/sys/fs/cgroup/cpu.max")  # cgroup v2: "<quota> <period>" or "max <period>"
+    if cpu_max is not None:
+        quota, _, period = cpu_max.partition(" ")
+        if quota != "max" and period:
+            return int(quota) / int(period)
+        return None
+    quota = _read("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")  # cgroup v1: -1 means no quota
+    period = _read("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+    if quota is not None and period is not None and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def default_workers() -> int:
+    """
+    One worker per CPU the container may use, rounding a fractional quota up
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        cpus = os.cpu_count() or 1
+    quota = cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(cpus, 1)
+
+
+class DrainingServer(uvicorn.Server):
+    """
+    uvicorn server that drains before shutting down on SIGTERM, and exits if the
+    supervisor that forked it goes away
+    """
+
+    def __init__(self, config: uvicorn.Config, drain: float = 0.0, parent_pid: Optional[int] = None):
+        super().__init__(config)
+        self.drain = drain
+        self.parent_pid = parent_pid
+        self.draining = False
+
+    def handle_exit(self, sig, frame):
+        if sig == signal.SIGTERM and self.drain > 0 and not self.draining and not self.should_exit:
+            from app.services.health import start_draining
+
+            self.draining = True
+            start_draining()
+            logger.info(f"Draining for {self.drain:.0f}s before shutting down")
+            asyncio.get_event_loop().call_later(self.drain, super().handle_exit, sig, frame)
+            return
+        super().handle_exit(sig, frame)
+
+    async def on_tick(self, counter: int) -> bool:
+        if self.parent_pid is not None and os.getppid() != self.parent_pid:
+            logger.warning("Server process is gone, shutting down")
+            self.should_exit = True
+        return await super().on_tick(counter)
+
+
+class Supervisor:
+    """
+    Forks ``workers`` uvicorn workers on one listening socket, replaces those that
+    die, and passes shutdown signals on to them
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, drain: float):
+        self.config = config
+        self.workers = workers
+        self.drain = drain
+        self.children: Dict[int, float] = {}  # pid -> start time
+        self.stopping: Optional[int] = None
+        self.exit_code = 0
+        self.sock: Optional[socket.socket] = None
+
+    def run(self) -> int:
+        self.sock = self.config.bind_socket()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_signal)
+        logger.info(f"Starting {self.workers} workers (pid {os.getpid()})")
+        for _ in range(self.workers):
+            self._spawn()
+        while self.stopping is None:
+            self._reap()
+            time.sleep(0.2)
+        self._shutdown()
+        return self.exit_code
+
+    def _handle_signal(self, sig, frame):
+        if self.stopping is None:
+            self.stopping = sig
+        else:
+            # Asked again: stop waiting for the drain
+            self._signal_children(signal.SIGINT)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            self._run_worker()
+        self.children[pid] = time.monotonic()
+
+    def _run_worker(self):
+        parent_pid = os.getppid()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        # Out of the terminal's process group: Ctrl-C reaches the supervisor, which
+        # passes it on once
+        os.setpgid(0, 0)
+        code = 0
+        try:
+            server = DrainingServer(self.config, self.drain, parent_pid)
+            server.run(sockets=[self.sock])
+            if not server.started:
+                code = STARTUP_FAILURE
+        except BaseException:
+            logger.exception("Worker failed")
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _reap(self):
+        from app.core.metrics import mark_worker_dead
+
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            started = self.children.pop(pid, None)
+            if started is None:
+                continue
+            mark_worker_dead(pid)
+            if self.stopping is not None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if code == STARTUP_FAILURE:
+                logger.error(f"Worker {pid} failed to start, shutting down")
+                self.stopping = signal.SIGTERM
+                self.exit_code = STARTUP_FAILURE
+                continue
+            logger.warning(f"Worker {pid} exited with code {code}, restarting it")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self._spawn()
+
+    def _signal_children(self, sig: int):
+        for pid in list(self.children):
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def _shutdown(self):
+        logger.info(f"Shutting down {len(self.children)} workers")
+        self._signal_children(self.stopping)
+        drain = self.drain if self.stopping == signal.SIGTERM else 0
+        deadline = time.monotonic() + drain + (self.config.timeout_graceful_shutdown or 0) + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        if self.children:
+            logger.error(f"Killing {len(self.children)} workers still running after the graceful timeout")
+            self._signal_children(signal.SIGKILL)
+            while self.children:
+                pid, _ = os.waitpid(-1, 0)
+                self.children.pop(pid, None)
+        self.sock.close()
+
+
+def build_config() -> uvicorn.Config:
+    return uvicorn.Config(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        loop=settings.SERVER_LOOP,
+        http=settings.SERVER_HTTP,
+        log_level=settings.LOG_LEVEL.lower(),
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT_SECONDS,
+    )
+
+
+def main() -> int:
+    configure_logging()
+    workers = settings.SERVER_WORKERS or default_workers()
+    if workers > 1 and not hasattr(os, "fork"):
+        logger.warning("Several workers need os.fork; running one")
+        workers = 1
+    config = build_config()
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    logger.info(f"Serving on {settings.SERVER_HOST}:{settings.SERVER_PORT} with {workers} workers "
+                f"(loop={settings.SERVER_LOOP if settings.SERVER_LOOP != 'auto' else loop}, "
+                f"http={settings.SERVER_HTTP if settings.SERVER_HTTP != 'auto' else http})")
+    if workers == 1:
+        server = DrainingServer(config, settings.SERVER_DRAIN_SECONDS)
+        server.run()
+        return 0 if server.started else STARTUP_FAILURE
+
+    metrics_dir = None
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    try:
+        # Imported and warmed once here; the forked workers inherit it all
+        importlib.import_module("app.main")
+        from app.services.warmup import warm_process
+
+        warm_process()
+        return Supervisor(config, workers, settings.SERVER_DRAIN_SECONDS).run()
+    finally:
+        if metrics_dir is not None:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
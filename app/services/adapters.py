@@ -0,0 +1,249 @@
+"""
+Model adapters: how chat messages are rendered into a Bedrock request body for a
+model family, and how its responses and stream chunks are parsed.
+
+Adapters are looked up through an ordered registry of model ID patterns. The
+lookup is cached per model ID, so the pattern matching runs once per model rather
+than on every call. Text-completion adapters render the prompt in a single join,
+so rendering stays linear in the length of the conversation.
+"""
+import logging
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.prompt_cache import get_prompt_cache_planner, text_block
+
+logger = logging.getLogger(__name__)
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+
+# Opens a Messages API conversation that starts with an assistant turn, since the
+# API requires the first turn to come from the user
+LEADING_USER_TURN = "(conversation start)"
+
+
+class InvalidConversation(ValueError):
+    """The messages cannot be sent to the model's API"""
+
+    status_code = 400
+
+
+class ModelAdapter:
+    """Request rendering and response parsing for one model family"""
+
+    name = "base"
+
+    def create_body(self, model_id: str, messages: Sequence[Any], max_tokens: int, temperature: float,
+                    rendered_turns: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Request body for ``messages``. ``rendered_turns`` is ``render_turns(messages)``
+        kept from earlier requests (see sessions); adapters that do not render a
+        prompt string ignore it.
+        """
+        raise NotImplementedError
+
+    def parse_completion(self, response_body: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def parse_stream_chunk(self, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """Text delta and stop reason carried by one decoded response-stream chunk"""
+        raise NotImplementedError
+
+    def parse_stop_reason(self, response_body: Dict[str, Any]) -> Optional[str]:
+        return response_body.get("stop_reason")
+
+
+class TextPromptAdapter(ModelAdapter):
+    """
+    Base for models that take a single rendered prompt string. Subclasses format
+    individual messages; the prompt is an optional preamble, the concatenation of
+    those fragments and a final assistant cue. Fragments only depend on their own
+    message, so the rendered turns of a growing conversation can be extended
+    instead of re-rendered.
+    """
+
+    completion_key = "completion"
+    prompt_suffix = ""
+
+    def fragment(self, msg: Any) -> str:
+        raise NotImplementedError
+
+    def preamble(self, messages: Sequence[Any]) -> str:
+        return ""
+
+    def render_turns(self, messages: Sequence[Any]) -> str:
+        return "".join([self.fragment(msg) for msg in messages])
+
+    def render_prompt(self, messages: Sequence[Any], rendered_turns: Optional[str] = None) -> str:
+        if rendered_turns is not None:
+            return "".join((self.preamble(messages), rendered_turns, self.prompt_suffix))
+        parts = [self.preamble(messages)]
+        parts.extend(self.fragment(msg) for msg in messages)
+        parts.append(self.prompt_suffix)
+        return "".join(parts)
+
+    def parse_completion(self, response_body: Dict[str, Any]) -> str:
+        return response_body.get(self.completion_key, "").strip()
+
+    def parse_stream_chunk(self, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        return payload.get(self.completion_key), payload.get("stop_reason")
+
+
+class ClaudeTextAdapter(TextPromptAdapter):
+    """Anthropic text completions API (Claude 2 and Claude Instant)"""
+
+    name = "claude-text"
+    prompt_suffix = "Assistant:"
+
+    def fragment(self, msg: Any) -> str:
+        if msg.role == "user":
+            return f"Human: {msg.content}\n\n"
+        if msg.role == "assistant":
+            return f"Assistant: {msg.content}\n\n"
+        return ""  # System prompt is rendered up front
+
+    def preamble(self, messages: Sequence[Any]) -> str:
+        # Only the first system message is used, at the start of the prompt
+        system = next((msg for msg in messages if msg.role == "system"), None)
+        return f"{system.content}\n\n" if system is not None else ""
+
+    def create_body(self, model_id: str, messages: Sequence[Any], max_tokens: int, temperature: float,
+                    rendered_turns: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "prompt": self.render_prompt(messages, rendered_turns),
+            "max_tokens_to_sample": max_tokens,
+            "temperature": temperature,
+            "anthropic_version": ANTHROPIC_VERSION
+        }
+
+
+class LlamaAdapter(TextPromptAdapter):
+    """Meta Llama text generation"""
+
+    name = "llama"
+    completion_key = "generation"
+    prompt_suffix = "<assistant>\n"
+
+    def fragment(self, msg: Any) -> str:
+        if msg.role == "system":
+            return f"<system>\n{msg.content}\n</system>\n"
+        if msg.role == "user":
+            return f"<human>\n{msg.content}\n</human>\n"
+        return f"<assistant>\n{msg.content}\n</assistant>\n"
+
+    def create_body(self, model_id: str, messages: Sequence[Any], max_tokens: int, temperature: float,
+                    rendered_turns: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "prompt": self.render_prompt(messages, rendered_turns),
+            "max_gen_len": max_tokens,
+            "temperature": temperature
+        }
+
+
+class ClaudeMessagesAdapter(ModelAdapter):
+    """
+    Anthropic Messages API (Claude 3 and later). System messages become the
+    ``system`` field; consecutive messages from the same role are merged because
+    the API requires user and assistant turns to alternate, starting with a user
+    turn (one is inserted before a leading assistant turn). With prompt caching
+    enabled, cache checkpoints are added after the system prompt and long
+    documents that recur across requests.
+    """
+
+    name = "claude-messages"
+
+    def create_body(self, model_id: str, messages: Sequence[Any], max_tokens: int, temperature: float,
+                    rendered_turns: Optional[str] = None) -> Dict[str, Any]:
+        system = []
+        turns: List[Dict[str, Any]] = []
+        for msg in messages:
+            if msg.role == "system":
+                system.append(msg.content)
+            elif turns and turns[-1]["role"] == msg.role:
+                turns[-1] = {"role": msg.role, "content": f"{turns[-1]['content']}\n\n{msg.content}"}
+            else:
+                turns.append({"role": msg.role, "content": msg.content})
+        if not turns:
+            raise InvalidConversation(f"{model_id} needs at least one user or assistant message")
+        if turns[0]["role"] != "user":
+            turns.insert(0, {"role": "user", "content": LEADING_USER_TURN})
+        system_prompt = "\n\n".join(system) if system else None
+
+        cache_system = False
+        if settings.PROMPT_CACHE_ENABLED:
+            cache_system, cached_turns = get_prompt_cache_planner().plan(model_id, system_prompt, turns)
+            for index in cached_turns:
+                turns[index] = {"role": turns[index]["role"],
+                                "content": [text_block(turns[index]["content"], checkpoint=True)]}
+
+        body: Dict[str, Any] = {
+            "anthropic_version": ANTHROPIC_VERSION,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "messages": turns,
+        }
+        if system_prompt is not None:
+            body["system"] = [text_block(system_prompt, checkpoint=True)] if cache_system else system_prompt
+        return body
+
+    def parse_completion(self, response_body: Dict[str, Any]) -> str:
+        return "".join(block.get("text", "") for block in response_body.get("content", [])
+                       if block.get("type") == "text").strip()
+
+    def parse_stream_chunk(self, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        event_type = payload.get("type")
+        if event_type == "content_block_delta":
+            return payload.get("delta", {}).get("text"), None
+        if event_type == "message_delta":
+            return None, payload.get("delta", {}).get("stop_reason")
+        return None, None
+
+
+
+# Bedrock stop reasons for output cut off at max_tokens; every other reason is a normal stop
+LENGTH_STOP_REASONS = ("max_tokens", "length")
+
+
+def finish_reason(stop_reason: Optional[str]) -> str:
+    """
+    OpenAI finish reason for a Bedrock stop reason
+    """
+    return "length" if stop_reason in LENGTH_STOP_REASONS else "stop"
+
+
+# Checked in order; the first pattern contained in the lower-cased model ID wins
+_registry: List[Tuple[str, ModelAdapter]] = []
+
+
+def register_adapter(pattern: str, adapter: ModelAdapter, first: bool = False):
+    """
+    Route model IDs containing ``pattern`` to ``adapter``. With ``first`` the
+    pattern takes precedence over those already registered.
+    """
+    entry = (pattern.lower(), adapter)
+    if first:
+        _registry.insert(0, entry)
+    else:
+        _registry.append(entry)
+    get_adapter.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def get_adapter(model_id: str) -> ModelAdapter:
+    """
+    Adapter for a model ID, resolved once per ID
+    """
+    lowered = model_id.lower()
+    for pattern, adapter in _registry:
+        if pattern in lowered:
+            return adapter
+    logger.warning(f"Unknown model format for {model_id}, defaulting to Claude format")
+    return _default_adapter
+
+
+_default_adapter = ClaudeTextAdapter()
+register_adapter("claude-v2", _default_adapter)
+register_adapter("claude-instant", _default_adapter)
+register_adapter("claude", ClaudeMessagesAdapter())
+register_adapter("llama", LlamaAdapter())
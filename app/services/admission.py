@@ -0,0 +1,326 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_LIMIT, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, model_label
+from app.services.bedrock_errors import is_throttle
+
+logger = logging.getLogger(__name__)
+
+# Longest Retry-After we advertise, in seconds
+MAX_RETRY_AFTER = 60
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of being sent to Bedrock"""
+
+    def __init__(self, model_id: str, reason: str, status_code: int, retry_after: float):
+        super().__init__(f"Model {model_id} is overloaded ({reason}), retry later")
+        self.model_id = model_id
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, min(MAX_RETRY_AFTER, math.ceil(self.retry_after))))}
+
+
+def _median(values) -> float:
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+class LatencySignal:
+    """
+    Latency gradient of one kind of call: the median of the last few samples
+    over the median of a longer window. Latencies that merely vary (completions
+    of different lengths) leave the ratio near 1; only a shift of the whole
+    distribution, as queueing inside Bedrock causes, raises it.
+    """
+
+    def __init__(self, window: int = 200, recent: int = 10, min_samples: int = 20):
+        self.samples: deque = deque(maxlen=window)
+        self.recent: deque = deque(maxlen=recent)
+        self.min_samples = min_samples
+
+    def add(self, latency: float):
+        self.samples.append(latency)
+        self.recent.append(latency)
+
+    def gradient(self) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        baseline = _median(self.samples)
+        return _median(self.recent) / baseline if baseline > 0 else None
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit for one model.
+
+    The limit grows by roughly one per round trip while it is fully used and
+    latency has not inflated beyond ``latency_tolerance`` times its recent
+    median. Streaming time to first token and full invoke round trips are
+    tracked as separate signals, since they differ by orders of magnitude. The
+    limit is cut multiplicatively on throttling (by ``backoff``) or when latency
+    inflates (by 10%), at most once per smoothed round trip so a burst of
+    throttles from one overload episode counts once.
+    """
+
+    def __init__(self, initial: int, min_limit: int, max_limit: int,
+                 latency_tolerance: float = 2.0, backoff: float = 0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.latency: Optional[float] = None
+        self.signals: Dict[str, LatencySignal] = {"invoke": LatencySignal(), "stream": LatencySignal()}
+        self.throttled_at = 0.0
+        self._last_decrease = 0.0
+
+    def on_success(self, latency: float, in_flight: int, kind: str = "invoke"):
+        self.latency = latency if self.latency is None else 0.9 * self.latency + 0.1 * latency
+        signal = self.signals[kind]
+        signal.add(latency)
+        gradient = signal.gradient() if self.latency_tolerance else None
+        if gradient is not None and gradient > self.latency_tolerance:
+            self._decrease(0.9)
+        elif in_flight + 1 >= int(self.limit):
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        self.throttled_at = time.monotonic()
+        self._decrease(self.backoff)
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency or 0.0):
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+
+    def recently_throttled(self) -> bool:
+        return time.monotonic() - self.throttled_at < max(1.0, 2 * (self.latency or 0.0))
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "future")
+
+    def __init__(self, priority: int, seq: int, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.future = future
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        # Higher priority first, then FIFO
+        return (-self.priority, self.seq) < (-other.priority, other.seq)
+
+
+class AdmissionTicket:
+    """
+    Held while a request occupies a slot. Streaming calls set ``latency`` to the
+    time to first token so long generations do not read as slow responses.
+    """
+
+    __slots__ = ("latency", "throttled")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.throttled = False
+
+    def record_error(self, error: BaseException):
+        """Note an error that was retried within the slot"""
+        self.throttled = self.throttled or is_throttle(error)
+
+
+class ModelAdmission:
+    """Concurrency limit and bounded priority wait queue for one model"""
+
+    def __init__(self, model_id: str, limit: AdaptiveLimit, max_queue: int, queue_timeout: float):
+        self.model_id = model_id
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queued = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = 0
+
+    def _retry_after(self) -> float:
+        return (self.queued + 1) / max(1.0, self.limit.limit) * (self.limit.latency or 1.0)
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        ADMISSION_REJECTIONS.labels(self.model_id, reason).inc()
+        # 429 while Bedrock itself is throttling us, 503 when we are just saturated
+        status_code = 429 if self.limit.recently_throttled() else 503
+        logger.warning(f"Shedding request for {self.model_id}: {reason} "
+                       f"(limit {self.limit.limit:.1f}, in flight {self.in_flight}, queued {self.queued})")
+        return AdmissionRejected(self.model_id, reason, status_code, self._retry_after())
+
+    def _publish(self):
+        ADMISSION_LIMIT.labels(self.model_id).set(self.limit.limit)
+        ADMISSION_QUEUE_DEPTH.labels(self.model_id).set(self.queued)
+
+    async def acquire(self, priority: int = 0):
+        if self.in_flight < int(self.limit.limit) and not self.queued:
+            self.in_flight += 1
+            return
+
+        # Fail fast when the queue is full or the wait would outlast the deadline
+        if self.limit.latency is not None and self._retry_after() > self.queue_timeout:
+            raise self._reject("deadline")
+        if self.queued >= self.max_queue:
+            live = [waiter for waiter in self._waiters if not waiter.future.done()]
+            lowest = max(live) if live else None
+            if lowest is None or lowest.priority >= priority:
+                raise self._reject("queue_full")
+            # Make room by shedding the lowest-priority waiter
+            self.queued -= 1
+            lowest.future.set_exception(self._reject("preempted"))
+
+        self._seq += 1
+        waiter = _Waiter(priority, self._seq, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self.queued += 1
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except BaseException as e:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # The slot was granted just as we gave up on it
+                if isinstance(e, asyncio.TimeoutError):
+                    return
+                self.release()
+                raise
+            if not waiter.future.done():
+                waiter.future.cancel()
+                self.queued -= 1
+                self._publish()
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("queue_timeout") from None
+            raise
+
+    def release(self, latency: Optional[float] = None, error: Optional[BaseException] = None,
+                signal: bool = False, kind: str = "invoke"):
+        self.in_flight -= 1
+        if signal:
+            if error is not None and is_throttle(error):
+                self.limit.on_throttle()
+            elif error is None and latency is not None:
+                self.limit.on_success(latency, self.in_flight, kind)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._waiters and self.in_flight < int(self.limit.limit):
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            self.queued -= 1
+            self.in_flight += 1
+            waiter.future.set_result(True)
+        self._publish()
+
+
+class AdmissionController:
+    """
+    Admission control in front of Bedrock calls.
+
+    Each model gets an adaptive concurrency limit. Requests over the limit wait in a
+    bounded priority queue (priority set per API key) for up to the queue timeout;
+    beyond that they are rejected immediately with a Retry-After hint.
+    """
+
+    def __init__(self, enabled: bool, initial_limit: int, min_limit: int, max_limit: int, max_queue: int,
+                 queue_timeout: float, latency_tolerance: float, backoff: float,
+                 priorities: Optional[Dict[str, int]] = None):
+        self.enabled = enabled
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.priorities = priorities or {}
+        self._models: Dict[str, ModelAdmission] = {}
+
+    def priority_for(self, api_key: Optional[str]) -> int:
+        return self.priorities.get(api_key, 0) if api_key else 0
+
+    def model(self, model_id: str) -> ModelAdmission:
+        model_id = model_label(model_id)
+        admission = self._models.get(model_id)
+        if admission is None:
+            limit = AdaptiveLimit(self.initial_limit, self.min_limit, self.max_limit,
+                                  self.latency_tolerance, self.backoff)
+            admission = self._models[model_id] = ModelAdmission(model_id, limit, self.max_queue, self.queue_timeout)
+            admission._publish()
+        return admission
+
+    @asynccontextmanager
+    async def slot(self, model_id: str, priority: int = 0) -> AsyncIterator[AdmissionTicket]:
+        """
+        Hold a concurrency slot for ``model_id`` for the duration of the block.
+        Raises AdmissionRejected when the request is shed.
+        """
+        ticket = AdmissionTicket()
+        if not self.enabled:
+            yield ticket
+            return
+
+        admission = self.model(model_id)
+        await admission.acquire(priority)
+        started = time.perf_counter()
+        error: Optional[BaseException] = None
+        try:
+            yield ticket
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            latency = ticket.latency if ticket.latency is not None else time.perf_counter() - started
+            # A stream the client abandoned after its first token still measured Bedrock
+            if ticket.latency is not None and error is not None and not isinstance(error, Exception):
+                error = None
+            # Only successes and throttles say anything about Bedrock's capacity
+            if ticket.throttled:
+                admission.limit.on_throttle()
+            signal = error is None or is_throttle(error)
+            admission.release(latency, error, signal=signal, kind="stream" if ticket.latency is not None else "invoke")
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            model_id: {"limit": admission.limit.limit, "in_flight": admission.in_flight,
+                       "queued": admission.queued}
+            for model_id, admission in self._models.items()
+        }
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Return the worker-wide admission controller
+    """
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            enabled=settings.ADMISSION_CONTROL_ENABLED,
+            initial_limit=settings.ADMISSION_INITIAL_LIMIT,
+            min_limit=settings.ADMISSION_MIN_LIMIT,
+            max_limit=settings.ADMISSION_MAX_LIMIT,
+            max_queue=settings.ADMISSION_MAX_QUEUE,
+            queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            latency_tolerance=settings.ADMISSION_LATENCY_TOLERANCE,
+            backoff=settings.ADMISSION_BACKOFF_RATIO,
+            priorities=settings.ADMISSION_API_KEY_PRIORITIES,
+        )
+    return _controller
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from app.models.batch import BatchChatCompletionItem, BatchItemError
+from app.models.chat import ChatCompletionRequest
+from app.services.admission import AdmissionRejected
+from app.services.bedrock import BedrockService
+from app.services.bedrock_errors import is_throttle
+from app.services.resilience import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+
+def batch_item_error(exc: Exception) -> BatchItemError:
+    """
+    Describe a failed batch item with the status code the single-request endpoint would use
+    """
+    if isinstance(exc, (AdmissionRejected, CircuitOpenError)):
+        return BatchItemError(message=str(exc), type="overloaded", status_code=exc.status_code)
+    if is_throttle(exc):
+        return BatchItemError(message=str(exc), type="throttled", status_code=429)
+    if isinstance(exc, ValueError):
+        return BatchItemError(message=str(exc), type="invalid_request", status_code=400)
+    return BatchItemError(message=str(exc), type="server_error", status_code=500)
+
+
+async def run_chat_completion(request: ChatCompletionRequest, index: int, api_key: Optional[str] = None,
+                              user_id: Optional[str] = None) -> BatchChatCompletionItem:
+    """
+    Run one non-streaming request, capturing any failure in the returned item
+    """
+    try:
+        if request.stream:
+            raise ValueError("Streaming is not supported for batch requests")
+        service = BedrockService(api_key=api_key, user_id=user_id or request.user_id)
+        response = await service.create_chat_completion(request)
+        return BatchChatCompletionItem(index=index, response=response)
+    except Exception as e:
+        logger.warning(f"Batch item {index} failed: {str(e)}")
+        return BatchChatCompletionItem(index=index, error=batch_item_error(e))
+
+
+async def run_batch(requests: List[ChatCompletionRequest], max_concurrency: int,
+                    api_key: Optional[str] = None) -> List[BatchChatCompletionItem]:
+    """
+    Run requests concurrently, at most ``max_concurrency`` at a time. One item's
+    failure does not affect the others; results are returned in request order.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(index: int, request: ChatCompletionRequest) -> BatchChatCompletionItem:
+        async with semaphore:
+            return await run_chat_completion(request, index, api_key)
+
+    return await asyncio.gather(*(run(index, request) for index, request in enumerate(requests)))
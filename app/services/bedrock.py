@@ -1,170 +1,657 @@
 import json
-import boto3
 import logging
 import asyncio
-from typing import Dict, List, Optional, Any, AsyncGenerator
+import threading
+import time
+from typing import Dict, List, Optional, Any, AsyncGenerator, Awaitable, Callable, Tuple
 
-from app.models.chat import Message, ChatCompletionChunk, ChatCompletionChunkChoice, ChatCompletionChunkDelta
+from app.models.chat import (
+    Message, ChatCompletionChoice, ChatCompletionRequest, ChatCompletionResponse, ChatCompletionUsage,
+    PromptTokensDetails,
+)
 from app.core.config import settings
+from app.core.serialization import loads
+from app.core.timing import record_timing, timed
+from app.core.metrics import (
+    BEDROCK_ERRORS, BEDROCK_LATENCY, BEDROCK_RETRIES, BEDROCK_THROTTLES, CACHE_EVENTS, PROMPT_CACHE_TOKENS,
+    TIME_TO_FIRST_TOKEN, TOKENS_PER_SECOND, register_model,
+)
+from app.services.adapters import TextPromptAdapter, finish_reason, get_adapter
+from app.services.admission import AdmissionRejected, get_admission_controller
+from app.services.bedrock_errors import error_code, is_server_failure, is_throttle, outcome
+from app.services.bedrock_client import get_shared_client
+from app.services.executor import get_executor
+from app.services.coalescing import get_coalescer
+from app.services.context import get_context_manager
+from app.services.embeddings import (
+    Embedding, embedding_cache_key, get_embedding_adapter, get_embedding_batcher, get_embedding_cache, to_float32,
+)
+from app.services.resilience import CircuitOpenError, get_resilience
+from app.services.routing import get_router, resolve_model_alias
+from app.services.sessions import PendingTurn
+from app.services.near_cache import NearProbe, get_near_cache, near_cache_threshold
+from app.services.rate_limiting import record_token_usage
+from app.services.response_cache import get_response_cache, is_cacheable, make_cache_key
+from app.services.tokenizer import (
+    StreamingTokenCounter, count_message_tokens, count_tokens, make_usage,
+    usage_from_invocation_metrics, usage_from_response,
+)
+from app.services.usage_tracking import track_usage
 
 logger = logging.getLogger(__name__)
 
+def _close_abandoned_stream(opening: asyncio.Future):
+    """Close a response stream that finished opening after its caller went away"""
+    if not opening.cancelled() and opening.exception() is None:
+        try:
+            opening.result()["body"].close()
+        except Exception:
+            pass
+
 class BedrockService:
     """Service for interacting with AWS Bedrock models"""
     
-    def __init__(self, client=None):
-        """Initialize with an optional boto3 bedrock-runtime client"""
-        self.client = client or boto3.client('bedrock-runtime', region_name=settings.AWS_REGION)
+    def __init__(self, client=None, api_key: Optional[str] = None, user_id: Optional[str] = None):
+        """
+        Initialize with an optional boto3 bedrock-runtime client, defaulting to the shared one.
+        The caller's API key decides its priority when Bedrock calls have to queue; calls
+        made on the caller's behalf, like context summaries, are billed to the key and user.
+        """
+        self.client = client or get_shared_client()
+        self.api_key = api_key
+        self.user_id = user_id
+        self.priority = get_admission_controller().priority_for(api_key)
+        self.region = getattr(getattr(self.client, "meta", None), "region_name", None) or settings.AWS_REGION
+        self.model_id: Optional[str] = None
+        self.stream_metrics: Dict[str, Any] = {}
+        self.cache_status: Optional[str] = None
+        self.cache_similarity: Optional[float] = None
+        self.context_tokens_saved = 0
     
     def _create_request_body(self, model_id: str, messages: List[Message], max_tokens: Optional[int] = None, 
-                           temperature: Optional[float] = None) -> Dict[str, Any]:
+                           temperature: Optional[float] = None, turn: Optional[PendingTurn] = None) -> Dict[str, Any]:
         """
-        Create the appropriate request body for the model
+        Create the appropriate request body for the model. For a session turn, text
+        prompts extend the session's rendered turns instead of rendering them again.
         """
         # Default values if not provided
         max_tokens = max_tokens or settings.DEFAULT_MAX_TOKENS
         temperature = temperature if temperature is not None else settings.DEFAULT_TEMPERATURE
         
         # Convert chat format to model-specific format
-        if "claude" in model_id.lower():
-            return self._create_anthropic_body(messages, max_tokens, temperature)
-        elif "llama" in model_id.lower():
-            return self._create_meta_body(messages, max_tokens, temperature)
+        adapter = get_adapter(model_id)
+        rendered_turns = None
+        if turn is not None and messages is turn.messages and isinstance(adapter, TextPromptAdapter):
+            rendered_turns = turn.rendered_turns(adapter)
+        return adapter.create_body(model_id, messages, max_tokens, temperature, rendered_turns)
+    
+    def _resolve_model(self, model_id: str, messages: List[Message], prompt_tokens: Optional[int] = None) -> str:
+        """
+        Resolve a configured model alias to a concrete model ID based on prompt size
+        """
+        if model_id in settings.MODEL_ALIASES:
+            if prompt_tokens is None:
+                prompt_tokens = count_message_tokens(messages)
+            model_id = resolve_model_alias(model_id, prompt_tokens)
+            logger.debug(f"Resolved model alias to {model_id}")
+        self.model_id = model_id
+        return model_id
+    
+    async def _fit_context(self, model_id: str, messages: List[Message], max_tokens: Optional[int] = None,
+                           costs: Optional[List[int]] = None) -> List[Message]:
+        """
+        Fit the conversation into the model's context window with the configured strategy
+        """
+        if settings.CONTEXT_STRATEGY == "none":
+            return messages
+        with timed("context"):
+            messages, self.context_tokens_saved = await get_context_manager().fit(
+                model_id, messages, max_tokens or settings.DEFAULT_MAX_TOKENS, summarize=self._summarize, costs=costs
+            )
+        return messages
+    
+    async def _prepare(self, model_id: str, messages: List[Message], max_tokens: Optional[int],
+                       temperature: Optional[float], turn: Optional[PendingTurn] = None,
+                       ) -> Tuple[str, List[Message], Dict[str, Any]]:
+        """
+        Resolve the model, fit the conversation into its context window and render
+        the request body. A session turn supplies its history with token counts
+        and renderings already computed.
+        """
+        if turn is None:
+            model_id = self._resolve_model(model_id, messages)
+            messages = await self._fit_context(model_id, messages, max_tokens)
         else:
-            logger.warning(f"Unknown model format for {model_id}, defaulting to Claude format")
-            return self._create_anthropic_body(messages, max_tokens, temperature)
+            messages = turn.messages
+            prompt_tokens = turn.prompt_tokens if model_id in settings.MODEL_ALIASES else None
+            model_id = self._resolve_model(model_id, messages, prompt_tokens)
+            if settings.CONTEXT_STRATEGY != "none":
+                messages = await self._fit_context(model_id, messages, max_tokens, turn.costs)
+        with timed("render"):
+            request_body = self._create_request_body(model_id, messages, max_tokens, temperature, turn)
+        return model_id, messages, request_body
     
-    def _create_anthropic_body(self, messages: List[Message], max_tokens: int, temperature: float) -> Dict[str, Any]:
+    async def _summarize(self, messages: List[Message]) -> str:
         """
-        Create request body for Anthropic Claude models
+        Run a summary prompt on the (cheaper) summary model, recording its usage
+        against the caller
         """
-        # Start with system prompt if present
-        anthropic_prompt = ""
-        system_messages = [msg for msg in messages if msg.role == "system"]
-        if system_messages:
-            anthropic_prompt = system_messages[0].content + "\n\n"
-        
-        # Add conversation messages
-        for msg in messages:
-            if msg.role == "system":
-                continue  # Already handled above
-            elif msg.role == "user":
-                anthropic_prompt += f"Human: {msg.content}\n\n"
-            elif msg.role == "assistant":
-                anthropic_prompt += f"Assistant: {msg.content}\n\n"
-        
-        # Add final assistant prompt
-        anthropic_prompt += "Assistant:"
-        
-        return {
-            "prompt": anthropic_prompt,
-            "max_tokens_to_sample": max_tokens,
-            "temperature": temperature,
-            "anthropic_version": "bedrock-2023-05-31"
-        }
-    
-    def _create_meta_body(self, messages: List[Message], max_tokens: int, temperature: float) -> Dict[str, Any]:
-        """
-        Create request body for Meta Llama models
-        """
-        # Llama uses a different format
-        prompt = ""
-        for msg in messages:
-            if msg.role == "system":
-                prompt += f"<system>\n{msg.content}\n</system>\n"
-            elif msg.role == "user":
-                prompt += f"<human>\n{msg.content}\n</human>\n"
-            elif msg.role == "assistant":
-                prompt += f"<assistant>\n{msg.content}\n</assistant>\n"
-        
-        # Final assistant turn
-        prompt += "<assistant>\n"
-        
-        return {
-            "prompt": prompt,
-            "max_gen_len": max_tokens,
-            "temperature": temperature
-        }
+        model_id = settings.CONTEXT_SUMMARY_MODEL
+        request_body = self._create_request_body(model_id, messages, settings.CONTEXT_SUMMARY_MAX_TOKENS, 0.0)
+        result = await self._complete(model_id, messages, request_body)
+        usage = result["usage"]
+        tokens = usage.get("total_tokens", 0)
+        await track_usage(model=model_id, tokens=tokens, user_id=self.user_id, api_key=self.api_key,
+                          cached_tokens=usage.get("cached_tokens", 0),
+                          cache_write_tokens=usage.get("cache_write_tokens", 0))
+        await record_token_usage(self.api_key, self.user_id, tokens)
+        return result["completion"]
     
-    async def generate_completion(self, model_id: str, messages: List[Message], max_tokens: Optional[int] = None,
-                               temperature: Optional[float] = None) -> Dict[str, Any]:
+    def _invoke_model(self, model_id: str, request_body: Dict[str, Any],
+                      client=None) -> Tuple[Dict[str, Any], Dict[str, str]]:
         """
-        Generate a completion using AWS Bedrock
+        Blocking invoke_model call; must be run off the event loop.
+        Returns the parsed response body and the HTTP response headers.
         """
-        request_body = self._create_request_body(model_id, messages, max_tokens, temperature)
-        
+        started = time.perf_counter()
         try:
-            logger.debug(f"Calling Bedrock model {model_id}")
-            response = self.client.invoke_model(
+            response = (client or self.client).invoke_model(
                 modelId=model_id,
                 contentType="application/json",
                 accept="application/json",
                 body=json.dumps(request_body)
             )
-            
-            # Parse the response
-            response_body = json.loads(response['body'].read())
-            logger.debug(f"Received response from Bedrock")
-            
-            # Extract the completion based on model
-            if "claude" in model_id.lower():
-                completion = response_body.get("completion", "").strip()
-            elif "llama" in model_id.lower():
-                completion = response_body.get("generation", "").strip()
+            result = loads(response['body'].read())
+        except Exception as e:
+            self._observe_call(model_id, started, response=None, error=e)
+            raise
+        self._observe_call(model_id, started, response=response)
+        return result, response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+    
+    def _invoke_model_stream(self, model_id: str, request_body: Dict[str, Any], client=None) -> Dict[str, Any]:
+        """
+        Blocking invoke_model_with_response_stream call; returns once the stream is open
+        """
+        started = time.perf_counter()
+        try:
+            response = (client or self.client).invoke_model_with_response_stream(
+                modelId=model_id,
+                contentType="application/json",
+                accept="application/json",
+                body=json.dumps(request_body)
+            )
+        except Exception as e:
+            self._observe_call(model_id, started, error=e)
+            raise
+        self._observe_call(model_id, started, response=response)
+        return response
+    
+    async def _open_stream(self, model_id: str, request_body: Dict[str, Any], client=None) -> Dict[str, Any]:
+        """
+        Open a response stream in the executor. If the caller goes away before it
+        opens, the stream is closed as soon as the call returns.
+        """
+        opening = asyncio.ensure_future(
+            get_executor().run(model_id, self._invoke_model_stream, model_id, request_body, client))
+        try:
+            return await asyncio.shield(opening)
+        except asyncio.CancelledError:
+            opening.add_done_callback(_close_abandoned_stream)
+            raise
+    
+    async def _invoke_admitted(self, model_id: str, request_body: Dict[str, Any],
+                               client=None) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        One invoke_model attempt holding an admission slot
+        """
+        async with get_admission_controller().slot(model_id, self.priority):
+            # The boto3 call and body read block, so run them in the executor
+            return await get_executor().run(model_id, self._invoke_model, model_id, request_body, client)
+    
+    async def _call_bedrock(self, model_id: str, attempt: Callable[[Any], Awaitable[Any]], hedge: bool = False,
+                            on_retry: Optional[Callable[[BaseException], None]] = None) -> Any:
+        """
+        Run ``attempt(client)`` under the retry/hedging/circuit breaker policy,
+        routed across regions when more than one is configured
+        """
+        if not get_router().enabled:
+            return await get_resilience().call(
+                model_id, self.region, lambda: attempt(self.client), hedge=hedge, on_retry=on_retry)
+        return await get_resilience().call(
+            model_id, None, lambda: self._call_routed(model_id, attempt), hedge=hedge, on_retry=on_retry)
+    
+    async def _call_routed(self, model_id: str, attempt: Callable[[Any], Awaitable[Any]]) -> Any:
+        """
+        Try regions fastest-healthy first. A region that throttles, or whose circuit is
+        open, is skipped for the next one; other errors are left to the retry policy.
+        """
+        router = get_router()
+        resilience = get_resilience()
+        error: Optional[Exception] = None
+        for region in router.candidates(model_id):
+            breaker = resilience.breaker(model_id, region)
+            try:
+                breaker.before_call()
+            except CircuitOpenError as e:
+                error = e
+                continue
+            started = time.perf_counter()
+            try:
+                result = await attempt(router.client(region))
+            except AdmissionRejected:
+                breaker.on_neutral()
+                raise
+            except Exception as e:
+                router.record(model_id, region, time.perf_counter() - started, e)
+                if is_server_failure(e):
+                    breaker.on_failure()
+                else:
+                    breaker.on_neutral()
+                if not is_throttle(e):
+                    raise
+                router.failed_over(model_id, region)
+                error = e
+                continue
+            except BaseException:
+                breaker.on_neutral()
+                raise
+            breaker.on_success()
+            router.record(model_id, region, time.perf_counter() - started)
+            self.region = region
+            return result
+        raise error
+    
+    def _observe_call(self, model_id: str, started: float, response: Optional[Dict[str, Any]] = None,
+                      error: Optional[BaseException] = None):
+        """
+        Record latency, retries and errors of one Bedrock API call
+        """
+        BEDROCK_LATENCY.labels(model_id, outcome(error)).observe(time.perf_counter() - started)
+        if response is not None:
+            retries = response.get("ResponseMetadata", {}).get("RetryAttempts", 0)
+            if retries:
+                BEDROCK_RETRIES.labels(model_id).inc(retries)
+        if error is None:
+            register_model(model_id)
+        else:
+            BEDROCK_ERRORS.labels(model_id, error_code(error)).inc()
+            if is_throttle(error):
+                BEDROCK_THROTTLES.labels(model_id).inc()
+    
+    def _observe_prompt_cache(self, model_id: str, usage: Dict[str, int]):
+        """
+        Record prompt tokens Bedrock served from or wrote to its prompt cache
+        """
+        if usage.get("cached_tokens"):
+            PROMPT_CACHE_TOKENS.labels(model_id, "read").inc(usage["cached_tokens"])
+        if usage.get("cache_write_tokens"):
+            PROMPT_CACHE_TOKENS.labels(model_id, "write").inc(usage["cache_write_tokens"])
+    
+    def _count_usage(self, messages: List[Message], completion: str) -> Dict[str, int]:
+        """
+        Count token usage locally, for responses where Bedrock did not report it
+        """
+        return make_usage(count_message_tokens(messages), count_tokens(completion))
+    
+    def _cache_key(self, model_id: str, request_body: Dict[str, Any]) -> Optional[str]:
+        """
+        Response cache key for this request, or None if it should not be cached
+        """
+        if not is_cacheable(request_body.get("temperature", settings.DEFAULT_TEMPERATURE)):
+            return None
+        return make_cache_key(model_id, request_body)
+    
+    async def _near_lookup(self, model_id: str, messages: List[Message],
+                           request_body: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[NearProbe]]:
+        """
+        Look the request up in the near-duplicate cache where its model and API key
+        allow it. Returns the cached response, if any, and the probe to store the
+        response under on a miss.
+        """
+        temperature = request_body.get("temperature", settings.DEFAULT_TEMPERATURE)
+        threshold = near_cache_threshold(model_id, self.api_key, temperature)
+        if threshold is None:
+            return None, None
+        cache = get_near_cache()
+        # Normalizing and hashing the prompt is pure CPU work; keep it off the event loop
+        probe = await asyncio.to_thread(cache.probe, model_id, request_body, messages[-1].content if messages else "")
+        if probe is None:
+            return None, None
+        cached, score = cache.get(probe, threshold)
+        self.cache_status = "HIT" if cached else "MISS"
+        if cached:
+            self.cache_similarity = score
+            logger.debug(f"Near-duplicate cache hit for {model_id} at similarity {score:.2f}")
+            return cached, None
+        return None, probe
+    
+    async def generate_completion(self, model_id: str, messages: List[Message], max_tokens: Optional[int] = None,
+                               temperature: Optional[float] = None,
+                               turn: Optional[PendingTurn] = None) -> Dict[str, Any]:
+        """
+        Generate a completion using AWS Bedrock. With a session ``turn``, the
+        conversation is the session's history plus the turn's new messages.
+        """
+        model_id, messages, request_body = await self._prepare(model_id, messages, max_tokens, temperature, turn)
+        
+        cache_key = self._cache_key(model_id, request_body)
+        if cache_key:
+            cached = await get_response_cache().get(cache_key)
+            self.cache_status = "HIT" if cached else "MISS"
+            if cached:
+                return cached
+        cached, near_probe = await self._near_lookup(model_id, messages, request_body)
+        if cached:
+            return cached
+        
+        if settings.REQUEST_COALESCING_ENABLED:
+            # Identical in-flight requests share a single upstream call
+            return await get_coalescer().do(
+                cache_key or make_cache_key(model_id, request_body),
+                lambda: self._complete(model_id, messages, request_body, cache_key, near_probe)
+            )
+        return await self._complete(model_id, messages, request_body, cache_key, near_probe)
+    
+    async def create_chat_completion(self, request: ChatCompletionRequest,
+                                     turn: Optional[PendingTurn] = None) -> ChatCompletionResponse:
+        """
+        Run a non-streaming chat completion request and format the OpenAI-style response
+        """
+        result = await self.generate_completion(
+            model_id=request.model,
+            messages=request.messages,
+            max_tokens=request.max_tokens,
+            temperature=request.temperature,
+            turn=turn
+        )
+        usage = result.get("usage", {})
+        return ChatCompletionResponse(
+            model=self.model_id or request.model,
+            choices=[
+                ChatCompletionChoice(
+                    index=0,
+                    message=Message(
+                        role="assistant",
+                        content=result.get("completion", "")
+                    ),
+                    finish_reason=result.get("finish_reason", "stop")
+                )
+            ],
+            usage=ChatCompletionUsage(
+                prompt_tokens=usage.get("prompt_tokens", 0),
+                completion_tokens=usage.get("completion_tokens", 0),
+                total_tokens=usage.get("total_tokens", 0),
+                prompt_tokens_details=PromptTokensDetails(
+                    cached_tokens=usage.get("cached_tokens", 0),
+                    cache_write_tokens=usage.get("cache_write_tokens", 0)
+                ) if "cached_tokens" in usage or "cache_write_tokens" in usage else None
+            )
+        )
+    
+    async def create_embeddings(self, model_id: str, texts: List[str], dimensions: Optional[int] = None,
+                                input_type: Optional[str] = None) -> Tuple[List[bytes], int]:
+        """
+        Embed ``texts`` as float32 vectors (see ``app.services.embeddings``). Cached
+        vectors are reused and the rest go through the micro-batcher. Returns the
+        vectors in input order and the input tokens billed for this request.
+        """
+        get_embedding_adapter(model_id)  # Reject unknown models before anything is queued
+        self.model_id = model_id
+        cache = get_embedding_cache()
+        keys = [embedding_cache_key(model_id, dimensions, input_type, text) for text in texts]
+        vectors: Dict[str, bytes] = {}
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in vectors or key in missing:
+                continue
+            cached = cache.get(key)
+            if cached is not None:
+                vectors[key] = cached
             else:
-                completion = response_body.get("completion", response_body.get("generation", "")).strip()
-            
-            # Estimate token usage - this is approximate
-            prompt_tokens = len(request_body.get("prompt", "")) // 4
-            completion_tokens = len(completion) // 4
+                missing[key] = text
+        CACHE_EVENTS.labels("embedding", "hit").inc(len(vectors))
+        CACHE_EVENTS.labels("embedding", "miss").inc(len(missing))
+        self.cache_status = "MISS" if missing else "HIT"
+        
+        tokens = 0
+        if missing:
+            embedded = await get_embedding_batcher().embed(
+                model_id, dimensions, input_type, missing,
+                lambda batch: self._embed_batch(model_id, batch, dimensions, input_type)
+            )
+            for key, (vector, count) in embedded.items():
+                vectors[key] = vector
+                tokens += count
+                cache.set(key, vector)
+        return [vectors[key] for key in keys], tokens
+    
+    async def _embed_batch(self, model_id: str, texts: List[str], dimensions: Optional[int],
+                           input_type: Optional[str]) -> List[Embedding]:
+        """
+        One upstream embedding call for a batch of texts
+        """
+        adapter = get_embedding_adapter(model_id)
+        request_body = adapter.create_body(texts, dimensions, input_type)
+        logger.debug(f"Embedding {len(texts)} texts with {model_id}")
+        # Retried on throttles and 5xx, and hedged when enabled (the call is idempotent)
+        response_body, headers = await self._call_bedrock(
+            model_id, lambda client: self._invoke_admitted(model_id, request_body, client), hedge=True
+        )
+        embeddings = adapter.parse_embeddings(response_body)
+        if len(embeddings) != len(texts):
+            raise ValueError(f"{model_id} returned {len(embeddings)} embeddings for {len(texts)} texts")
+        return list(zip(map(to_float32, embeddings), adapter.token_counts(response_body, headers, texts)))
+    
+    async def _complete(self, model_id: str, messages: List[Message], request_body: Dict[str, Any],
+                        cache_key: Optional[str] = None,
+                        near_probe: Optional[NearProbe] = None) -> Dict[str, Any]:
+        """
+        Call Bedrock for a rendered request body and parse the completion
+        """
+        try:
+            logger.debug(f"Calling Bedrock model {model_id}")
+            # Retried on throttles and 5xx, and hedged when enabled (the call is idempotent)
+            with timed("bedrock"):
+                response_body, headers = await self._call_bedrock(
+                    model_id, lambda client: self._invoke_admitted(model_id, request_body, client), hedge=True
+                )
+            logger.debug("Received response from Bedrock")
             
-            return {
-                "completion": completion,
-                "usage": {
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": completion_tokens,
-                    "total_tokens": prompt_tokens + completion_tokens
+            with timed("parse"):
+                adapter = get_adapter(model_id)
+                completion = adapter.parse_completion(response_body)
+                
+                result = {
+                    "completion": completion,
+                    # Prefer the token counts Bedrock reports over local counting
+                    "usage": usage_from_response(response_body, headers) or self._count_usage(messages, completion),
+                    "finish_reason": finish_reason(adapter.parse_stop_reason(response_body)),
                 }
-            }
+            self._observe_prompt_cache(model_id, result["usage"])
             
         except Exception as e:
             logger.error(f"Error in Bedrock completion: {str(e)}")
             raise
+        
+        if cache_key:
+            await get_response_cache().set(cache_key, result)
+        if near_probe is not None:
+            get_near_cache().set(near_probe, result)
+        return result
+    
+    def _parse_stream_chunk(self, model_id: str, payload: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Extract the text delta and stop reason from one decoded response-stream chunk
+        """
+        return get_adapter(model_id).parse_stream_chunk(payload)
     
-    async def generate_completion_stream(self, model_id: str, messages: List[Message], 
+    async def stream_completion_deltas(self, model_id: str, messages: List[Message],
                                        max_tokens: Optional[int] = None,
                                        temperature: Optional[float] = None,
-                                       ) -> AsyncGenerator[ChatCompletionChunk, None]:
+                                       turn: Optional[PendingTurn] = None,
+                                       ) -> AsyncGenerator[str, None]:
         """
-        Generate a streaming completion
-        Note: AWS Bedrock doesn't natively support streaming for all models.
-        This implementation simulates streaming by breaking a complete response into chunks.
+        Stream text deltas for a chat completion.
+        
+        Cacheable requests are served from, and stored in, the response cache and
+        the near-duplicate cache. With request coalescing enabled, identical
+        concurrent streams share one upstream Bedrock stream. Time-to-first-token, stop
+        reason and Bedrock invocation metrics are recorded in ``self.stream_metrics``.
         """
+        model_id, messages, request_body = await self._prepare(model_id, messages, max_tokens, temperature, turn)
+        
+        # Replay cached completions as a single delta
+        cache_key = self._cache_key(model_id, request_body)
+        if cache_key:
+            cached = await get_response_cache().get(cache_key)
+            self.cache_status = "HIT" if cached else "MISS"
+            if cached:
+                self.stream_metrics = {"ttft": 0.0, "chunks": 1, "finish_reason": cached.get("finish_reason"),
+                                       "invocation_metrics": None, "usage": cached.get("usage")}
+                yield cached["completion"]
+                return
+        cached, near_probe = await self._near_lookup(model_id, messages, request_body)
+        if cached:
+            self.stream_metrics = {"ttft": 0.0, "chunks": 1, "finish_reason": cached.get("finish_reason"),
+                                   "invocation_metrics": None, "usage": cached.get("usage")}
+            yield cached["completion"]
+            return
+        
+        if settings.REQUEST_COALESCING_ENABLED:
+            deltas, self.stream_metrics = get_coalescer().stream(
+                cache_key or make_cache_key(model_id, request_body),
+                lambda metrics: self._stream_upstream(model_id, messages, request_body, metrics, cache_key,
+                                                      near_probe)
+            )
+        else:
+            self.stream_metrics = {}
+            deltas = self._stream_upstream(model_id, messages, request_body, self.stream_metrics, cache_key,
+                                           near_probe)
+        
         try:
-            # Get the full completion first
-            response = await self.generate_completion(model_id, messages, max_tokens, temperature)
-            completion = response.get("completion", "")
-            
-            # Break into chunks and yield
-            chunk_size = 20  # Simulating stream with 20-char chunks
-            for i in range(0, len(completion), chunk_size):
-                chunk = completion[i:i+chunk_size]
-                
-                # Create SSE-compatible chunk
-                yield ChatCompletionChunk(
-                    model=model_id,
-                    choices=[
-                        ChatCompletionChunkChoice(
-                            index=0,
-                            delta=ChatCompletionChunkDelta(content=chunk),
-                            finish_reason=None if i + chunk_size < len(completion) else "stop"
-                        )
-                    ]
+            async for text in deltas:
+                yield text
+        finally:
+            await deltas.aclose()
+    
+    async def _stream_upstream(self, model_id: str, messages: List[Message], request_body: Dict[str, Any],
+                               metrics: Dict[str, Any], cache_key: Optional[str] = None,
+                               near_probe: Optional[NearProbe] = None) -> AsyncGenerator[str, None]:
+        """
+        Stream text deltas from Bedrock's invoke_model_with_response_stream API.
+        
+        The blocking event-stream iterator runs on the executor's stream pool and hands
+        each decoded frame to the event loop as soon as it arrives. Closing the generator
+        (e.g. when the client disconnects) stops the reader and closes the upstream stream.
+        Completion tokens are counted incrementally; ``metrics["usage"]`` is set when
+        the stream ends, preferring Bedrock's invocation metrics.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+        upstream = {}
+        started = time.monotonic()
+        parts: List[str] = []
+        token_counter = StreamingTokenCounter()
+        parse_time = 0.0
+        metrics.update(ttft=None, chunks=0, finish_reason=None, invocation_metrics=None, usage=None)
+        
+        def post(kind: str, value: Any = None):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, (kind, value))
+            except RuntimeError:
+                pass  # Event loop already closed
+        
+        def pump(body):
+            try:
+                for event in body:
+                    if stop.is_set():
+                        break
+                    chunk = event.get("chunk")
+                    if chunk:
+                        post("chunk", chunk["bytes"])
+            except Exception as e:
+                if not stop.is_set():
+                    post("error", e)
+            finally:
+                post("end")
+        
+        async def read(body):
+            try:
+                await get_executor().read_stream(model_id, pump, body)
+            except Exception as e:
+                # The reader never ran, e.g. because the executor is shutting down
+                queue.put_nowait(("error", e))
+        
+        logger.debug(f"Streaming from Bedrock model {model_id}")
+        async with get_admission_controller().slot(model_id, self.priority) as ticket:
+            admitted = time.monotonic()
+            # Opening the stream is retried; once tokens flow, errors go to the client
+            with timed("bedrock"):
+                response = await self._call_bedrock(
+                    model_id, lambda client: self._open_stream(model_id, request_body, client),
+                    on_retry=ticket.record_error
                 )
+            upstream["body"] = response["body"]
+            reader = asyncio.ensure_future(read(response["body"]))
+            try:
+                while True:
+                    kind, value = await queue.get()
+                    if kind == "end":
+                        break
+                    if kind == "error":
+                        raise value
                 
-                # Small delay to simulate streaming
-                await asyncio.sleep(0.05)
+                    parse_started = time.perf_counter()
+                    payload = json.loads(value)
+                    invocation_metrics = payload.get("amazon-bedrock-invocationMetrics")
+                    if invocation_metrics:
+                        metrics["invocation_metrics"] = invocation_metrics
+                    text, stop_reason = self._parse_stream_chunk(model_id, payload)
+                    if stop_reason:
+                        metrics["finish_reason"] = stop_reason
+                    parse_time += time.perf_counter() - parse_started
+                    if text:
+                        if metrics["ttft"] is None:
+                            metrics["ttft"] = time.monotonic() - started
+                            record_timing("ttft", metrics["ttft"])
+                            # Admission adapts to Bedrock's own time to first token
+                            ticket.latency = time.monotonic() - admitted
+                            TIME_TO_FIRST_TOKEN.labels(model_id).observe(metrics["ttft"])
+                            logger.info(f"Bedrock stream for {model_id}: time to first token "
+                                        f"{metrics['ttft'] * 1000:.1f} ms")
+                        metrics["chunks"] += 1
+                        token_counter.feed(text)
+                        if cache_key or near_probe is not None:
+                            parts.append(text)
+                        yield text
             
-        except Exception as e:
-            logger.error(f"Error in Bedrock streaming: {str(e)}")
-            raise
\ No newline at end of file
+                metrics["usage"] = (usage_from_invocation_metrics(metrics["invocation_metrics"])
+                                    or make_usage(count_message_tokens(messages), token_counter.total()))
+                self._observe_prompt_cache(model_id, metrics["usage"])
+                generation_time = time.monotonic() - started - (metrics["ttft"] or 0.0)
+                if metrics["ttft"] is not None and generation_time > 0:
+                    TOKENS_PER_SECOND.labels(model_id).observe(metrics["usage"]["completion_tokens"] / generation_time)
+                if cache_key or near_probe is not None:
+                    result = {"completion": "".join(parts), "usage": metrics["usage"],
+                              "finish_reason": finish_reason(metrics["finish_reason"])}
+                    if cache_key:
+                        await get_response_cache().set(cache_key, result)
+                    if near_probe is not None:
+                        get_near_cache().set(near_probe, result)
+            except Exception as e:
+                logger.error(f"Error in Bedrock streaming: {str(e)}")
+                raise
+            finally:
+                record_timing("parse", parse_time)
+                # Stop the reader thread and close the upstream HTTP stream
+                stop.set()
+                body = upstream.get("body")
+                if body is not None:
+                    try:
+                        body.close()
+                    except Exception:
+                        pass
+                # The reader returns once the body is closed; don't leave its task behind
+                reader.cancel()
+                await asyncio.gather(reader, return_exceptions=True)
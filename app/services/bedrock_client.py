@@ -0,0 +1,129 @@
+import logging
+import threading
+from typing import Optional
+
+import boto3
+import botocore.loaders
+import botocore.session
+from botocore.config import Config
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Process-wide client shared by every request handled by this worker.
+# botocore clients are thread-safe, so one instance (and its connection pool)
+# can serve all concurrent requests.
+_client = None
+_client_lock = threading.Lock()
+
+# botocore's data loader caches the parsed service model and endpoint data. Every
+# session uses this one, so the JSON is read and parsed once per process instead
+# of for each client.
+_data_loader = None
+
+
+def build_client_config() -> Config:
+    """
+    Build the botocore configuration used for the bedrock-runtime client
+    """
+    return Config(
+        region_name=settings.AWS_REGION,
+        max_pool_connections=settings.BEDROCK_MAX_POOL_CONNECTIONS,
+        tcp_keepalive=settings.BEDROCK_TCP_KEEPALIVE,
+        connect_timeout=settings.BEDROCK_CONNECT_TIMEOUT,
+        read_timeout=settings.BEDROCK_READ_TIMEOUT,
+        retries={
+            "mode": settings.BEDROCK_RETRY_MODE,
+            "max_attempts": settings.BEDROCK_MAX_ATTEMPTS,
+        },
+    )
+
+
+def _session() -> boto3.session.Session:
+    """
+    New boto3 session on a dedicated botocore session that shares the process-wide
+    data loader
+    """
+    global _data_loader
+    if _data_loader is None:
+        _data_loader = botocore.loaders.create_loader()
+    botocore_session = botocore.session.Session()
+    session = boto3.session.Session(botocore_session=botocore_session)
+    # Registered after boto3 has set up the session's own loader, which it uses for
+    # resource definitions only
+    botocore_session.register_component("data_loader", _data_loader)
+    return session
+
+
+def create_bedrock_client(region_name: Optional[str] = None):
+    """
+    Create a new bedrock-runtime client with the configured pool and timeout settings.
+
+    A dedicated botocore session is used so that client creation does not contend
+    on the global default session.
+    """
+    return _session().client(
+        "bedrock-runtime",
+        region_name=region_name or settings.AWS_REGION,
+        endpoint_url=settings.BEDROCK_ENDPOINT_URL,
+        config=build_client_config(),
+    )
+
+
+def preload_client_data():
+    """
+    Load botocore's lazily imported modules and the bedrock-runtime model and
+    endpoint data into the shared loader, without resolving credentials or opening
+    a connection. Safe to call before worker processes are forked.
+    """
+    client = _session().client(
+        "bedrock-runtime",
+        region_name=settings.AWS_REGION,
+        endpoint_url=settings.BEDROCK_ENDPOINT_URL,
+        aws_access_key_id="preload",
+        aws_secret_access_key="preload",
+    )
+    client.close()
+
+
+def init_bedrock_client():
+    """
+    Create the shared client if it does not exist yet and return it.
+    Called from the application startup hook.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_bedrock_client()
+                logger.info(
+                    f"Initialized shared Bedrock client for {settings.AWS_REGION} "
+                    f"(pool={settings.BEDROCK_MAX_POOL_CONNECTIONS})"
+                )
+    return _client
+
+
+def get_shared_client():
+    """
+    Return the shared bedrock-runtime client, creating it lazily if startup
+    has not run (e.g. when the service is used outside the ASGI app).
+    """
+    return _client if _client is not None else init_bedrock_client()
+
+
+def close_bedrock_client():
+    """
+    Close the shared client and release its pooled connections.
+    Called from the application shutdown hook.
+    """
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is None:
+        return
+    try:
+        client.close()
+        logger.info("Closed shared Bedrock client")
+    except Exception as e:
+        logger.warning(f"Error closing Bedrock client: {str(e)}")
@@ -0,0 +1,71 @@
+from typing import Optional
+
+from botocore.exceptions import ConnectionError as BotocoreConnectionError, HTTPClientError
+
+# Bedrock error codes that indicate we are sending too much traffic
+THROTTLING_CODES = frozenset({
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceQuotaExceededException",
+})
+
+# Error codes worth retrying: throttles plus transient server-side failures
+RETRYABLE_CODES = THROTTLING_CODES | frozenset({
+    "InternalServerException",
+    "ServiceUnavailableException",
+    "ModelNotReadyException",
+    "ModelTimeoutException",
+    "ModelStreamErrorException",
+})
+
+
+def error_code(exc: BaseException) -> str:
+    """
+    Error code of a botocore ClientError / EventStreamError, or the exception class name
+    """
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        if code:
+            return code
+    return type(exc).__name__
+
+
+def http_status(exc: BaseException) -> Optional[int]:
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return None
+
+
+def is_throttle(exc: BaseException) -> bool:
+    return error_code(exc) in THROTTLING_CODES or http_status(exc) == 429
+
+
+def is_server_failure(exc: BaseException) -> bool:
+    """
+    Errors that suggest Bedrock (or the path to it) is unhealthy: 5xx responses,
+    timeouts and connection failures. Throttles and client errors do not count.
+    """
+    if isinstance(exc, (HTTPClientError, BotocoreConnectionError)):
+        return True
+    if is_throttle(exc):
+        return False
+    status = http_status(exc)
+    return error_code(exc) in RETRYABLE_CODES or (status is not None and status >= 500)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    return is_throttle(exc) or is_server_failure(exc)
+
+
+def outcome(exc: Optional[BaseException]) -> str:
+    """
+    Metric label describing how a call ended
+    """
+    if exc is None:
+        return "success"
+    if not isinstance(exc, Exception):
+        # CancelledError / GeneratorExit: the client went away
+        return "cancelled"
+    return "throttled" if is_throttle(exc) else "error"
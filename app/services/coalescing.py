@@ -0,0 +1,179 @@
+import asyncio
+import logging
+from typing import Any, AsyncGenerator, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class _InFlightCall:
+    """A shared upstream call and the number of requests waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class _StreamBroadcast:
+    """
+    One upstream stream fanned out to any number of subscribers.
+
+    The upstream stream is pumped by its own task, which keeps running while any
+    subscriber remains and is cancelled when the last one closes. Every delta is
+    kept so subscribers that join late replay from the start and all consumers
+    see the same completion.
+    """
+
+    def __init__(self, source: AsyncGenerator[str, None], state: Dict[str, Any]):
+        self.state = state
+        self.items: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.abandoned = False
+        self._changed = asyncio.Event()
+        self.task = asyncio.ensure_future(self._pump(source))
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _pump(self, source: AsyncGenerator[str, None]):
+        try:
+            async for item in source:
+                self.items.append(item)
+                self._notify()
+        except asyncio.CancelledError:
+            # Only reaches subscribers if the task was cancelled from outside (e.g. shutdown)
+            self.error = RuntimeError("Shared upstream stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+            await source.aclose()
+
+    def subscribe(self) -> "_Subscription":
+        """
+        A new subscriber, counted from now on (not from its first read) so the
+        stream is not stopped under a subscriber that has yet to start reading
+        """
+        self.subscribers += 1
+        return _Subscription(self)
+
+    def _leave(self):
+        self.subscribers -= 1
+        if self.subscribers == 0 and not self.task.done():
+            # Last consumer went away: stop the upstream stream
+            self.abandoned = True
+            self.task.cancel()
+
+
+class _Subscription:
+    """A subscriber's view of a ``_StreamBroadcast``; must be closed with ``aclose()``"""
+
+    def __init__(self, broadcast: _StreamBroadcast):
+        self.broadcast = broadcast
+        self.index = 0
+        self.closed = False
+
+    def __aiter__(self) -> "_Subscription":
+        return self
+
+    async def __anext__(self) -> str:
+        broadcast = self.broadcast
+        while not self.closed:
+            if self.index < len(broadcast.items):
+                self.index += 1
+                return broadcast.items[self.index - 1]
+            if broadcast.done:
+                await self.aclose()
+                if broadcast.error is not None:
+                    raise broadcast.error
+                break
+            await broadcast._changed.wait()
+        raise StopAsyncIteration
+
+    async def aclose(self):
+        if not self.closed:
+            self.closed = True
+            self.broadcast._leave()
+
+
+class RequestCoalescer:
+    """
+    Single-flight layer: concurrent requests with the same key share one upstream call.
+
+    The upstream call keeps running as long as at least one request is waiting on it,
+    so a disconnecting leader does not cancel it for the followers. Errors raised by
+    the upstream call propagate to every waiter.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _InFlightCall] = {}
+        self._streams: Dict[str, _StreamBroadcast] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Await ``fn()``, sharing the call with any identical request already in flight
+        """
+        call = self._calls.get(key)
+        if call is None or call.abandoned:
+            call = self._calls[key] = _InFlightCall(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            self.coalesced += 1
+            CACHE_EVENTS.labels("coalescing", "shared").inc()
+            logger.debug(f"Coalesced request onto in-flight call {key[:12]}")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.abandoned = True
+                call.task.cancel()
+
+    def stream(self, key: str,
+               factory: Callable[[Dict[str, Any]], AsyncGenerator[str, None]],
+               ) -> Tuple[AsyncIterator[str], Dict[str, Any]]:
+        """
+        Subscribe to the upstream stream for ``key``, starting it with ``factory`` if needed.
+
+        ``factory`` receives a state dict shared by all subscribers (used for stream
+        metrics); the subscription and that dict are returned. The caller must
+        ``aclose()`` the subscription, even if it never reads from it.
+        """
+        broadcast = self._streams.get(key)
+        if broadcast is None or broadcast.abandoned:
+            state: Dict[str, Any] = {}
+            broadcast = self._streams[key] = _StreamBroadcast(factory(state), state)
+            broadcast.task.add_done_callback(lambda _: self._forget(self._streams, key, broadcast))
+        else:
+            self.coalesced += 1
+            CACHE_EVENTS.labels("coalescing", "shared").inc()
+            logger.debug(f"Coalesced stream onto in-flight stream {key[:12]}")
+        return broadcast.subscribe(), broadcast.state
+
+    @staticmethod
+    def _forget(registry: Dict[str, Any], key: str, entry: Any):
+        if registry.get(key) is entry:
+            del registry[key]
+
+
+_coalescer: Optional[RequestCoalescer] = None
+
+
+def get_coalescer() -> RequestCoalescer:
+    """
+    Return the worker-wide request coalescer
+    """
+    global _coalescer
+    if _coalescer is None:
+        _coalescer = RequestCoalescer()
+    return _coalescer
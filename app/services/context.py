@@ -0,0 +1,273 @@
+"""
+Context window management: fit long conversations into a model's prompt budget
+before they are rendered.
+
+The budget is the model's context window less the completion's ``max_tokens``
+(optionally capped lower by ``CONTEXT_MAX_PROMPT_TOKENS``). Conversations that
+fit are passed through untouched. Longer ones are cut down by the configured
+strategy; system messages are always kept:
+
+- ``sliding_window`` keeps the most recent turns that fit.
+- ``keep_ends`` keeps the first turns (which usually set up the task) and as many
+  of the most recent ones as fit.
+- ``summarize`` is ``keep_ends`` with the dropped middle replaced by a summary
+  written by a cheap model. Summaries are cached per conversation and extended
+  incrementally as the conversation grows, so each turn is summarized once.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_EVENTS, CONTEXT_TOKENS_SAVED
+from app.models.chat import Message
+from app.services.tokenizer import message_tokens
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("none", "sliding_window", "keep_ends", "summarize")
+
+# Context window per model family; checked in order, the first pattern contained
+# in the lower-cased model ID wins. MODEL_CONTEXT_WINDOWS settings take precedence.
+KNOWN_CONTEXT_WINDOWS: List[Tuple[str, int]] = [
+    ("claude-v2:1", 200000),
+    ("claude-v2", 100000),
+    ("claude-instant", 100000),
+    ("claude", 200000),
+    ("llama3", 8192),
+    ("llama2", 4096),
+]
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Headroom for the local token count differing from the model's own tokenizer
+TOKENIZER_MARGIN = 0.05
+
+SUMMARY_INSTRUCTIONS = (
+    "Summarize the conversation below for an assistant that will continue it without seeing it. "
+    "Keep facts, decisions, names, numbers and open questions; leave out pleasantries. "
+    "Reply with the summary only."
+)
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+
+Summarizer = Callable[[List[Message]], Awaitable[str]]
+
+
+def context_window(model_id: str) -> int:
+    """
+    Context window of a model in tokens
+    """
+    lowered = model_id.lower()
+    for pattern, window in settings.MODEL_CONTEXT_WINDOWS.items():
+        if pattern.lower() in lowered:
+            return window
+    for pattern, window in KNOWN_CONTEXT_WINDOWS:
+        if pattern in lowered:
+            return window
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def prompt_budget(model_id: str, max_tokens: int, max_prompt_tokens: int = 0) -> int:
+    """
+    Largest prompt, in tokens, that leaves room for ``max_tokens`` of completion
+    """
+    budget = int(context_window(model_id) * (1 - TOKENIZER_MARGIN)) - max_tokens
+    if max_prompt_tokens:
+        budget = min(budget, max_prompt_tokens)
+    return max(budget, 0)
+
+
+def summary_prompt(previous: Optional[str], messages: Sequence[Any]) -> List[Message]:
+    """
+    Messages asking the summary model to fold ``messages`` into ``previous``
+    """
+    parts = []
+    if previous:
+        parts.append(f"{SUMMARY_HEADER}\n{previous}\n\nContinuation:")
+    parts.extend(f"{msg.role}: {msg.content}" for msg in messages)
+    return [
+        Message(role="system", content=SUMMARY_INSTRUCTIONS),
+        Message(role="user", content="\n\n".join(parts)),
+    ]
+
+
+class ContextManager:
+    """Applies the configured context strategy to conversations over budget"""
+
+    def __init__(self, strategy: str, max_prompt_tokens: int = 0, keep_first: int = 1, keep_last: int = 8,
+                 summary_cache_size: int = 1000):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown context strategy {strategy!r}, expected one of {', '.join(STRATEGIES)}")
+        self.strategy = strategy
+        self.max_prompt_tokens = max_prompt_tokens
+        self.keep_first = keep_first
+        self.keep_last = max(keep_last, 1)
+        self.summary_cache_size = summary_cache_size
+        # Digest of (conversation head, summarized turns) -> summary
+        self._summaries: "OrderedDict[bytes, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def fit(self, model_id: str, messages: Sequence[Any], max_tokens: int,
+                  summarize: Optional[Summarizer] = None,
+                  costs: Optional[List[int]] = None) -> Tuple[Sequence[Any], int]:
+        """
+        Fit ``messages`` into the prompt budget of ``model_id``. Returns the
+        messages to send and the number of prompt tokens saved. ``costs`` are the
+        messages' token counts, when the caller already has them.
+        """
+        if self.strategy == "none":
+            return messages, 0
+        if costs is None:
+            costs = [message_tokens(msg) for msg in messages]
+        total = sum(costs)
+        budget = prompt_budget(model_id, max_tokens, self.max_prompt_tokens)
+        if total <= budget:
+            return messages, 0
+
+        if self.strategy == "sliding_window":
+            fitted = [messages[i] for i in self._sliding_window(messages, costs, budget)]
+        elif self.strategy == "keep_ends":
+            fitted = [messages[i] for i in self._keep_ends(messages, costs, budget)]
+        else:
+            fitted = await self._summarize(messages, costs, budget, summarize)
+
+        saved = max(total - sum(message_tokens(msg) for msg in fitted), 0)
+        CONTEXT_TOKENS_SAVED.labels(model_id, self.strategy).inc(saved)
+        logger.debug(f"Context for {model_id}: {len(messages)} -> {len(fitted)} messages, {saved} tokens saved")
+        return fitted, saved
+
+    def _sliding_window(self, messages: Sequence[Any], costs: List[int], budget: int,
+                        keep: Sequence[int] = ()) -> List[int]:
+        """
+        Indices of the messages to keep: system messages, those in ``keep`` and
+        the most recent turns that fit. The last message is always kept.
+        """
+        kept = set(keep) | {i for i, msg in enumerate(messages) if msg.role == "system"}
+        used = sum(costs[i] for i in kept)
+        for i in range(len(messages) - 1, -1, -1):
+            if i in kept:
+                continue
+            if used + costs[i] > budget and i != len(messages) - 1:
+                break
+            kept.add(i)
+            used += costs[i]
+        # The Messages API needs the conversation to open with a user turn
+        turns = sorted(i for i in kept if messages[i].role != "system")
+        while len(turns) > 1 and messages[turns[0]].role == "assistant" and turns[0] not in keep:
+            kept.discard(turns.pop(0))
+        return sorted(kept)
+
+    def _head(self, messages: Sequence[Any]) -> List[int]:
+        """Indices of the first ``keep_first`` turns, never including the last message"""
+        turns = [i for i, msg in enumerate(messages[:-1]) if msg.role != "system"]
+        return turns[:self.keep_first]
+
+    def _keep_ends(self, messages: Sequence[Any], costs: List[int], budget: int) -> List[int]:
+        head = self._head(messages)
+        system = sum(cost for msg, cost in zip(messages, costs) if msg.role == "system")
+        if system + sum(costs[i] for i in head) + costs[-1] > budget:
+            # The opening turns do not fit next to the latest one; keep only the recent end
+            return self._sliding_window(messages, costs, budget)
+        kept = self._sliding_window(messages, costs, budget, keep=head)
+        tail = [i for i in kept if messages[i].role != "system" and i not in head]
+        tail = tail[max(len(tail) - self.keep_last, 0):]
+        while not head and len(tail) > 1 and messages[tail[0]].role == "assistant":
+            tail.pop(0)
+        return sorted({i for i in kept if messages[i].role == "system"} | set(head) | set(tail))
+
+    async def _summarize(self, messages: Sequence[Any], costs: List[int], budget: int,
+                         summarize: Optional[Summarizer]) -> List[Any]:
+        kept = self._keep_ends(messages, costs, budget)
+        trimmed = [messages[i] for i in kept]
+        head = set(self._head(messages))
+        kept_set = set(kept)
+        middle = [i for i, msg in enumerate(messages) if msg.role != "system" and i not in head
+                  and i not in kept_set]
+        if summarize is None or not middle:
+            return trimmed
+
+        # Move the cut in steps, so the summarized part (and its cache key) stays
+        # the same for several turns instead of changing on every request
+        step = max(self.keep_last // 2, 1)
+        start = middle[0]
+        cut = min(start + -(-(middle[-1] + 1 - start) // step) * step, len(messages) - 1)
+        while not head and cut < len(messages) - 1 and messages[cut].role == "assistant":
+            cut += 1
+        summarized = [messages[i] for i in range(start, cut) if messages[i].role != "system"]
+
+        try:
+            summary = await self._summary(messages, sorted(head), summarized, summarize)
+        except Exception as e:
+            logger.warning(f"Conversation summary failed, dropping older turns instead: {str(e)}")
+            return trimmed
+
+        fitted = self._with_summary(
+            [msg for i, msg in enumerate(messages) if i < start or i >= cut or msg.role == "system"], summary)
+        fitted_costs = [message_tokens(msg) for msg in fitted]
+        if sum(fitted_costs) > budget:
+            return [fitted[i] for i in self._sliding_window(fitted, fitted_costs, budget)]
+        return fitted
+
+    async def _summary(self, messages: Sequence[Any], head: List[int], summarized: List[Any],
+                       summarize: Summarizer) -> str:
+        """
+        Summary of ``summarized``, extending the longest cached summary of the
+        same conversation rather than starting over
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for msg in messages:
+            if msg.role == "system":
+                h.update(f"system:{len(msg.content)}:{msg.content}".encode("utf-8"))
+        for i in head:
+            h.update(f"{messages[i].role}:{len(messages[i].content)}:{messages[i].content}".encode("utf-8"))
+        digests = []
+        for msg in summarized:
+            h.update(f"{msg.role}:{len(msg.content)}:{msg.content}".encode("utf-8"))
+            digests.append(h.copy().digest())
+
+        previous, done = None, 0
+        with self._lock:
+            for n in range(len(summarized), 0, -1):
+                cached = self._summaries.get(digests[n - 1])
+                if cached is not None:
+                    self._summaries.move_to_end(digests[n - 1])
+                    previous, done = cached, n
+                    break
+        CACHE_EVENTS.labels("context_summary", "hit" if done == len(summarized) else "miss").inc()
+        if done == len(summarized):
+            return previous
+
+        summary = (await summarize(summary_prompt(previous, summarized[done:]))).strip()
+        with self._lock:
+            self._summaries[digests[-1]] = summary
+            while len(self._summaries) > self.summary_cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def _with_summary(self, messages: List[Any], summary: str) -> List[Any]:
+        """Fold the summary into the first system message, adding one if needed"""
+        block = f"{SUMMARY_HEADER}\n{summary}"
+        for i, msg in enumerate(messages):
+            if msg.role == "system":
+                return messages[:i] + [Message(role="system", content=f"{msg.content}\n\n{block}")] + messages[i + 1:]
+        return [Message(role="system", content=block)] + messages
+
+
+_manager: Optional[ContextManager] = None
+
+
+def get_context_manager() -> ContextManager:
+    """
+    Return the worker-wide context manager
+    """
+    global _manager
+    if _manager is None:
+        _manager = ContextManager(
+            strategy=settings.CONTEXT_STRATEGY,
+            max_prompt_tokens=settings.CONTEXT_MAX_PROMPT_TOKENS,
+            keep_first=settings.CONTEXT_KEEP_FIRST_TURNS,
+            keep_last=settings.CONTEXT_KEEP_LAST_TURNS,
+            summary_cache_size=settings.CONTEXT_SUMMARY_CACHE_SIZE,
+        )
+    return _manager
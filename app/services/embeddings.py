@@ -0,0 +1,276 @@
+"""
+Embeddings: Bedrock embedding model adapters, a micro-batcher and a vector cache.
+
+With ``EMBEDDING_BATCH_WINDOW_MS`` set, concurrent requests for the same model
+and options are gathered for up to that long into one upstream call, for models
+that take several texts per call (Cohere Embed, up to 96). Models that embed one text per
+call (Titan) are called right away. Identical texts already waiting or in flight
+share one upstream embedding.
+
+Vectors are kept as little-endian float32 bytes: in the content-hash LRU (4 bytes
+per dimension instead of a Python float object each) and for the response, where
+``encoding_format=base64`` sends those bytes as they are.
+"""
+import asyncio
+import hashlib
+import logging
+import sys
+from array import array
+from typing import Any, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_EVENTS, EMBEDDING_BATCH_SIZE
+from app.services.response_cache import MemoryLRU
+from app.services.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# (float32 vector bytes, input tokens billed for it)
+Embedding = Tuple[bytes, int]
+
+
+class UnsupportedEmbeddingModel(Exception):
+    """The model is not a known Bedrock embedding model"""
+
+    status_code = 400
+
+
+def to_float32(values: Sequence[float]) -> bytes:
+    """Little-endian float32 bytes of a vector"""
+    vector = array("f", values)
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector.tobytes()
+
+
+def from_float32(data: bytes) -> array:
+    """Inverse of ``to_float32``"""
+    vector = array("f")
+    vector.frombytes(data)
+    if sys.byteorder == "big":
+        vector.byteswap()
+    return vector
+
+
+class EmbeddingAdapter:
+    """Request rendering and response parsing for one embedding model family"""
+
+    name = "base"
+    max_batch = 1
+
+    def create_body(self, texts: List[str], dimensions: Optional[int], input_type: Optional[str]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def parse_embeddings(self, response_body: Mapping[str, Any]) -> List[List[float]]:
+        raise NotImplementedError
+
+    def token_counts(self, response_body: Mapping[str, Any], headers: Mapping[str, str],
+                     texts: List[str]) -> List[int]:
+        """
+        Input tokens per text. Bedrock reports one count per call; it is split
+        across the texts in proportion to their local token counts.
+        """
+        local = [max(count_tokens(text), 1) for text in texts]
+        reported = headers.get("x-amzn-bedrock-input-token-count")
+        if reported is None:
+            return local
+        total, scale = int(reported), int(reported) / sum(local)
+        counts = [int(count * scale) for count in local]
+        counts[-1] += total - sum(counts)
+        return counts
+
+
+class TitanEmbeddingAdapter(EmbeddingAdapter):
+    """Amazon Titan Text Embeddings: one text per call"""
+
+    name = "titan"
+
+    def create_body(self, texts: List[str], dimensions: Optional[int], input_type: Optional[str]) -> Dict[str, Any]:
+        body: Dict[str, Any] = {"inputText": texts[0]}
+        if dimensions:
+            body["dimensions"] = dimensions
+        return body
+
+    def parse_embeddings(self, response_body: Mapping[str, Any]) -> List[List[float]]:
+        return [response_body["embedding"]]
+
+    def token_counts(self, response_body: Mapping[str, Any], headers: Mapping[str, str],
+                     texts: List[str]) -> List[int]:
+        if "inputTextTokenCount" in response_body:
+            return [response_body["inputTextTokenCount"]]
+        return super().token_counts(response_body, headers, texts)
+
+
+class CohereEmbeddingAdapter(EmbeddingAdapter):
+    """Cohere Embed: up to 96 texts per call"""
+
+    name = "cohere"
+    max_batch = 96
+
+    def create_body(self, texts: List[str], dimensions: Optional[int], input_type: Optional[str]) -> Dict[str, Any]:
+        return {"texts": texts, "input_type": input_type or "search_document", "truncate": "END"}
+
+    def parse_embeddings(self, response_body: Mapping[str, Any]) -> List[List[float]]:
+        embeddings = response_body["embeddings"]
+        # Requests naming embedding_types get them keyed by type
+        return embeddings["float"] if isinstance(embeddings, dict) else embeddings
+
+
+_registry: List[Tuple[str, EmbeddingAdapter]] = [
+    ("titan-embed-text", TitanEmbeddingAdapter()),
+    ("cohere.embed", CohereEmbeddingAdapter()),
+]
+
+
+def get_embedding_adapter(model_id: str) -> EmbeddingAdapter:
+    """
+    Adapter for an embedding model ID
+    """
+    lowered = model_id.lower()
+    for pattern, adapter in _registry:
+        if pattern in lowered:
+            return adapter
+    raise UnsupportedEmbeddingModel(f"{model_id} is not a supported embedding model")
+
+
+def embedding_cache_key(model_id: str, dimensions: Optional[int], input_type: Optional[str], text: str) -> str:
+    """
+    Content hash identifying the embedding of ``text`` with the given options
+    """
+    h = hashlib.blake2b(f"{model_id}\x00{dimensions}\x00{input_type}\x00".encode("utf-8"), digest_size=16)
+    h.update(text.encode("utf-8"))
+    return h.hexdigest()
+
+
+class _PendingBatch:
+    """Texts waiting to be sent in one upstream call"""
+
+    __slots__ = ("run", "texts", "futures", "timer")
+
+    def __init__(self, run: Callable[[List[str]], Awaitable[List[Embedding]]]):
+        self.run = run
+        self.texts: List[str] = []
+        self.futures: List[asyncio.Future] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+class EmbeddingBatcher:
+    """
+    Gathers texts from concurrent requests into batched upstream calls.
+
+    A batch is sent when it reaches the model's batch size or ``window`` seconds
+    after its first text arrived, whichever comes first; with no window, each
+    request's texts are sent on their own. The upstream call runs with the options
+    and Bedrock service of the request that opened the batch.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max(max_batch, 1)
+        self.batches = 0
+        self.texts = 0
+        self._pending: Dict[Tuple[str, Optional[int], Optional[str]], _PendingBatch] = {}
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._tasks = set()
+
+    async def embed(self, model_id: str, dimensions: Optional[int], input_type: Optional[str],
+                    texts: Dict[str, str], run: Callable[[List[str]], Awaitable[List[Embedding]]],
+                    ) -> Dict[str, Embedding]:
+        """
+        Embed ``texts`` (cache key -> text). Texts already being embedded for
+        another request are shared and count no tokens for this one.
+        """
+        limit = min(get_embedding_adapter(model_id).max_batch, self.max_batch)
+        group = (model_id, dimensions, input_type)
+        waits: List[Tuple[str, asyncio.Future, bool]] = []
+        for key, text in texts.items():
+            future = self._in_flight.get(key)
+            if future is not None:
+                CACHE_EVENTS.labels("embedding", "shared").inc()
+                waits.append((key, future, False))
+                continue
+            future = asyncio.get_running_loop().create_future()
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _, key=key, future=future: self._forget(key, future))
+            self._add(group, text, future, run, limit)
+            waits.append((key, future, True))
+        if self.window <= 0:
+            self._flush(group)
+
+        results = {}
+        for key, future, owner in waits:
+            # Shielded: a request going away must not cancel a vector others wait for
+            vector, tokens = await asyncio.shield(future)
+            results[key] = (vector, tokens if owner else 0)
+        return results
+
+    def _add(self, group, text: str, future: asyncio.Future,
+             run: Callable[[List[str]], Awaitable[List[Embedding]]], limit: int):
+        batch = self._pending.get(group)
+        if batch is None:
+            batch = self._pending[group] = _PendingBatch(run)
+            if limit > 1 and self.window > 0:
+                batch.timer = asyncio.get_running_loop().call_later(self.window, self._flush, group)
+        batch.texts.append(text)
+        batch.futures.append(future)
+        if len(batch.texts) >= limit:
+            self._flush(group)
+
+    def _flush(self, group):
+        batch = self._pending.pop(group, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        self.batches += 1
+        self.texts += len(batch.texts)
+        EMBEDDING_BATCH_SIZE.labels(group[0]).observe(len(batch.texts))
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: _PendingBatch):
+        try:
+            embeddings = await batch.run(batch.texts)
+        except asyncio.CancelledError:
+            for future in batch.futures:
+                future.cancel()
+            raise
+        except Exception as e:
+            for future in batch.futures:
+                if not future.done():
+                    future.set_exception(e)
+                    # Retrieved here so waiters that went away leave no "never retrieved" warnings
+                    future.exception()
+            return
+        for future, embedding in zip(batch.futures, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    def _forget(self, key: str, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+
+_cache: Optional[MemoryLRU] = None
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_cache() -> MemoryLRU:
+    """
+    Return the worker-wide embedding cache (cache key -> float32 vector bytes)
+    """
+    global _cache
+    if _cache is None:
+        _cache = MemoryLRU(settings.EMBEDDING_CACHE_MAX_BYTES, settings.EMBEDDING_CACHE_TTL_SECONDS, name="embedding")
+    return _cache
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """
+    Return the worker-wide embedding batcher
+    """
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(settings.EMBEDDING_BATCH_WINDOW_MS / 1000, settings.EMBEDDING_MAX_BATCH_SIZE)
+    return _batcher
@@ -0,0 +1,108 @@
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.metrics import BEDROCK_QUEUE_WAIT, IN_FLIGHT, model_label
+
+logger = logging.getLogger(__name__)
+
+
+class BedrockExecutor:
+    """
+    Bounded thread pool for running blocking boto3 calls off the event loop.
+
+    Each model gets its own concurrency cap so a slow model cannot occupy every
+    worker thread and starve requests for other models. Response streams are read
+    on a separate pool: a reader holds its thread for the whole stream, so long
+    streams would otherwise leave no threads for non-streaming calls.
+    """
+
+    def __init__(self, max_workers: int, default_model_concurrency: int,
+                 model_concurrency: Optional[Dict[str, int]] = None, stream_workers: int = 200):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock")
+        self._stream_pool = ThreadPoolExecutor(max_workers=stream_workers, thread_name_prefix="bedrock-stream")
+        self._default_model_concurrency = default_model_concurrency
+        self._model_concurrency = model_concurrency or {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, model_id: str) -> asyncio.Semaphore:
+        key = model_label(model_id)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            limit = self._model_concurrency.get(key, self._default_model_concurrency)
+            semaphore = self._semaphores[key] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def run(self, model_id: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run ``fn(*args, **kwargs)`` in the pool, waiting for a slot for ``model_id`` first
+        """
+        loop = asyncio.get_running_loop()
+        queued = time.perf_counter()
+        async with self._semaphore(model_id):
+            BEDROCK_QUEUE_WAIT.labels(model_id).observe(time.perf_counter() - queued)
+            in_flight = IN_FLIGHT.labels(model_id)
+            in_flight.inc()
+            try:
+                return await loop.run_in_executor(self._pool, functools.partial(fn, *args, **kwargs))
+            finally:
+                in_flight.dec()
+
+    async def read_stream(self, model_id: str, fn: Callable[..., Any], *args) -> Any:
+        """
+        Run the stream reader ``fn(*args)`` on the stream pool. Streams are already
+        capped per model by admission control; beyond the pool size, new streams wait
+        for a reader thread to free up.
+        """
+        loop = asyncio.get_running_loop()
+        in_flight = IN_FLIGHT.labels(model_id)
+        in_flight.inc()
+        try:
+            return await loop.run_in_executor(self._stream_pool, functools.partial(fn, *args))
+        finally:
+            in_flight.dec()
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._stream_pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_executor: Optional[BedrockExecutor] = None
+
+
+def init_executor() -> BedrockExecutor:
+    """
+    Create the worker-wide executor. Called from the application startup hook.
+    """
+    global _executor
+    if _executor is None:
+        _executor = BedrockExecutor(
+            max_workers=settings.BEDROCK_EXECUTOR_MAX_WORKERS,
+            default_model_concurrency=settings.BEDROCK_MODEL_CONCURRENCY,
+            model_concurrency=settings.BEDROCK_MODEL_CONCURRENCY_LIMITS,
+            stream_workers=settings.BEDROCK_STREAM_MAX_WORKERS,
+        )
+        logger.info(f"Initialized Bedrock executor with {settings.BEDROCK_EXECUTOR_MAX_WORKERS} workers "
+                    f"and {settings.BEDROCK_STREAM_MAX_WORKERS} stream readers")
+    return _executor
+
+
+def get_executor() -> BedrockExecutor:
+    """
+    Return the worker-wide executor, creating it lazily if startup has not run
+    """
+    return _executor if _executor is not None else init_executor()
+
+
+def shutdown_executor():
+    """
+    Stop the executor. Called from the application shutdown hook.
+    """
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
@@ -0,0 +1,245 @@
+"""
+Background Bedrock health monitoring.
+
+A per-worker task probes every configured region / model pair on an interval and
+keeps the outcome in memory: status, consecutive failures, last success and
+failure, and recent probe latencies. ``/health/bedrock`` and the readiness
+endpoint serve that state without calling AWS.
+
+Probes are cheap. In ``validation`` mode (the default) the probe is an
+``InvokeModel`` call with an empty body: Bedrock authenticates the caller and
+checks model access before rejecting the body with a ``ValidationException``,
+so that answer proves the region, credentials and model are usable without
+generating any tokens. ``invoke`` mode runs a one-token completion instead.
+Throttled probes count as reachable.
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import BEDROCK_HEALTHY
+from app.core.serialization import dumps
+from app.models.chat import Message
+from app.services.adapters import get_adapter
+from app.services.bedrock_errors import error_code, is_throttle
+from app.services.routing import get_router
+
+logger = logging.getLogger(__name__)
+
+PROBE_MODES = ("validation", "invoke")
+
+
+def _timestamp(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+
+class TargetHealth:
+    """Probe history of one region / model pair"""
+
+    def __init__(self, region: str, model_id: str, history: int):
+        self.region = region
+        self.model_id = model_id
+        self.status = "unknown"
+        self.consecutive_failures = 0
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.latencies: deque = deque(maxlen=history)
+
+    def record(self, latency: float, error: Optional[str] = None, throttled: bool = False):
+        now = time.time()
+        self.latencies.append(latency)
+        if error is None:
+            self.status = "throttled" if throttled else "healthy"
+            self.consecutive_failures = 0
+            self.last_success = now
+        else:
+            self.status = "unhealthy"
+            self.consecutive_failures += 1
+            self.last_failure = now
+            self.last_error = error
+        BEDROCK_HEALTHY.labels(self.model_id, self.region).set(0 if error else 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        return {
+            "region": self.region,
+            "model": self.model_id,
+            "status": self.status,
+            "consecutive_failures": self.consecutive_failures,
+            "last_success": _timestamp(self.last_success),
+            "last_failure": _timestamp(self.last_failure),
+            "last_error": self.last_error,
+            "latency_ms": {
+                "last": round(self.latencies[-1] * 1000, 1),
+                "p50": round(latencies[len(latencies) // 2] * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            } if latencies else None,
+        }
+
+
+class HealthMonitor:
+    """
+    Probes Bedrock targets in the background and serves their health from memory.
+
+    The replica is ready once the first round of probes has finished, and turns
+    unready while every target has failed at least ``failure_threshold`` probes
+    in a row (as long as one region can serve, routing fails over to it).
+    """
+
+    def __init__(self, targets: List[Tuple[str, str]], client_for: Callable[[str], Any], interval: float,
+                 timeout: float, failure_threshold: int, mode: str = "validation", history: int = 20):
+        if mode not in PROBE_MODES:
+            raise ValueError(f"Unknown health probe mode {mode!r}, expected one of {', '.join(PROBE_MODES)}")
+        self.targets = [TargetHealth(region, model_id, history) for region, model_id in targets]
+        self.client_for = client_for
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.mode = mode
+        self.rounds = 0
+        self._task: Optional[asyncio.Task] = None
+        self._snapshot = b""
+        self._ready = False
+        self._render()
+
+    def _probe_body(self, model_id: str) -> bytes:
+        if self.mode == "validation":
+            return b"{}"
+        body = get_adapter(model_id).create_body(model_id, [Message(role="user", content="ping")], 1, 0.0)
+        return json.dumps(body).encode("utf-8")
+
+    def _call(self, target: TargetHealth, body: bytes) -> Optional[BaseException]:
+        """Blocking probe call; returns the error Bedrock answered with, if any"""
+        try:
+            self.client_for(target.region).invoke_model(
+                modelId=target.model_id, body=body, contentType="application/json", accept="application/json"
+            )
+        except Exception as e:
+            return e
+        return None
+
+    async def probe(self, target: TargetHealth):
+        started = time.perf_counter()
+        try:
+            error = await asyncio.wait_for(
+                asyncio.to_thread(self._call, target, self._probe_body(target.model_id)), self.timeout
+            )
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"No answer within {self.timeout}s")
+        latency = time.perf_counter() - started
+
+        if error is None or (self.mode == "validation" and error_code(error) == "ValidationException"):
+            target.record(latency)
+        elif is_throttle(error):
+            target.record(latency, throttled=True)
+        else:
+            if target.status != "unhealthy":
+                logger.warning(f"Bedrock health probe failed for {target.model_id} in {target.region}: "
+                               f"{error_code(error)}: {str(error)}")
+            target.record(latency, error=f"{error_code(error)}: {str(error)}")
+
+    async def probe_all(self):
+        await asyncio.gather(*(self.probe(target) for target in self.targets))
+        self.rounds += 1
+        self._render()
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"Bedrock health monitor round failed: {str(e)}")
+            # Jitter so replicas started together do not probe in lockstep
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    def _render(self):
+        """Precompute readiness and the /health/bedrock body after each round"""
+        down = bool(self.targets) and all(
+            target.consecutive_failures >= self.failure_threshold for target in self.targets)
+        self._ready = self.rounds > 0 and not down
+        connected = any(target.status in ("healthy", "throttled") for target in self.targets)
+        self._snapshot = dumps({
+            "status": "connected" if connected else ("unknown" if self.rounds == 0 else "disconnected"),
+            "timestamp": datetime.utcnow().isoformat(),
+            "service": "aws-bedrock",
+            "ready": self._ready,
+            "probe_mode": self.mode,
+            "targets": [target.to_dict() for target in self.targets],
+        })
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def snapshot(self) -> bytes:
+        """JSON body for /health/bedrock, as of the last probe round"""
+        return self._snapshot
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+
+_monitor: Optional[HealthMonitor] = None
+_draining = False
+
+
+def start_draining():
+    """
+    Fail readiness from now on, while requests are still served. Called when the
+    worker is told to shut down (``app.server``).
+    """
+    global _draining
+    _draining = True
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def init_health_monitor() -> Optional[HealthMonitor]:
+    """
+    Create and start the worker-wide health monitor. Called from the application
+    startup hook.
+    """
+    global _monitor
+    if _monitor is None and settings.HEALTH_MONITOR_ENABLED:
+        router = get_router()
+        models = settings.HEALTH_PROBE_MODELS or [settings.DEFAULT_MODEL]
+        _monitor = HealthMonitor(
+            [(region, model_id) for region in router.regions for model_id in models],
+            router.client,
+            interval=settings.HEALTH_PROBE_INTERVAL_SECONDS,
+            timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS,
+            failure_threshold=settings.HEALTH_FAILURE_THRESHOLD,
+            mode=settings.HEALTH_PROBE_MODE,
+        )
+        _monitor.start()
+    return _monitor
+
+
+def get_health_monitor() -> Optional[HealthMonitor]:
+    return _monitor
+
+
+async def close_health_monitor():
+    """
+    Stop the background probes. Called from the application shutdown hook.
+    """
+    global _monitor
+    monitor, _monitor = _monitor, None
+    if monitor is not None:
+        await monitor.stop()
@@ -0,0 +1,406 @@
+"""
+Near-duplicate response cache.
+
+Catches repeated prompts that the exact-match cache misses because of trivial
+differences: whitespace, casing, punctuation, or a timestamp or request ID
+pasted into the system prompt. The rendered prompt is normalized (NFKC,
+lower-cased, dates, times, epoch timestamps and IDs replaced by placeholders,
+punctuation dropped, whitespace collapsed), cut into shingles (pairs of
+adjacent words) and summarized as a MinHash signature. The fraction of slots
+two signatures share estimates the Jaccard similarity of their shingle sets.
+
+The last message is compared on its own as well, exactly when it is short, and
+a cached request is only as similar as the lower of the two scores: otherwise a
+long shared system prompt would make different short questions look alike.
+Signatures are indexed in bands (locality-sensitive hashing) over both, so a
+lookup only scores cached requests sharing a band with it. Signatures only
+estimate similarity, so the best match is confirmed on the exact shingle sets,
+which every entry keeps, before it is served.
+
+Signatures use one-permutation hashing: each distinct shingle is hashed once
+and lands in one of NUM_SLOTS slots, which keep their minimum, and empty slots
+borrow from the next non-empty one. That is one hash per shingle rather than
+one per shingle and slot, which keeps long prompts cheap without numpy.
+
+Every request parameter other than the prompt (max tokens, temperature, stop
+sequences) has to match exactly. Only models matching a NEAR_CACHE_MODELS
+pattern use the cache, each with its own similarity threshold, which
+NEAR_CACHE_API_KEYS can override or turn off per API key. Prompts longer than
+NEAR_CACHE_MAX_PROMPT_CHARS are not cached. The index lives in each worker's
+memory, bounded by NEAR_CACHE_MAX_BYTES.
+
+Similarity counts shared word pairs, not meaning: questions differing in one
+word of ten score about 0.8, as do trivial rewordings. SAFE_THRESHOLD is the
+lowest threshold that kept them apart in benchmarks/bench_near_cache.py.
+"""
+import json
+import logging
+import operator
+import re
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_EVENTS, NEAR_CACHE_SIMILARITY
+from app.services.response_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+NUM_SLOTS = 128
+BANDS = 32
+# Requests sharing a band, every BANDS-th slot of both signatures, are scored. Densified
+# slots copy their neighbours, so a band of adjacent slots could hang on a single shingle.
+ROWS = NUM_SLOTS // BANDS
+# Last messages with up to this many shingles are compared exactly for every candidate
+EXACT_MAX_SHINGLES = 256
+# Recommended similarity threshold; lower ones serve answers to different questions
+SAFE_THRESHOLD = 0.9
+
+_SLOT_BITS = NUM_SLOTS.bit_length() - 1
+_HASH_MASK = (1 << 64) - 1
+_EMPTY = 1 << 64
+# Slots filled from a neighbour differ by how far away it was
+_ROTATION = 1 << (64 - _SLOT_BITS)
+# Signatures, band keys and bookkeeping of one entry, of one set member and of one stored hash, roughly
+_ENTRY_OVERHEAD = 6144
+_SHINGLE_OVERHEAD = 64
+_HASH_SIZE = 8
+
+# Parts of the rendered request body that make up the prompt
+PROMPT_FIELDS = ("prompt", "system", "messages")
+
+_MONTHS = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+# Applied in order to the lower-cased prompt; each needs a digit to match
+_MASKS: List[Tuple["re.Pattern[str]", str]] = [
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b"), " _id_ "),
+    (re.compile(r"\b\d{4}-\d{2}-\d{2}(?:[t ]\d{1,2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:z|[+-]\d{2}:?\d{2})?)?\b"),
+     " _date_ "),
+    (re.compile(r"\b\d{1,2}[/.]\d{1,2}[/.]\d{2,4}\b"), " _date_ "),
+    (re.compile(rf"\b(?:\d{{1,2}}(?:st|nd|rd|th)? {_MONTHS},? \d{{4}}"
+                rf"|{_MONTHS} \d{{1,2}}(?:st|nd|rd|th)?,? \d{{4}})\b"), " _date_ "),
+    (re.compile(r"\b\d{1,2}:\d{2}(?::\d{2}(?:[.,]\d+)?)?(?:\s*[ap]\.?m\b\.?)?(?:\s*(?:utc|gmt|z)\b)?"), " _time_ "),
+    (re.compile(r"\b1\d{9}(?:\d{3})?\b"), " _ts_ "),  # Unix time in seconds or milliseconds
+    (re.compile(r"\b(?=[0-9a-f]*\d)[0-9a-f]{16,}\b"), " _id_ "),
+]
+_DIGIT = re.compile(r"\d")
+_PUNCTUATION = re.compile(r"[^\w\s]+")
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Reduce a prompt to what decides its completion, as far as cheap rules can tell
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    if _DIGIT.search(text):
+        for pattern, placeholder in _MASKS:
+            text = pattern.sub(placeholder, text)
+    return " ".join(_PUNCTUATION.sub(" ", text).split())
+
+
+def _collect_text(value: Any, parts: List[str]):
+    if isinstance(value, str):
+        parts.append(value)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_text(item, parts)
+    elif isinstance(value, dict):
+        # Messages API turns and content blocks; cache checkpoints carry no text
+        if isinstance(value.get("role"), str):
+            parts.append(f"{value['role']}:")
+        for key in ("content", "text"):
+            if key in value:
+                _collect_text(value[key], parts)
+
+
+def prompt_parts(request_body: Dict[str, Any]) -> List[str]:
+    """
+    The text of a rendered request body's prompt, whatever the model's request format
+    """
+    parts: List[str] = []
+    for field in PROMPT_FIELDS:
+        if field in request_body:
+            _collect_text(request_body[field], parts)
+    return parts
+
+
+def shingles(text: str) -> FrozenSet[int]:
+    """
+    Hashes of the pairs of adjacent words in normalized text, the first word
+    paired with the start of the text.
+
+    Uses Python's string hash, which is randomized per interpreter: shingles and
+    signatures are only comparable within the process that computed them.
+    """
+    words = text.split()
+    return frozenset(map(hash, zip([""] + words, words)))
+
+
+def signature(hashes: FrozenSet[int]) -> Optional[array]:
+    """
+    One-permutation MinHash signature of a shingle set, or None for an empty one
+    """
+    if not hashes:
+        return None
+    slots = [_EMPTY] * NUM_SLOTS
+    for h in hashes:
+        h &= _HASH_MASK
+        slot = h & (NUM_SLOTS - 1)
+        value = h >> _SLOT_BITS
+        if value < slots[slot]:
+            slots[slot] = value
+    # Rotation densification: an empty slot takes the next non-empty slot's value.
+    # Walking backwards twice round, every empty slot has seen that slot.
+    if _EMPTY in slots:
+        dense = list(slots)
+        donor, distance = _EMPTY, 0
+        for position in range(2 * NUM_SLOTS - 1, -1, -1):
+            slot = position & (NUM_SLOTS - 1)
+            if slots[slot] != _EMPTY:
+                donor, distance = slots[slot], 0
+            else:
+                distance += 1
+                if donor != _EMPTY:
+                    dense[slot] = donor + distance * _ROTATION
+        slots = dense
+    return array("Q", slots)
+
+
+def similarity(a: array, b: array) -> float:
+    """
+    Estimated Jaccard similarity of the shingle sets behind two signatures
+    """
+    return sum(map(operator.eq, a, b)) / NUM_SLOTS
+
+
+def jaccard(a: array, b: array) -> float:
+    """
+    Exact Jaccard similarity of two shingle sets stored as arrays of distinct hashes
+    """
+    if not a or not b:
+        return float(not a and not b)
+    shared = len(set(a).intersection(b))
+    return shared / (len(a) + len(b) - shared)
+
+
+class NearProbe:
+    """A request's parameter key, signatures and band keys, computed once for lookup and store"""
+
+    __slots__ = ("model_id", "params_key", "signature", "prompt_shingles", "last_message", "last_shingles",
+                 "band_keys")
+
+    def __init__(self, model_id: str, params_key: str, prompt: FrozenSet[int], last_message: FrozenSet[int]):
+        self.model_id = model_id
+        self.params_key = params_key
+        self.signature = signature(prompt)
+        self.prompt_shingles = array("q", prompt)
+        self.last_message = signature(last_message)
+        self.last_shingles = last_message if len(last_message) <= EXACT_MAX_SHINGLES else None
+        last = self.last_message or ()
+        self.band_keys = tuple(
+            hash((params_key, band, tuple(self.signature[band::BANDS]), tuple(last[band::BANDS])))
+            for band in range(BANDS)
+        )
+
+    def _last_score(self, cached: "NearProbe") -> float:
+        if self.last_message is None or cached.last_message is None:
+            return float(self.last_message is cached.last_message)
+        if self.last_shingles is not None and cached.last_shingles is not None:
+            return len(self.last_shingles & cached.last_shingles) / len(self.last_shingles | cached.last_shingles)
+        return similarity(self.last_message, cached.last_message)
+
+    def score(self, cached: "NearProbe", floor: float = 0.0) -> float:
+        """
+        Similarity to a cached request: the lower of their prompts' and last
+        messages'. Scores at or below ``floor`` may come back as 0.
+        """
+        last = self._last_score(cached)
+        if last <= floor:
+            return 0.0
+        return min(similarity(self.signature, cached.signature), last)
+
+    def verify(self, cached: "NearProbe") -> float:
+        """
+        ``score`` with the prompts compared exactly rather than estimated
+        """
+        return min(jaccard(self.prompt_shingles, cached.prompt_shingles), self._last_score(cached))
+
+    def cost(self) -> int:
+        return (_ENTRY_OVERHEAD + _SHINGLE_OVERHEAD * len(self.last_shingles or ())
+                + _HASH_SIZE * len(self.prompt_shingles))
+
+
+class NearDuplicateIndex:
+    """
+    In-process LSH index of request signatures and their completions, bounded by
+    total size with per-entry TTL and least-recently-used eviction
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.evictions = 0
+        self._next_id = 0
+        # entry ID -> (expires at, probe, completion JSON)
+        self._entries: "OrderedDict[int, Tuple[float, NearProbe, bytes]]" = OrderedDict()
+        self._buckets: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def nearest(self, probe: NearProbe) -> Tuple[Optional[NearProbe], Optional[bytes], float]:
+        """
+        The most similar cached request with the same parameters, its completion
+        and estimated similarity; (None, None, 0.0) when no cached request shares a band
+        """
+        candidates = set()
+        for key in probe.band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        best_id, best = None, 0.0
+        now = time.time()
+        for entry_id in candidates:
+            expires_at, cached, _ = self._entries[entry_id]
+            if expires_at < now:
+                self._remove(entry_id)
+                continue
+            # Band keys can collide across parameter sets
+            if cached.params_key != probe.params_key:
+                continue
+            score = probe.score(cached, best)
+            if score > best:
+                best_id, best = entry_id, score
+        if best_id is None:
+            return None, None, 0.0
+        self._entries.move_to_end(best_id)
+        _, cached, value = self._entries[best_id]
+        return cached, value, best
+
+    def add(self, probe: NearProbe, value: bytes):
+        cost = len(value) + probe.cost()
+        if cost > self.max_bytes:
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (time.time() + self.ttl, probe, value)
+        for key in probe.band_keys:
+            self._buckets.setdefault(key, []).append(entry_id)
+        self.size += cost
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, entry_id: int):
+        _, probe, value = self._entries.pop(entry_id)
+        self.size -= len(value) + probe.cost()
+        for key in probe.band_keys:
+            bucket = self._buckets[key]
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._buckets[key]
+
+
+class NearDuplicateCache:
+    """
+    Completion cache keyed by prompt similarity rather than identity
+    """
+
+    def __init__(self, index: NearDuplicateIndex):
+        self.index = index
+        self.hits = 0
+        self.misses = 0
+
+    def probe(self, model_id: str, request_body: Dict[str, Any], last_message: str) -> Optional[NearProbe]:
+        """
+        Normalize and sign the request's prompt and last message; None if the
+        prompt has no text to compare or is longer than NEAR_CACHE_MAX_PROMPT_CHARS.
+        Takes a few milliseconds for long prompts, so callers on the event loop run
+        it in a thread.
+        """
+        parts = prompt_parts(request_body)
+        if sum(map(len, parts)) > settings.NEAR_CACHE_MAX_PROMPT_CHARS:
+            return None
+        last = normalize_prompt(last_message)
+        # Messages API bodies carry the last message as is; normalize it once
+        prompt = shingles(" ".join(last if part == last_message else normalize_prompt(part) for part in parts))
+        if not prompt:
+            return None
+        params = {key: value for key, value in request_body.items() if key not in PROMPT_FIELDS}
+        return NearProbe(model_id, make_cache_key(model_id, params), prompt, shingles(last))
+
+    def get(self, probe: NearProbe, threshold: float) -> Tuple[Optional[Dict[str, Any]], float]:
+        """
+        The cached response for a request at least ``threshold`` similar to the
+        probe's, with its similarity
+        """
+        cached, value, score = self.index.nearest(probe)
+        if cached is not None and score >= threshold:
+            score = probe.verify(cached)
+        if cached is not None:
+            NEAR_CACHE_SIMILARITY.labels(probe.model_id).observe(score)
+        if cached is None or score < threshold:
+            self.misses += 1
+            CACHE_EVENTS.labels("near_duplicate", "miss").inc()
+            return None, score
+        self.hits += 1
+        CACHE_EVENTS.labels("near_duplicate", "hit").inc()
+        return json.loads(value), score
+
+    def set(self, probe: NearProbe, response: Dict[str, Any]):
+        self.index.add(probe, json.dumps(response, separators=(",", ":")).encode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.index.evictions,
+            "entries": len(self.index),
+            "bytes": self.index.size,
+        }
+
+
+_cache: Optional[NearDuplicateCache] = None
+
+
+def near_cache_threshold(model_id: str, api_key: Optional[str], temperature: float) -> Optional[float]:
+    """
+    Similarity threshold for serving this request from the near-duplicate cache,
+    or None where the policy does not allow it
+    """
+    if not settings.NEAR_CACHE_ENABLED or temperature > settings.NEAR_CACHE_MAX_TEMPERATURE:
+        return None
+    lowered = model_id.lower()
+    threshold = next(
+        (value for pattern, value in settings.NEAR_CACHE_MODELS.items() if pattern.lower() in lowered), None
+    )
+    if threshold is None:
+        return None
+    if api_key is not None and api_key in settings.NEAR_CACHE_API_KEYS:
+        threshold = settings.NEAR_CACHE_API_KEYS[api_key]
+    return threshold if threshold > 0 else None
+
+
+def get_near_cache() -> NearDuplicateCache:
+    """
+    Return the worker-wide near-duplicate cache, creating it on first use
+    """
+    global _cache
+    if _cache is None:
+        _cache = NearDuplicateCache(NearDuplicateIndex(settings.NEAR_CACHE_MAX_BYTES, settings.NEAR_CACHE_TTL_SECONDS))
+        loose = [pattern for pattern, threshold in settings.NEAR_CACHE_MODELS.items() if threshold < SAFE_THRESHOLD]
+        if loose:
+            logger.warning(f"Near-duplicate cache thresholds below {SAFE_THRESHOLD} for {loose} can serve "
+                           f"answers to different questions")
+    return _cache
+
+
+def close_near_cache():
+    """
+    Drop the cache. Called from the application shutdown hook.
+    """
+    global _cache
+    cache, _cache = _cache, None
+    if cache is not None:
+        logger.info(f"Near-duplicate cache stats: {cache.stats()}")
@@ -0,0 +1,104 @@
+"""
+Placement of Bedrock prompt-cache checkpoints for Messages API models.
+
+A checkpoint (``cache_control``) caches everything up to and including the block
+it is attached to. Candidates are the system prompt and long messages ("documents")
+before the final turn. A candidate gets a checkpoint once the prefix it closes is
+long enough to be cached and has been seen often enough recently, so one-off
+prompts do not pay the cache-write premium.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.tokenizer import count_tokens
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
+class PromptCachePlanner:
+    """Tracks how often prompt prefixes recur and decides which ones to cache"""
+
+    def __init__(self, min_tokens: int, min_reuse: int, window: float, max_checkpoints: int,
+                 max_tracked: int = 10000):
+        self.min_tokens = min_tokens
+        self.min_reuse = min_reuse
+        self.window = window
+        self.max_checkpoints = max_checkpoints
+        self.max_tracked = max_tracked
+        # prefix digest -> (sightings within the window, last seen)
+        self._seen: "OrderedDict[bytes, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sighting(self, digest: bytes, now: float) -> int:
+        """Record one sighting of a prefix and return how often it was seen recently"""
+        with self._lock:
+            count, last_seen = self._seen.pop(digest, (0, now))
+            count = count + 1 if now - last_seen <= self.window else 1
+            self._seen[digest] = (count, now)
+            while len(self._seen) > self.max_tracked:
+                self._seen.popitem(last=False)
+        return count
+
+    def plan(self, model_id: str, system: Optional[str], turns: Sequence[dict]) -> Tuple[bool, List[int]]:
+        """
+        Decide where checkpoints go: whether to cache the system prompt, and the
+        indices of turns to attach a checkpoint to.
+        """
+        now = time.monotonic()
+        digest = hashlib.blake2b(model_id.encode("utf-8"), digest_size=16).digest()
+        prefix_tokens = 0
+        chosen: List[Optional[int]] = []  # None stands for the system prompt
+
+        def close_prefix(role: str, text: str) -> Tuple[bytes, int]:
+            h = hashlib.blake2b(digest, digest_size=16)
+            h.update(f"{role}:{len(text)}:".encode("ascii"))
+            h.update(text.encode("utf-8"))
+            return h.digest(), count_tokens(text)
+
+        if system:
+            digest, tokens = close_prefix("system", system)
+            prefix_tokens += tokens
+            if prefix_tokens >= self.min_tokens and self._sighting(digest, now) >= self.min_reuse:
+                chosen.append(None)
+
+        # The final turn is what changes between requests; never checkpoint it
+        for index, turn in enumerate(turns[:-1]):
+            digest, tokens = close_prefix(turn["role"], turn["content"])
+            prefix_tokens += tokens
+            if tokens >= self.min_tokens and self._sighting(digest, now) >= self.min_reuse:
+                chosen.append(index)
+
+        if len(chosen) > self.max_checkpoints:
+            # Keep the first (usually the shared system prompt) and the longest prefixes
+            chosen = chosen[:1] + chosen[len(chosen) - self.max_checkpoints + 1:]
+        return (bool(chosen) and chosen[0] is None), [index for index in chosen if index is not None]
+
+
+def text_block(text: str, checkpoint: bool = False) -> dict:
+    """Messages API text content block, optionally ending with a cache checkpoint"""
+    block = {"type": "text", "text": text}
+    if checkpoint:
+        block["cache_control"] = CACHE_CONTROL
+    return block
+
+
+_planner: Optional[PromptCachePlanner] = None
+
+
+def get_prompt_cache_planner() -> PromptCachePlanner:
+    """
+    Return the worker-wide prompt cache planner
+    """
+    global _planner
+    if _planner is None:
+        _planner = PromptCachePlanner(
+            min_tokens=settings.PROMPT_CACHE_MIN_TOKENS,
+            min_reuse=settings.PROMPT_CACHE_MIN_REUSE,
+            window=settings.PROMPT_CACHE_REUSE_WINDOW_SECONDS,
+            max_checkpoints=settings.PROMPT_CACHE_MAX_CHECKPOINTS,
+        )
+    return _planner
@@ -0,0 +1,264 @@
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.security import api_key_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Limits are expressed per minute
+PERIOD_SECONDS = 60.0
+
+# (key, limit, cost) of one GCRA bucket
+Bucket = Tuple[str, int, int]
+
+
+class RateLimitResult:
+    """Outcome of a rate limit check, convertible to X-RateLimit-* headers"""
+
+    __slots__ = ("allowed", "limit", "remaining", "reset_after", "retry_after")
+
+    def __init__(self, allowed: bool, limit: int, remaining: int, reset_after: float, retry_after: float = 0.0):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_after = reset_after
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _gcra(tat: float, now: float, limit: int, cost: int) -> tuple:
+    """
+    Generic cell rate algorithm.
+
+    ``tat`` is the theoretical arrival time of the next request. A request of ``cost``
+    units is allowed when the new TAT stays within one period of now, which permits a
+    burst of up to ``limit`` units. Returns (allowed, new_tat, remaining, retry_after).
+    """
+    interval = PERIOD_SECONDS / limit
+    new_tat = max(tat, now) + cost * interval
+    allow_at = new_tat - PERIOD_SECONDS
+    if allow_at > now:
+        return False, tat, 0, allow_at - now
+    remaining = int((PERIOD_SECONDS - (new_tat - now)) / interval)
+    return True, new_tat, remaining, 0.0
+
+
+class InMemoryRateLimitBackend:
+    """
+    Process-local GCRA state: one float per key, O(1) per check.
+    Limits only hold per worker; use a shared backend for cluster-wide limits.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self._tats: Dict[str, float] = {}
+        self._max_keys = max_keys
+
+    async def acquire(self, buckets: Sequence[Bucket]) -> List[RateLimitResult]:
+        """
+        Take ``cost`` units from every (key, limit, cost) bucket, or from none of them
+        if any bucket rejects the request
+        """
+        now = time.monotonic()
+        checks = [_gcra(self._tats.get(key, now), now, limit, cost) for key, limit, cost in buckets]
+        admitted = all(allowed for allowed, _, _, _ in checks)
+        results = []
+        for (key, limit, _), (allowed, new_tat, remaining, retry_after) in zip(buckets, checks):
+            if admitted:
+                self._store(key, new_tat, now)
+            results.append(RateLimitResult(allowed, limit, remaining, max(new_tat, now) - now, retry_after))
+        return results
+
+    async def charge(self, buckets: Sequence[Bucket]):
+        """Consume ``cost`` units from every bucket unconditionally, going into debt if needed"""
+        now = time.monotonic()
+        for key, limit, cost in buckets:
+            tat = max(self._tats.get(key, now), now)
+            self._store(key, tat + cost * PERIOD_SECONDS / limit, now)
+
+    def _store(self, key: str, tat: float, now: float):
+        self._tats[key] = tat
+        if len(self._tats) > self._max_keys:
+            # Keys whose TAT is in the past carry no state and can be dropped
+            self._tats = {k: v for k, v in self._tats.items() if v > now}
+
+
+class RedisRateLimitBackend:
+    """
+    Shared GCRA state in Redis so limits hold across replicas.
+
+    All buckets of a check are tested and updated in one Lua script call, atomically
+    and using Redis server time. The script touches several keys at once, so it needs
+    a single Redis node rather than Redis Cluster.
+    """
+
+    # ARGV: period, force, then limit and cost for each key. Returns allowed, pending
+    # seconds and retry_after for each key; keys are only updated if all allowed.
+    _ACQUIRE_SCRIPT = """
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local period = tonumber(ARGV[1])
+    local force = tonumber(ARGV[2])
+    local admitted = 1
+    local result = {}
+    local tats = {}
+    for i, key in ipairs(KEYS) do
+        local interval = period / tonumber(ARGV[2 * i + 1])
+        local cost = tonumber(ARGV[2 * i + 2])
+        local tat = tonumber(redis.call('GET', key) or now)
+        local new_tat = math.max(tat, now) + cost * interval
+        local allow_at = new_tat - period
+        if force == 0 and allow_at > now then
+            admitted = 0
+            table.insert(result, 0)
+            table.insert(result, tostring(tat - now))
+            table.insert(result, tostring(allow_at - now))
+        else
+            tats[i] = new_tat
+            table.insert(result, 1)
+            table.insert(result, tostring(new_tat - now))
+            table.insert(result, '0')
+        end
+    end
+    if admitted == 1 then
+        for i, key in ipairs(KEYS) do
+            redis.call('SET', key, tostring(tats[i]), 'PX', math.ceil((tats[i] - now) * 1000) + 1)
+        end
+    end
+    return result
+    """
+
+    def __init__(self, url: str):
+        try:
+            import redis.asyncio as redis_asyncio
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self._redis = redis_asyncio.from_url(url)
+        self._script = self._redis.register_script(self._ACQUIRE_SCRIPT)
+
+    async def _run(self, buckets: Sequence[Bucket], force: bool) -> List[RateLimitResult]:
+        args = [PERIOD_SECONDS, int(force)]
+        for _, limit, cost in buckets:
+            args += [limit, cost]
+        reply = await self._script(keys=[f"ratelimit:{key}" for key, _, _ in buckets], args=args)
+        results = []
+        for i, (_, limit, _) in enumerate(buckets):
+            allowed, pending, retry_after = reply[3 * i:3 * i + 3]
+            pending = max(float(pending), 0.0)
+            remaining = max(int((PERIOD_SECONDS - pending) / (PERIOD_SECONDS / limit)), 0)
+            results.append(RateLimitResult(bool(allowed), limit, remaining, pending, float(retry_after)))
+        return results
+
+    async def acquire(self, buckets: Sequence[Bucket]) -> List[RateLimitResult]:
+        return await self._run(buckets, force=False)
+
+    async def charge(self, buckets: Sequence[Bucket]):
+        await self._run(buckets, force=True)
+
+
+class RateLimiter:
+    """
+    Per API key and per user_id limits on requests/min and tokens/min.
+
+    Requests are admitted while the token budget is not in debt; actual token usage is
+    charged once the completion finishes, since it is unknown up front. A user_id gets
+    its own, usually smaller, limits so one user cannot use up the whole key's quota;
+    a user limit of 0 means none.
+    """
+
+    def __init__(self, backend, requests_per_minute: int, tokens_per_minute: int,
+                 user_requests_per_minute: int = 0, user_tokens_per_minute: int = 0):
+        self.backend = backend
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.user_requests_per_minute = user_requests_per_minute
+        self.user_tokens_per_minute = user_tokens_per_minute
+
+    @staticmethod
+    def identities(api_key: str, user_id: Optional[str] = None) -> List[str]:
+        # Hash API keys so raw secrets never end up in a shared store
+        key_fp = api_key_fingerprint(api_key)
+        identities = ["key:" + key_fp]
+        if user_id:
+            # User IDs are client-supplied, so scope them to the key that sent them
+            identities.append(f"user:{key_fp}:{user_id}")
+        return identities
+
+    def _limits(self, api_key: str, user_id: Optional[str]) -> List[Tuple[str, int, int]]:
+        """(identity, requests/min, tokens/min) for every identity the caller counts against"""
+        identities = self.identities(api_key, user_id)
+        limits = [(identities[0], self.requests_per_minute, self.tokens_per_minute)]
+        if len(identities) > 1:
+            limits.append((identities[1], self.user_requests_per_minute, self.user_tokens_per_minute))
+        return limits
+
+    async def check(self, api_key: str, user_id: Optional[str] = None) -> RateLimitResult:
+        """
+        Admit one request; returns the most restrictive result across all identities.
+        Nothing is consumed unless every limit admits the request.
+        """
+        buckets = []
+        for identity, requests, tokens in self._limits(api_key, user_id):
+            if requests:
+                buckets.append(("req:" + identity, requests, 1))
+            if tokens:
+                # Zero cost: only checks that the token budget is not in debt
+                buckets.append(("tok:" + identity, tokens, 0))
+        results = await self.backend.acquire(buckets)
+        rejected = [result for result in results if not result.allowed]
+        if rejected:
+            return max(rejected, key=lambda result: result.retry_after)
+        # Headers describe the tightest requests/min limit
+        return min((result for (key, _, _), result in zip(buckets, results) if key.startswith("req:")),
+                   key=lambda result: result.remaining)
+
+    async def record_tokens(self, api_key: str, user_id: Optional[str], tokens: int):
+        if tokens <= 0:
+            return
+        buckets = [("tok:" + identity, limit, tokens)
+                   for identity, _, limit in self._limits(api_key, user_id) if limit]
+        if buckets:
+            await self.backend.charge(buckets)
+
+
+_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Return the worker-wide rate limiter, creating its backend on first use
+    """
+    global _limiter
+    if _limiter is None:
+        if settings.RATE_LIMIT_BACKEND == "redis":
+            backend = RedisRateLimitBackend(settings.RATE_LIMIT_REDIS_URL)
+        else:
+            backend = InMemoryRateLimitBackend()
+        _limiter = RateLimiter(
+            backend,
+            settings.RATE_LIMIT_PER_MINUTE,
+            settings.RATE_LIMIT_TOKENS_PER_MINUTE,
+            settings.RATE_LIMIT_USER_PER_MINUTE,
+            settings.RATE_LIMIT_USER_TOKENS_PER_MINUTE,
+        )
+        logger.info(f"Rate limiting enabled with {settings.RATE_LIMIT_BACKEND} backend")
+    return _limiter
+
+
+async def record_token_usage(api_key: Optional[str], user_id: Optional[str], tokens: int):
+    """
+    Charge completed token usage against the caller's tokens/min budget
+    """
+    if settings.RATE_LIMIT_ENABLED and api_key:
+        await get_rate_limiter().record_tokens(api_key, user_id, tokens)
@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import BEDROCK_RESILIENCE_EVENTS, BEDROCK_RETRIES, model_label
+from app.services.bedrock_errors import error_code, is_retryable, is_server_failure
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Bedrock while the circuit for a model/region is open"""
+
+    def __init__(self, model_id: str, region: str, retry_after: float):
+        super().__init__(f"Bedrock model {model_id} in {region} is unavailable, retry later")
+        self.model_id = model_id
+        self.region = region
+        self.status_code = 503
+        self.retry_after = retry_after
+
+    def headers(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, int(self.retry_after + 0.5)))}
+
+
+class RetryBudget:
+    """
+    Token bucket bounding extra attempts (retries and hedges) to a share of traffic.
+
+    Every request deposits ``ratio`` tokens and every extra attempt spends one, so
+    during an outage retries add at most ``ratio`` load instead of multiplying it.
+    ``min_per_second`` keeps low-traffic models able to retry at all.
+    """
+
+    def __init__(self, ratio: float, min_per_second: float):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max(10.0, 10 * min_per_second)
+        self.tokens = self.max_tokens
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        self._refill()
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` server failures in a row the circuit opens and calls
+    fail fast for ``reset_timeout`` seconds. Then one probe call is let through
+    (half-open): success closes the circuit, failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, model_id: str, region: str, failure_threshold: int, reset_timeout: float):
+        self.model_id = model_id
+        self.region = region
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def before_call(self):
+        if self.state == self.CLOSED:
+            return
+        remaining = self._opened_at + self.reset_timeout - time.monotonic()
+        if self.state == self.OPEN and remaining <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        BEDROCK_RESILIENCE_EVENTS.labels(self.model_id, "breaker_rejected").inc()
+        raise CircuitOpenError(self.model_id, self.region, max(remaining, 1.0))
+
+    def on_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit for {self.model_id} in {self.region} closed")
+            BEDROCK_RESILIENCE_EVENTS.labels(self.model_id, "breaker_closed").inc()
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def on_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(f"Circuit for {self.model_id} in {self.region} opened after "
+                           f"{self.failures} consecutive failures")
+            BEDROCK_RESILIENCE_EVENTS.labels(self.model_id, "breaker_opened").inc()
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def on_neutral(self):
+        """The call ended without telling us anything about Bedrock's health"""
+        self._probing = False
+
+
+class _NoBreaker:
+    """Used when the caller applies circuit breakers itself (e.g. per routed region)"""
+
+    def before_call(self):
+        pass
+
+    def on_success(self):
+        pass
+
+    def on_failure(self):
+        pass
+
+    def on_neutral(self):
+        pass
+
+
+_NO_BREAKER = _NoBreaker()
+
+
+class LatencyTracker:
+    """Recent successful call latencies for one model, for choosing the hedge delay"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._quantiles: Dict[float, float] = {}
+        self._recorded = 0
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        self._recorded += 1
+        if self._recorded % 10 == 0:
+            self._quantiles.clear()
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        value = self._quantiles.get(q)
+        if value is None:
+            ordered = sorted(self.samples)
+            value = self._quantiles[q] = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return value
+
+
+class BedrockResilience:
+    """
+    Retries with full-jitter backoff under a retry budget, optional hedging for
+    idempotent calls, and a circuit breaker per model and region.
+    """
+
+    def __init__(self, max_attempts: int, base_delay: float, max_delay: float, budget_ratio: float,
+                 budget_min_per_second: float, hedging: bool, hedge_quantile: float, hedge_min_delay: float,
+                 breaker_threshold: int, breaker_reset: float):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_min_per_second = budget_min_per_second
+        self.hedging = hedging
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+        self._budgets: Dict[str, RetryBudget] = {}
+        self._latencies: Dict[str, LatencyTracker] = {}
+
+    def breaker(self, model_id: str, region: str) -> CircuitBreaker:
+        model_id = model_label(model_id)
+        breaker = self._breakers.get((model_id, region))
+        if breaker is None:
+            breaker = self._breakers[(model_id, region)] = CircuitBreaker(
+                model_id, region, self.breaker_threshold, self.breaker_reset)
+        return breaker
+
+    def _budget(self, model_id: str) -> RetryBudget:
+        model_id = model_label(model_id)
+        budget = self._budgets.get(model_id)
+        if budget is None:
+            budget = self._budgets[model_id] = RetryBudget(self.budget_ratio, self.budget_min_per_second)
+        return budget
+
+    def _latency(self, model_id: str) -> LatencyTracker:
+        model_id = model_label(model_id)
+        tracker = self._latencies.get(model_id)
+        if tracker is None:
+            tracker = self._latencies[model_id] = LatencyTracker()
+        return tracker
+
+    def _backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, exponential cap]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def call(self, model_id: str, region: Optional[str], fn: Callable[[], Awaitable[Any]],
+                   hedge: bool = False, on_retry: Optional[Callable[[BaseException], None]] = None) -> Any:
+        """
+        Await ``fn()``, retrying retryable Bedrock errors.
+
+        ``hedge`` marks the call as safe to duplicate: if it has not finished after the
+        model's recent p95 latency, a second attempt races it. ``on_retry`` is called
+        with each error that is about to be retried. With ``region`` None no circuit
+        breaker is applied here.
+        """
+        breaker = self.breaker(model_id, region) if region else _NO_BREAKER
+        budget = self._budget(model_id)
+        budget.deposit()
+        attempt = 0
+        while True:
+            breaker.before_call()
+            started = time.perf_counter()
+            try:
+                if hedge and self.hedging:
+                    result, started = await self._hedged(model_id, budget, fn, started)
+                else:
+                    result = await fn()
+            except Exception as e:
+                if is_server_failure(e):
+                    breaker.on_failure()
+                else:
+                    breaker.on_neutral()
+                attempt += 1
+                if not is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                if not budget.try_spend():
+                    BEDROCK_RESILIENCE_EVENTS.labels(model_id, "budget_exhausted").inc()
+                    raise
+                BEDROCK_RETRIES.labels(model_id).inc()
+                if on_retry is not None:
+                    on_retry(e)
+                delay = self._backoff(attempt)
+                logger.info(f"Retrying {model_id} after {error_code(e)} in {delay * 1000:.0f} ms "
+                            f"(attempt {attempt + 1}/{self.max_attempts})")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                breaker.on_neutral()
+                raise
+            breaker.on_success()
+            self._latency(model_id).record(time.perf_counter() - started)
+            return result
+
+    async def _hedged(self, model_id: str, budget: RetryBudget, fn: Callable[[], Awaitable[Any]],
+                      started: float) -> Tuple[Any, float]:
+        """
+        Race a backup attempt against a slow primary. Returns the winning result and
+        the start time of the attempt that produced it.
+        """
+        primary = asyncio.ensure_future(fn())
+        backup: Optional[asyncio.Future] = None
+        try:
+            delay = self._latency(model_id).quantile(self.hedge_quantile)
+            if delay is not None:
+                await asyncio.wait({primary}, timeout=max(self.hedge_min_delay, delay))
+            if primary.done() or delay is None or not budget.try_spend():
+                return await primary, started
+
+            BEDROCK_RESILIENCE_EVENTS.labels(model_id, "hedge").inc()
+            backup_started = time.perf_counter()
+            backup = asyncio.ensure_future(fn())
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            BEDROCK_RESILIENCE_EVENTS.labels(model_id, "hedge_won").inc()
+                            return task.result(), backup_started
+                        return task.result(), started
+            # Both attempts failed; report the primary's error
+            raise primary.exception()
+        finally:
+            # The losing (or abandoned) attempt is cancelled and its slot released
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+_resilience: Optional[BedrockResilience] = None
+
+
+def get_resilience() -> BedrockResilience:
+    """
+    Return the worker-wide resilience policy
+    """
+    global _resilience
+    if _resilience is None:
+        _resilience = BedrockResilience(
+            max_attempts=settings.BEDROCK_RETRY_ATTEMPTS,
+            base_delay=settings.BEDROCK_RETRY_BASE_DELAY,
+            max_delay=settings.BEDROCK_RETRY_MAX_DELAY,
+            budget_ratio=settings.BEDROCK_RETRY_BUDGET_RATIO,
+            budget_min_per_second=settings.BEDROCK_RETRY_BUDGET_MIN_PER_SECOND,
+            hedging=settings.BEDROCK_HEDGING_ENABLED,
+            hedge_quantile=settings.BEDROCK_HEDGE_QUANTILE,
+            hedge_min_delay=settings.BEDROCK_HEDGE_MIN_DELAY,
+            breaker_threshold=settings.BEDROCK_BREAKER_FAILURE_THRESHOLD,
+            breaker_reset=settings.BEDROCK_BREAKER_RESET_SECONDS,
+        )
+    return _resilience
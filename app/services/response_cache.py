@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(model_id: str, request_body: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a Bedrock request.
+
+    The rendered request body already contains the prompt, max tokens and temperature,
+    so hashing it together with the model ID identifies a deterministic completion.
+    """
+    canonical = json.dumps({"model": model_id, "body": request_body}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class MemoryLRU:
+    """
+    In-process LRU bounded by total value size, with per-entry TTL. Evictions are
+    counted under ``name`` in the cache events metric.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, name: str = "response"):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.name = name
+        self.size = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, expires_at: Optional[float] = None):
+        if len(value) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at or time.time() + self.ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            oldest, _ = next(iter(self._entries.items()))
+            self._remove(oldest)
+            self.evictions += 1
+            CACHE_EVENTS.labels(self.name, "evict").inc()
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size -= len(value)
+
+
+class SQLiteCacheTier:
+    """
+    Local on-disk cache tier shared by all workers on the host.
+
+    SQLite in WAL mode allows concurrent readers from several uvicorn processes
+    while one writer appends.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_expires ON response_cache (expires_at)")
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM response_cache WHERE key = ? AND expires_at >= ?",
+                (key, time.time()),
+            ).fetchone()
+        return (row[0], bytes(row[1])) if row else None
+
+    def set(self, key: str, value: bytes, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune()
+
+    def _prune(self):
+        """Drop expired rows, then the soonest-expiring rows beyond max_entries"""
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+        count = self._conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+            CACHE_EVENTS.labels("response", "evict").inc(excess)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Exact-match completion cache: an in-memory LRU in front of an optional SQLite tier
+    """
+
+    def __init__(self, memory: MemoryLRU, disk: Optional[SQLiteCacheTier] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                expires_at, value = entry
+                self.memory.set(key, value, expires_at)
+        if value is None:
+            self.misses += 1
+            CACHE_EVENTS.labels("response", "miss").inc()
+            return None
+        self.hits += 1
+        CACHE_EVENTS.labels("response", "hit").inc()
+        return json.loads(value)
+
+    async def set(self, key: str, response: Dict[str, Any]):
+        value = json.dumps(response, separators=(",", ":")).encode("utf-8")
+        expires_at = time.time() + self.memory.ttl
+        self.memory.set(key, value, expires_at)
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to write response cache entry to disk: {str(e)}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions + (self.disk.evictions if self.disk else 0),
+            "entries": len(self.memory),
+            "bytes": self.memory.size,
+        }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def is_cacheable(temperature: float) -> bool:
+    """
+    Only near-deterministic completions are worth caching
+    """
+    return settings.RESPONSE_CACHE_ENABLED and temperature <= settings.RESPONSE_CACHE_MAX_TEMPERATURE
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Return the worker-wide response cache, creating it on first use
+    """
+    global _cache
+    if _cache is None:
+        disk = None
+        if settings.RESPONSE_CACHE_SQLITE_PATH:
+            disk = SQLiteCacheTier(settings.RESPONSE_CACHE_SQLITE_PATH, settings.RESPONSE_CACHE_SQLITE_MAX_ENTRIES)
+        _cache = ResponseCache(
+            MemoryLRU(settings.RESPONSE_CACHE_MAX_BYTES, settings.RESPONSE_CACHE_TTL_SECONDS),
+            disk,
+        )
+    return _cache
+
+
+def close_response_cache():
+    """
+    Close the cache's disk tier. Called from the application shutdown hook.
+    """
+    global _cache
+    cache, _cache = _cache, None
+    if cache is not None:
+        logger.info(f"Response cache stats: {cache.stats()}")
+        cache.close()
@@ -0,0 +1,184 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import BEDROCK_FAILOVERS, model_label
+from app.services.bedrock_client import create_bedrock_client, get_shared_client
+from app.services.bedrock_errors import is_throttle
+from app.services.usage_tracking import DEFAULT_RATE, MODEL_RATES
+
+logger = logging.getLogger(__name__)
+
+# Weight of the error rate in an endpoint's score: a 25% error rate doubles it
+ERROR_PENALTY = 4.0
+
+
+class EndpointStats:
+    """EWMA latency and error rate for one region/model endpoint"""
+
+    __slots__ = ("latency", "error_rate", "updated", "throttled_until")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.updated = 0.0
+        self.throttled_until = 0.0
+
+    def record(self, latency: Optional[float], failed: bool, alpha: float):
+        if latency is not None and not failed:
+            self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+        self.error_rate = (1 - alpha) * self.error_rate + alpha * (1.0 if failed else 0.0)
+        self.updated = time.monotonic()
+
+    def score(self, recovery_seconds: float) -> float:
+        """Lower is better. Endpoints without recent data score 0 so they get (re)tried."""
+        if self.latency is None or time.monotonic() - self.updated > recovery_seconds:
+            return 0.0
+        return self.latency * (1.0 + ERROR_PENALTY * self.error_rate)
+
+
+class BedrockRouter:
+    """
+    Routes Bedrock calls across regions.
+
+    Holds one client per configured region and per-endpoint latency/error EWMAs.
+    Candidates for a model are ordered fastest-healthy first; regions that just
+    throttled are tried last until their cooldown passes.
+    """
+
+    def __init__(self, regions: List[str], alpha: float, recovery_seconds: float, throttle_cooldown: float,
+                 clients: Optional[Dict[str, Any]] = None):
+        self.regions = regions
+        self.alpha = alpha
+        self.recovery_seconds = recovery_seconds
+        self.throttle_cooldown = throttle_cooldown
+        self._clients: Dict[str, Any] = dict(clients or {})
+        self._clients_lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], EndpointStats] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.regions) > 1
+
+    def client(self, region: str):
+        client = self._clients.get(region)
+        if client is None:
+            with self._clients_lock:
+                client = self._clients.get(region)
+                if client is None:
+                    if region == settings.AWS_REGION:
+                        client = get_shared_client()
+                    else:
+                        client = create_bedrock_client(region)
+                        logger.info(f"Created Bedrock client for {region}")
+                    self._clients[region] = client
+        return client
+
+    def _endpoint(self, model_id: str, region: str) -> EndpointStats:
+        model_id = model_label(model_id)
+        stats = self._stats.get((model_id, region))
+        if stats is None:
+            stats = self._stats[(model_id, region)] = EndpointStats()
+        return stats
+
+    def candidates(self, model_id: str) -> List[str]:
+        """
+        Regions to try for ``model_id``, best first
+        """
+        now = time.monotonic()
+
+        def rank(region: str):
+            stats = self._endpoint(model_id, region)
+            return stats.throttled_until > now, stats.score(self.recovery_seconds)
+
+        return sorted(self.regions, key=rank)
+
+    def record(self, model_id: str, region: str, latency: float, error: Optional[BaseException] = None):
+        stats = self._endpoint(model_id, region)
+        stats.record(latency, error is not None, self.alpha)
+        if error is not None and is_throttle(error):
+            stats.throttled_until = time.monotonic() + self.throttle_cooldown
+
+    def failed_over(self, model_id: str, region: str):
+        BEDROCK_FAILOVERS.labels(model_id, region).inc()
+        logger.info(f"Failing over {model_id} away from {region}")
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            f"{model_id}@{region}": {"latency": stats.latency, "error_rate": stats.error_rate}
+            for (model_id, region), stats in self._stats.items()
+        }
+
+    def close(self):
+        with self._clients_lock:
+            clients, self._clients = self._clients, {}
+        for region, client in clients.items():
+            if region == settings.AWS_REGION:
+                continue  # The shared client is closed with the bedrock_client module
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning(f"Error closing Bedrock client for {region}: {str(e)}")
+
+
+def model_rate(model_id: str) -> float:
+    return MODEL_RATES.get(model_id, DEFAULT_RATE)
+
+
+def resolve_model_alias(model: str, prompt_tokens: int, aliases: Optional[Dict[str, Dict[str, int]]] = None) -> str:
+    """
+    Map a model alias to a concrete model ID.
+
+    An alias lists candidate models with the largest prompt (in tokens) each should
+    serve, 0 meaning no limit. The cheapest candidate (by the rates used for cost
+    estimates) that fits the prompt wins; if none fits, the one with the largest
+    limit is used. Names that are not aliases are returned unchanged.
+    """
+    aliases = settings.MODEL_ALIASES if aliases is None else aliases
+    candidates = aliases.get(model)
+    if not candidates:
+        return model
+    fitting = [m for m, max_tokens in candidates.items() if not max_tokens or prompt_tokens <= max_tokens]
+    if fitting:
+        return min(fitting, key=model_rate)
+    return max(candidates, key=lambda m: candidates[m])
+
+
+_router: Optional[BedrockRouter] = None
+
+
+def init_router() -> BedrockRouter:
+    """
+    Create the worker-wide router. Called from the application startup hook.
+    """
+    global _router
+    if _router is None:
+        regions = settings.BEDROCK_REGIONS or [settings.AWS_REGION]
+        _router = BedrockRouter(
+            regions,
+            alpha=settings.ROUTING_EWMA_ALPHA,
+            recovery_seconds=settings.ROUTING_RECOVERY_SECONDS,
+            throttle_cooldown=settings.ROUTING_THROTTLE_COOLDOWN_SECONDS,
+        )
+        if _router.enabled:
+            # Create clients up front so the first request per region does not pay for it
+            for region in regions:
+                _router.client(region)
+            logger.info(f"Routing Bedrock calls across {', '.join(regions)}")
+    return _router
+
+
+def get_router() -> BedrockRouter:
+    return _router if _router is not None else init_router()
+
+
+def close_router():
+    """
+    Close the per-region clients. Called from the application shutdown hook.
+    """
+    global _router
+    router, _router = _router, None
+    if router is not None:
+        router.close()
@@ -0,0 +1,468 @@
+"""
+Server-side conversation sessions, so clients send only the new turns of a chat.
+
+A session keeps its history together with the per-message token counts and, for
+text-prompt models, the rendered prompt turns, all extended incrementally as
+turns are added rather than recomputed on every request.
+
+Sessions live in an in-memory LRU bounded by size. With ``SESSION_SQLITE_PATH``
+set, every change is also written to a local SQLite tier (append-only per
+message), which keeps sessions evicted from memory and lets all workers on the
+host serve them. Sessions expire ``SESSION_TTL_SECONDS`` after their last change.
+
+A turn claims its session before the completion is requested (``SessionStore.begin``)
+and releases it once stored or failed, so a concurrent turn is refused before it
+costs a Bedrock call. The claim is a lease: a turn abandoned without either frees
+the session after ``SESSION_TURN_LEASE_SECONDS``.
+"""
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.metrics import CACHE_EVENTS
+from app.core.security import api_key_fingerprint
+from app.models.chat import Message
+from app.services.adapters import TextPromptAdapter
+from app.services.tokenizer import message_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class SessionConflict(Exception):
+    """Raised when a turn is started on a session that another turn holds or that changed since it was read"""
+
+    status_code = 409
+
+    def __init__(self, session_id: str):
+        super().__init__(f"Session {session_id} is being modified by another request, retry with the latest history")
+        self.session_id = session_id
+
+
+class Session:
+    """A conversation's history with its incrementally maintained token counts and renderings"""
+
+    def __init__(self, session_id: str, owner: str, model: str, messages: Optional[List[Message]] = None,
+                 max_tokens: Optional[int] = None, temperature: Optional[float] = None,
+                 user_id: Optional[str] = None, created: Optional[float] = None, expires_at: float = 0.0):
+        self.id = session_id
+        self.owner = owner
+        self.model = model
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.user_id = user_id
+        self.created = created or time.time()
+        self.expires_at = expires_at
+        # Lease expiry of the turn in progress in this worker, 0 when there is none
+        self.turn_until = 0.0
+        self.messages: List[Message] = []
+        self.size = 0
+        # Token counts of the messages counted so far; counting is deferred until
+        # something (context fitting, alias resolution) needs it
+        self._costs: List[int] = []
+        self._prompt_tokens = 0
+        # Adapter name -> (adapter, render_turns(messages))
+        self._rendered: Dict[str, Tuple[TextPromptAdapter, str]] = {}
+        self.extend(messages or [])
+
+    def extend(self, messages: Sequence[Message]):
+        """Append messages, extending renderings already made"""
+        self.messages.extend(messages)
+        self.size += sum(len(msg.content) for msg in messages)
+        for name, (adapter, rendered) in list(self._rendered.items()):
+            self._rendered[name] = (adapter, rendered + adapter.render_turns(messages))
+
+    def _count(self):
+        for msg in self.messages[len(self._costs):]:
+            cost = message_tokens(msg)
+            self._costs.append(cost)
+            self._prompt_tokens += cost
+
+    @property
+    def costs(self) -> List[int]:
+        self._count()
+        return self._costs
+
+    @property
+    def prompt_tokens(self) -> int:
+        self._count()
+        return self._prompt_tokens
+
+    def rendered_turns(self, adapter: TextPromptAdapter) -> str:
+        entry = self._rendered.get(adapter.name)
+        if entry is None:
+            entry = self._rendered[adapter.name] = (adapter, adapter.render_turns(self.messages))
+        return entry[1]
+
+
+class PendingTurn:
+    """
+    A session's history plus the messages of a turn in progress. The turn is only
+    added to the session once the completion succeeded (see ``SessionStore.commit``).
+    """
+
+    def __init__(self, session: Session, messages: List[Message], lease_until: Optional[float] = None):
+        self.session = session
+        # Expiry of the claim on the session, None once committed or released
+        self.lease_until = lease_until
+        self.new_messages = messages
+        self.base_count = len(session.messages)
+        self.messages = session.messages + messages
+        self._new_costs: Optional[List[int]] = None
+
+    def _count_new(self) -> List[int]:
+        if self._new_costs is None:
+            self._new_costs = [message_tokens(msg) for msg in self.new_messages]
+        return self._new_costs
+
+    @property
+    def costs(self) -> List[int]:
+        return self.session.costs + self._count_new()
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.session.prompt_tokens + sum(self._count_new())
+
+    def rendered_turns(self, adapter: TextPromptAdapter) -> str:
+        return self.session.rendered_turns(adapter) + adapter.render_turns(self.new_messages)
+
+
+class SQLiteSessionTier:
+    """
+    Local on-disk session tier shared by all workers on the host. Messages are
+    stored one row each, so adding a turn only writes the new messages.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                model TEXT NOT NULL,
+                max_tokens INTEGER,
+                temperature REAL,
+                user_id TEXT,
+                created REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                message_count INTEGER NOT NULL,
+                turn_until REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS sessions_expires ON sessions (expires_at);
+            CREATE TABLE IF NOT EXISTS session_messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "turn_until" not in columns:
+            # Files written before turns were claimed
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN turn_until REAL NOT NULL DEFAULT 0")
+
+    def create(self, session: Session):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions (id, owner, model, max_tokens, temperature, user_id, created, expires_at, "
+                    "message_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (session.id, session.owner, session.model, session.max_tokens, session.temperature,
+                     session.user_id, session.created, session.expires_at, len(session.messages)),
+                )
+                self._insert_messages(session.id, 0, session.messages)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._count_write()
+
+    def append(self, session_id: str, base_count: int, messages: Sequence[Message], expires_at: float):
+        """Add messages after ``base_count``, failing if the session has moved on since"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                updated = self._conn.execute(
+                    "UPDATE sessions SET message_count = ?, expires_at = ?, turn_until = 0 "
+                    "WHERE id = ? AND message_count = ?",
+                    (base_count + len(messages), expires_at, session_id, base_count),
+                ).rowcount
+                if not updated:
+                    raise SessionConflict(session_id)
+                self._insert_messages(session_id, base_count, messages)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._count_write()
+
+    def claim(self, session_id: str, base_count: int, until: float):
+        """
+        Hold the session for a turn started after ``base_count`` messages until
+        ``until``, failing if it has moved on or another worker's turn holds it
+        """
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE sessions SET turn_until = ? WHERE id = ? AND message_count = ? AND turn_until < ?",
+                (until, session_id, base_count, time.time()),
+            ).rowcount
+        if not updated:
+            raise SessionConflict(session_id)
+
+    def release(self, session_id: str, until: float):
+        """Drop the claim made with ``until``, unless it already lapsed and another turn took over"""
+        with self._lock:
+            self._conn.execute("UPDATE sessions SET turn_until = 0 WHERE id = ? AND turn_until = ?",
+                               (session_id, until))
+
+    def _insert_messages(self, session_id: str, start: int, messages: Sequence[Message]):
+        self._conn.executemany(
+            "INSERT INTO session_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+            [(session_id, start + i, msg.role, msg.content) for i, msg in enumerate(messages)],
+        )
+
+    def header(self, session_id: str) -> Optional[Tuple[int, float]]:
+        """Message count and expiry of a live session"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT message_count, expires_at FROM sessions WHERE id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT owner, model, max_tokens, temperature, user_id, created, expires_at FROM sessions "
+                "WHERE id = ? AND expires_at >= ?",
+                (session_id, time.time()),
+            ).fetchone()
+            if row is None:
+                return None
+            messages = self._messages(session_id, 0)
+        owner, model, max_tokens, temperature, user_id, created, expires_at = row
+        return Session(session_id, owner, model, messages, max_tokens=max_tokens, temperature=temperature,
+                       user_id=user_id, created=created, expires_at=expires_at)
+
+    def messages_since(self, session_id: str, start: int) -> List[Message]:
+        with self._lock:
+            return self._messages(session_id, start)
+
+    def _messages(self, session_id: str, start: int) -> List[Message]:
+        rows = self._conn.execute(
+            "SELECT role, content FROM session_messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+            (session_id, start),
+        ).fetchall()
+        return [Message(role=role, content=content) for role, content in rows]
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._delete(session_id)
+
+    def _delete(self, session_id: str):
+        self._conn.execute("DELETE FROM session_messages WHERE session_id = ?", (session_id,))
+        self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _count_write(self):
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        """Drop expired sessions and their messages"""
+        expired = self._conn.execute("SELECT id FROM sessions WHERE expires_at < ?", (time.time(),)).fetchall()
+        for (session_id,) in expired:
+            self._delete(session_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SessionStore:
+    """Sessions in an in-memory LRU bounded by total content size, over an optional SQLite tier"""
+
+    def __init__(self, max_bytes: int, ttl: float, disk: Optional[SQLiteSessionTier] = None,
+                 turn_lease: float = 300.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+        self.turn_lease = turn_lease
+        self.size = 0
+        self.evictions = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    async def create(self, api_key: str, model: str, messages: List[Message], max_tokens: Optional[int] = None,
+                     temperature: Optional[float] = None, user_id: Optional[str] = None) -> Session:
+        session = Session(uuid.uuid4().hex, api_key_fingerprint(api_key), model, messages,
+                          max_tokens=max_tokens, temperature=temperature, user_id=user_id,
+                          expires_at=time.time() + self.ttl)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.create, session)
+        self._remember(session)
+        return session
+
+    async def get(self, session_id: str, api_key: str) -> Optional[Session]:
+        """
+        Live session owned by ``api_key``, or None. With the SQLite tier, the
+        in-memory copy is brought up to date with turns other workers added.
+        """
+        session = self._sessions.get(session_id)
+        if session is not None and session.expires_at < time.time():
+            self._forget(session_id)
+            session = None
+        if self.disk is not None:
+            if session is None:
+                session = await asyncio.to_thread(self.disk.load, session_id)
+                if session is not None:
+                    self._remember(session)
+            else:
+                header = await asyncio.to_thread(self.disk.header, session_id)
+                if header is None:
+                    self._forget(session_id)
+                    session = None
+                elif header[0] != len(session.messages):
+                    newer = await asyncio.to_thread(self.disk.messages_since, session_id, len(session.messages))
+                    self._grow(session, newer)
+                    session.expires_at = header[1]
+        CACHE_EVENTS.labels("session", "hit" if session is not None else "miss").inc()
+        if session is None or session.owner != api_key_fingerprint(api_key):
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    async def begin(self, session: Session, messages: List[Message]) -> PendingTurn:
+        """
+        Start a turn on ``session``, claiming the session until the turn is
+        committed or released. Raises SessionConflict while another turn holds
+        it, or if it changed since it was read, before any completion is paid for.
+        """
+        now = time.time()
+        if session.turn_until > now:
+            raise SessionConflict(session.id)
+        turn = PendingTurn(session, messages, lease_until=now + self.turn_lease)
+        session.turn_until = turn.lease_until
+        if self.disk is not None:
+            try:
+                await asyncio.to_thread(self.disk.claim, session.id, turn.base_count, turn.lease_until)
+            except BaseException:
+                self._unclaim(turn)
+                raise
+        return turn
+
+    async def release(self, turn: PendingTurn):
+        """
+        Give up a turn that did not complete, leaving the session unchanged and
+        free for the next turn. Does nothing for a committed or released turn.
+        """
+        until = self._unclaim(turn)
+        if until is not None and self.disk is not None:
+            await asyncio.to_thread(self.disk.release, turn.session.id, until)
+
+    def _unclaim(self, turn: PendingTurn) -> Optional[float]:
+        until, turn.lease_until = turn.lease_until, None
+        if until is not None and turn.session.turn_until == until:
+            turn.session.turn_until = 0.0
+        return until
+
+    async def commit(self, turn: PendingTurn, reply: Optional[Message] = None):
+        """
+        Add a completed turn (and the assistant's reply) to its session and release
+        the session. Raises SessionConflict if another turn was added since ``turn``
+        was started (possible once its claim lapsed); the turn is then still held.
+        """
+        session = turn.session
+        messages = turn.new_messages + ([reply] if reply is not None else [])
+        if len(session.messages) != turn.base_count:
+            raise SessionConflict(session.id)
+        expires_at = time.time() + self.ttl
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.append, session.id, turn.base_count, messages, expires_at)
+        # A concurrent get() may already have synced these messages from disk
+        if len(session.messages) == turn.base_count:
+            self._grow(session, messages)
+        session.expires_at = expires_at
+        self._unclaim(turn)
+        if session.id not in self._sessions:
+            self._remember(session)
+
+    async def delete(self, session_id: str, api_key: str) -> bool:
+        session = await self.get(session_id, api_key)
+        if session is None:
+            return False
+        self._forget(session_id)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.delete, session_id)
+        return True
+
+    def _grow(self, session: Session, messages: Sequence[Message]):
+        before = session.size
+        session.extend(messages)
+        if session.id in self._sessions:
+            self.size += session.size - before
+            self._evict()
+
+    def _remember(self, session: Session):
+        if session.id in self._sessions:
+            self._forget(session.id)
+        self._sessions[session.id] = session
+        self.size += session.size
+        self._evict()
+
+    def _forget(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.size -= session.size
+
+    def _evict(self):
+        # Always keep the most recent session, even if it alone exceeds the bound
+        while self.size > self.max_bytes and len(self._sessions) > 1:
+            oldest = next(iter(self._sessions))
+            self._forget(oldest)
+            self.evictions += 1
+            if self.disk is None:
+                logger.debug(f"Session {oldest} evicted from memory and dropped")
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._sessions), "bytes": self.size, "evictions": self.evictions}
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """
+    Return the worker-wide session store, creating it on first use
+    """
+    global _store
+    if _store is None:
+        disk = SQLiteSessionTier(settings.SESSION_SQLITE_PATH) if settings.SESSION_SQLITE_PATH else None
+        _store = SessionStore(settings.SESSION_MEMORY_MAX_BYTES, settings.SESSION_TTL_SECONDS, disk,
+                              turn_lease=settings.SESSION_TURN_LEASE_SECONDS)
+    return _store
+
+
+def close_session_store():
+    """
+    Close the store's disk tier. Called from the application shutdown hook.
+    """
+    global _store
+    store, _store = _store, None
+    if store is not None:
+        logger.info(f"Session store stats: {store.stats()}")
+        store.close()
@@ -0,0 +1,124 @@
+"""
+Server-sent event encoding for streamed chat completions.
+
+Every chunk of a stream shares the same id, created timestamp and model, so the
+JSON up to the delta is rendered once per stream and only the escaped delta text
+is spliced in per chunk. Chunks are produced as bytes, wire-compatible with
+``ChatCompletionChunk.model_dump_json(exclude_none=True)``.
+"""
+import asyncio
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Mapping, Optional
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.serialization import dumps
+
+DONE = b"data: [DONE]\n\n"
+
+
+class ChunkEncoder:
+    """Renders the SSE frames of one chat completion stream"""
+
+    __slots__ = ("_prefix",)
+
+    def __init__(self, model: str, chunk_id: Optional[str] = None, created: Optional[int] = None):
+        head = dumps({
+            "id": chunk_id or str(uuid.uuid4()),
+            "object": "chat.completion.chunk",
+            "created": int(time.time()) if created is None else created,
+            "model": model,
+        })
+        # '{"id":...,"model":"..."' + ',"choices":[{"index":0,"delta":'
+        self._prefix = b"data: " + head[:-1] + b',"choices":[{"index":0,"delta":'
+
+    def delta(self, text: str) -> bytes:
+        """Frame carrying a content delta"""
+        return b"".join((self._prefix, b'{"content":', dumps(text), b"}}]}\n\n"))
+
+    def finish(self, finish_reason: str = "stop") -> bytes:
+        """Final frame with an empty delta and the finish reason"""
+        return b"".join((self._prefix, b'{},"finish_reason":', dumps(finish_reason), b"}]}\n\n"))
+
+
+def encode_error(message: str, error_type: str = "server_error") -> bytes:
+    """Frame reporting an error after the stream has started"""
+    return b"data: " + dumps({"error": {"message": message, "type": error_type}}) + b"\n\n"
+
+
+async def coalesce_deltas(deltas: AsyncIterator[str], interval: float, max_chars: int) -> AsyncIterator[str]:
+    """
+    Merge small text deltas so each SSE frame carries more text.
+
+    The first delta is passed through immediately so time to first token is not
+    affected. After that, deltas are buffered until ``interval`` seconds have passed
+    since the last flush or ``max_chars`` characters are pending. With ``interval``
+    of 0 deltas are passed through unchanged.
+    """
+    if interval <= 0:
+        async for text in deltas:
+            yield text
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    pending: Optional[asyncio.Future] = None
+    buffer = []
+    buffered = 0
+    first = True
+    flushed_at = loop.time()
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = max(flushed_at + interval - loop.time(), 0) if buffer else None
+            done, _ = await asyncio.wait((pending,), timeout=timeout)
+            if not done:
+                # Flush interval elapsed with no new delta; keep waiting on the same read
+                yield "".join(buffer)
+                buffer, buffered, flushed_at = [], 0, loop.time()
+                continue
+
+            read, pending = pending, None
+            try:
+                text = read.result()
+            except StopAsyncIteration:
+                break
+            if first:
+                first = False
+                flushed_at = loop.time()
+                yield text
+                continue
+            buffer.append(text)
+            buffered += len(text)
+            if buffered >= max_chars or loop.time() - flushed_at >= interval:
+                yield "".join(buffer)
+                buffer, buffered, flushed_at = [], 0, loop.time()
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            # Let the cancelled read unwind before the caller closes the source
+            pending.cancel()
+            await asyncio.wait((pending,))
+
+
+class EventStreamResponse(StreamingResponse):
+    """
+    ``text/event-stream`` response that always awaits ``on_close`` when it is done,
+    including when the client leaves before the body is started and the body
+    generator, with its own cleanup, never runs
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], on_close: Callable[[], Awaitable[None]],
+                 headers: Optional[Mapping[str, str]] = None):
+        super().__init__(content, media_type="text/event-stream", headers=headers)
+        self.on_close = on_close
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
@@ -0,0 +1,205 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Approximate per-message framing cost ("Human: ", separators, role markers)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Pre-tokenizer used when no BPE encoding is available: words, numbers, single
+# punctuation marks and whitespace runs, similar to the cl100k split pattern.
+_PRETOKEN_RE = re.compile(r"""'s|'t|'re|'ve|'m|'ll|'d| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+""")
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Load the local BPE encoding once. Returns None when tiktoken or its encoding
+    file is unavailable, in which case the regex estimator is used.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is not None or _encoding_failed:
+        return _encoding
+    with _encoding_lock:
+        if _encoding is None and not _encoding_failed:
+            try:
+                import tiktoken
+                _encoding = tiktoken.get_encoding(settings.TOKENIZER_ENCODING)
+            except Exception as e:
+                _encoding_failed = True
+                logger.warning(f"BPE tokenizer unavailable, using estimator: {str(e)}")
+    return _encoding
+
+
+def warm_tokenizer():
+    """
+    Load the BPE encoding ahead of the first request. Called from the application
+    startup hook, since loading may read (or download) the encoding file.
+    """
+    _get_encoding()
+
+
+def _estimate_tokens(text: str) -> int:
+    """
+    Regex-based token estimate: each pre-token counts as one token, with long
+    words split into roughly four-character pieces as BPE merges would.
+    """
+    count = 0
+    for match in _PRETOKEN_RE.finditer(text):
+        length = match.end() - match.start()
+        count += 1 if length <= 8 else (length + 3) // 4
+    return count
+
+
+# Memoized counts. The memo keeps its texts alive, so it is bounded by their total
+# length rather than by entry count, and texts too long to be worth keeping are
+# counted without it.
+_MEMO_MAX_CHARS = 16 * 1024 * 1024
+_MEMO_MAX_TEXT_CHARS = 1024 * 1024
+_memo: "OrderedDict[str, int]" = OrderedDict()
+_memo_chars = 0
+_memo_lock = threading.Lock()
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in ``text``. Results for repeated strings (system prompts, earlier
+    turns of a conversation) are memoized.
+    """
+    global _memo_chars
+    if not text:
+        return 0
+    if len(text) > _MEMO_MAX_TEXT_CHARS:
+        return _count_uncached(text)
+    with _memo_lock:
+        count = _memo.get(text)
+        if count is not None:
+            _memo.move_to_end(text)
+            return count
+    count = _count_uncached(text)
+    with _memo_lock:
+        if text not in _memo:
+            _memo[text] = count
+            _memo_chars += len(text)
+            while _memo_chars > _MEMO_MAX_CHARS:
+                evicted, _ = _memo.popitem(last=False)
+                _memo_chars -= len(evicted)
+    return count
+
+
+def message_tokens(msg: Any) -> int:
+    """
+    Prompt tokens of one chat message, including the per-message overhead
+    """
+    return count_tokens(msg.content) + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_message_tokens(messages: List[Any]) -> int:
+    """
+    Count prompt tokens for a list of chat messages, message by message so each
+    repeated message hits the memoization cache
+    """
+    return sum(message_tokens(msg) for msg in messages)
+
+
+def make_usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0,
+               cache_write_tokens: int = 0) -> Dict[str, int]:
+    """
+    Usage dict in the chat completion format. ``prompt_tokens`` includes prompt
+    tokens read from or written to the prompt cache; those counts are only added
+    when non-zero.
+    """
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+    if cached_tokens:
+        usage["cached_tokens"] = cached_tokens
+    if cache_write_tokens:
+        usage["cache_write_tokens"] = cache_write_tokens
+    return usage
+
+
+def usage_from_response(response_body: Mapping[str, Any],
+                        headers: Optional[Mapping[str, str]] = None) -> Optional[Dict[str, int]]:
+    """
+    Token usage reported by Bedrock for an invoke_model response, if any.
+
+    Checks the Anthropic Messages ``usage`` block, Llama's token count fields and
+    finally the ``X-Amzn-Bedrock-*-Token-Count`` response headers. Anthropic counts
+    prompt-cache reads and writes separately from ``input_tokens``; they are added
+    back into the prompt tokens.
+    """
+    usage = response_body.get("usage")
+    if isinstance(usage, dict) and "input_tokens" in usage:
+        cached = usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        return make_usage(usage["input_tokens"] + cached + written, usage.get("output_tokens", 0), cached, written)
+    if "prompt_token_count" in response_body:
+        return make_usage(response_body["prompt_token_count"], response_body.get("generation_token_count", 0))
+    if headers:
+        input_tokens = headers.get("x-amzn-bedrock-input-token-count")
+        output_tokens = headers.get("x-amzn-bedrock-output-token-count")
+        if input_tokens is not None and output_tokens is not None:
+            return make_usage(int(input_tokens), int(output_tokens))
+    return None
+
+
+def usage_from_invocation_metrics(metrics: Optional[Mapping[str, Any]]) -> Optional[Dict[str, int]]:
+    """
+    Token usage from the ``amazon-bedrock-invocationMetrics`` block of a response stream
+    """
+    if not metrics or "inputTokenCount" not in metrics:
+        return None
+    cached = metrics.get("cacheReadInputTokenCount") or 0
+    written = metrics.get("cacheWriteInputTokenCount") or 0
+    return make_usage(metrics["inputTokenCount"] + cached + written, metrics.get("outputTokenCount", 0),
+                      cached, written)
+
+
+class StreamingTokenCounter:
+    """
+    Incremental token counter for streamed completions.
+
+    Text is counted up to the last whitespace boundary as deltas arrive, so tokens
+    are never split across deltas and each character is tokenized once.
+    """
+
+    def __init__(self):
+        self.counted = 0
+        self._tail = ""
+
+    def feed(self, delta: str):
+        text = self._tail + delta
+        boundary = max(text.rfind(" "), text.rfind("\n"))
+        if boundary <= 0:
+            if len(text) < 256:
+                self._tail = text
+                return
+            # No whitespace in a long run (e.g. code): count it rather than rescanning
+            boundary = len(text)
+        # Leading spaces attach to the following word, so split before the space
+        self.counted += _count_uncached(text[:boundary])
+        self._tail = text[boundary:]
+
+    def total(self) -> int:
+        return self.counted + _count_uncached(self._tail)
+
+
+def _count_uncached(text: str) -> int:
+    # Streamed fragments are unique, so they would only pollute the memo cache
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
@@ -1,31 +1,65 @@
+import asyncio
 import logging
 import json
+import sqlite3
+import threading
 import time
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List
 from fastapi import Request
 
 from app.core.config import settings
+from app.core.security import api_key_fingerprint
 
 logger = logging.getLogger(__name__)
 
+# Example pricing rates per 1000 tokens (these should be updated with actual AWS rates)
+MODEL_RATES = {
+    "anthropic.claude-v2": 0.008,
+    "anthropic.claude-instant-v1": 0.0004,
+    "anthropic.claude-3-sonnet-20240229-v1:0": 0.003,
+    "anthropic.claude-3-haiku-20240307-v1:0": 0.00025,
+    "meta.llama2-13b-chat-v1": 0.00075,
+    "amazon.titan-embed-text-v1": 0.0001,
+    "amazon.titan-embed-text-v2:0": 0.00002,
+    "cohere.embed-english-v3": 0.0001,
+    "cohere.embed-multilingual-v3": 0.0001
+}
+
+# Default rate if model not found
+DEFAULT_RATE = 0.005
+
+# Queued by UsagePipeline.stop: the flusher writes what it holds and exits
+_STOP = object()
+
+# Prompt-cache pricing relative to the model's input rate
+CACHE_READ_RATE_MULTIPLIER = 0.1
+CACHE_WRITE_RATE_MULTIPLIER = 1.25
+
 async def track_usage(
     model: str,
     tokens: int,
     user_id: Optional[str] = None,
-    http_request: Optional[Request] = None
+    http_request: Optional[Request] = None,
+    api_key: Optional[str] = None,
+    cached_tokens: int = 0,
+    cache_write_tokens: int = 0
 ):
     """
     Track API usage for billing, monitoring, and rate limiting purposes.
     
-    In a production system, this would typically write to a database or send to a monitoring service.
-    For this example, we'll just log the usage, but the structure is in place to extend.
+    Records are handed to the usage pipeline, which batches them into the local
+    usage store in the background. Enqueueing never blocks the request; records
+    are dropped (and counted) when the pipeline is saturated.
     
     Args:
         model: The model ID used
         tokens: Number of tokens used
         user_id: Optional user identifier
         http_request: Optional request object for extracting additional metadata
+        api_key: Optional API key, stored only as a fingerprint
+        cached_tokens: Prompt tokens read from the prompt cache (included in tokens)
+        cache_write_tokens: Prompt tokens written to the prompt cache (included in tokens)
     """
     if not settings.TRACK_USAGE:
         return
@@ -51,22 +85,16 @@ async def track_usage(
         "model": model,
         "tokens": tokens,
         "user_id": user_id or "anonymous",
-        "cost_estimate": estimate_cost(model, tokens),
+        "api_key": api_key_fingerprint(api_key) if api_key else "unknown",
+        "cost_estimate": estimate_cost(model, tokens, cached_tokens, cache_write_tokens),
         "request": request_metadata
     }
     
-    # In a real implementation, you would store this in a database or send to a monitoring system
-    # For this example, we'll just log it
-    logger.info(f"Usage tracked: {json.dumps(usage_record)}")
-    
-    # Example of extending this:
-    # await store_usage_in_database(usage_record)
-    # await send_to_monitoring_service(usage_record)
-    # await check_rate_limits(user_id, tokens)
+    get_usage_pipeline().submit(usage_record)
     
     return usage_record
 
-def estimate_cost(model: str, tokens: int) -> float:
+def estimate_cost(model: str, tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0) -> float:
     """
     Estimate the cost of the API call based on model and tokens used.
     This is a simplified example - real pricing would come from AWS.
@@ -74,24 +102,237 @@ def estimate_cost(model: str, tokens: int) -> float:
     Args:
         model: The model ID
         tokens: Number of tokens used
+        cached_tokens: Tokens of those read from the prompt cache
+        cache_write_tokens: Tokens of those written to the prompt cache
         
     Returns:
         Estimated cost in USD
     """
-    # Example pricing rates per 1000 tokens (these should be updated with actual AWS rates)
-    model_rates = {
-        "anthropic.claude-v2": 0.008,
-        "anthropic.claude-instant-v1": 0.0004,
-        "anthropic.claude-3-sonnet-20240229-v1:0": 0.003,
-        "anthropic.claude-3-haiku-20240307-v1:0": 0.00025,
-        "meta.llama2-13b-chat-v1": 0.00075
-    }
-    
-    # Default rate if model not found
-    default_rate = 0.005
-    
     # Get rate for this model or use default
-    rate_per_1k = model_rates.get(model, default_rate)
+    rate_per_1k = MODEL_RATES.get(model, DEFAULT_RATE)
     
-    # Calculate and return cost
-    return (tokens / 1000) * rate_per_1k
\ No newline at end of file
+    # Calculate and return cost; cache reads are discounted, cache writes carry a premium
+    billed = (tokens - cached_tokens - cache_write_tokens
+              + cached_tokens * CACHE_READ_RATE_MULTIPLIER
+              + cache_write_tokens * CACHE_WRITE_RATE_MULTIPLIER)
+    return (billed / 1000) * rate_per_1k
+
+
+class UsageStore:
+    """
+    Append-only usage store in SQLite (WAL mode).
+
+    Each batch inserts the raw records and upserts per API key / model / minute
+    rollups in the same transaction, so aggregates can be queried without
+    scanning raw records. Several workers can write to the same file.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS usage_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                api_key TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                model TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                request TEXT
+            );
+            CREATE TABLE IF NOT EXISTS usage_rollups (
+                minute INTEGER NOT NULL,
+                api_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                requests INTEGER NOT NULL,
+                tokens INTEGER NOT NULL,
+                cost REAL NOT NULL,
+                PRIMARY KEY (minute, api_key, model)
+            );
+        """)
+
+    def write_batch(self, records: List[Dict[str, Any]]):
+        rollups: Dict[tuple, List[float]] = {}
+        rows = []
+        for record in records:
+            rows.append((
+                record["timestamp"], record["api_key"], record["user_id"], record["model"],
+                record["tokens"], record["cost_estimate"], json.dumps(record["request"]),
+            ))
+            timestamp = datetime.fromisoformat(record["timestamp"]).replace(tzinfo=timezone.utc)
+            minute = int(timestamp.timestamp()) // 60 * 60
+            totals = rollups.setdefault((minute, record["api_key"], record["model"]), [0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += record["tokens"]
+            totals[2] += record["cost_estimate"]
+
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO usage_records (timestamp, api_key, user_id, model, tokens, cost, request) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT INTO usage_rollups (minute, api_key, model, requests, tokens, cost) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (minute, api_key, model) DO UPDATE SET "
+                "requests = requests + excluded.requests, "
+                "tokens = tokens + excluded.tokens, "
+                "cost = cost + excluded.cost",
+                [(minute, key, model, *totals) for (minute, key, model), totals in rollups.items()],
+            )
+
+    def query_rollups(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                      start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        clauses, params = [], []
+        for column, op, value in (("api_key", "=", api_key), ("model", "=", model),
+                                  ("minute", ">=", start), ("minute", "<", end)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT minute, api_key, model, requests, tokens, cost FROM usage_rollups {where} "
+                "ORDER BY minute, api_key, model",
+                params,
+            ).fetchall()
+        return [
+            {"minute": row[0], "api_key": row[1], "model": row[2],
+             "requests": row[3], "tokens": row[4], "cost": row[5]}
+            for row in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class UsagePipeline:
+    """
+    Bounded in-memory queue drained by a background flusher.
+
+    The flusher writes a batch once it reaches USAGE_BATCH_SIZE records or
+    USAGE_FLUSH_INTERVAL_SECONDS after its first record, whichever comes first.
+    """
+
+    def __init__(self, store: UsageStore, max_queue_size: int, batch_size: int, flush_interval: float):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+        self.written = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"Usage queue full, {self.dropped} records dropped so far")
+            return False
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            record = await self.queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            await asyncio.to_thread(self.store.write_batch, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.dropped += len(batch)
+            logger.error(f"Failed to write {len(batch)} usage records: {str(e)}")
+
+    async def stop(self):
+        """
+        Stop the flusher once it has written the batch it holds, then write
+        everything still queued
+        """
+        if self._task is not None:
+            if not self._task.done():
+                await self.queue.put(_STOP)
+                await self._task
+            self._task = None
+
+        remaining = []
+        while not self.queue.empty():
+            remaining.append(self.queue.get_nowait())
+        for i in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[i:i + self.batch_size])
+        logger.info(f"Usage pipeline stopped: {self.written} records written, {self.dropped} dropped")
+
+
+_pipeline: Optional[UsagePipeline] = None
+
+
+def get_usage_pipeline() -> UsagePipeline:
+    """
+    Return the worker-wide usage pipeline, starting it on first use
+    """
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = UsagePipeline(
+            UsageStore(settings.USAGE_DB_PATH),
+            max_queue_size=settings.USAGE_QUEUE_MAX_SIZE,
+            batch_size=settings.USAGE_BATCH_SIZE,
+            flush_interval=settings.USAGE_FLUSH_INTERVAL_SECONDS,
+        )
+        _pipeline.start()
+    return _pipeline
+
+
+async def flush_usage_pipeline():
+    """
+    Flush and close the usage pipeline. Called from the application shutdown hook.
+    """
+    global _pipeline
+    pipeline, _pipeline = _pipeline, None
+    if pipeline is not None:
+        await pipeline.stop()
+        pipeline.store.close()
+
+
+async def query_usage_rollups(api_key: Optional[str] = None, model: Optional[str] = None,
+                              start: Optional[int] = None, end: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Query per API key / model / minute usage aggregates.
+
+    Args:
+        api_key: Optional raw API key to filter by
+        model: Optional model ID to filter by
+        start: Optional inclusive start, as a Unix timestamp
+        end: Optional exclusive end, as a Unix timestamp
+    """
+    store = get_usage_pipeline().store
+    key = api_key_fingerprint(api_key) if api_key else None
+    start = start // 60 * 60 if start is not None else None
+    return await asyncio.to_thread(store.query_rollups, key, model, start, end)
@@ -0,0 +1,80 @@
+"""
+Worker warm-up: pay the one-time costs of a first request before the worker
+accepts connections.
+
+``warm_process`` covers what can be shared between workers: the tokenizer
+encoding, botocore's service data, adapter resolution and request rendering for
+the configured models, and modules imported on first use. The production
+launcher (``app.server``) runs it once before forking workers, so each worker
+starts with it already in memory and does not run it again.
+``warm_worker`` runs from the startup hook for what each process needs of its
+own, such as the thread pool behind sync dependencies.
+
+The Bedrock connection itself is warmed by the health monitor's first probe
+round, which ``/health/ready`` waits for.
+"""
+import asyncio
+import importlib
+import logging
+import time
+from typing import List
+
+import anyio
+
+from app.core.config import settings
+from app.models.chat import Message
+from app.services.adapters import get_adapter
+from app.services.bedrock_client import preload_client_data
+from app.services.embeddings import UnsupportedEmbeddingModel, get_embedding_adapter
+from app.services.tokenizer import warm_tokenizer
+
+logger = logging.getLogger(__name__)
+
+_warmed = False
+
+
+def warm_models() -> List[str]:
+    """
+    Chat model IDs this deployment is configured to use
+    """
+    models = [settings.DEFAULT_MODEL, *settings.HEALTH_PROBE_MODELS]
+    for candidates in settings.MODEL_ALIASES.values():
+        models.extend(candidates)
+    if settings.CONTEXT_STRATEGY == "summarize":
+        models.append(settings.CONTEXT_SUMMARY_MODEL)
+    return list(dict.fromkeys(models))
+
+
+def warm_process():
+    """
+    Load shared state ahead of the first request. Opens no connections and starts
+    no threads, so it is safe to run before forking. Processes forked after it
+    inherit the result and skip it.
+    """
+    global _warmed
+    if _warmed:
+        return
+    started = time.perf_counter()
+    warm_tokenizer()
+    preload_client_data()
+    # A single-turn conversation records nothing with the prompt cache planner
+    probe = [Message(role="user", content="ping")]
+    for model_id in warm_models():
+        get_adapter(model_id).create_body(model_id, probe, 1, 0.0)
+    try:
+        get_embedding_adapter(settings.DEFAULT_EMBEDDING_MODEL)
+    except UnsupportedEmbeddingModel as e:
+        logger.warning(str(e))
+    # anyio imports its asyncio backend on the first threadpool call
+    importlib.import_module("anyio._backends._asyncio")
+    _warmed = True
+    logger.info(f"Warmed up in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+
+async def warm_worker():
+    """
+    Warm this worker up. Called from the application startup hook.
+    """
+    await asyncio.to_thread(warm_process)
+    # Start the thread pool that sync dependencies run in
+    await anyio.to_thread.run_sync(int)
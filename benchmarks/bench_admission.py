@@ -0,0 +1,109 @@
+"""
+Compare request outcomes with and without adaptive admission control when Bedrock
+is overloaded.
+
+The fake model serves ``capacity`` concurrent calls; beyond that latency inflates
+and a share of calls is throttled. Clients keep ``concurrency`` requests open.
+
+Usage:
+    python -m benchmarks.bench_admission [concurrency] [requests] [capacity]
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+from app.models.chat import Message
+from app.services import admission
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-v2"
+MESSAGES = [Message(role="user", content="Say hello.")]
+
+
+class OverloadedFakeClient(FakeBedrockClient):
+    """Fake whose latency grows and which throttles once past its capacity"""
+
+    def __init__(self, capacity: int, latency: float = 0.05):
+        super().__init__(latency=0.0)
+        self.base_latency = latency
+        self.capacity = capacity
+        self.in_flight = 0
+        self.throttles = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, contentType="application/json", accept="application/json"):
+        with self._lock:
+            self.in_flight += 1
+            overload = self.in_flight / self.capacity
+        try:
+            if overload > 1.5:
+                with self._lock:
+                    self.throttles += 1
+                raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Rate exceeded"},
+                                   "ResponseMetadata": {"HTTPStatusCode": 429}}, "InvokeModel")
+            time.sleep(self.base_latency * max(1.0, overload) ** 2)
+            return super().invoke_model(modelId, body, contentType, accept)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+async def _run(enabled: bool, concurrency: int, total: int, capacity: int):
+    admission._controller = AdmissionController(
+        enabled=enabled, initial_limit=4, min_limit=1, max_limit=64, max_queue=concurrency,
+        queue_timeout=5.0, latency_tolerance=2.0, backoff=0.5,
+    )
+    client = OverloadedFakeClient(capacity, latency=0.05)
+    service = BedrockService(client)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, outcomes = [], {"ok": 0, "throttled": 0, "shed": 0}
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await service.generate_completion(MODEL_ID, MESSAGES)
+                outcomes["ok"] += 1
+                latencies.append(time.perf_counter() - started)
+            except AdmissionRejected:
+                outcomes["shed"] += 1
+            except ClientError:
+                outcomes["throttled"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    limit = admission._controller.stats().get(MODEL_ID, {}).get("limit")
+    label = "admission on " if enabled else "admission off"
+    print(f"{label}: ok={outcomes['ok']:>4} throttled={outcomes['throttled']:>4} shed={outcomes['shed']:>4} "
+          f"goodput={outcomes['ok'] / elapsed:>6.1f}/s p50={percentile(latencies, 50) * 1000:>7.1f}ms "
+          f"p99={percentile(latencies, 99) * 1000:>7.1f}ms"
+          + (f" final limit={limit:.1f}" if limit else ""))
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    capacity = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+    # Throttles and shed requests are expected here; keep the output readable
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    init_executor()
+    print(f"{total} requests at concurrency {concurrency}, fake capacity {capacity}")
+    try:
+        for enabled in (False, True):
+            await _run(enabled, concurrency, total, capacity)
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
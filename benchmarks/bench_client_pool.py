@@ -0,0 +1,52 @@
+"""
+Benchmark the per-request overhead of acquiring a Bedrock client.
+
+Compares the previous behaviour (a new ``boto3.client('bedrock-runtime')`` per
+request) with the shared, pooled client created at startup.
+
+Usage:
+    python -m benchmarks.bench_client_pool [iterations]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "benchmark")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark")
+
+import boto3  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services.bedrock_client import close_bedrock_client, get_shared_client, init_bedrock_client  # noqa: E402
+
+
+def _measure(label, fn, iterations):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    per_call_us = elapsed / iterations * 1e6
+    print(f"{label:<28} {per_call_us:>12.1f} us/request   peak alloc {peak / 1024:>10.1f} KiB")
+    return per_call_us
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    def per_request_client():
+        return boto3.client("bedrock-runtime", region_name=settings.AWS_REGION)
+
+    init_bedrock_client()
+    before = _measure("new client per request", per_request_client, iterations)
+    after = _measure("shared pooled client", get_shared_client, iterations)
+    close_bedrock_client()
+
+    print(f"speedup: {before / max(after, 1e-9):.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+CPU cost per request of decoding a chat completion body and encoding the response.
+
+Compares FastAPI's default path (JSON parse, ``ChatCompletionRequest`` validation,
+building ``ChatCompletionResponse`` and re-validating it through ``response_model``)
+with the fast codec (``decode_chat_request`` / ``encode_chat_completion``) on 1 KB,
+100 KB and 1 MB request bodies.
+
+Usage:
+    python -m benchmarks.bench_codec
+"""
+import asyncio
+import json
+import random
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.core.serialization import JSON_BACKEND
+from app.models.chat import (
+    ChatCompletionChoice, ChatCompletionRequest, ChatCompletionResponse, ChatCompletionUsage, Message,
+)
+from app.models.compact import decode_chat_request, encode_chat_completion
+
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+COMPLETION = "A reply of a few sentences about the conversation so far. " * 30
+USAGE = {"prompt_tokens": 1000, "completion_tokens": 300, "total_tokens": 1300}
+
+RESPONSE_FIELD = create_response_field(name="Response_create_chat_completion", type_=ChatCompletionResponse)
+
+
+def _body(rng: random.Random, size: int) -> bytes:
+    """Chat request body of roughly ``size`` bytes, as a conversation of ~500 byte turns"""
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    total = 200
+    while total < size:
+        content = " ".join(rng.choice(WORDS) for _ in range(70))
+        messages.append({"role": "user" if len(messages) % 2 else "assistant", "content": content})
+        total += len(content) + 40
+    return json.dumps({"model": "anthropic.claude-v2", "messages": messages, "max_tokens": 500,
+                       "temperature": 0.2}).encode("utf-8")
+
+
+async def _pydantic(body: bytes) -> bytes:
+    request = ChatCompletionRequest.model_validate(json.loads(body))
+    response = ChatCompletionResponse(
+        model=request.model,
+        choices=[ChatCompletionChoice(index=0, message=Message(role="assistant", content=COMPLETION),
+                                      finish_reason="stop")],
+        usage=ChatCompletionUsage(**USAGE),
+    )
+    content = await serialize_response(field=RESPONSE_FIELD, response_content=response, is_coroutine=True)
+    return JSONResponse(content).body
+
+
+async def _fast(body: bytes) -> bytes:
+    request = decode_chat_request(body)
+    return encode_chat_completion(request.model, COMPLETION, USAGE)
+
+
+async def _cpu_per_request(fn, body: bytes, iterations: int) -> float:
+    await fn(body)  # Warm up
+    start = time.process_time()
+    for _ in range(iterations):
+        await fn(body)
+    return (time.process_time() - start) / iterations
+
+
+async def main():
+    rng = random.Random(7)
+    print(f"JSON backend: {JSON_BACKEND}")
+    print(f"{'body':>8} {'pydantic':>12} {'fast codec':>12} {'speedup':>8}")
+    for label, size, iterations in (("1 KB", 1024, 5000), ("100 KB", 100 * 1024, 200), ("1 MB", 1024 * 1024, 20)):
+        body = _body(rng, size)
+        baseline = await _cpu_per_request(_pydantic, body, iterations)
+        fast = await _cpu_per_request(_fast, body, iterations)
+        print(f"{label:>8} {baseline * 1e6:>10.0f}us {fast * 1e6:>10.0f}us {baseline / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
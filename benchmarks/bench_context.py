@@ -0,0 +1,101 @@
+"""
+Prompt size, latency and estimated cost of the context window strategies.
+
+Replays one long conversation turn by turn (each request carries the whole
+history, as chat clients send it) against a fake Bedrock whose latency grows with
+the prompt, once per ``CONTEXT_STRATEGY``. Costs include the summary model's
+calls for the ``summarize`` strategy.
+
+Usage:
+    python -m benchmarks.bench_context [turns] [prompt token cap]
+"""
+import asyncio
+import io
+import json
+import logging
+import random
+import sys
+import time
+from collections import Counter
+
+from app.core.config import settings
+from app.models.chat import Message
+from app.services import admission, context
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.context import STRATEGIES
+from app.services.executor import init_executor, shutdown_executor
+from app.services.usage_tracking import estimate_cost
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+
+
+class MeteredFakeBedrockClient(FakeBedrockClient):
+    """Fake client that adds up the input and output tokens billed per model"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.tokens = Counter()
+
+    def invoke_model(self, modelId, body, contentType="application/json", accept="application/json"):
+        response = super().invoke_model(modelId, body, contentType, accept)
+        payload = response["body"].read()
+        usage = json.loads(payload).get("usage", {})
+        self.tokens[modelId] += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        return {"body": io.BytesIO(payload)}
+
+
+def _conversation(turns: int):
+    rng = random.Random(7)
+    return [Message(role="system", content="You are a helpful assistant.")] + [
+        Message(role="user" if i % 2 == 0 else "assistant", content=" ".join(rng.choice(WORDS) for _ in range(150)))
+        for i in range(turns)
+    ]
+
+
+async def _replay(conversation):
+    client = MeteredFakeBedrockClient(latency=0.01, prefill_per_1k_tokens=0.002)
+    latencies, saved = [], 0
+    for turn in range(2, len(conversation) + 1, 2):
+        service = BedrockService(client)
+        started = time.perf_counter()
+        await service.generate_completion(MODEL_ID, conversation[:turn], max_tokens=500, temperature=0.5)
+        latencies.append(time.perf_counter() - started)
+        saved += service.context_tokens_saved
+    cost = sum(estimate_cost(model, tokens) for model, tokens in client.tokens.items())
+    return latencies, saved, client.tokens, cost
+
+
+async def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    cap = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    settings.RESPONSE_CACHE_ENABLED = False
+    settings.CONTEXT_MAX_PROMPT_TOKENS = cap
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    conversation = _conversation(turns)
+    print(f"{turns} turns, prompt cap {cap} tokens")
+    try:
+        for strategy in STRATEGIES:
+            settings.CONTEXT_STRATEGY = strategy
+            context._manager = None
+            latencies, saved, tokens, cost = await _replay(conversation)
+            summary_tokens = tokens.get(settings.CONTEXT_SUMMARY_MODEL, 0)
+            print(f"{strategy:<15} p50={percentile(latencies, 50) * 1000:>6.1f}ms "
+                  f"last={latencies[-1] * 1000:>6.1f}ms saved={saved:>9} tokens "
+                  f"billed={sum(tokens.values()):>9} (summaries {summary_tokens}) cost=${cost:.3f}")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,105 @@
+"""
+Embedding throughput and response size: one upstream call per text vs micro-batching.
+
+Concurrent clients each embed one text per request, as a retrieval pipeline calling
+Bedrock directly does, against a fake Cohere Embed model with a fixed per-call
+latency. Variants:
+
+- ``unbatched``: one upstream call per text, vectors returned as the JSON float
+  lists Bedrock sends
+- ``batched``: texts from concurrent requests share upstream calls
+  (``EMBEDDING_BATCH_WINDOW_MS``, 5 ms when unset), float32-precision JSON
+- ``batched b64``: as above with ``encoding_format=base64``
+- ``cached``: the same texts again, all served from the embedding cache
+
+Usage:
+    python -m benchmarks.bench_embeddings [texts] [concurrency] [latency ms]
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from app.core.config import settings
+from app.core.serialization import dumps
+from app.models.embeddings import encode_embeddings
+from app.services import admission, embeddings
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.embeddings import from_float32
+from app.services.executor import init_executor, shutdown_executor
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "cohere.embed-english-v3"
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+
+
+def _texts(count: int):
+    rng = random.Random(7)
+    return [f"{i} " + " ".join(rng.choice(WORDS) for _ in range(40)) for i in range(count)]
+
+
+async def _replay(client, texts, concurrency: int, encoding_format: str, plain_json: bool = False):
+    queue = list(reversed(texts))
+    latencies, wire_bytes = [], 0
+
+    async def worker():
+        nonlocal wire_bytes
+        while queue:
+            text = queue.pop()
+            started = time.perf_counter()
+            service = BedrockService(client)
+            vectors, tokens = await service.create_embeddings(MODEL_ID, [text])
+            if plain_json:
+                body = dumps({"embeddings": [list(from_float32(vector)) for vector in vectors]})
+            else:
+                body = encode_embeddings(MODEL_ID, vectors, encoding_format, tokens)
+            wire_bytes += len(body)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, wire_bytes
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 30.0) / 1000
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    texts = _texts(count)
+    window = settings.EMBEDDING_BATCH_WINDOW_MS or 5.0
+    print(f"{count} texts, {concurrency} concurrent single-text requests, {latency * 1000:.0f} ms per upstream call")
+    try:
+        variants = (
+            ("unbatched", 1, "float", True, True),
+            ("batched", 96, "float", False, True),
+            ("batched b64", 96, "base64", False, True),
+            ("cached", 96, "base64", False, False),
+        )
+        for name, max_batch, encoding_format, plain_json, cold in variants:
+            settings.EMBEDDING_MAX_BATCH_SIZE = max_batch
+            settings.EMBEDDING_BATCH_WINDOW_MS = window if max_batch > 1 else 0
+            embeddings._batcher = None
+            if cold:
+                embeddings._cache = None
+            client = FakeBedrockClient(latency=latency)
+            elapsed, latencies, wire_bytes = await _replay(client, texts, concurrency, encoding_format, plain_json)
+            print(f"{name:<12} {count / elapsed:>8.0f} texts/s  p50={percentile(latencies, 50) * 1000:>6.1f}ms "
+                  f"p99={percentile(latencies, 99) * 1000:>6.1f}ms  upstream calls={client.calls:>5}  "
+                  f"{wire_bytes / count / 1024:>5.1f} KiB/text on the wire")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Near-duplicate response cache: hit rate, wrong answers and lookup cost.
+
+Replays support-desk traffic in which each request is one of a fixed set of
+questions ("How do I <action> <product>?") behind a shared system prompt that
+carries the current time and a request ID, re-asked with trivial changes:
+casing, whitespace, punctuation and filler words. Questions differ from each
+other in a word or two, so a cache that is too loose serves the answer to a
+different question; each upstream answer names its question, so those are
+counted as wrong answers. Variants:
+
+- ``no cache``
+- ``exact``: the exact-match response cache
+- ``near <threshold>``: the near-duplicate cache at that similarity threshold
+
+Requests are sent one at a time against a fake Messages API model. The lookup
+cost is the CPU time to normalize, sign, look up and verify one request (the
+service signs in a thread, off the event loop), also shown for prompts that
+start with a long, number-heavy document just under NEAR_CACHE_MAX_PROMPT_CHARS.
+
+Usage:
+    python -m benchmarks.bench_near_cache [requests] [latency ms]
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+import uuid
+
+from app.core.config import settings
+from app.models.chat import Message
+from app.services import admission, near_cache, response_cache
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from app.services.near_cache import NearDuplicateCache, NearDuplicateIndex
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+SYSTEM = ("You are the support assistant for Acme Cloud. Answer in at most three sentences, link to the "
+          "relevant help article, and never ask for passwords. Current time: {time}. Request ID: {id}.")
+ACTIONS = ("reset my password for", "cancel my subscription to", "export my data from", "change the billing "
+           "address in", "add a team member to", "turn on two-factor authentication in", "delete my account on",
+           "upgrade my plan for", "connect Slack to", "restore deleted files in")
+PRODUCTS = ("Acme Docs", "Acme Mail", "Acme Drive", "Acme Chat", "Acme Sheets", "Acme Meet")
+FILLERS = ("", "please ", "hi, ", "quick question: ", "hey ")
+
+
+def _questions():
+    return [f"How do I {action} {product}?" for action in ACTIONS for product in PRODUCTS]
+
+
+def _perturb(rng: random.Random, question: str) -> str:
+    if rng.random() < 0.3:
+        question = question.lower()
+    if rng.random() < 0.3:
+        question = question.rstrip("?") + rng.choice(("", "??", " ?", "."))
+    if rng.random() < 0.3:
+        question = question.replace(" ", "  ", 1)
+    return rng.choice(FILLERS) + question
+
+
+def _traffic(count: int):
+    rng = random.Random(11)
+    questions = _questions()
+    # Popular questions come up far more often
+    weights = [1 / (rank + 1) for rank in range(len(questions))]
+    rng.shuffle(weights)
+    traffic = []
+    for i in range(count):
+        index = rng.choices(range(len(questions)), weights)[0]
+        system = SYSTEM.format(time=f"2026-10-17T{9 + i // 3600 % 8:02d}:{i // 60 % 60:02d}:{i % 60:02d}Z",
+                               id=uuid.UUID(int=rng.getrandbits(128)))
+        messages = [Message(role="system", content=system),
+                    Message(role="user", content=_perturb(rng, questions[index]))]
+        traffic.append((index, messages))
+    return traffic
+
+
+async def _replay(client: FakeBedrockClient, traffic):
+    latencies, wrong = [], 0
+    for index, messages in traffic:
+        client.completion = f"Answer to question {index}."
+        started = time.perf_counter()
+        result = await BedrockService(client).generate_completion(MODEL_ID, messages, 200, 0.0)
+        latencies.append(time.perf_counter() - started)
+        wrong += result["completion"] != client.completion
+    return latencies, wrong
+
+
+def _lookup_cost(messages_list, threshold: float) -> float:
+    cache = NearDuplicateCache(NearDuplicateIndex(settings.NEAR_CACHE_MAX_BYTES, 3600))
+    service = BedrockService(FakeBedrockClient())
+    bodies = [service._create_request_body(MODEL_ID, messages, 200, 0.0) for messages in messages_list]
+    for body, messages in zip(bodies, messages_list):
+        cache.set(cache.probe(MODEL_ID, body, messages[-1].content), {"completion": "x", "usage": {}})
+    started = time.perf_counter()
+    for body, messages in zip(bodies, messages_list):
+        cache.get(cache.probe(MODEL_ID, body, messages[-1].content), threshold)
+    return (time.perf_counter() - started) / len(bodies)
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    traffic = _traffic(count)
+    print(f"{count} requests over {len(_questions())} questions, {latency * 1000:.0f} ms per upstream call")
+    try:
+        variants = (("no cache", False, None), ("exact", True, None),
+                    ("near 0.95", False, 0.95), ("near 0.9", False, 0.9), ("near 0.8", False, 0.8))
+        for name, exact, threshold in variants:
+            settings.RESPONSE_CACHE_ENABLED = exact
+            settings.NEAR_CACHE_ENABLED = threshold is not None
+            settings.NEAR_CACHE_MODELS = {"claude": threshold} if threshold else {}
+            response_cache._cache = None
+            near_cache._cache = None
+            client = FakeBedrockClient(latency=latency, token_interval=0)
+            latencies, wrong = await _replay(client, traffic)
+            print(f"{name:<10} hit rate={1 - client.calls / count:>6.1%}  wrong answers={wrong:>4}  "
+                  f"upstream calls={client.calls:>5}  p50={percentile(latencies, 50) * 1000:>5.1f}ms  "
+                  f"mean={sum(latencies) / count * 1000:>5.1f}ms")
+
+        sample = [messages for _, messages in traffic[:500]]
+        print(f"lookup cost: {_lookup_cost(sample, 0.9) * 1e6:.0f}us per request", end="")
+        document = " ".join(random.Random(3).choice(("latency", "quota", "region", "token", "cache", "model"))
+                            + str(i) for i in range(1500))
+        long_prompts = [[Message(role="user", content=f"{document}\n\n{messages[-1].content}")]
+                        for messages in sample[:50]]
+        print(f", {_lookup_cost(long_prompts, 0.9) * 1e3:.1f}ms with a "
+              f"{len(long_prompts[0][0].content) / 1024:.0f} KiB prompt")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""
+Latency and estimated cost of prompt caching against a fake Bedrock that simulates it.
+
+Two workloads on a Claude 3 model: many short questions under one long shared
+system prompt, and several questions asked about each of a few long documents.
+Each runs with ``PROMPT_CACHE_ENABLED`` off and on; the fake answers prompts that
+hit a cached prefix at ``cache_read_latency`` and reports cache read and write
+token counts, which are priced with ``estimate_cost``.
+
+Usage:
+    python -m benchmarks.bench_prompt_cache [requests] [concurrency]
+"""
+import asyncio
+import logging
+import random
+import sys
+import time
+
+from app.core.config import settings
+from app.models.chat import Message
+from app.services import admission, prompt_cache
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from app.services.usage_tracking import estimate_cost
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _shared_system_prompt(rng: random.Random, total: int):
+    system = Message(role="system", content=_text(rng, 3000))
+    return [[system, Message(role="user", content=_text(rng, 20))] for _ in range(total)]
+
+
+def _document_questions(rng: random.Random, total: int):
+    documents = [_text(rng, 4000) for _ in range(4)]
+    return [[
+        Message(role="system", content="Answer questions about the document."),
+        Message(role="user", content=rng.choice(documents)),
+        Message(role="assistant", content="I have read the document."),
+        Message(role="user", content=_text(rng, 20)),
+    ] for _ in range(total)]
+
+
+async def _drive(conversations, concurrency: int):
+    client = FakeBedrockClient(latency=0.3, cache_read_latency=0.1)
+    service = BedrockService(client)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, cost = [], 0.0
+
+    async def one(messages):
+        nonlocal cost
+        async with semaphore:
+            started = time.perf_counter()
+            result = await service.generate_completion(MODEL_ID, messages, max_tokens=100, temperature=0.5)
+            latencies.append(time.perf_counter() - started)
+            usage = result["usage"]
+            cost += estimate_cost(MODEL_ID, usage["total_tokens"], usage.get("cached_tokens", 0),
+                                  usage.get("cache_write_tokens", 0))
+
+    await asyncio.gather(*(one(messages) for messages in conversations))
+    return latencies, cost
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    settings.RESPONSE_CACHE_ENABLED = False
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    try:
+        for workload, build in (("shared system prompt", _shared_system_prompt),
+                                ("document questions", _document_questions)):
+            conversations = build(random.Random(7), total)
+            for enabled in (False, True):
+                settings.PROMPT_CACHE_ENABLED = enabled
+                prompt_cache._planner = None
+                latencies, cost = await _drive(conversations, concurrency)
+                print(f"{workload:<21} caching {'on ' if enabled else 'off'} "
+                      f"p50={percentile(latencies, 50) * 1000:>6.1f}ms p95={percentile(latencies, 95) * 1000:>6.1f}ms "
+                      f"cost=${cost:.4f}")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
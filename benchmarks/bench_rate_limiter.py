@@ -0,0 +1,39 @@
+"""
+Micro-benchmark of the in-process rate limiter.
+
+Measures the cost of one admission check (requests/min and tokens/min for an API
+key and a user_id) and one token charge, which is what every request pays.
+
+Usage:
+    python -m benchmarks.bench_rate_limiter [iterations]
+"""
+import asyncio
+import sys
+import time
+
+from app.services.rate_limiting import InMemoryRateLimitBackend, RateLimiter
+
+
+async def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    # Limits high enough that every check is admitted, i.e. the common path
+    limiter = RateLimiter(InMemoryRateLimitBackend(), requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12,
+                          user_requests_per_minute=10 ** 9, user_tokens_per_minute=10 ** 12)
+    keys = [f"api-key-{i}" for i in range(1000)]
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        await limiter.check(keys[i % len(keys)], f"user-{i % 5000}")
+    check_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for i in range(iterations):
+        await limiter.record_tokens(keys[i % len(keys)], f"user-{i % 5000}", 750)
+    charge_us = (time.perf_counter() - start) / iterations * 1e6
+
+    print(f"check (key + user, req + tokens): {check_us:6.2f} us/request")
+    print(f"record_tokens (key + user):       {charge_us:6.2f} us/request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Tail latency and success rate against a fake Bedrock with injected faults.
+
+Compares no resilience, retries with backoff, and retries plus hedging on a fake
+that throttles, fails and has a slow latency tail; then shows how the circuit
+breaker turns a hard outage into fast failures.
+
+Usage:
+    python -m benchmarks.bench_resilience [requests] [concurrency]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from app.models.chat import Message
+from app.services import admission, resilience
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from app.services.resilience import BedrockResilience
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-v2"
+MESSAGES = [Message(role="user", content="Say hello.")]
+
+POLICIES = {
+    "no retries": dict(max_attempts=1, hedging=False),
+    "retries": dict(max_attempts=3, hedging=False),
+    "retries + hedging": dict(max_attempts=3, hedging=True),
+}
+
+
+def _policy(max_attempts: int, hedging: bool, breaker_threshold: int = 1000) -> BedrockResilience:
+    return BedrockResilience(
+        max_attempts=max_attempts, base_delay=0.02, max_delay=0.5, budget_ratio=0.2, budget_min_per_second=5.0,
+        hedging=hedging, hedge_quantile=0.95, hedge_min_delay=0.01,
+        breaker_threshold=breaker_threshold, breaker_reset=5.0,
+    )
+
+
+async def _drive(client: FakeBedrockClient, total: int, concurrency: int):
+    service = BedrockService(client)
+    semaphore = asyncio.Semaphore(concurrency)
+    ok, failed = [], []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await service.generate_completion(MODEL_ID, MESSAGES)
+                ok.append(time.perf_counter() - started)
+            except Exception:
+                failed.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return ok, failed
+
+
+def _ms(value) -> str:
+    return f"{value * 1000:>7.1f}ms" if value is not None else "      -  "
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    try:
+        print(f"faults: 5% throttled, 3% 5xx, 5% of calls 10x slower; {total} requests at concurrency {concurrency}")
+        for name, policy in POLICIES.items():
+            resilience._resilience = _policy(**policy)
+            client = FakeBedrockClient(latency=0.05, throttle_rate=0.05, error_rate=0.03, slow_rate=0.05)
+            ok, failed = await _drive(client, total, concurrency)
+            print(f"{name:<18} success={len(ok) / total:>6.1%} p50={_ms(percentile(ok, 50))} "
+                  f"p95={_ms(percentile(ok, 95))} p99={_ms(percentile(ok, 99))} bedrock calls={client.calls}")
+
+        print("outage: every call fails with a 5xx after 200 ms")
+        for name, threshold in (("without breaker", 1000), ("with breaker", 5)):
+            resilience._resilience = _policy(3, False, breaker_threshold=threshold)
+            client = FakeBedrockClient(latency=0.2, error_rate=1.0)
+            ok, failed = await _drive(client, 200, concurrency)
+            print(f"{name:<18} failure p50={_ms(percentile(failed, 50))} p99={_ms(percentile(failed, 99))} "
+                  f"bedrock calls={client.calls}")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,94 @@
+"""
+Multi-region routing against fake regions with different latency and throttling.
+
+Compares pinning every call to the primary region with routing across regions
+(EWMA latency/error ranking plus failover on throttles), and shows which model
+an alias resolves to for small and large prompts.
+
+Usage:
+    python -m benchmarks.bench_routing [requests] [concurrency]
+"""
+import asyncio
+import logging
+import sys
+import time
+
+from app.models.chat import Message
+from app.services import admission, routing
+from app.services.admission import AdmissionController
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from app.services.routing import BedrockRouter, resolve_model_alias
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+MODEL_ID = "anthropic.claude-v2"
+MESSAGES = [Message(role="user", content="Say hello.")]
+
+ALIASES = {
+    "claude-auto": {
+        "anthropic.claude-3-haiku-20240307-v1:0": 4000,
+        "anthropic.claude-3-sonnet-20240229-v1:0": 0,
+    }
+}
+
+
+def _regions():
+    return {
+        # Primary region is busy: slower and throttling a third of calls
+        "us-east-1": FakeBedrockClient(latency=0.12, throttle_rate=0.3),
+        "us-west-2": FakeBedrockClient(latency=0.05),
+        "eu-central-1": FakeBedrockClient(latency=0.08),
+    }
+
+
+async def _drive(total: int, concurrency: int, regions):
+    service = BedrockService(regions["us-east-1"])
+    semaphore = asyncio.Semaphore(concurrency)
+    ok, failed = [], 0
+
+    async def one():
+        nonlocal failed
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await service.generate_completion(MODEL_ID, MESSAGES)
+                ok.append(time.perf_counter() - started)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(one() for _ in range(total)))
+    return ok, failed
+
+
+async def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    logging.getLogger("app").setLevel(logging.CRITICAL)
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    init_executor()
+    try:
+        for name, routed in (("primary region only", False), ("routed", True)):
+            regions = _regions()
+            routing._router = BedrockRouter(
+                list(regions) if routed else ["us-east-1"], alpha=0.2, recovery_seconds=5.0,
+                throttle_cooldown=1.0, clients=regions,
+            )
+            ok, failed = await _drive(total, concurrency, regions)
+            calls = " ".join(f"{region}={client.calls}" for region, client in regions.items())
+            print(f"{name:<20} success={len(ok) / total:>6.1%} p50={percentile(ok, 50) * 1000:>6.1f}ms "
+                  f"p99={percentile(ok, 99) * 1000:>6.1f}ms calls: {calls}")
+    finally:
+        shutdown_executor()
+
+    for prompt_tokens in (500, 20000):
+        print(f"claude-auto with a {prompt_tokens}-token prompt -> "
+              f"{resolve_model_alias('claude-auto', prompt_tokens, ALIASES)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Overhead of per-request stage timing and of sampled profiling.
+
+Sends non-streaming chat completions straight through the ASGI router (no HTTP
+server, Bedrock faked with no latency) with no timing middleware, with
+``ServerTimingMiddleware`` recording stages but not profiling, and with every
+request profiled, and reports the CPU time per request of each. Variants run in
+interleaved rounds.
+
+Usage:
+    python -m benchmarks.bench_server_timing [requests]
+"""
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+
+from app.core.config import settings
+from app.core.timing import ServerTimingMiddleware
+from app.main import app
+from app.services import admission, bedrock_client
+from app.services.admission import AdmissionController
+from app.services.executor import init_executor, shutdown_executor
+from benchmarks.fake_bedrock import FakeBedrockClient
+from benchmarks.loadgen import percentile
+
+BODY = json.dumps({
+    "model": "anthropic.claude-3-sonnet-20240229-v1:0",
+    "messages": [{"role": "user", "content": "How long does a request spend in each stage?"}],
+}).encode("utf-8")
+
+
+async def _request(asgi) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/v1/chat/completions", "raw_path": b"/v1/chat/completions", "query_string": b"",
+        "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(BODY)).encode()),
+                    (b"x-api-key", settings.API_KEYS[0].encode())],
+    }
+    messages = [{"type": "http.request", "body": BODY, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    await asgi(scope, receive, send)
+    return status[0]
+
+
+async def _run(variants, requests: int, rounds: int = 20):
+    """CPU seconds per request of each variant, interleaving rounds so drift hits all alike"""
+    times = {name: [] for name, _ in variants}
+    for name, asgi in variants:
+        for _ in range(50):
+            await _request(asgi)
+    for _ in range(rounds):
+        for name, asgi in variants:
+            for _ in range(requests // rounds):
+                started = time.process_time()
+                assert await _request(asgi) == 200
+                times[name].append(time.process_time() - started)
+    return times
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    if not settings.API_KEYS:
+        settings.API_KEYS = ["bench"]
+    settings.TRACK_USAGE = False
+    settings.RESPONSE_CACHE_ENABLED = False
+    logging.getLogger("app").setLevel(logging.WARNING)
+    admission._controller = AdmissionController(
+        enabled=False, initial_limit=1, min_limit=1, max_limit=1, max_queue=0, queue_timeout=0,
+        latency_tolerance=0, backoff=1,
+    )
+    bedrock_client.init_bedrock_client()
+    bedrock_client._client = FakeBedrockClient(latency=0, token_interval=0)
+    init_executor()
+    try:
+        with tempfile.TemporaryDirectory() as profile_dir:
+            variants = (
+                ("no timing", app.router),
+                ("timing", ServerTimingMiddleware(app.router)),
+                ("profiled", ServerTimingMiddleware(app.router, profile_dir=profile_dir, sample_rate=1.0)),
+            )
+            for name, times in (await _run(variants, requests)).items():
+                print(f"{name:<10} mean={sum(times) / len(times) * 1e6:>7.0f}us "
+                      f"p50={percentile(times, 50) * 1e6:>7.0f}us p99={percentile(times, 99) * 1e6:>7.0f}us CPU/request")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
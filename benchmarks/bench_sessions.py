@@ -0,0 +1,79 @@
+"""
+Bytes uploaded and server CPU per turn: stateless chat completions vs sessions.
+
+Replays a long Claude text-completion conversation. Stateless, each request body
+carries the whole history and is validated and rendered in full; with a session
+the body carries only the new user message and the prompt is extended from the
+session's rendered turns. Measures request decoding plus request-body preparation
+(model resolution, context fitting, rendering), i.e. the work done before the
+Bedrock call.
+
+Usage:
+    python -m benchmarks.bench_sessions [turns] [words per message]
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+
+from app.models.chat import ChatCompletionRequest, Message
+from app.models.session import SessionTurnRequest
+from app.services.bedrock import BedrockService
+from app.services.sessions import SessionStore
+
+MODEL_ID = "anthropic.claude-v2"
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+
+
+def _conversation(turns: int, words: int):
+    rng = random.Random(7)
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": " ".join(rng.choice(WORDS) for _ in range(words))}
+            for i in range(turns)]
+
+
+async def _stateless(service: BedrockService, conversation):
+    uploaded, cpu = 0, 0.0
+    for turn in range(1, len(conversation) + 1, 2):
+        body = json.dumps({"model": MODEL_ID, "messages": conversation[:turn]}).encode("utf-8")
+        uploaded += len(body)
+        start = time.process_time()
+        request = ChatCompletionRequest.model_validate_json(body)
+        await service._prepare(request.model, request.messages, None, None)
+        cpu += time.process_time() - start
+    return uploaded, cpu
+
+
+async def _session(service: BedrockService, conversation):
+    store = SessionStore(max_bytes=1 << 30, ttl=3600)
+    session = await store.create("key", MODEL_ID, [])
+    uploaded, cpu = 0, 0.0
+    for turn in range(1, len(conversation) + 1, 2):
+        body = json.dumps({"messages": [conversation[turn - 1]]}).encode("utf-8")
+        uploaded += len(body)
+        start = time.process_time()
+        request = SessionTurnRequest.model_validate_json(body)
+        pending = await store.begin(session, request.messages)
+        await service._prepare(MODEL_ID, pending.messages, None, None, pending)
+        reply = conversation[turn] if turn < len(conversation) else {"role": "assistant", "content": ""}
+        await store.commit(pending, Message(**reply))
+        cpu += time.process_time() - start
+    return uploaded, cpu
+
+
+async def main():
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    conversation = _conversation(turns, words)
+    service = BedrockService(client=object())
+    requests = len(range(1, len(conversation) + 1, 2))
+    print(f"{requests} turns of a {turns}-message conversation")
+    for name, replay in (("stateless", _stateless), ("session", _session)):
+        uploaded, cpu = await replay(service, conversation)
+        print(f"{name:<10} uploaded {uploaded / 1024 / 1024:>7.1f} MB  CPU {cpu * 1000:>8.1f} ms "
+              f"({cpu / requests * 1e6:>6.0f} us/turn)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Benchmark SSE chunk encoding for streamed chat completions, on one core.
+
+Compares building a ``ChatCompletionChunk`` model per delta (``model_dump_json``
+plus an f-string) with ``ChunkEncoder``, which renders the per-stream prefix once
+and splices in the escaped delta as bytes. Also shows how many frames a stream of
+small deltas produces with coalescing enabled.
+
+Usage:
+    python -m benchmarks.bench_sse [deltas]
+"""
+import asyncio
+import random
+import sys
+import time
+
+from app.core.serialization import JSON_BACKEND
+from app.models.chat import ChatCompletionChunk, ChatCompletionChunkChoice, ChatCompletionChunkDelta
+from app.services.sse import ChunkEncoder, coalesce_deltas
+
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+WORDS = ("the model streams a reply with \"quotes\", newlines\n, unicode café — "
+         "and ordinary words about latency throughput tokens").split(" ")
+
+
+def _pydantic(deltas):
+    for text in deltas:
+        chunk = ChatCompletionChunk(
+            model=MODEL_ID,
+            choices=[ChatCompletionChunkChoice(index=0, delta=ChatCompletionChunkDelta(content=text),
+                                               finish_reason=None)]
+        )
+        (f"data: {chunk.model_dump_json(exclude_none=True)}\n\n").encode("utf-8")
+
+
+def _encoder(deltas):
+    encoder = ChunkEncoder(MODEL_ID)
+    for text in deltas:
+        encoder.delta(text)
+
+
+def _rate(fn, deltas) -> float:
+    start = time.perf_counter()
+    fn(deltas)
+    return len(deltas) / (time.perf_counter() - start)
+
+
+async def _frames(deltas, interval: float, max_chars: int) -> int:
+    async def source():
+        for i, text in enumerate(deltas):
+            if i % 8 == 0:
+                await asyncio.sleep(0.001)  # Deltas arrive in bursts, like tokens off the wire
+            yield text
+
+    frames = 0
+    async for _ in coalesce_deltas(source(), interval, max_chars):
+        frames += 1
+    return frames
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(7)
+    deltas = [" " + rng.choice(WORDS) for _ in range(total)]
+
+    # Output must match byte for byte apart from the per-stream id and timestamp
+    chunk = ChatCompletionChunk(id="x", created=1, model=MODEL_ID, choices=[
+        ChatCompletionChunkChoice(index=0, delta=ChatCompletionChunkDelta(content=deltas[0]))])
+    assert ChunkEncoder(MODEL_ID, "x", 1).delta(deltas[0]) == \
+        f"data: {chunk.model_dump_json(exclude_none=True)}\n\n".encode("utf-8")
+
+    print(f"JSON backend: {JSON_BACKEND}")
+    baseline = _rate(_pydantic, deltas)
+    fast = _rate(_encoder, deltas)
+    print(f"pydantic chunk model: {baseline:>12,.0f} chunks/s")
+    print(f"ChunkEncoder:         {fast:>12,.0f} chunks/s ({fast / baseline:.1f}x)")
+
+    sample = deltas[:4000]
+    for interval_ms in (0, 10, 50):
+        frames = asyncio.run(_frames(sample, interval_ms / 1000, 4096))
+        print(f"coalescing at {interval_ms:>2} ms: {len(sample)} deltas -> {frames} frames")
+
+
+if __name__ == "__main__":
+    main()
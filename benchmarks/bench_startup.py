@@ -0,0 +1,134 @@
+"""
+Startup cost: import time, and how soon a freshly started server answers.
+
+Measures ``import app.main`` in a fresh interpreter, then starts the bridge
+against the fake Bedrock runtime and reports, per launcher, the time from process
+start until ``/health/ready`` returns 200 and until the first chat completion
+sent after that succeeds, and the CPU time and proportional memory (PSS, which
+counts pages shared between processes once) of the whole process tree at that
+point. Launchers:
+
+- ``uvicorn``: ``uvicorn app.main:app --workers N``, every worker importing the
+  application itself
+- ``app.server``: ``python -m app.server``, importing and warming up once and
+  forking the workers
+
+Usage:
+    python -m benchmarks.bench_startup [workers] [runs]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadgen import ProcessSampler, percentile
+from benchmarks.run_suite import _free_port, _wait_ready, start_fake_bedrock
+
+API_KEY = "benchmark-key"
+CHAT = {"model": "anthropic.claude-3-sonnet-20240229-v1:0", "messages": [{"role": "user", "content": "hi"}]}
+
+
+def _import_seconds() -> float:
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            env=dict(os.environ, API_KEYS=json.dumps([API_KEY]), LOG_LEVEL="WARNING"))
+    return float(result.stdout.split()[-1])
+
+
+def _pss_bytes(pids) -> int:
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            pass
+    return total
+
+
+def _command(launcher: str, port: int, workers: int):
+    if launcher == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(workers), "--log-level", "warning"], {}
+    return [sys.executable, "-m", "app.server"], {
+        "SERVER_HOST": "127.0.0.1", "SERVER_PORT": str(port), "SERVER_WORKERS": str(workers),
+    }
+
+
+async def _start(launcher: str, workers: int, bedrock_port: int):
+    port = _free_port()
+    command, extra_env = _command(launcher, port, workers)
+    env = dict(os.environ)
+    env.update({
+        "API_KEYS": json.dumps([API_KEY]),
+        "BEDROCK_ENDPOINT_URL": f"http://127.0.0.1:{bedrock_port}",
+        "AWS_ACCESS_KEY_ID": env.get("AWS_ACCESS_KEY_ID", "benchmark"),
+        "AWS_SECRET_ACCESS_KEY": env.get("AWS_SECRET_ACCESS_KEY", "benchmark"),
+        "LOG_LEVEL": "WARNING",
+        "TRACK_USAGE": "false",
+    })
+    env.update(extra_env)
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sampler = ProcessSampler([process.pid])
+    sampler.start(interval=10)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=10.0) as client:
+            while True:
+                try:
+                    if (await client.get("/health/ready")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError(f"{launcher} exited with {process.returncode}")
+                await asyncio.sleep(0.01)
+            ready = time.perf_counter() - started
+            response = await client.post("/v1/chat/completions", json=CHAT, headers={"X-API-Key": API_KEY})
+            assert response.status_code == 200, response.text
+            first_request = time.perf_counter() - started
+        stats = await sampler.stop()
+        pss = _pss_bytes(sampler.tree())
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    return ready, first_request, stats["cpu_seconds"], pss
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("workers", type=int, nargs="?", default=4)
+    parser.add_argument("runs", type=int, nargs="?", default=5)
+    args = parser.parse_args()
+
+    imports = [_import_seconds() for _ in range(args.runs)]
+    print(f"import app.main: p50={percentile(imports, 50) * 1000:.0f}ms min={min(imports) * 1000:.0f}ms")
+
+    bedrock_port = _free_port()
+    fake = start_fake_bedrock(bedrock_port, argparse.Namespace(
+        latency=0.0, tokens_per_second=1000.0, completion_tokens=5, throttle_rate=0.0, error_rate=0.0,
+    ))
+    try:
+        _wait_ready(f"http://127.0.0.1:{bedrock_port}/")
+        print(f"{args.workers} workers, median of {args.runs} starts")
+        for launcher in ("uvicorn", "app.server"):
+            runs = [await _start(launcher, args.workers, bedrock_port) for _ in range(args.runs)]
+            ready, first, cpu, pss = (percentile([run[i] for run in runs], 50) for i in range(4))
+            print(f"{launcher:<11} ready={ready * 1000:>6.0f}ms  first request={first * 1000:>6.0f}ms  "
+                  f"CPU to ready={cpu:>5.2f}s  PSS={pss / 2 ** 20:>6.0f} MiB")
+    finally:
+        fake.terminate()
+        fake.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
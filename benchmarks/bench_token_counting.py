@@ -0,0 +1,58 @@
+"""
+Benchmark token accounting on a ~100k-token conversation.
+
+Reports the cold cost of counting a long conversation, the warm cost on the next
+turn (where every earlier message hits the memoization cache) and the per-delta
+cost of incremental counting during streaming.
+
+Usage:
+    python -m benchmarks.bench_token_counting
+"""
+import random
+import time
+
+from app.models.chat import Message
+from app.services.tokenizer import StreamingTokenCounter, _get_encoding, count_message_tokens
+
+WORDS = ("the model returns a streamed answer about latency throughput tokens cache "
+         "request bedrock region quota prompt system user assistant context window").split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def main():
+    rng = random.Random(7)
+    system = Message(role="system", content=_text(rng, 2000))
+    turns = [Message(role="user" if i % 2 == 0 else "assistant", content=_text(rng, 480)) for i in range(200)]
+    conversation = [system] + turns
+
+    backend = "tiktoken BPE" if _get_encoding() is not None else "regex estimator"
+
+    start = time.perf_counter()
+    total = count_message_tokens(conversation)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    next_turn = conversation + [Message(role="user", content=_text(rng, 50))]
+    start = time.perf_counter()
+    count_message_tokens(next_turn)
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    deltas = [" " + w for w in _text(rng, 20000).split(" ")]
+    counter = StreamingTokenCounter()
+    start = time.perf_counter()
+    for delta in deltas:
+        counter.feed(delta)
+    counter.total()
+    per_delta_us = (time.perf_counter() - start) / len(deltas) * 1e6
+
+    print(f"backend: {backend}")
+    print(f"conversation: {len(conversation)} messages, {total} tokens")
+    print(f"cold count:        {cold_ms:8.2f} ms")
+    print(f"next turn (warm):  {warm_ms:8.2f} ms")
+    print(f"streaming counter: {per_delta_us:8.2f} us/delta")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Compare two benchmark result files written by ``loadgen`` or ``run_suite``.
+
+Scenarios are matched by mode, model, concurrency and rate; the change in RPS,
+p50/p95/p99 latency and TTFT is printed for each.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import json
+import sys
+
+
+def _key(result):
+    scenario = result["scenario"]
+    return scenario["mode"], scenario["model"], scenario["concurrency"], scenario["rate"]
+
+
+def _change(old, new):
+    if old is None or new is None:
+        return "        -"
+    if not old:
+        return f"{new:>9.3f}"
+    return f"{(new - old) / old * 100:>+8.1f}%"
+
+
+def main():
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    with open(sys.argv[1]) as f:
+        baseline = json.load(f)
+    with open(sys.argv[2]) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline.get('git_revision')} -> candidate {candidate.get('git_revision')}")
+    print(f"{'scenario':<34}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'ttft p50':>10}")
+    old_results = {_key(result): result for result in baseline["results"]}
+    for new in candidate["results"]:
+        old = old_results.get(_key(new))
+        if old is None:
+            continue
+        mode, model, concurrency, rate = _key(new)
+        load = f"rate={rate}" if rate else f"c={concurrency}"
+        old_ttft, new_ttft = old.get("ttft_seconds") or {}, new.get("ttft_seconds") or {}
+        print(f"{mode + ' ' + load:<34}"
+              f"{_change(old['rps'], new['rps']):>10}"
+              f"{_change(old['latency_seconds']['p50'], new['latency_seconds']['p50']):>10}"
+              f"{_change(old['latency_seconds']['p95'], new['latency_seconds']['p95']):>10}"
+              f"{_change(old['latency_seconds']['p99'], new['latency_seconds']['p99']):>10}"
+              f"{_change(old_ttft.get('p50'), new_ttft.get('p50')):>10}")
+
+
+if __name__ == "__main__":
+    main()
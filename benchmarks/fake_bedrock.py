@@ -0,0 +1,226 @@
+"""
+In-process stand-in for a boto3 ``bedrock-runtime`` client.
+
+The fake blocks the calling thread for a configurable latency, just like a real
+network round trip through boto3 would, so it exercises the same code paths as
+production without spending Bedrock money. Embedding models (Titan and Cohere
+request formats) return deterministic pseudo-random unit vectors.
+"""
+import io
+import json
+import random
+import threading
+import time
+import zlib
+
+from botocore.exceptions import ClientError
+
+
+class FakeEventStream:
+    """Iterable mimicking botocore's EventStream of response-stream chunks"""
+
+    def __init__(self, payloads, token_interval: float):
+        self._payloads = payloads
+        self._token_interval = token_interval
+        self.closed = False
+
+    def __iter__(self):
+        for payload in self._payloads:
+            if self.closed:
+                return
+            time.sleep(self._token_interval)
+            yield {"chunk": {"bytes": json.dumps(payload).encode("utf-8")}}
+
+    def close(self):
+        self.closed = True
+
+
+class FakePromptCache:
+    """
+    Simulates Bedrock prompt caching for Messages API bodies. The prefix ending at a
+    ``cache_control`` checkpoint is written to the cache the first time it is seen
+    and read from it afterwards; token counts are estimated at four bytes a token.
+    """
+
+    def __init__(self):
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def usage(self, model_id: str, request_body: dict):
+        """Split the prompt into (uncached, cache read, cache write) token counts"""
+        blocks = []
+        system = request_body.get("system")
+        if system is not None:
+            blocks.extend(system if isinstance(system, list) else [{"text": system}])
+        for message in request_body.get("messages", []):
+            content = message.get("content")
+            blocks.extend(content if isinstance(content, list) else [{"text": content}])
+
+        total = len(json.dumps(request_body)) // 4
+        prefix, prefix_tokens, read, written = [model_id], 0, 0, 0
+        with self._lock:
+            for block in blocks:
+                text = block.get("text") or ""
+                prefix.append(text)
+                prefix_tokens += len(text) // 4
+                if "cache_control" not in block:
+                    continue
+                key = "\x00".join(prefix)
+                if key in self._prefixes:
+                    read = prefix_tokens
+                else:
+                    self._prefixes.add(key)
+                    written = prefix_tokens - read
+        return total - read - written, read, written
+
+
+_embedding_bases = {}
+
+
+def _embedding_base(dimensions: int):
+    """A random unit vector and the JSON text of each of its values"""
+    base = _embedding_bases.get(dimensions)
+    if base is None:
+        rng = random.Random(dimensions)
+        values = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+        norm = sum(v * v for v in values) ** 0.5
+        values = [v / norm for v in values]
+        base = _embedding_bases[dimensions] = (values, [repr(v) for v in values])
+    return base
+
+
+def fake_embedding(text: str, dimensions: int):
+    """
+    Deterministic unit-length pseudo-embedding of ``text``: a rotation of one
+    random unit vector
+    """
+    values, _ = _embedding_base(dimensions)
+    offset = zlib.crc32(text.encode("utf-8")) % dimensions
+    return values[offset:] + values[:offset]
+
+
+def _fake_embedding_json(text: str, dimensions: int) -> str:
+    # Joined from precomputed value strings: encoding thousands of floats per call
+    # would cost the fake far more CPU than Bedrock's answer costs the bridge
+    _, texts = _embedding_base(dimensions)
+    offset = zlib.crc32(text.encode("utf-8")) % dimensions
+    return "[" + ",".join(texts[offset:] + texts[:offset]) + "]"
+
+
+def embedding_payload(model_id: str, request_body: dict, default_dimensions: int = 1024) -> bytes:
+    """Titan or Cohere style embeddings response body for an embedding request body"""
+    if "texts" in request_body:
+        vectors = ",".join(_fake_embedding_json(text, default_dimensions) for text in request_body["texts"])
+        body = (f'{{"id":"fake","response_type":"embeddings_floats","texts":{json.dumps(request_body["texts"])},'
+                f'"embeddings":[{vectors}]}}')
+    else:
+        text = request_body["inputText"]
+        vector = _fake_embedding_json(text, request_body.get("dimensions", default_dimensions))
+        body = f'{{"embedding":{vector},"inputTextTokenCount":{len(text.split())}}}'
+    return body.encode("utf-8")
+
+
+class FakeBedrockClient:
+    """Minimal bedrock-runtime client returning canned completions and embeddings"""
+
+    def __init__(self, latency: float = 0.1, completion: str = "Hello from fake Bedrock.",
+                 token_interval: float = 0.01, throttle_rate: float = 0.0, error_rate: float = 0.0,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0, cache_read_latency: float = 0.0,
+                 prefill_per_1k_tokens: float = 0.0):
+        self.latency = latency
+        self.completion = completion
+        self.token_interval = token_interval
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.cache_read_latency = cache_read_latency
+        self.prefill_per_1k_tokens = prefill_per_1k_tokens
+        self.prompt_cache = FakePromptCache()
+        self.calls = 0
+        self._scripted_failures = []
+
+    def _sleep(self, cache_read: bool = False, prompt_tokens: int = 0):
+        # Uncached prompt tokens add prefill time
+        prefill = self.prefill_per_1k_tokens * prompt_tokens / 1000
+        # Prompts served from the prompt cache skip most of the prefill
+        if cache_read and self.cache_read_latency:
+            time.sleep(self.cache_read_latency + prefill)
+            return
+        # A share of calls lands in a slow tail
+        slow = random.random() < self.slow_rate
+        time.sleep(self.latency * (self.slow_factor if slow else 1.0) + prefill)
+
+    def fail_next(self, count: int, code: str = "InternalServerException", status: int = 500):
+        """Fail the next ``count`` calls with ``code``, before any random faults"""
+        self._scripted_failures.extend([(code, status)] * count)
+
+    def _maybe_fail(self, operation: str):
+        roll = random.random()
+        if self._scripted_failures:
+            code, status = self._scripted_failures.pop(0)
+        elif roll < self.throttle_rate:
+            code, status = "ThrottlingException", 429
+        elif roll < self.throttle_rate + self.error_rate:
+            code, status = "InternalServerException", 500
+        else:
+            return
+        raise ClientError(
+            {"Error": {"Code": code, "Message": "Injected failure"}, "ResponseMetadata": {"HTTPStatusCode": status}},
+            operation,
+        )
+
+    def invoke_model(self, modelId, body, contentType="application/json", accept="application/json"):
+        self.calls += 1
+        request_body = json.loads(body)
+        if "embed" in modelId.lower():
+            self._sleep()
+            self._maybe_fail("InvokeModel")
+            return {"body": io.BytesIO(embedding_payload(modelId, request_body))}
+        uncached, read, written = self.prompt_cache.usage(modelId, request_body)
+        self._sleep(cache_read=read > 0, prompt_tokens=uncached)
+        self._maybe_fail("InvokeModel")
+        if "messages" in request_body:
+            usage = {"input_tokens": uncached, "output_tokens": len(self.completion.split(" "))}
+            if read or written:
+                usage.update(cache_read_input_tokens=read, cache_creation_input_tokens=written)
+            payload = {
+                "type": "message",
+                "role": "assistant",
+                "content": [{"type": "text", "text": self.completion}],
+                "stop_reason": "end_turn",
+                "usage": usage,
+            }
+        elif "llama" in modelId.lower():
+            payload = {"generation": self.completion, "stop_reason": "stop"}
+        else:
+            payload = {"completion": self.completion, "stop_reason": "stop_sequence"}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, modelId, body, contentType="application/json",
+                                          accept="application/json"):
+        self.calls += 1
+        request_body = json.loads(body)
+        uncached, read, written = self.prompt_cache.usage(modelId, request_body)
+        self._sleep(cache_read=read > 0, prompt_tokens=uncached)
+        self._maybe_fail("InvokeModelWithResponseStream")
+        words = self.completion.split(" ")
+        deltas = [word if i == 0 else " " + word for i, word in enumerate(words)]
+        invocation_metrics = {"inputTokenCount": uncached, "outputTokenCount": len(words)}
+        if read or written:
+            invocation_metrics.update(cacheReadInputTokenCount=read, cacheWriteInputTokenCount=written)
+        if "messages" in request_body:
+            payloads = [{"type": "message_start", "message": {"role": "assistant", "content": []}}]
+            payloads += [{"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}
+                         for text in deltas]
+            payloads.append({"type": "message_delta", "delta": {"stop_reason": "end_turn"}})
+            payloads.append({"type": "message_stop", "amazon-bedrock-invocationMetrics": invocation_metrics})
+        else:
+            key = "generation" if "llama" in modelId.lower() else "completion"
+            payloads = [{key: text, "stop_reason": None} for text in deltas]
+            payloads[-1]["stop_reason"] = "stop"
+            payloads[-1]["amazon-bedrock-invocationMetrics"] = invocation_metrics
+        return {"body": FakeEventStream(payloads, self.token_interval)}
+
+    def close(self):
+        pass
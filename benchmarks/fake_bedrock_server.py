@@ -0,0 +1,200 @@
+"""
+Local HTTP stand-in for the ``bedrock-runtime`` API.
+
+Implements ``InvokeModel`` and ``InvokeModelWithResponseStream`` closely enough for
+boto3 to talk to it, so the bridge can be load tested end to end by pointing
+``BEDROCK_ENDPOINT_URL`` at this server. Latency, token rate, throttling and error
+injection are configurable.
+
+Usage:
+    python -m benchmarks.fake_bedrock_server --port 9000 --latency 0.2 --tokens-per-second 80
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import json
+import random
+import struct
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from benchmarks.fake_bedrock import FakePromptCache
+
+
+class FakeBedrockConfig:
+    """Behaviour knobs for the fake runtime"""
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 80.0, completion_tokens: int = 200,
+                 throttle_rate: float = 0.0, error_rate: float = 0.0, cache_read_latency: float = 0.0,
+                 slow_rate: float = 0.0, slow_factor: float = 10.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.cache_read_latency = cache_read_latency
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+
+
+def encode_event(payload: bytes, headers: dict) -> bytes:
+    """
+    Encode one AWS event-stream message: prelude, string headers, payload and CRCs
+    """
+    encoded_headers = b""
+    for name, value in headers.items():
+        name_bytes, value_bytes = name.encode("utf-8"), value.encode("utf-8")
+        encoded_headers += struct.pack("!B", len(name_bytes)) + name_bytes
+        encoded_headers += struct.pack("!BH", 7, len(value_bytes)) + value_bytes
+    total_length = 12 + len(encoded_headers) + len(payload) + 4
+    prelude = struct.pack("!II", total_length, len(encoded_headers))
+    prelude += struct.pack("!I", binascii.crc32(prelude) & 0xFFFFFFFF)
+    message = prelude + encoded_headers + payload
+    return message + struct.pack("!I", binascii.crc32(message) & 0xFFFFFFFF)
+
+
+def chunk_event(body: dict) -> bytes:
+    payload = json.dumps({"bytes": base64.b64encode(json.dumps(body).encode("utf-8")).decode("ascii")})
+    return encode_event(payload.encode("utf-8"), {
+        ":event-type": "chunk",
+        ":content-type": "application/json",
+        ":message-type": "event",
+    })
+
+
+def _error(status: int, code: str, message: str) -> JSONResponse:
+    return JSONResponse({"message": message}, status_code=status, headers={"x-amzn-ErrorType": code})
+
+
+def _words(count: int):
+    return [("lorem", " ipsum", " dolor", " sit", " amet")[i % 5] for i in range(count)]
+
+
+def _text_key(model_id: str) -> str:
+    return "generation" if "llama" in model_id.lower() else "completion"
+
+
+def _completion_events(model_id: str, request_body: dict, words, prompt_usage):
+    """Response-stream chunk bodies, in the Messages API or text completion format"""
+    uncached, read, written = prompt_usage
+    invocation_metrics = {"inputTokenCount": uncached, "outputTokenCount": len(words)}
+    if read or written:
+        invocation_metrics.update(cacheReadInputTokenCount=read, cacheWriteInputTokenCount=written)
+    if "messages" in request_body:
+        yield {"type": "message_start", "message": {"role": "assistant", "content": []}}
+        for word in words:
+            yield {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}}
+        yield {"type": "message_delta", "delta": {"stop_reason": "end_turn"}}
+        yield {"type": "message_stop", "amazon-bedrock-invocationMetrics": invocation_metrics}
+        return
+    key = _text_key(model_id)
+    for i, word in enumerate(words):
+        body = {key: word, "stop_reason": None}
+        if i == len(words) - 1:
+            body["stop_reason"] = "stop_sequence"
+            body["amazon-bedrock-invocationMetrics"] = invocation_metrics
+        yield body
+
+
+def _injected_failure(config: FakeBedrockConfig):
+    roll = random.random()
+    if roll < config.throttle_rate:
+        return _error(429, "ThrottlingException", "Too many requests, please wait before trying again.")
+    if roll < config.throttle_rate + config.error_rate:
+        return _error(500, "InternalServerException", "Injected internal error")
+    return None
+
+
+def _prompt_latency(config: FakeBedrockConfig, cache_read: bool) -> float:
+    # Prompts that hit the prompt cache are served at the (lower) cache-read latency
+    if config.cache_read_latency and cache_read:
+        return config.cache_read_latency
+    if random.random() < config.slow_rate:
+        return config.latency * config.slow_factor
+    return config.latency
+
+
+def create_app(config: FakeBedrockConfig) -> Starlette:
+    prompt_cache = FakePromptCache()
+
+    async def invoke(request: Request):
+        model_id = request.path_params["model_id"]
+        request_body = json.loads(await request.body() or b"{}")
+        failure = _injected_failure(config)
+        prompt_tokens, read, written = prompt_cache.usage(model_id, request_body)
+        await asyncio.sleep(_prompt_latency(config, read > 0))
+        if failure is not None:
+            return failure
+        words = _words(config.completion_tokens)
+        await asyncio.sleep(len(words) / config.tokens_per_second if config.tokens_per_second else 0)
+        if "messages" in request_body:
+            usage = {"input_tokens": prompt_tokens, "output_tokens": len(words)}
+            if read or written:
+                usage.update(cache_read_input_tokens=read, cache_creation_input_tokens=written)
+            body = {"type": "message", "role": "assistant", "content": [{"type": "text", "text": "".join(words)}],
+                    "stop_reason": "end_turn", "usage": usage}
+        else:
+            body = {_text_key(model_id): "".join(words), "stop_reason": "stop_sequence"}
+        return JSONResponse(
+            body,
+            headers={
+                "X-Amzn-Bedrock-Input-Token-Count": str(prompt_tokens),
+                "X-Amzn-Bedrock-Output-Token-Count": str(len(words)),
+            },
+        )
+
+    async def invoke_stream(request: Request):
+        model_id = request.path_params["model_id"]
+        request_body = json.loads(await request.body() or b"{}")
+        failure = _injected_failure(config)
+        prompt_usage = prompt_cache.usage(model_id, request_body)
+        await asyncio.sleep(_prompt_latency(config, prompt_usage[1] > 0))
+        if failure is not None:
+            return failure
+
+        async def events():
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second else 0
+            words = _words(config.completion_tokens)
+            for body in _completion_events(model_id, request_body, words, prompt_usage):
+                yield chunk_event(body)
+                await asyncio.sleep(interval)
+
+        return StreamingResponse(events(), media_type="application/vnd.amazon.eventstream")
+
+    return Starlette(routes=[
+        Route("/model/{model_id:path}/invoke-with-response-stream", invoke_stream, methods=["POST"]),
+        Route("/model/{model_id:path}/invoke", invoke, methods=["POST"]),
+    ])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=80.0)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of calls in a slow latency tail")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="Latency multiplier for slow calls")
+    parser.add_argument("--cache-read-latency", type=float, default=0.0,
+                        help="Latency for prompts that hit the prompt cache (0 disables)")
+    args = parser.parse_args()
+
+    config = FakeBedrockConfig(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, completion_tokens=args.completion_tokens,
+        throttle_rate=args.throttle_rate, error_rate=args.error_rate, cache_read_latency=args.cache_read_latency,
+        slow_rate=args.slow_rate, slow_factor=args.slow_factor,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
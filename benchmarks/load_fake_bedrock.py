@@ -0,0 +1,51 @@
+"""
+Load test BedrockService.generate_completion against the in-process fake Bedrock.
+
+Shows how throughput scales with the number of concurrent requests now that
+blocking boto3 calls are offloaded from the event loop.
+
+Usage:
+    python -m benchmarks.load_fake_bedrock [latency_seconds] [requests_per_level]
+"""
+import asyncio
+import sys
+import time
+
+from app.models.chat import Message
+from app.services.bedrock import BedrockService
+from app.services.executor import init_executor, shutdown_executor
+from benchmarks.fake_bedrock import FakeBedrockClient
+
+MODEL_ID = "anthropic.claude-v2"
+MESSAGES = [Message(role="user", content="Say hello.")]
+
+
+async def _run_level(service: BedrockService, concurrency: int, total: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await service.generate_completion(MODEL_ID, MESSAGES)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.1
+    total = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+
+    init_executor()
+    service = BedrockService(FakeBedrockClient(latency=latency))
+    print(f"fake Bedrock latency {latency * 1000:.0f} ms, {total} requests per level")
+    try:
+        for concurrency in (1, 2, 4, 8, 16, 32):
+            rps = await _run_level(service, concurrency, total)
+            print(f"concurrency {concurrency:>3}: {rps:>8.1f} req/s")
+    finally:
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
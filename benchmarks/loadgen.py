@@ -0,0 +1,313 @@
+"""
+Load generator for ``/v1/chat/completions``.
+
+Drives a running bridge in streaming or non-streaming mode, either with a fixed
+number of concurrent clients (closed loop) or at a fixed arrival rate (open loop,
+Poisson arrivals). Reports RPS, latency percentiles, time-to-first-token and the
+CPU/RSS of the server processes given with ``--pid`` (children included).
+
+Usage:
+    python -m benchmarks.loadgen --api-key KEY --concurrency 32 --duration 30 --stream
+    python -m benchmarks.loadgen --api-key KEY --rate 50 --duration 30 --pid 1234 --output run.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ProcessSampler:
+    """Samples CPU time and RSS of a set of processes and their descendants from /proc"""
+
+    def __init__(self, pids: List[int]):
+        self.pids = pids
+        self.peak_rss_bytes = 0
+        self._rss_samples: List[int] = []
+        self._start_ticks = 0
+        self._start_time = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def tree(self) -> List[int]:
+        found, pending = [], list(self.pids)
+        while pending:
+            pid = pending.pop()
+            found.append(pid)
+            try:
+                with open(f"/proc/{pid}/task/{pid}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        return found
+
+    @staticmethod
+    def _cpu_ticks(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return int(fields[11]) + int(fields[12])  # utime + stime
+        except (OSError, IndexError, ValueError):
+            return 0
+
+    @staticmethod
+    def _rss_bytes(pid: int) -> int:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    def _total_ticks(self) -> int:
+        return sum(self._cpu_ticks(pid) for pid in self.tree())
+
+    async def _sample(self, interval: float):
+        while True:
+            rss = sum(self._rss_bytes(pid) for pid in self.tree())
+            self._rss_samples.append(rss)
+            self.peak_rss_bytes = max(self.peak_rss_bytes, rss)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = 0.5):
+        self._start_ticks = self._total_ticks()
+        self._start_time = time.perf_counter()
+        self._task = asyncio.ensure_future(self._sample(interval))
+
+    async def stop(self) -> Dict[str, Optional[float]]:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        elapsed = time.perf_counter() - self._start_time
+        cpu_seconds = (self._total_ticks() - self._start_ticks) / CLOCK_TICKS
+        return {
+            "processes": len(self.tree()),
+            "cpu_seconds": cpu_seconds,
+            "cpu_percent": 100.0 * cpu_seconds / elapsed if elapsed else None,
+            "rss_mean_bytes": sum(self._rss_samples) / len(self._rss_samples) if self._rss_samples else None,
+            "rss_peak_bytes": self.peak_rss_bytes,
+        }
+
+
+class LoadGenerator:
+    """Issues chat completion requests and records per-request timings"""
+
+    def __init__(self, url: str, api_key: str, model: str, prompt: str, max_tokens: int, stream: bool,
+                 temperature: float = 0.7, timeout: float = 300.0):
+        self.endpoint = url.rstrip("/") + "/v1/chat/completions"
+        self.headers = {"X-API-Key": api_key}
+        self.payload = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": stream,
+        }
+        self.stream = stream
+        self.timeout = timeout
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.errors = 0
+
+    def _record_status(self, status):
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+
+    async def request(self, client: httpx.AsyncClient):
+        started = time.perf_counter()
+        try:
+            if self.stream:
+                async with client.stream("POST", self.endpoint, json=self.payload, headers=self.headers) as response:
+                    first = None
+                    async for line in response.aiter_lines():
+                        if first is None and line.startswith("data:"):
+                            first = time.perf_counter() - started
+                    status = response.status_code
+                if first is not None and status == 200:
+                    self.ttfts.append(first)
+            else:
+                response = await client.post(self.endpoint, json=self.payload, headers=self.headers)
+                status = response.status_code
+        except httpx.HTTPError as e:
+            self.errors += 1
+            self._record_status(type(e).__name__)
+            return
+        self._record_status(status)
+        if status == 200:
+            self.latencies.append(time.perf_counter() - started)
+        else:
+            self.errors += 1
+
+    async def run_concurrency(self, client: httpx.AsyncClient, concurrency: int, duration: float,
+                              max_requests: Optional[int]):
+        deadline = time.perf_counter() + duration
+        issued = 0
+
+        async def worker():
+            nonlocal issued
+            while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+                issued += 1
+                await self.request(client)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    async def run_rate(self, client: httpx.AsyncClient, rate: float, duration: float,
+                       max_requests: Optional[int]):
+        deadline = time.perf_counter() + duration
+        pending = set()
+        issued = 0
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            task = asyncio.ensure_future(self.request(client))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            issued += 1
+            await asyncio.sleep(random.expovariate(rate))
+        if pending:
+            await asyncio.gather(*pending)
+
+    def summary(self, elapsed: float) -> Dict[str, object]:
+        def stats(values: List[float]) -> Dict[str, Optional[float]]:
+            return {
+                "mean": sum(values) / len(values) if values else None,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": max(values) if values else None,
+            }
+
+        completed = len(self.latencies)
+        return {
+            "requests": completed + self.errors,
+            "completed": completed,
+            "errors": self.errors,
+            "statuses": self.statuses,
+            "elapsed_seconds": elapsed,
+            "rps": completed / elapsed if elapsed else None,
+            "latency_seconds": stats(self.latencies),
+            "ttft_seconds": stats(self.ttfts) if self.stream else None,
+        }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(url: str, api_key: str, model: str, stream: bool, duration: float,
+                   concurrency: Optional[int] = None, rate: Optional[float] = None,
+                   max_requests: Optional[int] = None, prompt: str = "Write a short story about a lighthouse.",
+                   max_tokens: int = 256, pids: Optional[List[int]] = None) -> Dict[str, object]:
+    """
+    Run one load scenario and return its results
+    """
+    generator = LoadGenerator(url, api_key, model, prompt, max_tokens, stream)
+    sampler = ProcessSampler(pids or [])
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(timeout=generator.timeout, limits=limits) as client:
+        sampler.start()
+        started = time.perf_counter()
+        if rate:
+            await generator.run_rate(client, rate, duration, max_requests)
+        else:
+            await generator.run_concurrency(client, concurrency or 1, duration, max_requests)
+        elapsed = time.perf_counter() - started
+        resources = await sampler.stop()
+
+    result = {
+        "scenario": {
+            "mode": "stream" if stream else "non-stream",
+            "model": model,
+            "concurrency": None if rate else (concurrency or 1),
+            "rate": rate,
+            "duration": duration,
+            "max_tokens": max_tokens,
+        },
+        **generator.summary(elapsed),
+    }
+    if pids:
+        result["server"] = resources
+    return result
+
+
+def format_result(result: Dict[str, object]) -> str:
+    def ms(value):
+        return f"{value * 1000:.1f}ms" if value is not None else "-"
+
+    scenario, latency, ttft = result["scenario"], result["latency_seconds"], result["ttft_seconds"]
+    load = f"rate={scenario['rate']}/s" if scenario["rate"] else f"concurrency={scenario['concurrency']}"
+    line = (f"{scenario['mode']:>10} {load:<16} rps={result['rps']:.1f} errors={result['errors']} "
+            f"p50={ms(latency['p50'])} p95={ms(latency['p95'])} p99={ms(latency['p99'])}")
+    if ttft:
+        line += f" ttft_p50={ms(ttft['p50'])} ttft_p95={ms(ttft['p95'])}"
+    server = result.get("server")
+    if server:
+        line += f" cpu={server['cpu_percent']:.0f}% rss_peak={server['rss_peak_bytes'] / 2**20:.0f}MiB"
+    return line
+
+
+def write_results(path: str, results: List[Dict[str, object]], label: Optional[str] = None):
+    """
+    Save results with the git revision so runs from different commits can be compared
+    """
+    document = {
+        "label": label,
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--api-key", required=True)
+    parser.add_argument("--model", default="anthropic.claude-v2")
+    parser.add_argument("--stream", action="store_true")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=8, help="Closed loop: number of concurrent clients")
+    load.add_argument("--rate", type=float, help="Open loop: mean requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--prompt", default="Write a short story about a lighthouse.")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="Server process to sample (repeatable)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--label")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_load(
+        args.url, args.api_key, args.model, args.stream, args.duration,
+        concurrency=args.concurrency, rate=args.rate, max_requests=args.requests,
+        prompt=args.prompt, max_tokens=args.max_tokens, pids=args.pid,
+    ))
+    print(format_result(result))
+    if args.output:
+        write_results(args.output, [result], args.label)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+End-to-end benchmark suite.
+
+Starts the fake Bedrock runtime and the bridge (uvicorn, pointed at the fake via
+BEDROCK_ENDPOINT_URL), runs streaming and non-streaming load at several
+concurrency levels and writes all results to one JSON file.
+
+Usage:
+    python -m benchmarks.run_suite --output results.json
+    python -m benchmarks.run_suite --workers 4 --concurrency 16 64 --duration 20 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.loadgen import format_result, run_load, write_results
+
+API_KEY = "benchmark-key"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+
+def start_fake_bedrock(port: int, args) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_bedrock_server", "--port", str(port),
+        "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second),
+        "--completion-tokens", str(args.completion_tokens),
+        "--throttle-rate", str(args.throttle_rate), "--error-rate", str(args.error_rate),
+    ])
+
+
+def start_bridge(port: int, bedrock_port: int, workers: int, extra_env) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "API_KEYS": json.dumps([API_KEY]),
+        "BEDROCK_ENDPOINT_URL": f"http://127.0.0.1:{bedrock_port}",
+        "AWS_ACCESS_KEY_ID": env.get("AWS_ACCESS_KEY_ID", "benchmark"),
+        "AWS_SECRET_ACCESS_KEY": env.get("AWS_SECRET_ACCESS_KEY", "benchmark"),
+        "RATE_LIMIT_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    env.update(extra_env)
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ], env=env)
+
+
+async def run_matrix(url: str, pid: int, args):
+    results = []
+    for stream in (False, True):
+        for concurrency in args.concurrency:
+            result = await run_load(
+                url, API_KEY, args.model, stream, args.duration, concurrency=concurrency,
+                max_tokens=args.completion_tokens, pids=[pid],
+            )
+            print(format_result(result), flush=True)
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--model", default="anthropic.claude-v2")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--completion-tokens", type=int, default=100)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the bridge, e.g. RESPONSE_CACHE_ENABLED=true")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--label")
+    args = parser.parse_args()
+
+    bedrock_port, bridge_port = _free_port(), _free_port()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    fake = start_fake_bedrock(bedrock_port, args)
+    bridge = start_bridge(bridge_port, bedrock_port, args.workers, extra_env)
+    url = f"http://127.0.0.1:{bridge_port}"
+    try:
+        _wait_ready(f"http://127.0.0.1:{bedrock_port}/")
+        _wait_ready(f"{url}/health")
+        results = asyncio.run(run_matrix(url, bridge.pid, args))
+    finally:
+        for process in (bridge, fake):
+            process.terminate()
+            process.wait(timeout=30)
+
+    write_results(args.output, results, args.label)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Shared fixtures. Bedrock is replaced by the in-process fake from ``benchmarks``,
+so the suite needs neither AWS credentials nor network access.
+"""
+import os
+
+# Settings are read when app.core.config is first imported
+os.environ.setdefault("API_KEYS", '["test-key"]')
+os.environ.setdefault("TRACK_USAGE", "false")
+os.environ.setdefault("HEALTH_MONITOR_ENABLED", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.dependencies import get_bedrock_client
+from app.core.config import settings
+from app.main import app
+from app.services import (
+    admission, bedrock_client, coalescing, context, embeddings, near_cache, prompt_cache, rate_limiting,
+    resilience, response_cache, sessions,
+)
+from app.services.executor import shutdown_executor
+from benchmarks.fake_bedrock import FakeBedrockClient
+
+API_KEY = "test-key"
+HEADERS = {"X-API-Key": API_KEY}
+
+# Worker-wide singletons rebuilt from settings on first use
+SINGLETONS = (
+    (admission, "_controller"), (coalescing, "_coalescer"), (context, "_manager"), (embeddings, "_batcher"),
+    (embeddings, "_cache"), (near_cache, "_cache"), (prompt_cache, "_planner"), (rate_limiting, "_limiter"),
+    (resilience, "_resilience"), (response_cache, "_cache"), (sessions, "_store"),
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_services():
+    """
+    Start every test from fresh singletons, so settings it changes take effect
+    and no state (or event loop binding) leaks into the next test
+    """
+    for module, name in SINGLETONS:
+        setattr(module, name, None)
+    yield
+    shutdown_executor()
+    for module, name in SINGLETONS:
+        setattr(module, name, None)
+
+
+@pytest.fixture
+def fake_bedrock(monkeypatch):
+    """
+    Fake bedrock-runtime client answering instantly, installed as the shared client
+    """
+    fake = FakeBedrockClient(latency=0.0, token_interval=0.0)
+    monkeypatch.setattr(bedrock_client, "_client", fake)
+    return fake
+
+
+@pytest.fixture
+def client(fake_bedrock):
+    """
+    Test client for the application, backed by ``fake_bedrock``
+    """
+    app.dependency_overrides[get_bedrock_client] = lambda: fake_bedrock
+    try:
+        with TestClient(app) as test_client:
+            test_client.headers.update(HEADERS)
+            yield test_client
+    finally:
+        app.dependency_overrides.pop(get_bedrock_client, None)
+
+
+@pytest.fixture
+def configure(monkeypatch):
+    """
+    Override settings for one test: ``configure(RATE_LIMIT_ENABLED=True)``
+    """
+    def apply(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(settings, name, value)
+    return apply
@@ -0,0 +1,60 @@
+import pytest
+
+from app.models.chat import Message
+from app.services.adapters import (
+    LEADING_USER_TURN, ClaudeMessagesAdapter, ClaudeTextAdapter, InvalidConversation, LlamaAdapter, get_adapter,
+)
+
+MESSAGES_MODEL = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+
+def _messages(*pairs):
+    return [Message(role=role, content=content) for role, content in pairs]
+
+
+def _body(*pairs):
+    return ClaudeMessagesAdapter().create_body(MESSAGES_MODEL, _messages(*pairs), 100, 0.5)
+
+
+def test_messages_body_alternates_turns():
+    body = _body(("system", "Be brief."), ("user", "Hi"), ("user", "Anyone there?"), ("assistant", "Yes"))
+    assert body["system"] == "Be brief."
+    assert body["messages"] == [{"role": "user", "content": "Hi\n\nAnyone there?"},
+                                {"role": "assistant", "content": "Yes"}]
+    assert body["max_tokens"] == 100 and body["temperature"] == 0.5
+
+
+def test_assistant_first_conversation_gets_a_leading_user_turn():
+    body = _body(("system", "Be brief."), ("assistant", "How can I help?"), ("user", "Hi"))
+    assert [turn["role"] for turn in body["messages"]] == ["user", "assistant", "user"]
+    assert body["messages"][0]["content"] == LEADING_USER_TURN
+
+
+def test_system_only_conversation_is_rejected():
+    with pytest.raises(InvalidConversation):
+        _body(("system", "Be brief."))
+
+
+def test_adapter_lookup():
+    assert isinstance(get_adapter("anthropic.claude-v2:1"), ClaudeTextAdapter)
+    assert isinstance(get_adapter("anthropic.claude-instant-v1"), ClaudeTextAdapter)
+    assert isinstance(get_adapter(MESSAGES_MODEL), ClaudeMessagesAdapter)
+    assert isinstance(get_adapter("meta.llama3-8b-instruct-v1:0"), LlamaAdapter)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_endpoint_returns_400_for_a_system_only_request(client, fake_bedrock, stream):
+    response = client.post("/v1/chat/completions", json={
+        "model": MESSAGES_MODEL, "stream": stream, "messages": [{"role": "system", "content": "Be brief."}],
+    })
+    assert response.status_code == 400
+    assert fake_bedrock.calls == 0
+
+
+def test_endpoint_accepts_an_assistant_first_conversation(client, fake_bedrock):
+    response = client.post("/v1/chat/completions", json={
+        "model": MESSAGES_MODEL,
+        "messages": [{"role": "assistant", "content": "How can I help?"}, {"role": "user", "content": "Hi"}],
+    })
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"] == fake_bedrock.completion
@@ -0,0 +1,179 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from app.services.admission import AdaptiveLimit, AdmissionController, AdmissionRejected, get_admission_controller
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+
+
+def _controller(limit=1, max_queue=1, queue_timeout=1.0, **overrides):
+    options = dict(enabled=True, initial_limit=limit, min_limit=1, max_limit=8, max_queue=max_queue,
+                   queue_timeout=queue_timeout, latency_tolerance=2.0, backoff=0.5)
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+def _throttle():
+    return ClientError({"Error": {"Code": "ThrottlingException", "Message": "slow down"},
+                        "ResponseMetadata": {"HTTPStatusCode": 429}}, "InvokeModel")
+
+
+def test_disabled_controller_admits_everything():
+    async def run():
+        controller = _controller(enabled=False, limit=1, max_queue=0)
+        async with controller.slot(MODEL_ID):
+            async with controller.slot(MODEL_ID):
+                pass
+        assert controller.stats() == {}
+
+    asyncio.run(run())
+
+
+def test_over_limit_waits_for_a_slot():
+    async def run():
+        controller = _controller(limit=1, max_queue=4)
+        order = []
+
+        async def call(name, hold):
+            async with controller.slot(MODEL_ID):
+                order.append(name)
+                await asyncio.sleep(hold)
+
+        first = asyncio.ensure_future(call("first", 0.05))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(call("second", 0))
+        await asyncio.sleep(0.01)
+        assert controller.model(MODEL_ID).queued == 1
+        await asyncio.gather(first, second)
+        assert order == ["first", "second"]
+        assert controller.model(MODEL_ID).in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def run():
+        controller = _controller(limit=1, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(MODEL_ID):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hold()) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot(MODEL_ID):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value
+
+    rejected = asyncio.run(run())
+    assert rejected.reason == "queue_full"
+    assert rejected.status_code == 503
+    assert int(rejected.headers()["Retry-After"]) >= 1
+
+
+def test_queue_timeout_rejects_waiter():
+    async def run():
+        controller = _controller(limit=1, max_queue=4, queue_timeout=0.02)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(MODEL_ID):
+                await release.wait()
+
+        task = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot(MODEL_ID):
+                pass
+        assert controller.model(MODEL_ID).queued == 0
+        release.set()
+        await task
+        return rejected.value
+
+    assert asyncio.run(run()).reason == "queue_timeout"
+
+
+def test_higher_priority_waiter_is_served_first_and_preempts():
+    async def run():
+        controller = _controller(limit=1, max_queue=1)
+        release = asyncio.Event()
+        served = []
+
+        async def call(name, priority):
+            async with controller.slot(MODEL_ID, priority):
+                served.append(name)
+                await release.wait()
+
+        holder = asyncio.ensure_future(call("holder", 0))
+        await asyncio.sleep(0)
+        low = asyncio.ensure_future(call("low", 0))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(call("high", 5))
+        await asyncio.sleep(0.01)
+        release.set()
+        results = await asyncio.gather(holder, low, high, return_exceptions=True)
+        return served, results
+
+    served, results = asyncio.run(run())
+    assert served == ["holder", "high"]
+    assert isinstance(results[1], AdmissionRejected) and results[1].reason == "preempted"
+
+
+def test_throttle_cuts_limit_and_sheds_with_429():
+    async def run():
+        controller = _controller(limit=4, max_queue=0)
+        with pytest.raises(ClientError):
+            async with controller.slot(MODEL_ID):
+                raise _throttle()
+        admission = controller.model(MODEL_ID)
+        assert admission.limit.limit == 2
+
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.slot(MODEL_ID):
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(hold()) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            async with controller.slot(MODEL_ID):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return rejected.value
+
+    assert asyncio.run(run()).status_code == 429
+
+
+def test_limit_grows_while_fully_used():
+    limit = AdaptiveLimit(initial=2, min_limit=1, max_limit=4)
+    for _ in range(20):
+        limit.on_success(0.1, in_flight=int(limit.limit) - 1)
+    assert limit.limit == 4
+
+
+def test_limit_shrinks_when_latency_inflates():
+    limit = AdaptiveLimit(initial=8, min_limit=1, max_limit=8, latency_tolerance=2.0)
+    for _ in range(50):
+        limit.on_success(0.1, in_flight=0)
+    for _ in range(10):
+        limit.on_success(1.0, in_flight=0)
+    assert limit.limit < 8
+
+
+def test_overloaded_endpoint_returns_503(client, configure):
+    configure(ADMISSION_CONTROL_ENABLED=True, ADMISSION_INITIAL_LIMIT=1, ADMISSION_MAX_QUEUE=0)
+    get_admission_controller().model(MODEL_ID).in_flight = 1  # Slot taken by another request
+    response = client.post("/v1/chat/completions", json={
+        "model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}],
+    })
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
+
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import pytest
+
+from app.batch_job import BatchJob, Checkpoint, parse_line
+
+MODEL_ID = "anthropic.claude-v2"
+
+
+def _write_input(path, count):
+    lines = []
+    for i in range(count):
+        if i % 3 == 0:
+            lines.append({"custom_id": f"item-{i}", "body": {"messages": [{"role": "user", "content": f"q{i}"}]}})
+        elif i % 3 == 1:
+            lines.append({"model": MODEL_ID, "messages": [{"role": "user", "content": f"q{i}"}]})
+        else:
+            lines.append({"request_id": f"item-{i}", "title": "Title", "body": f"q{i}"})
+    path.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+
+def _job(tmp_path, concurrency=4, checkpoint_every=1):
+    return BatchJob(str(tmp_path / "in.jsonl"), str(tmp_path / "out.jsonl"), concurrency=concurrency, window=8,
+                    checkpoint_every=checkpoint_every, default_model=MODEL_ID)
+
+
+def _results(tmp_path):
+    return [json.loads(line) for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+
+
+def test_parse_line_formats():
+    assert parse_line(b'{"custom_id": "a", "body": {"messages": []}}', 0, MODEL_ID)[0] == "a"
+    custom_id, request = parse_line(b'{"messages": [{"role": "user", "content": "hi"}]}', 7, MODEL_ID)
+    assert custom_id == "line-7" and request.model == MODEL_ID and not request.stream
+    custom_id, request = parse_line(b'{"request_id": "r1", "title": "T", "body": "B"}', 0, MODEL_ID)
+    assert custom_id == "r1" and request.messages[0].content == "T\n\nB"
+    with pytest.raises(ValueError):
+        parse_line(b'{"neither": true}', 0, MODEL_ID)
+
+
+def test_job_writes_every_line_and_checkpoints(tmp_path, fake_bedrock):
+    _write_input(tmp_path / "in.jsonl", 9)
+    with open(tmp_path / "in.jsonl", "a") as f:
+        f.write("\nnot json\n")
+    job = _job(tmp_path)
+    asyncio.run(job.run())
+
+    results = _results(tmp_path)
+    assert sorted(result["line"] for result in results) == [0, 1, 2, 3, 4, 5, 6, 7, 8, 10]
+    assert job.succeeded == 9 and job.failed == 1
+    assert next(r for r in results if r["line"] == 10)["error"]["status_code"] == 400
+    assert next(r for r in results if r["line"] == 0)["custom_id"] == "item-0"
+    assert fake_bedrock.calls == 9
+
+    checkpoint = Checkpoint.load(str(tmp_path / "out.jsonl.checkpoint"), str(tmp_path / "in.jsonl"))
+    assert checkpoint.watermark == 11
+    assert checkpoint.done_above == set()
+    assert checkpoint.output_bytes == (tmp_path / "out.jsonl").stat().st_size
+
+
+def test_resume_skips_done_lines_and_drops_unsaved_results(tmp_path, fake_bedrock):
+    _write_input(tmp_path / "in.jsonl", 5)
+    done = [{"custom_id": f"item-{line}", "line": line, "response": {}} for line in (0, 1, 3)]
+    saved = "".join(json.dumps(result) + "\n" for result in done)
+    # A result written after the last checkpoint, cut short by the crash
+    (tmp_path / "out.jsonl").write_text(saved + '{"custom_id": "item-2", "li')
+    offsets = [0]
+    for line in (tmp_path / "in.jsonl").read_bytes().splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    checkpoint = Checkpoint(str(tmp_path / "out.jsonl.checkpoint"), str((tmp_path / "in.jsonl").resolve()))
+    checkpoint.watermark, checkpoint.watermark_offset = 2, offsets[2]
+    checkpoint.done_above = {3}
+    checkpoint.output_bytes = len(saved)
+    checkpoint.save()
+
+    asyncio.run(_job(tmp_path).run())
+
+    results = _results(tmp_path)
+    assert sorted(result["line"] for result in results) == [0, 1, 2, 3, 4]
+    assert fake_bedrock.calls == 2
+
+
+def test_interrupted_job_resumes_without_duplicates(tmp_path, fake_bedrock):
+    fake_bedrock.latency = 0.005
+    _write_input(tmp_path / "in.jsonl", 30)
+
+    async def interrupt():
+        job = _job(tmp_path, concurrency=2, checkpoint_every=3)
+        task = asyncio.ensure_future(job.run())
+        while job.succeeded < 10:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(interrupt())
+    interrupted = len(_results(tmp_path))
+    assert 0 < interrupted < 30
+
+    asyncio.run(_job(tmp_path).run())
+    lines = [result["line"] for result in _results(tmp_path)]
+    assert sorted(lines) == list(range(30))
+
+
+def test_new_job_appends_to_existing_output(tmp_path, fake_bedrock):
+    _write_input(tmp_path / "in.jsonl", 2)
+    (tmp_path / "out.jsonl").write_text('{"earlier": "result"}\n')
+    asyncio.run(_job(tmp_path).run())
+    results = _results(tmp_path)
+    assert results[0] == {"earlier": "result"}
+    assert len(results) == 3
+
+
+def test_checkpoint_of_another_input_is_refused(tmp_path, fake_bedrock):
+    _write_input(tmp_path / "in.jsonl", 1)
+    Checkpoint(str(tmp_path / "out.jsonl.checkpoint"), "/elsewhere/in.jsonl").save()
+    with pytest.raises(SystemExit):
+        _job(tmp_path)
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.coalescing import RequestCoalescer
+
+MODEL_ID = "anthropic.claude-v2"
+BODY = {"model": MODEL_ID, "temperature": 0.0, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def test_identical_calls_share_one_upstream_call():
+    calls = []
+
+    async def upstream():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "result"
+
+    async def run():
+        coalescer = RequestCoalescer()
+        results = await asyncio.gather(*(coalescer.do("key", upstream) for _ in range(5)),
+                                       coalescer.do("other", upstream))
+        return results, coalescer.coalesced
+
+    results, coalesced = asyncio.run(run())
+    assert results == ["result"] * 6
+    assert len(calls) == 2 and coalesced == 4
+
+
+def test_errors_reach_every_waiter():
+    async def upstream():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    async def run():
+        coalescer = RequestCoalescer()
+        return await asyncio.gather(*(coalescer.do("key", upstream) for _ in range(3)), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(run())] == ["upstream failed"] * 3
+
+
+def test_leader_leaving_does_not_cancel_the_call_for_followers():
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def run():
+        coalescer = RequestCoalescer()
+        leader = asyncio.ensure_future(coalescer.do("key", upstream))
+        follower = asyncio.ensure_future(coalescer.do("key", upstream))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == "result"
+
+
+def test_streams_are_shared_and_replayed_to_late_subscribers():
+    started = []
+
+    async def upstream(state):
+        started.append(1)
+        state["finish_reason"] = "stop"
+        for word in ("a", "b", "c"):
+            await asyncio.sleep(0.005)
+            yield word
+
+    async def read(subscription):
+        try:
+            return [text async for text in subscription]
+        finally:
+            await subscription.aclose()
+
+    async def run():
+        coalescer = RequestCoalescer()
+        first, state = coalescer.stream("key", upstream)
+        first_read = asyncio.ensure_future(read(first))
+        await asyncio.sleep(0.007)
+        second, shared_state = coalescer.stream("key", upstream)
+        return await asyncio.gather(first_read, read(second)), state is shared_state
+
+    (first, second), shared_state = asyncio.run(run())
+    assert first == second == ["a", "b", "c"]
+    assert shared_state and len(started) == 1
+
+
+def test_stream_stops_only_when_the_last_subscriber_leaves():
+    closed = threading.Event()
+
+    async def upstream(state):
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.set()
+
+    async def run():
+        coalescer = RequestCoalescer()
+        owner, _ = coalescer.stream("key", upstream)
+        follower, _ = coalescer.stream("key", upstream)
+        await owner.__anext__()
+        # The follower has not read anything yet, but keeps the stream alive
+        await owner.aclose()
+        await asyncio.sleep(0.01)
+        assert not closed.is_set()
+        assert await follower.__anext__() == "x"
+        await follower.aclose()
+        await asyncio.sleep(0.01)
+        return closed.is_set()
+
+    assert asyncio.run(run())
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_endpoint_coalesces_identical_concurrent_requests(client, fake_bedrock, configure, stream):
+    configure(REQUEST_COALESCING_ENABLED=True)
+    fake_bedrock.latency = 0.1
+
+    headers = {"X-API-Key": client.headers["X-API-Key"]}
+
+    async def send_all():
+        # Concurrent requests on the test client's event loop
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=headers) as http:
+            return await asyncio.gather(*(http.post("/v1/chat/completions", json={**BODY, "stream": stream})
+                                          for _ in range(3)))
+
+    responses = client.portal.call(send_all)
+    assert [response.status_code for response in responses] == [200] * 3
+    if stream:
+        assert all(response.content.endswith(b"data: [DONE]\n\n") for response in responses)
+    else:
+        assert {response.json()["choices"][0]["message"]["content"] for response in responses} == {
+            fake_bedrock.completion}
+    assert fake_bedrock.calls == 1
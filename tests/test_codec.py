@@ -0,0 +1,153 @@
+"""
+Wire compatibility of the hand-rolled encoders and the fast codec with the
+pydantic models they stand in for
+"""
+import asyncio
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.models.chat import (
+    ChatCompletionChoice, ChatCompletionChunk, ChatCompletionChunkChoice, ChatCompletionChunkDelta,
+    ChatCompletionRequest, ChatCompletionResponse, ChatCompletionUsage, Message, PromptTokensDetails,
+)
+from app.models.compact import CodecError, decode_chat_request, encode_chat_completion
+from app.services.sse import DONE, ChunkEncoder, coalesce_deltas, encode_error
+
+MODEL_ID = "anthropic.claude-v2"
+TEXTS = ["Hello", " wörld", ' "quoted"\n', "\\ back\tslash", "emoji 🙂", "</script>", " "]
+
+
+def _chunk(text=None, finish_reason=None) -> bytes:
+    chunk = ChatCompletionChunk(id="chunk-1", created=1700000000, model=MODEL_ID, choices=[
+        ChatCompletionChunkChoice(index=0, delta=ChatCompletionChunkDelta(content=text), finish_reason=finish_reason),
+    ])
+    return f"data: {chunk.model_dump_json(exclude_none=True)}\n\n".encode("utf-8")
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_delta_frames_match_pydantic(text):
+    encoder = ChunkEncoder(MODEL_ID, chunk_id="chunk-1", created=1700000000)
+    assert encoder.delta(text) == _chunk(text)
+
+
+@pytest.mark.parametrize("reason", ["stop", "length"])
+def test_finish_frame_matches_pydantic(reason):
+    encoder = ChunkEncoder(MODEL_ID, chunk_id="chunk-1", created=1700000000)
+    assert encoder.finish(reason) == _chunk(finish_reason=reason)
+
+
+def test_error_frame_is_json():
+    frame = encode_error('bad "thing"')
+    assert frame.startswith(b"data: ") and frame.endswith(b"\n\n")
+    assert json.loads(frame[6:]) == {"error": {"message": 'bad "thing"', "type": "server_error"}}
+
+
+@pytest.mark.parametrize("usage", [
+    {"prompt_tokens": 3, "completion_tokens": 4, "total_tokens": 7},
+    {"prompt_tokens": 3, "completion_tokens": 4, "total_tokens": 7, "cached_tokens": 2, "cache_write_tokens": 0},
+])
+def test_completion_body_matches_pydantic(usage):
+    body = json.loads(encode_chat_completion(MODEL_ID, TEXTS[2], usage, "length"))
+    details = None
+    if "cached_tokens" in usage:
+        details = PromptTokensDetails(cached_tokens=usage["cached_tokens"],
+                                      cache_write_tokens=usage["cache_write_tokens"])
+    expected = ChatCompletionResponse(
+        id=body["id"], created=body["created"], model=MODEL_ID,
+        choices=[ChatCompletionChoice(index=0, message=Message(role="assistant", content=TEXTS[2]),
+                                      finish_reason="length")],
+        usage=ChatCompletionUsage(prompt_tokens=3, completion_tokens=4, total_tokens=7,
+                                  prompt_tokens_details=details),
+    )
+    assert body == json.loads(expected.model_dump_json())
+
+
+def test_usage_details_are_only_sent_when_reported(client, fake_bedrock):
+    usage = ChatCompletionUsage(prompt_tokens=3, completion_tokens=4, total_tokens=7)
+    assert "prompt_tokens_details" not in json.loads(usage.model_dump_json())
+    assert "prompt_tokens_details" not in usage.model_dump()
+    usage.prompt_tokens_details = PromptTokensDetails(cached_tokens=2)
+    assert json.loads(usage.model_dump_json())["prompt_tokens_details"]["cached_tokens"] == 2
+
+    request = {"model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}]}
+    fast = client.post("/v1/chat/completions", json=request).json()
+    batch = client.post("/v1/batch/chat/completions", json={"requests": [request]}).json()
+    session_id = client.post("/v1/sessions", json={"model": MODEL_ID, "messages": []}).json()["id"]
+    turn = client.post(f"/v1/sessions/{session_id}/messages", json={"messages": request["messages"]}).json()
+    for response in (fast, batch["data"][0]["response"], turn):
+        assert set(response["usage"]) == {"prompt_tokens", "completion_tokens", "total_tokens"}
+
+
+def test_decode_accepts_what_pydantic_accepts():
+    raw = {"model": MODEL_ID, "messages": [{"role": "system", "content": "Be brief."},
+                                           {"role": "user", "content": TEXTS[1]}],
+           "max_tokens": 10, "temperature": 0.5, "stream": True, "user_id": "alice"}
+    compact = decode_chat_request(json.dumps(raw).encode("utf-8"))
+    model = ChatCompletionRequest(**raw)
+    for field in ("model", "max_tokens", "temperature", "stream", "user_id"):
+        assert getattr(compact, field) == getattr(model, field)
+    assert [(m.role, m.content) for m in compact.messages] == [(m.role, m.content) for m in model.messages]
+
+
+@pytest.mark.parametrize("raw, loc", [
+    ({"messages": []}, ["body", "model"]),
+    ({"model": MODEL_ID}, ["body", "messages"]),
+    ({"model": MODEL_ID, "messages": [{"role": "robot", "content": "x"}]}, ["body", "messages", 0, "role"]),
+    ({"model": MODEL_ID, "messages": [{"role": "user", "content": 1}]}, ["body", "messages", 0, "content"]),
+    ({"model": MODEL_ID, "messages": [], "temperature": 2}, ["body", "temperature"]),
+    ({"model": MODEL_ID, "messages": [], "max_tokens": "many"}, ["body", "max_tokens"]),
+])
+def test_decode_rejects_what_pydantic_rejects(raw, loc):
+    with pytest.raises(ValidationError):
+        ChatCompletionRequest(**raw)
+    with pytest.raises(CodecError) as rejected:
+        decode_chat_request(json.dumps(raw).encode("utf-8"))
+    assert rejected.value.status_code == 422
+    assert rejected.value.detail[0]["loc"] == loc
+
+
+def test_decode_rejects_invalid_json():
+    with pytest.raises(CodecError) as rejected:
+        decode_chat_request(b"{not json")
+    assert rejected.value.detail[0]["type"] == "json_invalid"
+
+
+async def _deltas(items, gap):
+    for item in items:
+        yield item
+        await asyncio.sleep(gap)
+
+
+def test_coalesce_passes_through_without_interval():
+    async def run():
+        return [text async for text in coalesce_deltas(_deltas(TEXTS, 0), 0, 256)]
+
+    assert asyncio.run(run()) == TEXTS
+
+
+def test_coalesce_merges_deltas_but_not_the_first():
+    async def run():
+        return [text async for text in coalesce_deltas(_deltas(["a"] * 20, 0.001), 10.0, 5)]
+
+    frames = asyncio.run(run())
+    assert frames[0] == "a"
+    assert "".join(frames) == "a" * 20
+    assert len(frames) < 20
+    assert all(len(frame) <= 5 for frame in frames)
+
+
+def test_streamed_endpoint_frames(client, fake_bedrock):
+    fake_bedrock.completion = "Hello there, friend."
+    response = client.post("/v1/chat/completions", json={
+        "model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}], "stream": True,
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.content.split(b"\n\n")
+    assert frames[-1] == b"" and frames[-2] + b"\n\n" == DONE
+    chunks = [ChatCompletionChunk.model_validate_json(frame[len(b"data: "):]) for frame in frames[:-2]]
+    assert "".join(chunk.choices[0].delta.content or "" for chunk in chunks) == fake_bedrock.completion
+    assert chunks[-1].choices[0].finish_reason == "stop"
+    assert len({chunk.id for chunk in chunks}) == 1
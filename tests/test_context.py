@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.models.chat import Message
+from app.services.context import SUMMARY_HEADER, ContextManager, context_window, prompt_budget
+from app.services.tokenizer import message_tokens
+
+MODEL_ID = "anthropic.claude-v2"
+
+
+def _conversation(turns, words=50):
+    messages = [Message(role="system", content="You are a helpful assistant.")]
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append(Message(role=role, content=f"turn {i} " + "word " * words))
+    return messages
+
+
+def _fit(manager, messages, max_prompt_tokens, summarize=None):
+    manager.max_prompt_tokens = max_prompt_tokens
+    return asyncio.run(manager.fit(MODEL_ID, messages, 100, summarize))
+
+
+def _tokens(messages):
+    return sum(message_tokens(msg) for msg in messages)
+
+
+def test_context_windows_and_budget(configure):
+    assert context_window("anthropic.claude-v2:1") == 200000
+    assert context_window("anthropic.claude-v2") == 100000
+    assert context_window("unknown.model") == 8192
+    configure(MODEL_CONTEXT_WINDOWS={"unknown": 1000})
+    assert context_window("unknown.model") == 1000
+    assert prompt_budget("unknown.model", 100) == 850
+    assert prompt_budget("unknown.model", 100, max_prompt_tokens=500) == 500
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        ContextManager("truncate_everything")
+
+
+@pytest.mark.parametrize("strategy", ["none", "sliding_window", "keep_ends", "summarize"])
+def test_conversations_that_fit_are_untouched(strategy):
+    messages = _conversation(4)
+    fitted, saved = _fit(ContextManager(strategy), messages, 0)
+    assert fitted is messages and saved == 0
+
+
+def test_sliding_window_keeps_system_and_recent_turns():
+    messages = _conversation(20)
+    fitted, saved = _fit(ContextManager("sliding_window"), messages, 400)
+    assert fitted[0] is messages[0]
+    assert fitted[-1] is messages[-1]
+    assert fitted[1].role == "user"
+    assert _tokens(fitted) <= 400
+    assert saved == _tokens(messages) - _tokens(fitted)
+    # The kept turns are the most recent ones, in order
+    turns = fitted[1:]
+    assert turns == messages[len(messages) - len(turns):]
+
+
+def test_keep_ends_keeps_opening_and_latest_turns():
+    messages = _conversation(20)
+    fitted, _ = _fit(ContextManager("keep_ends", keep_first=1, keep_last=4), messages, 400)
+    assert fitted[0] is messages[0]
+    assert fitted[1] is messages[1]
+    assert fitted[-1] is messages[-1]
+    assert len(fitted) <= 1 + 1 + 4
+    assert _tokens(fitted) <= 400
+
+
+def test_summarize_replaces_the_middle_and_reuses_summaries():
+    prompts = []
+
+    async def summarize(prompt):
+        prompts.append(prompt)
+        return f"summary {len(prompts)}"
+
+    manager = ContextManager("summarize", keep_first=1, keep_last=4)
+    messages = _conversation(20)
+    fitted, saved = _fit(manager, messages, 600, summarize)
+    assert saved > 0
+    assert len(prompts) == 1
+    assert fitted[0].role == "system" and f"{SUMMARY_HEADER}\nsummary 1" in fitted[0].content
+    assert fitted[-1] is messages[-1]
+
+    # The same conversation is summarized from the cache
+    again, _ = _fit(manager, messages, 600, summarize)
+    assert len(prompts) == 1
+    assert [m.content for m in again] == [m.content for m in fitted]
+
+    # A longer conversation extends the cached summary instead of starting over
+    _fit(manager, _conversation(30), 600, summarize)
+    assert len(prompts) == 2
+    assert "summary 1" in prompts[1][-1].content
+
+
+def test_summary_failure_falls_back_to_dropping_turns():
+    async def summarize(prompt):
+        raise RuntimeError("summary model unavailable")
+
+    messages = _conversation(20)
+    fitted, saved = _fit(ContextManager("summarize"), messages, 400, summarize)
+    assert saved > 0
+    assert not any(SUMMARY_HEADER in msg.content for msg in fitted)
+    assert fitted[-1] is messages[-1]
+
+
+def test_completion_endpoint_trims_long_conversations(client, fake_bedrock, configure):
+    configure(CONTEXT_STRATEGY="sliding_window", CONTEXT_MAX_PROMPT_TOKENS=300)
+    messages = [{"role": m.role, "content": m.content} for m in _conversation(21)]
+    response = client.post("/v1/chat/completions", json={"model": MODEL_ID, "messages": messages,
+                                                         "max_tokens": 50})
+    assert response.status_code == 200
+    assert int(response.headers["X-Context-Tokens-Saved"]) > 0
@@ -0,0 +1,129 @@
+import asyncio
+import base64
+
+import httpx
+import pytest
+
+from app.main import app
+from app.services.embeddings import EmbeddingBatcher, from_float32, to_float32
+from benchmarks.fake_bedrock import fake_embedding
+
+COHERE = "cohere.embed-english-v3"
+TITAN = "amazon.titan-embed-text-v2:0"
+
+
+def _runner(calls, fail=False):
+    async def run(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.001)
+        if fail:
+            raise RuntimeError("upstream failed")
+        return [(text.encode("utf-8"), 1) for text in texts]
+    return run
+
+
+def _embed(batcher, texts, run, model_id=COHERE):
+    return batcher.embed(model_id, None, None, {text: text for text in texts}, run)
+
+
+def test_float32_round_trip():
+    assert list(from_float32(to_float32([0.5, -1.0, 2.25]))) == [0.5, -1.0, 2.25]
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    async def run():
+        batcher = EmbeddingBatcher(window=0.01, max_batch=96)
+        return await asyncio.gather(*(_embed(batcher, [f"a{i}", f"b{i}"], _runner(calls)) for i in range(3)))
+
+    results = asyncio.run(run())
+    assert calls == [["a0", "b0", "a1", "b1", "a2", "b2"]]
+    assert results[1] == {"a1": (b"a1", 1), "b1": (b"b1", 1)}
+
+
+def test_full_batches_are_sent_right_away():
+    calls = []
+
+    async def run():
+        batcher = EmbeddingBatcher(window=10.0, max_batch=2)
+        await asyncio.wait_for(_embed(batcher, ["a", "b", "c", "d"], _runner(calls)), 1.0)
+
+    asyncio.run(run())
+    assert calls == [["a", "b"], ["c", "d"]]
+
+
+def test_single_text_models_and_no_window_are_not_batched():
+    calls = []
+
+    async def run():
+        batcher = EmbeddingBatcher(window=10.0, max_batch=96)
+        await asyncio.wait_for(asyncio.gather(_embed(batcher, ["a"], _runner(calls), TITAN),
+                                              _embed(batcher, ["b"], _runner(calls), TITAN)), 1.0)
+        unbatched = EmbeddingBatcher(window=0.0, max_batch=96)
+        await asyncio.gather(_embed(unbatched, ["c", "d"], _runner(calls)), _embed(unbatched, ["e"], _runner(calls)))
+
+    asyncio.run(run())
+    assert calls == [["a"], ["b"], ["c", "d"], ["e"]]
+
+
+def test_texts_in_flight_are_shared_and_billed_once():
+    calls = []
+
+    async def run():
+        batcher = EmbeddingBatcher(window=0.01, max_batch=96)
+        return await asyncio.gather(_embed(batcher, ["a", "b"], _runner(calls)), _embed(batcher, ["b"], _runner(calls)))
+
+    first, second = asyncio.run(run())
+    assert calls == [["a", "b"]]
+    assert first["b"] == (b"b", 1) and second["b"] == (b"b", 0)
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        batcher = EmbeddingBatcher(window=0.01, max_batch=96)
+        results = await asyncio.gather(_embed(batcher, ["a"], _runner([], fail=True)),
+                                       _embed(batcher, ["b"], _runner([], fail=True)), return_exceptions=True)
+        return results, batcher._in_flight
+
+    results, in_flight = asyncio.run(run())
+    assert [str(result) for result in results] == ["upstream failed"] * 2
+    assert in_flight == {}
+
+
+def test_endpoint_embeds_and_caches(client, fake_bedrock):
+    response = client.post("/v1/embeddings", json={"model": TITAN, "input": ["hello", "world"], "dimensions": 256})
+    assert response.status_code == 200
+    assert response.headers["X-Cache"] == "MISS"
+    data = response.json()["data"]
+    assert [item["index"] for item in data] == [0, 1]
+    assert data[0]["embedding"] == pytest.approx(fake_embedding("hello", 256), abs=1e-6)
+    assert fake_bedrock.calls == 2
+
+    response = client.post("/v1/embeddings", json={
+        "model": TITAN, "input": "world", "dimensions": 256, "encoding_format": "base64"})
+    assert response.headers["X-Cache"] == "HIT"
+    vector = from_float32(base64.b64decode(response.json()["data"][0]["embedding"]))
+    assert list(vector) == pytest.approx(fake_embedding("world", 256), abs=1e-6)
+    assert fake_bedrock.calls == 2
+
+
+def test_endpoint_batches_concurrent_requests(client, fake_bedrock, configure):
+    configure(EMBEDDING_BATCH_WINDOW_MS=20.0)
+
+    async def embed_concurrently():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test",
+                                     headers={"X-API-Key": client.headers["X-API-Key"]}) as http:
+            return await asyncio.gather(*(
+                http.post("/v1/embeddings", json={"model": COHERE, "input": [f"text {i}", "shared"]})
+                for i in range(4)))
+
+    responses = client.portal.call(embed_concurrently)
+    assert [response.status_code for response in responses] == [200] * 4
+    assert fake_bedrock.calls == 1
+
+
+@pytest.mark.parametrize("model, texts, status", [("anthropic.claude-v2", ["a"], 400), (TITAN, ["a", "b", "c"], 413)])
+def test_endpoint_rejects_bad_requests(client, configure, model, texts, status):
+    configure(EMBEDDING_MAX_INPUTS=2)
+    assert client.post("/v1/embeddings", json={"model": model, "input": texts}).status_code == status
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import pytest
+
+from app.services import health
+from app.services.health import HealthMonitor
+from benchmarks.fake_bedrock import FakeBedrockClient
+
+MODEL_ID = "anthropic.claude-v2"
+REGIONS = ("us-east-1", "us-west-2")
+
+
+def _monitor(clients, **overrides):
+    options = dict(interval=30.0, timeout=1.0, failure_threshold=2)
+    options.update(overrides)
+    return HealthMonitor([(region, MODEL_ID) for region in clients], clients.__getitem__, **options)
+
+
+def _clients():
+    return {region: FakeBedrockClient(latency=0.0) for region in REGIONS}
+
+
+def _statuses(monitor):
+    return {target["region"]: target["status"] for target in json.loads(monitor.snapshot())["targets"]}
+
+
+def test_ready_after_the_first_round():
+    monitor = _monitor(_clients())
+    assert not monitor.ready
+    assert json.loads(monitor.snapshot())["status"] == "unknown"
+    asyncio.run(monitor.probe_all())
+    assert monitor.ready
+    assert _statuses(monitor) == {"us-east-1": "healthy", "us-west-2": "healthy"}
+
+
+def test_validation_errors_and_throttles_count_as_reachable():
+    clients = _clients()
+    clients["us-east-1"].fail_next(1, "ValidationException", 400)
+    clients["us-west-2"].fail_next(1, "ThrottlingException", 429)
+    monitor = _monitor(clients)
+    asyncio.run(monitor.probe_all())
+    assert _statuses(monitor) == {"us-east-1": "healthy", "us-west-2": "throttled"}
+    assert monitor.ready
+
+
+def test_unready_only_while_every_target_keeps_failing():
+    clients = _clients()
+    clients["us-east-1"].fail_next(4, "AccessDeniedException", 403)
+    monitor = _monitor(clients)
+    for _ in range(2):
+        asyncio.run(monitor.probe_all())
+    assert _statuses(monitor) == {"us-east-1": "unhealthy", "us-west-2": "healthy"}
+    assert monitor.ready
+
+    clients["us-west-2"].fail_next(2)
+    for _ in range(2):
+        asyncio.run(monitor.probe_all())
+    snapshot = json.loads(monitor.snapshot())
+    assert not monitor.ready
+    assert snapshot["status"] == "disconnected"
+    assert snapshot["targets"][0]["last_error"].startswith("AccessDeniedException")
+
+    asyncio.run(monitor.probe_all())
+    assert monitor.ready
+
+
+def test_slow_probes_time_out():
+    monitor = _monitor({"us-east-1": FakeBedrockClient(latency=0.5)}, timeout=0.05, failure_threshold=1)
+    asyncio.run(monitor.probe_all())
+    assert _statuses(monitor) == {"us-east-1": "unhealthy"}
+    assert not monitor.ready
+
+
+def test_invoke_mode_sends_a_one_token_completion():
+    monitor = _monitor(_clients(), mode="invoke")
+    assert json.loads(monitor._probe_body(MODEL_ID))["max_tokens_to_sample"] == 1
+    with pytest.raises(ValueError):
+        _monitor(_clients(), mode="ping")
+
+
+def test_endpoints_serve_the_monitor_state(client, monkeypatch):
+    assert client.get("/health/ready").status_code == 200
+    assert client.get("/health/bedrock").json()["status"] == "unknown"
+
+    monitor = _monitor(_clients())
+    monkeypatch.setattr(health, "_monitor", monitor)
+    assert client.get("/health/ready").status_code == 503
+    asyncio.run(monitor.probe_all())
+    assert client.get("/health/ready").json() == {"ready": True}
+    assert client.get("/health/bedrock").json()["status"] == "connected"
+
+    monkeypatch.setattr(health, "_draining", True)
+    assert client.get("/health/ready").status_code == 503
+    assert client.get("/health").status_code == 200
@@ -0,0 +1,54 @@
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core import metrics
+from app.core.metrics import OTHER_MODEL, model_label, register_model
+
+CONFIGURED = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+
+@pytest.fixture
+def registered(monkeypatch):
+    """Start from no registered models, with room for two"""
+    monkeypatch.setattr(metrics, "_registered", set())
+    monkeypatch.setattr(metrics.settings, "METRICS_MAX_MODELS", 2)
+    return metrics._registered
+
+
+def test_unknown_models_share_one_label(registered):
+    assert model_label(CONFIGURED) == CONFIGURED
+    assert model_label("made-up-model-1") == OTHER_MODEL
+    assert model_label(None) == OTHER_MODEL
+
+
+def test_answered_models_are_registered_up_to_the_limit(registered):
+    for model_id in ("model-a", "model-b", "model-c", CONFIGURED):
+        register_model(model_id)
+    assert registered == {"model-a", "model-b"}
+    assert [model_label(m) for m in ("model-a", "model-c")] == ["model-a", OTHER_MODEL]
+
+
+def _other_requests():
+    return REGISTRY.get_sample_value(
+        "bridge_chat_request_duration_seconds_count",
+        {"model": OTHER_MODEL, "stream": "false", "outcome": "success"}) or 0
+
+
+def test_client_model_ids_cannot_grow_the_label_set(client, registered):
+    before = _other_requests()
+    for i in range(5):
+        response = client.post("/v1/chat/completions", json={
+            "model": f"anthropic.claude-v2-made-up-{i}", "messages": [{"role": "user", "content": "Hi"}]})
+        assert response.status_code == 200
+    # Bedrock answered for every ID, so the first two got their own label
+    assert registered == {"anthropic.claude-v2-made-up-0", "anthropic.claude-v2-made-up-1"}
+    assert _other_requests() - before == 3
+
+
+def test_metrics_are_exposed_without_auth(client):
+    client.post("/v1/chat/completions", json={
+        "model": CONFIGURED, "messages": [{"role": "user", "content": "Hi"}]})
+    response = client.get("/metrics", headers={"X-API-Key": ""})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert f'bridge_bedrock_call_duration_seconds_count{{model="{CONFIGURED}",outcome="success"}}' in response.text
@@ -0,0 +1,111 @@
+import pytest
+
+from app.services.near_cache import (
+    SAFE_THRESHOLD, NearDuplicateCache, NearDuplicateIndex, near_cache_threshold, normalize_prompt,
+)
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+SYSTEM = "You are the support assistant for Acme Cloud. Current time: {time}. Request ID: {id}."
+
+
+def _body(question, time="2026-10-17T09:00:00Z", request_id="3f2a9c1e-0b4d-4e8f-9a7c-5d6e7f8a9b0c", **params):
+    body = {"anthropic_version": "bedrock-2023-05-31", "max_tokens": 200, "temperature": 0.0,
+            "system": SYSTEM.format(time=time, id=request_id),
+            "messages": [{"role": "user", "content": question}]}
+    body.update(params)
+    return body
+
+
+def _cache():
+    return NearDuplicateCache(NearDuplicateIndex(max_bytes=1 << 20, ttl=60))
+
+
+def _store(cache, question, **kwargs):
+    cache.set(cache.probe(MODEL_ID, _body(question, **kwargs), question), {"completion": question})
+
+
+def _lookup(cache, question, threshold=SAFE_THRESHOLD, **kwargs):
+    return cache.get(cache.probe(MODEL_ID, _body(question, **kwargs), question), threshold)
+
+
+def test_normalization_masks_volatile_details():
+    assert normalize_prompt("Hello,   WORLD!") == "hello world"
+    assert normalize_prompt("at 2026-10-17T09:00:00Z") == normalize_prompt("at 2025-01-02T23:59:59Z")
+    assert normalize_prompt("id 3f2a9c1e-0b4d-4e8f-9a7c-5d6e7f8a9b0c") == "id _id_"
+    assert normalize_prompt("order 12") != normalize_prompt("order 13")
+
+
+def test_trivially_different_prompt_hits():
+    cache = _cache()
+    _store(cache, "How do I reset my password for Acme Mail?")
+    cached, score = _lookup(cache, "how do i reset my password for acme mail ??", time="2026-10-18T10:30:00Z",
+                            request_id="00000000-1111-2222-3333-444444444444")
+    assert cached == {"completion": "How do I reset my password for Acme Mail?"}
+    assert score >= SAFE_THRESHOLD
+
+
+def test_different_question_with_shared_system_prompt_misses():
+    cache = _cache()
+    _store(cache, "How do I reset my password for Acme Mail?")
+    for question in ("How do I reset my password for Acme Drive?", "How do I cancel my subscription to Acme Mail?"):
+        cached, score = _lookup(cache, question)
+        assert cached is None
+        assert score < SAFE_THRESHOLD
+    assert cache.stats()["misses"] == 2
+
+
+def test_other_parameters_must_match_exactly():
+    cache = _cache()
+    _store(cache, "How do I export my data?")
+    cached, _ = _lookup(cache, "How do I export my data?", max_tokens=500)
+    assert cached is None
+
+
+def test_long_prompts_are_not_cached(configure):
+    configure(NEAR_CACHE_MAX_PROMPT_CHARS=100)
+    assert _cache().probe(MODEL_ID, _body("x " * 100), "x " * 100) is None
+
+
+def test_entries_are_bounded_and_expire():
+    cache = NearDuplicateCache(NearDuplicateIndex(max_bytes=20000, ttl=60))
+    for i in range(20):
+        _store(cache, f"Question number {i} about a completely different topic {i * 7919}")
+    assert 0 < len(cache.index) < 20
+    assert cache.index.size <= 20000
+
+    expired = NearDuplicateCache(NearDuplicateIndex(max_bytes=1 << 20, ttl=0))
+    _store(expired, "How do I export my data?")
+    assert _lookup(expired, "How do I export my data?")[0] is None
+
+
+def test_threshold_policy(configure):
+    configure(NEAR_CACHE_ENABLED=True, NEAR_CACHE_MODELS={"haiku": 0.95}, NEAR_CACHE_API_KEYS={"strict": 0},
+              NEAR_CACHE_MAX_TEMPERATURE=0.0)
+    assert near_cache_threshold(MODEL_ID, "key", 0.0) == 0.95
+    assert near_cache_threshold(MODEL_ID, "strict", 0.0) is None
+    assert near_cache_threshold(MODEL_ID, "key", 0.7) is None
+    assert near_cache_threshold("anthropic.claude-v2", "key", 0.0) is None
+    configure(NEAR_CACHE_ENABLED=False)
+    assert near_cache_threshold(MODEL_ID, "key", 0.0) is None
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_endpoint_serves_near_duplicates_from_cache(client, fake_bedrock, configure, stream):
+    configure(NEAR_CACHE_ENABLED=True, NEAR_CACHE_MODELS={"haiku": SAFE_THRESHOLD})
+
+    def ask(question, request_id):
+        return client.post("/v1/chat/completions", json={
+            "model": MODEL_ID, "temperature": 0.0, "stream": stream,
+            "messages": [{"role": "system", "content": SYSTEM.format(time="09:00", id=request_id)},
+                         {"role": "user", "content": question}],
+        })
+
+    first = ask("How do I add a team member to Acme Chat?", "3f2a9c1e-0b4d-4e8f-9a7c-5d6e7f8a9b0c")
+    assert first.headers["X-Cache"] == "MISS"
+    second = ask("how do I add a team member to Acme Chat", "00000000-1111-2222-3333-444444444444")
+    assert second.headers["X-Cache"] == "HIT"
+    assert float(second.headers["X-Cache-Similarity"]) >= SAFE_THRESHOLD
+    assert fake_bedrock.calls == 1
+    third = ask("How do I add a team member to Acme Meet?", "00000000-1111-2222-3333-444444444444")
+    assert third.headers["X-Cache"] == "MISS"
+    assert fake_bedrock.calls == 2
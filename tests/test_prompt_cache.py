@@ -0,0 +1,77 @@
+from app.models.chat import Message
+from app.services.adapters import get_adapter
+from app.services.prompt_cache import CACHE_CONTROL, PromptCachePlanner
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+SYSTEM = "You are a meticulous contract reviewer. " * 60
+DOCUMENT = "Clause 1. The supplier shall deliver the goods on time. " * 60
+
+
+def _planner(**overrides):
+    options = dict(min_tokens=100, min_reuse=2, window=300.0, max_checkpoints=4)
+    options.update(overrides)
+    return PromptCachePlanner(**options)
+
+
+def _turns(*contents):
+    roles = ("user", "assistant")
+    return [{"role": roles[i % 2], "content": content} for i, content in enumerate(contents)]
+
+
+def test_prefixes_are_cached_once_they_recur():
+    planner = _planner()
+    turns = _turns(DOCUMENT, "Noted.", "Summarize clause 1.")
+    assert planner.plan(MODEL_ID, SYSTEM, turns) == (False, [])
+    assert planner.plan(MODEL_ID, SYSTEM, turns) == (True, [0])
+
+
+def test_short_and_final_turns_are_never_cached():
+    planner = _planner(min_reuse=1)
+    assert planner.plan(MODEL_ID, "Be brief.", _turns("Hi", "Hello!", DOCUMENT)) == (False, [])
+
+
+def test_prefixes_depend_on_model_and_everything_before_them():
+    planner = _planner()
+    planner.plan(MODEL_ID, SYSTEM, _turns(DOCUMENT, "Noted.", "Go on."))
+    assert planner.plan("anthropic.claude-3-sonnet-20240229-v1:0", SYSTEM, _turns(DOCUMENT, "Noted.", "Go on.")) \
+        == (False, [])
+    # Another system prompt changes every prefix after it
+    assert planner.plan(MODEL_ID, SYSTEM + "Be formal.", _turns(DOCUMENT, "Noted.", "Go on.")) == (False, [])
+
+
+def test_sightings_expire_after_the_window():
+    planner = _planner(window=0.0)
+    turns = _turns(DOCUMENT, "Noted.", "Go on.")
+    planner.plan(MODEL_ID, SYSTEM, turns)
+    assert planner.plan(MODEL_ID, SYSTEM, turns) == (False, [])
+
+
+def test_checkpoints_are_capped():
+    planner = _planner(min_reuse=1, max_checkpoints=2)
+    documents = [f"Document {i}. " + DOCUMENT for i in range(4)]
+    cache_system, turns = planner.plan(MODEL_ID, SYSTEM, _turns(*documents, "Compare them."))
+    assert (cache_system, turns) == (True, [3])
+
+
+def test_adapter_marks_checkpoints(configure):
+    configure(PROMPT_CACHE_ENABLED=True, PROMPT_CACHE_MIN_TOKENS=100, PROMPT_CACHE_MIN_REUSE=1)
+    messages = [Message(role="system", content=SYSTEM), Message(role="user", content=DOCUMENT),
+                Message(role="assistant", content="Noted."), Message(role="user", content="Summarize.")]
+    body = get_adapter(MODEL_ID).create_body(MODEL_ID, messages, 100, 0.0)
+    assert body["system"] == [{"type": "text", "text": SYSTEM, "cache_control": CACHE_CONTROL}]
+    assert body["messages"][0]["content"] == [{"type": "text", "text": DOCUMENT, "cache_control": CACHE_CONTROL}]
+    assert body["messages"][-1]["content"] == "Summarize."
+
+
+def test_endpoint_reports_cached_prompt_tokens(client, configure):
+    configure(PROMPT_CACHE_ENABLED=True, PROMPT_CACHE_MIN_TOKENS=100, PROMPT_CACHE_MIN_REUSE=1)
+
+    def ask(question):
+        return client.post("/v1/chat/completions", json={"model": MODEL_ID, "messages": [
+            {"role": "system", "content": SYSTEM}, {"role": "user", "content": question}]}).json()["usage"]
+
+    first = ask("First question?")
+    assert first["prompt_tokens_details"]["cached_tokens"] == 0
+    assert first["prompt_tokens_details"]["cache_write_tokens"] > 0
+    second = ask("Second question?")
+    assert second["prompt_tokens_details"]["cached_tokens"] == first["prompt_tokens_details"]["cache_write_tokens"]
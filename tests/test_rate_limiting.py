@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+
+from app.core.security import api_key_fingerprint
+from app.services import rate_limiting
+from app.services.rate_limiting import (
+    InMemoryRateLimitBackend, RateLimiter, RedisRateLimitBackend, get_rate_limiter, record_token_usage,
+)
+
+BODY = {"model": "anthropic.claude-v2", "messages": [{"role": "user", "content": "Hi"}]}
+
+
+@pytest.fixture(params=["memory", "redis"])
+def make_backend(request, monkeypatch):
+    """
+    Factory for each backend; call it inside the test's event loop. The Redis
+    backend runs its Lua script against fakeredis.
+    """
+    if request.param == "memory":
+        return InMemoryRateLimitBackend
+    fakeredis = pytest.importorskip("fakeredis")
+    import redis.asyncio
+
+    monkeypatch.setattr(redis.asyncio, "from_url", lambda url: fakeredis.FakeAsyncRedis())
+    return lambda: RedisRateLimitBackend("redis://localhost")
+
+
+async def _acquire(backend, key, limit, cost=1):
+    return (await backend.acquire([(key, limit, cost)]))[0]
+
+
+def test_burst_up_to_limit_then_rejected(make_backend):
+    async def run():
+        backend = make_backend()
+        results = [await _acquire(backend, "key", 5) for _ in range(6)]
+        return results
+
+    results = asyncio.run(run())
+    assert all(result.allowed for result in results[:5])
+    assert [result.remaining for result in results[:5]] == [4, 3, 2, 1, 0]
+    rejected = results[5]
+    assert not rejected.allowed
+    # One unit comes back every 60 / 5 seconds
+    assert 0 < rejected.retry_after <= 12
+    assert 1 <= int(rejected.headers()["Retry-After"]) <= 12
+    assert rejected.headers()["X-RateLimit-Limit"] == "5"
+
+
+def test_keys_are_limited_independently(make_backend):
+    async def run():
+        backend = make_backend()
+        await _acquire(backend, "a", 1)
+        return (await _acquire(backend, "a", 1)).allowed, (await _acquire(backend, "b", 1)).allowed
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_rejected_check_consumes_no_bucket(make_backend):
+    async def run():
+        backend = make_backend()
+        await _acquire(backend, "b", 1)
+        for _ in range(3):
+            results = await backend.acquire([("a", 2, 1), ("b", 1, 1)])
+            assert [result.allowed for result in results] == [True, False]
+        return [(await _acquire(backend, "a", 2)).allowed for _ in range(3)]
+
+    assert asyncio.run(run()) == [True, True, False]
+
+
+def test_token_debt_blocks_requests(make_backend):
+    async def run():
+        limiter = RateLimiter(make_backend(), requests_per_minute=100, tokens_per_minute=1000)
+        assert (await limiter.check("key")).allowed
+        await limiter.record_tokens("key", None, 1500)
+        return await limiter.check("key")
+
+    result = asyncio.run(run())
+    assert not result.allowed
+    assert result.limit == 1000
+
+
+def test_user_limits_are_scoped_to_the_api_key():
+    identities = RateLimiter.identities("secret-key", "alice")
+    assert identities == ["key:" + api_key_fingerprint("secret-key"),
+                          f"user:{api_key_fingerprint('secret-key')}:alice"]
+    assert not any("secret-key" in identity for identity in identities)
+
+    async def run():
+        limiter = RateLimiter(InMemoryRateLimitBackend(), requests_per_minute=1, tokens_per_minute=0,
+                              user_requests_per_minute=1)
+        await limiter.check("key-1", "alice")
+        return (await limiter.check("key-2", "alice")).allowed
+
+    assert asyncio.run(run())
+
+
+def test_user_limit_binds_before_the_key_limit(make_backend):
+    async def run():
+        limiter = RateLimiter(make_backend(), requests_per_minute=3, tokens_per_minute=0,
+                              user_requests_per_minute=1)
+        alice = [await limiter.check("key", "alice") for _ in range(4)]
+        # Alice's rejected requests took nothing from the key's budget
+        bob = [await limiter.check("key", "bob"), await limiter.check("key", "carol"),
+               await limiter.check("key", "dave")]
+        return alice, bob
+
+    alice, others = asyncio.run(run())
+    assert [result.allowed for result in alice] == [True, False, False, False]
+    assert alice[1].limit == 1
+    assert [result.allowed for result in others] == [True, True, False]
+
+
+def test_user_token_limit_is_charged_separately(make_backend):
+    async def run():
+        limiter = RateLimiter(make_backend(), requests_per_minute=100, tokens_per_minute=10000,
+                              user_requests_per_minute=100, user_tokens_per_minute=1000)
+        await limiter.check("key", "alice")
+        await limiter.record_tokens("key", "alice", 1500)
+        return (await limiter.check("key", "alice")).allowed, (await limiter.check("key", "bob")).allowed
+
+    assert asyncio.run(run()) == (False, True)
+
+
+def test_record_token_usage_charges_only_when_enabled(configure):
+    configure(RATE_LIMIT_ENABLED=False)
+    asyncio.run(record_token_usage("key", None, 10))
+    assert rate_limiting._limiter is None
+
+    configure(RATE_LIMIT_ENABLED=True, RATE_LIMIT_TOKENS_PER_MINUTE=1000)
+
+    async def run():
+        await record_token_usage("key", None, 1500)
+        return await get_rate_limiter().check("key")
+
+    assert not asyncio.run(run()).allowed
+
+
+def test_endpoint_enforces_request_limit(client, configure):
+    configure(RATE_LIMIT_ENABLED=True, RATE_LIMIT_PER_MINUTE=2, RATE_LIMIT_TOKENS_PER_MINUTE=0)
+    first = client.post("/v1/chat/completions", json=BODY)
+    assert first.status_code == 200
+    assert first.headers["X-RateLimit-Limit"] == "2"
+    assert first.headers["X-RateLimit-Remaining"] == "1"
+    assert client.post("/v1/chat/completions", json=BODY).status_code == 200
+    limited = client.post("/v1/chat/completions", json=BODY)
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+
+
+def test_endpoint_charges_completion_tokens(client, configure):
+    configure(RATE_LIMIT_ENABLED=True, RATE_LIMIT_PER_MINUTE=100, RATE_LIMIT_TOKENS_PER_MINUTE=5)
+    # The first request is admitted; the tokens it used put the key in debt
+    assert client.post("/v1/chat/completions", json=BODY).status_code == 200
+    assert client.post("/v1/chat/completions", json=BODY).status_code == 429
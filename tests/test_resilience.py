@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from app.services.resilience import BedrockResilience, CircuitBreaker, CircuitOpenError, RetryBudget
+
+MODEL_ID = "anthropic.claude-v2"
+BODY = {"model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def _policy(**overrides):
+    options = dict(max_attempts=3, base_delay=0.001, max_delay=0.01, budget_ratio=0.2, budget_min_per_second=1.0,
+                   hedging=False, hedge_quantile=0.95, hedge_min_delay=0.01, breaker_threshold=5,
+                   breaker_reset=30.0)
+    options.update(overrides)
+    return BedrockResilience(**options)
+
+
+@pytest.fixture
+def fast_retries(configure):
+    configure(BEDROCK_RETRY_BASE_DELAY=0.001, BEDROCK_RETRY_MAX_DELAY=0.01)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_throttles_and_5xx_are_retried(client, fake_bedrock, fast_retries, stream):
+    fake_bedrock.fail_next(1, "ThrottlingException", 429)
+    fake_bedrock.fail_next(1)
+    response = client.post("/v1/chat/completions", json={**BODY, "stream": stream})
+    assert response.status_code == 200
+    assert fake_bedrock.calls == 3
+
+
+def test_client_errors_are_not_retried(client, fake_bedrock, fast_retries):
+    fake_bedrock.fail_next(1, "ValidationException", 400)
+    assert client.post("/v1/chat/completions", json=BODY).status_code == 500
+    assert fake_bedrock.calls == 1
+
+
+def test_throttled_after_all_attempts_is_429(client, fake_bedrock, fast_retries):
+    fake_bedrock.fail_next(3, "ThrottlingException", 429)
+    response = client.post("/v1/chat/completions", json=BODY)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "1"
+    assert fake_bedrock.calls == 3
+
+
+def test_breaker_opens_and_fails_fast(client, fake_bedrock, configure, fast_retries):
+    configure(BEDROCK_RETRY_ATTEMPTS=1, BEDROCK_BREAKER_FAILURE_THRESHOLD=2)
+    fake_bedrock.fail_next(2)
+    assert [client.post("/v1/chat/completions", json=BODY).status_code for _ in range(2)] == [500, 500]
+    rejected = client.post("/v1/chat/completions", json=BODY)
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert fake_bedrock.calls == 2
+
+
+def test_breaker_half_open_probe():
+    async def run():
+        breaker = CircuitBreaker(MODEL_ID, "us-east-1", failure_threshold=1, reset_timeout=0.01)
+        breaker.on_failure()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        await asyncio.sleep(0.02)
+        # One probe is let through; others still fail fast until it succeeds
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.on_success()
+        breaker.before_call()
+        return breaker.state
+
+    assert asyncio.run(run()) == CircuitBreaker.CLOSED
+
+
+def test_retry_budget_bounds_extra_attempts():
+    budget = RetryBudget(ratio=0.0, min_per_second=0.0)
+    spent = sum(budget.try_spend() for _ in range(20))
+    assert spent == budget.max_tokens == 10
+
+
+def test_hedge_wins_against_a_slow_primary():
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        await asyncio.sleep(1.0 if len(attempts) == 1 else 0.001)
+        return len(attempts)
+
+    async def run():
+        policy = _policy(hedging=True)
+        for _ in range(20):
+            policy._latency(MODEL_ID).record(0.001)
+        started = asyncio.get_running_loop().time()
+        result = await policy.call(MODEL_ID, "us-east-1", call, hedge=True)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(run())
+    assert result == 2 and elapsed < 0.5
+    assert len(attempts) == 2
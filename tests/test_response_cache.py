@@ -0,0 +1,69 @@
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from app.services.response_cache import MemoryLRU, ResponseCache, SQLiteCacheTier, make_cache_key
+
+MODEL_ID = "anthropic.claude-v2"
+BODY = {"model": MODEL_ID, "temperature": 0.0, "messages": [{"role": "user", "content": "What is 2 + 2?"}]}
+
+
+def _events(cache, result):
+    return REGISTRY.get_sample_value("bridge_cache_events_total", {"cache": cache, "result": result}) or 0.0
+
+
+def test_cache_key_ignores_dict_order():
+    body = {"prompt": "Hi", "temperature": 0.0}
+    assert make_cache_key(MODEL_ID, body) == make_cache_key(MODEL_ID, dict(reversed(body.items())))
+    assert make_cache_key(MODEL_ID, body) != make_cache_key("anthropic.claude-v2:1", body)
+
+
+def test_lru_is_bounded_by_size_and_counts_evictions():
+    evicted = _events("response", "evict")
+    lru = MemoryLRU(max_bytes=10, ttl=60)
+    for key in "abc":
+        lru.set(key, b"1234")
+    assert lru.get("a") is None and lru.get("c") == b"1234"
+    assert lru.size == 8 and lru.evictions == 1
+    assert _events("response", "evict") == evicted + 1
+
+    expired = MemoryLRU(max_bytes=10, ttl=0)
+    expired.set("a", b"1", expires_at=1.0)
+    assert expired.get("a") is None
+
+
+def test_disk_tier_is_shared_and_counts_evictions(tmp_path):
+    evicted = _events("response", "evict")
+    path = str(tmp_path / "cache.sqlite3")
+
+    async def run():
+        worker_a = ResponseCache(MemoryLRU(1 << 20, 60), SQLiteCacheTier(path, max_entries=50))
+        worker_b = ResponseCache(MemoryLRU(1 << 20, 60), SQLiteCacheTier(path, max_entries=50))
+        await worker_a.set("key", {"completion": "4"})
+        shared = await worker_b.get("key")
+        for i in range(100):
+            await worker_a.set(f"key-{i}", {"completion": str(i)})
+        stats = worker_a.stats()
+        worker_a.close()
+        worker_b.close()
+        return shared, stats
+
+    shared, stats = asyncio.run(run())
+    assert shared == {"completion": "4"}
+    # Pruned on the 100th write, down to max_entries
+    assert stats["evictions"] == 50
+    assert _events("response", "evict") == evicted + 50
+
+
+def test_endpoint_serves_repeats_from_cache(client, fake_bedrock, configure):
+    configure(RESPONSE_CACHE_ENABLED=True)
+    first = client.post("/v1/chat/completions", json=BODY)
+    second = client.post("/v1/chat/completions", json=BODY)
+    streamed = client.post("/v1/chat/completions", json={**BODY, "stream": True})
+    assert [r.headers["X-Cache"] for r in (first, second, streamed)] == ["MISS", "HIT", "HIT"]
+    assert second.json()["choices"] == first.json()["choices"]
+    assert fake_bedrock.calls == 1
+    # Sampled completions are not cached
+    client.post("/v1/chat/completions", json={**BODY, "temperature": 0.9})
+    client.post("/v1/chat/completions", json={**BODY, "temperature": 0.9})
+    assert fake_bedrock.calls == 3
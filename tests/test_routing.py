@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from app.services import routing
+from app.services.routing import BedrockRouter, resolve_model_alias
+from benchmarks.fake_bedrock import FakeBedrockClient
+
+# The configured default model: its routing stats keep one label before and after Bedrock first answers
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+HAIKU = "anthropic.claude-3-haiku-20240307-v1:0"
+REGIONS = ["us-east-1", "us-west-2"]
+BODY = {"model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def _router(**clients):
+    return BedrockRouter(REGIONS, alpha=0.5, recovery_seconds=30.0, throttle_cooldown=30.0, clients=clients)
+
+
+@pytest.fixture
+def regions(monkeypatch, fake_bedrock):
+    """Route across two regions, each served by its own fake client"""
+    west = FakeBedrockClient(latency=0.0, token_interval=0.0)
+    router = _router(**{"us-east-1": fake_bedrock, "us-west-2": west})
+    monkeypatch.setattr(routing, "_router", router)
+    return router, fake_bedrock, west
+
+
+def test_candidates_prefer_the_faster_healthy_region():
+    router = _router()
+    router.record(MODEL_ID, "us-east-1", 0.2)
+    router.record(MODEL_ID, "us-west-2", 0.1)
+    assert router.candidates(MODEL_ID) == ["us-west-2", "us-east-1"]
+
+    for _ in range(3):
+        router.record(MODEL_ID, "us-west-2", 0.1, RuntimeError("boom"))
+    assert router.candidates(MODEL_ID) == ["us-east-1", "us-west-2"]
+
+
+def test_stale_stats_are_retried():
+    router = _router()
+    router.record(MODEL_ID, "us-east-1", 0.1)
+    router.record(MODEL_ID, "us-west-2", 0.5)
+    router._endpoint(MODEL_ID, "us-west-2").updated = time.monotonic() - 60
+    assert router.candidates(MODEL_ID) == ["us-west-2", "us-east-1"]
+
+
+def test_aliases_pick_the_cheapest_model_that_fits():
+    aliases = {"auto": {HAIKU: 100, MODEL_ID: 0}}
+    assert resolve_model_alias("auto", 50, aliases) == HAIKU
+    assert resolve_model_alias("auto", 500, aliases) == MODEL_ID
+    assert resolve_model_alias("auto", 500, {"auto": {HAIKU: 100, MODEL_ID: 200}}) == MODEL_ID
+    assert resolve_model_alias(MODEL_ID, 50, aliases) == MODEL_ID
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_throttled_region_fails_over(client, regions, configure, stream):
+    configure(BEDROCK_RETRY_ATTEMPTS=1)
+    router, east, west = regions
+    east.fail_next(1, "ThrottlingException", 429)
+    assert client.post("/v1/chat/completions", json={**BODY, "stream": stream}).status_code == 200
+    assert (east.calls, west.calls) == (1, 1)
+    # East stays in its throttle cooldown, so the next call goes straight to west
+    assert router.candidates(MODEL_ID) == ["us-west-2", "us-east-1"]
+    assert client.post("/v1/chat/completions", json={**BODY, "stream": stream}).status_code == 200
+    assert (east.calls, west.calls) == (1, 2)
+
+
+def test_other_errors_are_not_failed_over(client, regions, configure):
+    configure(BEDROCK_RETRY_ATTEMPTS=1)
+    _, east, west = regions
+    east.fail_next(1, "ValidationException", 400)
+    assert client.post("/v1/chat/completions", json=BODY).status_code == 500
+    assert (east.calls, west.calls) == (1, 0)
+
+
+def test_endpoint_resolves_aliases(client, fake_bedrock, configure):
+    configure(MODEL_ALIASES={"auto": {HAIKU: 1000, MODEL_ID: 0}})
+    response = client.post("/v1/chat/completions", json={**BODY, "model": "auto"})
+    assert response.status_code == 200
+    assert response.json()["model"] == HAIKU
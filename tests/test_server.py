@@ -0,0 +1,97 @@
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from app import server
+from app.services import health
+
+
+@pytest.fixture
+def cgroup(monkeypatch):
+    """Serve fake cgroup files: ``cgroup["/sys/fs/cgroup/cpu.max"] = "150000 100000"``"""
+    files = {}
+    monkeypatch.setattr(server, "_read", files.get)
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    return files
+
+
+def test_cpu_quota_from_cgroup_v2(cgroup):
+    assert server.cpu_quota() is None
+    cgroup["/sys/fs/cgroup/cpu.max"] = "max 100000"
+    assert server.cpu_quota() is None
+    cgroup["/sys/fs/cgroup/cpu.max"] = "150000 100000"
+    assert server.cpu_quota() == 1.5
+    assert server.default_workers() == 2
+
+
+def test_cpu_quota_from_cgroup_v1(cgroup):
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_period_us"] = "100000"
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_quota_us"] = "-1"
+    assert server.cpu_quota() is None
+    assert server.default_workers() == 8
+    cgroup["/sys/fs/cgroup/cpu/cpu.cfs_quota_us"] = "400000"
+    assert server.default_workers() == 4
+
+
+def test_sigterm_drains_before_exiting(monkeypatch):
+    monkeypatch.setattr(health, "_draining", False)
+    calls = []
+
+    class Loop:
+        def call_later(self, delay, callback, *args):
+            calls.append(delay)
+
+    monkeypatch.setattr(server.asyncio, "get_event_loop", lambda: Loop())
+    draining = server.DrainingServer(server.build_config(), drain=5.0)
+    draining.handle_exit(signal.SIGTERM, None)
+    assert health.is_draining() and calls == [5.0]
+    assert not draining.should_exit
+    # A second signal, or SIGINT, stops right away
+    draining.handle_exit(signal.SIGINT, None)
+    assert draining.should_exit
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for(url, status, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == status:
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="several workers need os.fork")
+def test_workers_serve_and_drain_on_sigterm(tmp_path):
+    port = _free_port()
+    env = {**os.environ, "SERVER_HOST": "127.0.0.1", "SERVER_PORT": str(port), "SERVER_WORKERS": "2",
+           "SERVER_DRAIN_SECONDS": "1", "SERVER_GRACEFUL_TIMEOUT_SECONDS": "5", "HEALTH_MONITOR_ENABLED": "false",
+           "TRACK_USAGE": "false", "PROMETHEUS_MULTIPROC_DIR": str(tmp_path)}
+    process = subprocess.Popen([sys.executable, "-m", "app.server"], env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        assert _wait_for(f"{base}/health/ready", 200)
+        process.send_signal(signal.SIGTERM)
+        # Still serving, but no longer ready
+        assert _wait_for(f"{base}/health/ready", 503, timeout=1.0)
+        assert httpx.get(f"{base}/health").status_code == 200
+        assert process.wait(timeout=15) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
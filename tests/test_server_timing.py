@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import os
+
+import pytest
+
+from app.core.timing import ServerTimingMiddleware, current_timing, record_timing, timed
+
+MODEL_ID = "anthropic.claude-v2"
+BODY = {"model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}]}
+
+
+def _stages(header):
+    stages = {}
+    for part in header.split(", "):
+        name, duration = part.split(";dur=")
+        stages[name] = float(duration)
+    return stages
+
+
+async def _handler(scope, receive, send):
+    with timed("work"):
+        await asyncio.sleep(0.01)
+    record_timing("extra", 0.002)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _call(middleware, headers=()):
+    scope = {"type": "http", "method": "GET", "path": "/v1/work", "headers": list(headers)}
+    sent = []
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return dict(sent[0]["headers"])
+
+
+def test_stages_are_sent_as_server_timing():
+    stages = _stages(_call(ServerTimingMiddleware(_handler))[b"server-timing"].decode())
+    assert list(stages) == ["work", "extra", "total"]
+    assert stages["work"] >= 10 and stages["extra"] == 2.0
+    assert stages["total"] >= stages["work"]
+
+
+def test_timing_is_a_no_op_outside_requests():
+    with timed("work"):
+        record_timing("extra", 1.0)
+    assert current_timing() is None
+
+
+def test_requests_are_logged_with_their_stages(caplog):
+    caplog.set_level(logging.INFO, logger="app.core.timing")
+    _call(ServerTimingMiddleware(_handler))
+    record = caplog.records[-1]
+    assert record.getMessage().startswith("GET /v1/work 200 work=")
+    assert set(record.timing) == {"work", "extra", "total"}
+
+
+@pytest.mark.parametrize("trigger", [False, True])
+def test_profiles_are_written_for_sampled_requests(tmp_path, trigger):
+    middleware = ServerTimingMiddleware(_handler, profile_dir=str(tmp_path), header_trigger=True)
+    headers = _call(middleware, [(b"x-profile", b"1")] if trigger else [])
+    if trigger:
+        name = headers[b"x-profile"].decode()
+        assert name.endswith("-GET-v1_work.prof")
+        assert os.listdir(tmp_path) == [name]
+    else:
+        assert b"x-profile" not in headers
+        assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_chat_completions_report_their_stages(client, stream):
+    response = client.post("/v1/chat/completions", json={**BODY, "stream": stream})
+    assert response.status_code == 200
+    stages = _stages(response.headers["Server-Timing"])
+    assert {"auth", "decode", "render", "bedrock", "total"} <= set(stages)
+    if not stream:
+        assert "serialize" in stages
+
+
+def test_untimed_requests_have_only_a_total(client):
+    assert list(_stages(client.get("/health").headers["Server-Timing"])) == ["total"]
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+from app.models.chat import Message
+from app.services.sessions import SessionConflict, SessionStore, SQLiteSessionTier, get_session_store
+
+MODEL_ID = "anthropic.claude-v2"
+
+
+def _user(content):
+    return Message(role="user", content=content)
+
+
+def _reply(content):
+    return Message(role="assistant", content=content)
+
+
+@pytest.fixture
+def disk_path(tmp_path):
+    return str(tmp_path / "sessions.sqlite3")
+
+
+def test_turns_extend_history_and_token_counts():
+    async def run():
+        store = SessionStore(max_bytes=1 << 20, ttl=60)
+        session = await store.create("key", MODEL_ID, [Message(role="system", content="Be brief.")])
+        turn = await store.begin(session, [_user("Hi")])
+        assert [m.content for m in turn.messages] == ["Be brief.", "Hi"]
+        assert turn.prompt_tokens > session.prompt_tokens
+        await store.commit(turn, _reply("Hello"))
+        return store, session
+
+    store, session = asyncio.run(run())
+    assert [m.content for m in session.messages] == ["Be brief.", "Hi", "Hello"]
+    assert session.prompt_tokens == sum(session.costs)
+    assert store.stats()["sessions"] == 1
+
+
+def test_sessions_are_private_to_their_api_key():
+    async def run():
+        store = SessionStore(max_bytes=1 << 20, ttl=60)
+        session = await store.create("key", MODEL_ID, [])
+        return await store.get(session.id, "key"), await store.get(session.id, "other-key")
+
+    mine, theirs = asyncio.run(run())
+    assert mine is not None and theirs is None
+
+
+def test_concurrent_turn_is_rejected_until_released():
+    async def run():
+        store = SessionStore(max_bytes=1 << 20, ttl=60)
+        session = await store.create("key", MODEL_ID, [])
+        turn = await store.begin(session, [_user("one")])
+        with pytest.raises(SessionConflict):
+            await store.begin(session, [_user("two")])
+        await store.release(turn)
+        second = await store.begin(session, [_user("two")])
+        await store.commit(second, _reply("ok"))
+        return session
+
+    assert [m.content for m in asyncio.run(run()).messages] == ["two", "ok"]
+
+
+def test_abandoned_turn_frees_the_session_after_its_lease():
+    async def run():
+        store = SessionStore(max_bytes=1 << 20, ttl=60, turn_lease=0.01)
+        session = await store.create("key", MODEL_ID, [])
+        await store.begin(session, [_user("lost")])
+        await asyncio.sleep(0.02)
+        await store.commit(await store.begin(session, [_user("next")]))
+        return session
+
+    assert [m.content for m in asyncio.run(run()).messages] == ["next"]
+
+
+def test_commit_is_a_compare_and_swap():
+    async def run():
+        store = SessionStore(max_bytes=1 << 20, ttl=60, turn_lease=0.0)
+        session = await store.create("key", MODEL_ID, [])
+        stale = await store.begin(session, [_user("stale")])
+        await store.commit(await store.begin(session, [_user("fresh")]))
+        with pytest.raises(SessionConflict):
+            await store.commit(stale, _reply("late"))
+        return session
+
+    assert [m.content for m in asyncio.run(run()).messages] == ["fresh"]
+
+
+def test_sqlite_tier_shares_sessions_between_workers(disk_path):
+    async def run():
+        worker_a = SessionStore(1 << 20, 60, SQLiteSessionTier(disk_path))
+        worker_b = SessionStore(1 << 20, 60, SQLiteSessionTier(disk_path))
+        session = await worker_a.create("key", MODEL_ID, [_user("first")])
+        # A turn in progress on one worker blocks the same session on the other
+        turn = await worker_a.begin(session, [_user("second")])
+        on_b = await worker_b.get(session.id, "key")
+        with pytest.raises(SessionConflict):
+            await worker_b.begin(on_b, [_user("racing")])
+        await worker_a.commit(turn, _reply("reply"))
+        # ...and once it is stored the other worker sees it
+        on_b = await worker_b.get(session.id, "key")
+        turn = await worker_b.begin(on_b, [_user("third")])
+        await worker_b.commit(turn)
+        synced = await worker_a.get(session.id, "key")
+        worker_a.close()
+        worker_b.close()
+        return synced
+
+    assert [m.content for m in asyncio.run(run()).messages] == ["first", "second", "reply", "third"]
+
+
+def test_evicted_sessions_reload_from_disk(disk_path):
+    async def run():
+        store = SessionStore(max_bytes=1, ttl=60, disk=SQLiteSessionTier(disk_path))
+        first = await store.create("key", MODEL_ID, [_user("kept on disk")])
+        await store.create("key", MODEL_ID, [_user("pushes the first one out")])
+        assert store.evictions == 1
+        reloaded = await store.get(first.id, "key")
+        store.close()
+        return reloaded
+
+    assert [m.content for m in asyncio.run(run()).messages] == ["kept on disk"]
+
+
+def test_session_api_round_trip(client):
+    created = client.post("/v1/sessions", json={
+        "model": MODEL_ID, "messages": [{"role": "system", "content": "Be brief."}],
+    })
+    assert created.status_code == 201
+    session_id = created.json()["id"]
+
+    turn = client.post(f"/v1/sessions/{session_id}/messages", json={"messages": [{"role": "user", "content": "Hi"}]})
+    assert turn.status_code == 200
+    streamed = client.post(f"/v1/sessions/{session_id}/messages",
+                           json={"messages": [{"role": "user", "content": "Again"}], "stream": True})
+    assert streamed.status_code == 200 and streamed.content.endswith(b"data: [DONE]\n\n")
+
+    session = client.get(f"/v1/sessions/{session_id}", params={"include_messages": True}).json()
+    assert [m["role"] for m in session["messages"]] == ["system", "user", "assistant", "user", "assistant"]
+    assert client.delete(f"/v1/sessions/{session_id}").status_code == 204
+    assert client.get(f"/v1/sessions/{session_id}").status_code == 404
+
+
+def test_turn_in_progress_gets_409_without_calling_bedrock(client, fake_bedrock):
+    session_id = client.post("/v1/sessions", json={"model": MODEL_ID, "messages": []}).json()["id"]
+    store = get_session_store()
+    session = store._sessions[session_id]
+    client.portal.call(store.begin, session, [_user("in progress")])
+
+    for stream in (False, True):
+        response = client.post(f"/v1/sessions/{session_id}/messages",
+                               json={"messages": [{"role": "user", "content": "Hi"}], "stream": stream})
+        assert response.status_code == 409
+    assert fake_bedrock.calls == 0
+
+
+def test_failed_turn_leaves_session_unchanged_and_free(client, fake_bedrock, configure):
+    configure(BEDROCK_RETRY_ATTEMPTS=1, BEDROCK_BREAKER_FAILURE_THRESHOLD=100)
+    session_id = client.post("/v1/sessions", json={"model": MODEL_ID, "messages": []}).json()["id"]
+    fake_bedrock.error_rate = 1.0
+    for stream in (False, True):
+        response = client.post(f"/v1/sessions/{session_id}/messages",
+                               json={"messages": [{"role": "user", "content": "Hi"}], "stream": stream})
+        assert response.status_code == 500
+    fake_bedrock.error_rate = 0.0
+    response = client.post(f"/v1/sessions/{session_id}/messages",
+                           json={"messages": [{"role": "user", "content": "Hi"}]})
+    assert response.status_code == 200
+    assert client.get(f"/v1/sessions/{session_id}").json()["message_count"] == 2
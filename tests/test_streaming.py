@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+from fastapi import BackgroundTasks, Response
+
+from app.api.endpoints.chat import _chat_completion
+from app.models.chat import Message
+from app.models.compact import CompactChatRequest
+from app.services.bedrock import BedrockService
+from app.services.executor import BedrockExecutor, get_executor
+from app.services.sessions import get_session_store
+
+MODEL_ID = "anthropic.claude-v2"
+MESSAGES = [Message(role="user", content="Hi")]
+
+
+def _record_streams(fake_bedrock):
+    """Slow down the fake's streams and keep every stream body it opens"""
+    fake_bedrock.completion = " ".join(["word"] * 200)
+    fake_bedrock.token_interval = 0.005
+    streams = []
+    opened = fake_bedrock.invoke_model_with_response_stream
+
+    def open_stream(**kwargs):
+        response = opened(**kwargs)
+        streams.append(response["body"])
+        return response
+
+    fake_bedrock.invoke_model_with_response_stream = open_stream
+    return streams
+
+
+def test_streams_do_not_occupy_the_call_pool():
+    release = threading.Event()
+
+    async def run():
+        executor = BedrockExecutor(max_workers=1, default_model_concurrency=4, stream_workers=2)
+        readers = [asyncio.ensure_future(executor.read_stream(MODEL_ID, release.wait)) for _ in range(2)]
+        # Both stream readers are busy, yet a blocking call still gets a thread
+        result = await asyncio.wait_for(executor.run(MODEL_ID, lambda: "called"), timeout=5)
+        release.set()
+        await asyncio.gather(*readers)
+        executor.shutdown()
+        return result
+
+    assert asyncio.run(run()) == "called"
+
+
+def test_closing_a_stream_early_stops_the_reader(fake_bedrock):
+    streams = _record_streams(fake_bedrock)
+
+    async def run():
+        deltas = BedrockService(fake_bedrock).stream_completion_deltas(MODEL_ID, MESSAGES)
+        first = await deltas.__anext__()
+        await deltas.aclose()
+        # No reader task is left pending once the stream is closed
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        return first, pending
+
+    first, pending = asyncio.run(run())
+    assert first == "word"
+    assert pending == []
+    assert streams[0].closed
+
+
+def test_reader_that_cannot_start_fails_the_stream(fake_bedrock, monkeypatch):
+    async def unavailable(*args):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    async def run():
+        monkeypatch.setattr(get_executor(), "read_stream", unavailable)
+        deltas = BedrockService(fake_bedrock).stream_completion_deltas(MODEL_ID, MESSAGES)
+        try:
+            return [text async for text in deltas]
+        except RuntimeError as e:
+            return str(e)
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5)) == "cannot schedule new futures after shutdown"
+
+
+def test_client_leaving_before_the_body_closes_upstream_and_frees_the_session(fake_bedrock):
+    streams = _record_streams(fake_bedrock)
+
+    async def disconnected():
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        # The client is gone while the response headers are being sent
+        await asyncio.sleep(10)
+
+    async def run():
+        store = get_session_store()
+        session = await store.create("key", MODEL_ID, [])
+        turn = await store.begin(session, MESSAGES)
+        request = CompactChatRequest(MODEL_ID, turn.messages, stream=True)
+        response = await _chat_completion(request, BackgroundTasks(), Response(), fake_bedrock, "key", None,
+                                          turn=turn)
+        # The first delta was read before the response was returned
+        assert len(streams) == 1 and not streams[0].closed
+        await asyncio.wait_for(response({"type": "http"}, disconnected, send), timeout=5)
+        # The session takes the next turn right away
+        await store.release(await store.begin(session, MESSAGES))
+
+    asyncio.run(run())
+    assert streams[0].closed
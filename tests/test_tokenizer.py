@@ -0,0 +1,47 @@
+from app.models.chat import Message
+from app.services import tokenizer
+from app.services.tokenizer import (
+    MESSAGE_OVERHEAD_TOKENS, StreamingTokenCounter, count_message_tokens, count_tokens, usage_from_invocation_metrics,
+    usage_from_response,
+)
+
+
+def test_memo_is_bounded_by_text_length(monkeypatch):
+    monkeypatch.setattr(tokenizer, "_MEMO_MAX_CHARS", 30000)
+    monkeypatch.setattr(tokenizer, "_MEMO_MAX_TEXT_CHARS", 20000)
+    monkeypatch.setattr(tokenizer, "_memo", type(tokenizer._memo)())
+    monkeypatch.setattr(tokenizer, "_memo_chars", 0)
+    texts = [f"text number {i} " * 1000 for i in range(5)]
+    counts = [count_tokens(text) for text in texts]
+    assert counts == [count_tokens(text) for text in texts]
+    assert 0 < tokenizer._memo_chars <= 30000
+    assert tokenizer._memo_chars == sum(len(text) for text in tokenizer._memo)
+    # Texts above the per-text limit are counted without being kept
+    huge = "word " * 5000
+    assert count_tokens(huge) > 0
+    assert huge not in tokenizer._memo
+
+
+def test_message_tokens_include_overhead():
+    messages = [Message(role="system", content="Be brief."), Message(role="user", content="Hi")]
+    assert count_message_tokens(messages) == (count_tokens("Be brief.") + count_tokens("Hi")
+                                              + 2 * MESSAGE_OVERHEAD_TOKENS)
+    assert count_tokens("") == 0
+
+
+def test_streaming_counter_matches_counting_the_whole_text():
+    text = "The quick brown fox jumps over the lazy dog, then writes some_code(x=1) and stops.\n" * 20
+    counter = StreamingTokenCounter()
+    for start in range(0, len(text), 7):
+        counter.feed(text[start:start + 7])
+    assert counter.total() == count_tokens(text)
+
+
+def test_bedrock_reported_usage_is_preferred_and_includes_cache_tokens():
+    usage = usage_from_response({"usage": {"input_tokens": 10, "output_tokens": 5, "cache_read_input_tokens": 90}})
+    assert usage == {"prompt_tokens": 100, "completion_tokens": 5, "total_tokens": 105, "cached_tokens": 90}
+    assert usage_from_response({}, {"x-amzn-bedrock-input-token-count": "3",
+                                    "x-amzn-bedrock-output-token-count": "4"})["total_tokens"] == 7
+    assert usage_from_response({}) is None
+    assert usage_from_invocation_metrics({"inputTokenCount": 8, "outputTokenCount": 2,
+                                          "cacheWriteInputTokenCount": 4})["cache_write_tokens"] == 4
@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from app.core.security import api_key_fingerprint
+from app.services import usage_tracking
+from app.services.usage_tracking import UsagePipeline, UsageStore, estimate_cost, track_usage
+
+MODEL_ID = "anthropic.claude-v2"
+
+
+def _record(tokens=10, api_key="fp", model=MODEL_ID, timestamp="2026-10-17T09:00:30"):
+    return {"timestamp": timestamp, "model": model, "tokens": tokens, "user_id": "anonymous",
+            "api_key": api_key, "cost_estimate": tokens / 1000, "request": {}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UsageStore(str(tmp_path / "usage.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_store_rolls_up_per_key_model_and_minute(store):
+    store.write_batch([_record(10), _record(20), _record(5, api_key="other"),
+                       _record(7, timestamp="2026-10-17T09:01:05")])
+    rollups = store.query_rollups(api_key="fp")
+    assert [(row["requests"], row["tokens"]) for row in rollups] == [(2, 30), (1, 7)]
+    assert rollups[1]["minute"] - rollups[0]["minute"] == 60
+    assert store.query_rollups(api_key="other")[0]["tokens"] == 5
+
+
+def test_pipeline_batches_and_drains_on_stop(store):
+    async def run():
+        pipeline = UsagePipeline(store, max_queue_size=100, batch_size=4, flush_interval=10.0)
+        pipeline.start()
+        for _ in range(10):
+            assert pipeline.submit(_record())
+        # Two full batches go out without waiting for the flush interval
+        for _ in range(100):
+            if pipeline.written >= 8:
+                break
+            await asyncio.sleep(0.01)
+        assert pipeline.written == 8
+        await pipeline.stop()
+        return pipeline
+
+    pipeline = asyncio.run(run())
+    assert pipeline.written == 10
+    assert pipeline.dropped == 0
+    assert store.query_rollups()[0]["requests"] == 10
+
+
+def test_pipeline_flushes_after_interval(store):
+    async def run():
+        pipeline = UsagePipeline(store, max_queue_size=100, batch_size=100, flush_interval=0.02)
+        pipeline.start()
+        pipeline.submit(_record())
+        await asyncio.sleep(0.2)
+        written = pipeline.written
+        await pipeline.stop()
+        return written
+
+    assert asyncio.run(run()) == 1
+
+
+def test_full_queue_drops_instead_of_blocking(store):
+    async def run():
+        pipeline = UsagePipeline(store, max_queue_size=2, batch_size=10, flush_interval=1.0)
+        accepted = [pipeline.submit(_record()) for _ in range(3)]
+        await pipeline.stop()
+        return accepted, pipeline
+
+    accepted, pipeline = asyncio.run(run())
+    assert accepted == [True, True, False]
+    assert pipeline.dropped == 1
+    assert pipeline.written == 2
+
+
+def test_cache_tokens_are_priced_differently():
+    full = estimate_cost(MODEL_ID, 1000)
+    assert estimate_cost(MODEL_ID, 1000, cached_tokens=1000) == pytest.approx(full * 0.1)
+    assert estimate_cost(MODEL_ID, 1000, cache_write_tokens=1000) == pytest.approx(full * 1.25)
+
+
+def test_track_usage_records_key_fingerprint(tmp_path, configure):
+    configure(TRACK_USAGE=True, USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"))
+
+    async def run():
+        try:
+            record = await track_usage(MODEL_ID, 42, user_id="alice", api_key="secret-key")
+        finally:
+            await usage_tracking.flush_usage_pipeline()
+        store = UsageStore(str(tmp_path / "usage.sqlite3"))
+        rollups = store.query_rollups(api_key=api_key_fingerprint("secret-key"))
+        store.close()
+        return record, rollups
+
+    record, rollups = asyncio.run(run())
+    assert record["api_key"] == api_key_fingerprint("secret-key")
+    assert [(row["model"], row["tokens"]) for row in rollups] == [(MODEL_ID, 42)]
+
+
+def test_completion_usage_reaches_the_store(client, tmp_path, configure):
+    configure(TRACK_USAGE=True, USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"))
+    response = client.post("/v1/chat/completions", json={
+        "model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}], "user_id": "alice",
+    })
+    assert response.status_code == 200
+    tokens = response.json()["usage"]["total_tokens"]
+    # Background tasks have run by now; write out the queued record
+    client.portal.call(usage_tracking.flush_usage_pipeline)
+    store = UsageStore(str(tmp_path / "usage.sqlite3"))
+    try:
+        rollups = store.query_rollups(api_key=api_key_fingerprint("test-key"))
+    finally:
+        store.close()
+    assert [(row["requests"], row["tokens"]) for row in rollups] == [(1, tokens)]
+
+
+def test_usage_endpoint_is_404_without_tracking(client, tmp_path, configure):
+    configure(TRACK_USAGE=False, USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"))
+    assert client.get("/v1/usage").status_code == 404
+    assert usage_tracking._pipeline is None
+    assert not (tmp_path / "usage.sqlite3").exists()
+
+
+def test_usage_endpoint_reports_the_calling_key(client, tmp_path, configure):
+    configure(TRACK_USAGE=True, USAGE_DB_PATH=str(tmp_path / "usage.sqlite3"))
+    client.post("/v1/chat/completions", json={"model": MODEL_ID, "messages": [{"role": "user", "content": "Hi"}]})
+    client.portal.call(usage_tracking.flush_usage_pipeline)
+    usage = client.get("/v1/usage", params={"model": MODEL_ID}).json()
+    assert [row["requests"] for row in usage["data"]] == [1]
+    assert usage["pipeline"] == {"queued": 0, "dropped": 0}
+    client.portal.call(usage_tracking.flush_usage_pipeline)